@@ -0,0 +1,756 @@
+"""
+Benchmarks of the scaling of network generation with OpenCortex.
+
+Each benchmark builds (part of) a network of a given size and measures the wall time of the operation benchmarked, the peak
+resident set size (RSS) of the process and the number of elements (cells, connections or inputs) generated per second. Every
+run of a benchmark is made in a fresh Python process, so that the peak RSS of one benchmark does not hide that of the next.
+
+Examples:
+
+    python run_benchmarks.py                                     # all benchmarks, default sizes, results printed
+    python run_benchmarks.py --sizes 1000 10000 --output baseline.json
+    python run_benchmarks.py --sizes 1000 10000 --compare baseline.json --output current.json
+    python run_benchmarks.py --input current.json --compare baseline.json   # compare stored results without running
+
+In comparison mode, a benchmark regresses when its wall time or peak RSS exceeds that of the baseline by more than the tolerance
+(see --time-tolerance, --rss-tolerance and --min-time); the script then exits with status 1.
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+### Fixtures of the unit tests: the cells Test and Test2 and the connectivity summary ConnListTest
+TEST_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "opencortex", "test")
+
+DEFAULT_SIZES = [100, 1000]
+
+### Benchmarks which do not depend on the network size, run once with size 0
+SIZE_INDEPENDENT = ["import"]
+
+### Maximum time (in seconds) for importing opencortex.core, opencortex.build and opencortex.utils (see --import-budget)
+IMPORT_TIME_BUDGET = 1.0
+
+RESULTS_FORMAT = 1
+
+
+##############################################################################################
+
+
+def _new_network(reference="Benchmark"):
+    import opencortex.core as oc
+
+    return oc.generate_network(reference, network_seed=1234)
+
+
+def _add_population(net, pop_id, size, component="iaf", side=None):
+    """Adds a population of `size` cells with uniformly random positions in a cube with a volume proportional to `size`"""
+
+    import opencortex.core as oc
+
+    if side == None:
+        side = 100 * (size / 100.0) ** (1 / 3.0)
+
+    return oc.add_population_in_rectangular_region(
+        net, pop_id, component, size, 0, 0, 0, side, side, side
+    )
+
+
+def _get_positions(population):
+    import numpy as np
+
+    return np.array(
+        [
+            [instance.location.x, instance.location.y, instance.location.z]
+            for instance in population.instances
+        ]
+    )
+
+
+def _count_connections(net):
+    count = 0
+
+    for projection in net.projections:
+        count += len(projection.connections) + len(projection.connection_wds)
+
+    for projection in net.electrical_projections:
+        count += (
+            len(projection.electrical_connections)
+            + len(projection.electrical_connection_instances)
+            + len(projection.electrical_connection_instance_ws)
+        )
+
+    return count
+
+
+##############################################################################################
+
+
+def bench_import(size, timer):
+    """Import of opencortex.core, opencortex.build and opencortex.utils in a fresh process; the simulation modules of pyNeuroML
+    must not be loaded"""
+
+    num_modules = len(sys.modules)
+
+    with timer:
+        for module in ["opencortex.core", "opencortex.build", "opencortex.utils"]:
+            importlib.import_module(module)
+
+    for module in ["pyneuroml.pynml", "pyneuroml.lems", "matplotlib"]:
+        if module in sys.modules:
+            raise Exception("Error! Importing opencortex loaded %s" % module)
+
+    return len(sys.modules) - num_modules, "modules"
+
+
+def bench_placement(size, timer):
+    """Random placement of the cells of one population"""
+
+    nml_doc, net = _new_network()
+
+    with timer:
+        _add_population(net, "Pop0", size)
+
+    return size, "cells"
+
+
+def bench_probabilistic_projection(size, timer):
+    """Projection between two populations of `size` cells with (on average) 50 connections per postsynaptic cell"""
+
+    import opencortex.core as oc
+
+    nml_doc, net = _new_network()
+
+    pre_pop = _add_population(net, "Pop0", size)
+
+    post_pop = _add_population(net, "Pop1", size)
+
+    with timer:
+        oc.add_probabilistic_projection(
+            net, "proj", pre_pop, post_pop, "AMPA", min(1.0, 50.0 / size), delay=2
+        )
+
+    return _count_connections(net), "connections"
+
+
+def bench_targeted_projection(size, timer):
+    """Convergent projection with AMPA and NMDA components between two populations of `size` cells, with 50 connections on the
+    dendrites of each postsynaptic cell"""
+
+    import opencortex.build as oc_build
+
+    nml_doc, net = _new_network()
+
+    pre_pop = _add_population(net, "Pop0", size)
+
+    post_pop = _add_population(net, "Pop1", size)
+
+    proj_array = [
+        oc_build.containers.ColumnarProjection(
+            id="proj_%s" % synapse,
+            presynaptic_population=pre_pop.id,
+            postsynaptic_population=post_pop.id,
+            synapse=synapse,
+        )
+        for synapse in ["AMPA", "NMDA"]
+    ]
+
+    pre_target_dict = {"axon_group": {"SegList": [5, 6], "LengthDist": [20, 40]}}
+
+    post_target_dict = {
+        "dendrite_group": {"SegList": [1, 2, 3, 4], "LengthDist": [50, 100, 120, 200]}
+    }
+
+    with timer:
+        oc_build.add_targeted_projection_by_dicts(
+            net,
+            proj_array,
+            pre_pop,
+            post_pop,
+            "convergent",
+            ["AMPA", "NMDA"],
+            pre_target_dict,
+            post_target_dict,
+            {"dendrite_group": 50},
+            {"NMDA": 5},
+            {"AMPA": 1.5},
+        )
+
+    return _count_connections(net), "connections"
+
+
+def bench_spatial_projection(size, timer):
+    """Distance-dependent convergent projection between two populations of `size` cells, with a cutoff radius of 100 um"""
+
+    import opencortex.build as oc_build
+
+    nml_doc, net = _new_network()
+
+    pre_pop = _add_population(net, "Pop0", size)
+
+    post_pop = _add_population(net, "Pop1", size)
+
+    proj_array = [
+        oc_build.containers.ColumnarProjection(
+            id="proj",
+            presynaptic_population=pre_pop.id,
+            postsynaptic_population=post_pop.id,
+            synapse="AMPA",
+        )
+    ]
+
+    target_dict = {"soma_group": {"SegList": [0], "LengthDist": [10]}}
+
+    with timer:
+        oc_build.add_chem_spatial_projection(
+            net,
+            proj_array,
+            pre_pop,
+            post_pop,
+            "convergent",
+            ["AMPA"],
+            None,
+            target_dict,
+            {"soma_group": 10},
+            "exp(-r/50)",
+            _get_positions(pre_pop),
+            _get_positions(post_pop),
+            None,
+            None,
+            cutoff_radius=100,
+            spatial_index_cache={},
+        )
+
+    return _count_connections(net), "connections"
+
+
+def bench_inputs(size, timer):
+    """Poisson inputs distributed on the soma group of a population of `size` cells, 20 inputs per cell"""
+
+    import opencortex.build as oc_build
+    import opencortex.core as oc
+
+    nml_doc, net = _new_network()
+
+    pop = _add_population(net, "Pop0", size)
+
+    oc.add_poisson_firing_synapse(
+        nml_doc, id="psf", average_rate="150 Hz", synapse_id="AMPA"
+    )
+
+    target_dict = {"soma_group": {"SegList": [0, 1], "LengthDist": [10, 30]}}
+
+    with timer:
+        oc_build.add_advanced_inputs_to_population(
+            net,
+            "Input",
+            pop,
+            [["psf"]],
+            target_dict,
+            {"soma_group": 20},
+            None,
+            None,
+            all_cells=True,
+        )
+
+    return (
+        sum(
+            [
+                len(input_list.input) + len(input_list.input_ws)
+                for input_list in net.input_lists
+            ]
+        ),
+        "inputs",
+    )
+
+
+def bench_build_connectivity(size, timer):
+    """opencortex.utils.build_connectivity() with the connectivity summary and cells of the unit tests; `size` cells in
+    CG3D_L23PyrRS and size/20 cells in CG3D_L23PyrFRB"""
+
+    import opencortex.utils as oc_utils
+
+    nml_doc, net = _new_network()
+
+    popDict = {}
+    popDict["CG3D_L23PyrRS"] = (size, "L23", "Test", "multi", None)
+    popDict["CG3D_L23PyrFRB"] = (max(1, size // 20), "L23", "Test2", "multi", None)
+
+    pop_params = oc_utils.add_populations_in_rectangular_layers(
+        net=net,
+        boundaryDict={"L1": [0, 0], "L23": [0, -500]},
+        popDict=popDict,
+        x_vector=[0, 500],
+        z_vector=[0, 500],
+    )
+
+    with timer:
+        oc_utils.build_connectivity(
+            net=net,
+            pop_objects=pop_params,
+            path_to_cells=TEST_DIR,
+            full_path_to_conn_summary=os.path.join(TEST_DIR, "ConnListTest"),
+            pre_segment_group_info=[{"PreSegGroup": "distal_axon", "ProjType": "Chem"}],
+            synaptic_scaling_params=[
+                {
+                    "weight": 2.0,
+                    "synComp": "AMPA",
+                    "synEndsWith": [],
+                    "targetCellGroup": [],
+                }
+            ],
+            synaptic_delay_params=[{"delay": 0.05, "synComp": "all"}],
+        )
+
+    return _count_connections(net), "connections"
+
+
+def _bench_save_network(size, timer, format):
+    import opencortex.core as oc
+
+    nml_doc, net = _new_network()
+
+    pre_pop = _add_population(net, "Pop0", size)
+
+    post_pop = _add_population(net, "Pop1", size)
+
+    oc.add_probabilistic_projection(
+        net, "proj", pre_pop, post_pop, "AMPA", min(1.0, 50.0 / size), delay=2
+    )
+
+    target_dir = tempfile.mkdtemp()
+
+    try:
+        with timer:
+            oc.save_network(
+                nml_doc,
+                "Benchmark.net.nml" + (".h5" if format == "hdf5" else ""),
+                validate=False,
+                format=format,
+                target_dir=target_dir,
+            )
+
+    finally:
+        shutil.rmtree(target_dir)
+
+    return _count_connections(net), "connections"
+
+
+def bench_save_network_xml(size, timer):
+    """opencortex.core.save_network() in XML of a network with two populations of `size` cells and ~50 connections per cell"""
+
+    return _bench_save_network(size, timer, "xml")
+
+
+def bench_save_network_hdf5(size, timer):
+    """opencortex.core.save_network() in HDF5 of a network with two populations of `size` cells and ~50 connections per cell"""
+
+    return _bench_save_network(size, timer, "hdf5")
+
+
+BENCHMARKS = {
+    "import": bench_import,
+    "placement": bench_placement,
+    "probabilistic_projection": bench_probabilistic_projection,
+    "targeted_projection": bench_targeted_projection,
+    "spatial_projection": bench_spatial_projection,
+    "inputs": bench_inputs,
+    "build_connectivity": bench_build_connectivity,
+    "save_network_xml": bench_save_network_xml,
+    "save_network_hdf5": bench_save_network_hdf5,
+}
+
+
+##############################################################################################
+
+
+class Timer(object):
+    """Context manager which adds the wall time spent in it to `elapsed`"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed += time.perf_counter() - self.start
+
+
+def _get_peak_rss():
+    """Returns the peak RSS of this process in MB (ru_maxrss is in kB on Linux and in bytes on macOS)"""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if sys.platform == "darwin":
+        return peak / (1024.0 * 1024.0)
+
+    return peak / 1024.0
+
+
+def run_case(name, size, result_file):
+    """Runs one benchmark in this process and writes the result to `result_file` (used in the child processes)"""
+
+    if name != "import":
+        importlib.import_module("opencortex.core")
+
+        from opencortex.build import cell_cache
+
+        ### the cells are parsed in each run rather than loaded from the persistent cache, which earlier runs would have filled
+        cell_cache.set_cache_dir(None)
+
+    ### peak RSS after the imports, i.e. the part of the peak RSS not due to the benchmark
+    base_rss = _get_peak_rss()
+
+    timer = Timer()
+
+    count, unit = BENCHMARKS[name](size, timer)
+
+    result = {
+        "Benchmark": name,
+        "Size": size,
+        "WallTime": timer.elapsed,
+        "PeakRSS": _get_peak_rss(),
+        "BaseRSS": base_rss,
+        "Count": count,
+        "Unit": unit,
+        "Rate": count / timer.elapsed if timer.elapsed > 0 else None,
+    }
+
+    with open(result_file, "w") as f:
+        json.dump(result, f)
+
+
+def run_in_subprocess(name, size, verbose=False):
+    """Runs one benchmark in a fresh Python process and returns its result"""
+
+    handle, result_file = tempfile.mkstemp(suffix=".json")
+
+    os.close(handle)
+
+    try:
+        process = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--run-case",
+                name,
+                str(size),
+                result_file,
+            ],
+            stdout=None if verbose else subprocess.DEVNULL,
+            stderr=None if verbose else subprocess.PIPE,
+            universal_newlines=True,
+        )
+
+        if process.returncode != 0:
+            raise Exception(
+                "Error! The benchmark %s failed for size %i:\n%s"
+                % (name, size, process.stderr if process.stderr else "")
+            )
+
+        with open(result_file) as f:
+            return json.load(f)
+
+    finally:
+        os.remove(result_file)
+
+
+def run_benchmarks(names, sizes, repeat=1, verbose=False):
+    """Runs the benchmarks `names` for all `sizes`; with `repeat` > 1 the minimum wall time and peak RSS of the runs are kept"""
+
+    results = []
+
+    for name in names:
+        for size in [0] if name in SIZE_INDEPENDENT else sizes:
+            runs = [run_in_subprocess(name, size, verbose) for i in range(0, repeat)]
+
+            result = min(runs, key=lambda run: run["WallTime"])
+
+            result["PeakRSS"] = min([run["PeakRSS"] for run in runs])
+
+            result["Repeats"] = repeat
+
+            print_result(result)
+
+            results.append(result)
+
+    return results
+
+
+def get_metadata():
+    import neuroml
+    import numpy as np
+    import opencortex
+
+    return {
+        "Format": RESULTS_FORMAT,
+        "Date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "Python": platform.python_version(),
+        "Platform": platform.platform(),
+        "Machine": platform.machine(),
+        "CPUs": os.cpu_count(),
+        "OpenCortex": opencortex.__version__,
+        "libNeuroML": neuroml.__version__,
+        "NumPy": np.__version__,
+    }
+
+
+##############################################################################################
+
+
+def print_result(result):
+    rate = (
+        "%12.0f %s/s" % (result["Rate"], result["Unit"])
+        if result["Rate"] != None
+        else ""
+    )
+
+    print(
+        "%-26s %9i %10.3f s %9.1f MB %10i %s"
+        % (
+            result["Benchmark"],
+            result["Size"],
+            result["WallTime"],
+            result["PeakRSS"],
+            result["Count"],
+            rate,
+        )
+    )
+
+
+def compare_results(
+    results, baseline, time_tolerance=0.25, rss_tolerance=0.25, min_time=0.05
+):
+    """Compares `results` with the `baseline` results of the same benchmarks and sizes.
+
+    Returns the list of (benchmark, size, quantity, baseline value, new value) of the regressions: a wall time more than
+    `time_tolerance` (relative) and `min_time` seconds above the baseline, or a peak RSS more than `rss_tolerance` above it.
+    """
+
+    baseline_by_case = dict(
+        ((result["Benchmark"], result["Size"]), result) for result in baseline
+    )
+
+    regressions = []
+
+    for result in results:
+        key = (result["Benchmark"], result["Size"])
+
+        if key not in baseline_by_case:
+            continue
+
+        old = baseline_by_case[key]
+
+        if (
+            result["WallTime"] > old["WallTime"] * (1 + time_tolerance)
+            and result["WallTime"] - old["WallTime"] > min_time
+        ):
+            regressions.append(
+                (key[0], key[1], "WallTime", old["WallTime"], result["WallTime"])
+            )
+
+        if result["PeakRSS"] > old["PeakRSS"] * (1 + rss_tolerance):
+            regressions.append(
+                (key[0], key[1], "PeakRSS", old["PeakRSS"], result["PeakRSS"])
+            )
+
+    return regressions
+
+
+def print_comparison(results, baseline, regressions):
+    baseline_by_case = dict(
+        ((result["Benchmark"], result["Size"]), result) for result in baseline
+    )
+
+    regressed = set([(benchmark, size) for benchmark, size, q, o, n in regressions])
+
+    print(
+        "\n%-26s %9s %21s %23s" % ("Benchmark", "Size", "WallTime (s)", "PeakRSS (MB)")
+    )
+
+    for result in results:
+        key = (result["Benchmark"], result["Size"])
+
+        if key not in baseline_by_case:
+            print("%-26s %9i   (not in the baseline)" % key)
+            continue
+
+        old = baseline_by_case[key]
+
+        print(
+            "%-26s %9i %8.3f -> %8.3f %9.1f -> %9.1f %s"
+            % (
+                key[0],
+                key[1],
+                old["WallTime"],
+                result["WallTime"],
+                old["PeakRSS"],
+                result["PeakRSS"],
+                "REGRESSION" if key in regressed else "",
+            )
+        )
+
+
+def load_results(file_name):
+    with open(file_name) as f:
+        stored = json.load(f)
+
+    if stored.get("Metadata", {}).get("Format") != RESULTS_FORMAT:
+        raise Exception(
+            "Error! %s is not a file of benchmark results in format %s"
+            % (file_name, RESULTS_FORMAT)
+        )
+
+    return stored
+
+
+def save_results(file_name, results):
+    with open(file_name, "w") as f:
+        json.dump({"Metadata": get_metadata(), "Results": results}, f, indent=2)
+
+
+##############################################################################################
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of network generation with OpenCortex",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Benchmarks: %s" % ", ".join(BENCHMARKS.keys()),
+    )
+
+    parser.add_argument(
+        "--benchmarks",
+        nargs="+",
+        choices=list(BENCHMARKS.keys()),
+        default=list(BENCHMARKS.keys()),
+        help="benchmarks to run (default: all)",
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SIZES,
+        help="network sizes (cells per population) (default: %s)"
+        % " ".join([str(size) for size in DEFAULT_SIZES]),
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="runs of each benchmark (default: 1)"
+    )
+    parser.add_argument("--output", help="JSON file to save the results to")
+    parser.add_argument(
+        "--input",
+        help="JSON file with stored results to compare instead of running the benchmarks",
+    )
+    parser.add_argument(
+        "--compare", help="JSON file with the baseline results to compare with"
+    )
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=0.25,
+        help="relative increase of the wall time flagged as a regression (default: 0.25)",
+    )
+    parser.add_argument(
+        "--rss-tolerance",
+        type=float,
+        default=0.25,
+        help="relative increase of the peak RSS flagged as a regression (default: 0.25)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="increases of the wall time below this many seconds are ignored (default: 0.05)",
+    )
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=IMPORT_TIME_BUDGET,
+        help="maximum time in seconds for importing opencortex (default: %s)"
+        % IMPORT_TIME_BUDGET,
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="show the output of OpenCortex"
+    )
+    parser.add_argument("--run-case", nargs=3, help=argparse.SUPPRESS)
+
+    args = parser.parse_args(args)
+
+    if args.run_case:
+        name, size, result_file = args.run_case
+
+        run_case(name, int(size), result_file)
+
+        return 0
+
+    if args.input:
+        results = load_results(args.input)["Results"]
+
+    else:
+        print(
+            "%-26s %9s %12s %12s %10s %s"
+            % ("Benchmark", "Size", "WallTime", "PeakRSS", "Count", "Rate")
+        )
+
+        results = run_benchmarks(
+            args.benchmarks, args.sizes, repeat=args.repeat, verbose=args.verbose
+        )
+
+    if args.output:
+        save_results(args.output, results)
+
+        print("\nSaved the results to %s" % args.output)
+
+    status = 0
+
+    for result in results:
+        if result["Benchmark"] == "import" and result["WallTime"] > args.import_budget:
+            print(
+                "\nImporting opencortex took %.3f s, over the budget of %.3f s"
+                % (result["WallTime"], args.import_budget)
+            )
+
+            status = 1
+
+    if args.compare:
+        baseline = load_results(args.compare)["Results"]
+
+        regressions = compare_results(
+            results,
+            baseline,
+            time_tolerance=args.time_tolerance,
+            rss_tolerance=args.rss_tolerance,
+            min_time=args.min_time,
+        )
+
+        print_comparison(results, baseline, regressions)
+
+        if len(regressions) > 0:
+            print(
+                "\n%i regression(s) compared with %s" % (len(regressions), args.compare)
+            )
+
+            return 1
+
+        print("\nNo regressions compared with %s" % args.compare)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,20 +9,59 @@
 ###
 ##############################################################
 
-print(
-    "\n*********************************************************************************************"
-)
-print("          Please note that OpenCortex is in a preliminary state ")
-print("          and the API is subject to change without notice!  ")
-print(
-    "*********************************************************************************************\n"
-)
+"""
+Importing opencortex (and opencortex.core, opencortex.build and opencortex.utils) has no side effects and does not load the
+simulation/LEMS modules of pyNeuroML (pyneuroml.pynml, pyneuroml.lems), which are slow to import; these are only loaded when
+they are first used, e.g. by opencortex.core.generate_lems_simulation() or opencortex.core.simulate_network().
+"""
+
+import importlib
 
 __version__ = "0.1.18"
 
 
 verbose = False
 
+_notice_printed = False
+
+### Attributes of opencortex.core, opencortex.build and opencortex.utils which are imported when first accessed: (module, attribute)
+_lazy_attributes = {
+    "pyneuroml": ("pyneuroml", None),
+    "pynml": ("pyneuroml.pynml", None),
+    "LEMSSimulation": ("pyneuroml.lems.LEMSSimulation", "LEMSSimulation"),
+}
+
+
+def _get_lazy_attribute(module_name, name):
+    """Returns the lazily imported attribute `name` of the module `module_name` (called by the __getattr__() of the module)"""
+
+    if name not in _lazy_attributes:
+        raise AttributeError("module %r has no attribute %r" % (module_name, name))
+
+    lazy_module_name, attribute = _lazy_attributes[name]
+
+    module = importlib.import_module(lazy_module_name)
+
+    return getattr(module, attribute) if attribute != None else module
+
+
+def print_notice():
+    """
+    Print (once) the notice that OpenCortex is in a preliminary state
+    """
+    global _notice_printed
+    if _notice_printed:
+        return
+    _notice_printed = True
+    print(
+        "\n*********************************************************************************************"
+    )
+    print("          Please note that OpenCortex is in a preliminary state ")
+    print("          and the API is subject to change without notice!  ")
+    print(
+        "*********************************************************************************************\n"
+    )
+
 
 def print_comment_v(text):
     """
@@ -31,15 +70,22 @@ def print_comment_v(text):
     print_comment(text, True)
 
 
-def print_comment(text, print_it=verbose):
+def print_comment(text, print_it=None, args=None):
     """
-    Print a comment only if print_it == True
+    Print a comment only if print_it == True (by default, if verbose is set, see set_verbose()).
+    If `args` is given, `text` is a format string which is only formatted with `args` if the comment is printed,
+    so that comments in loops cost (almost) nothing when they are not printed
     """
+    if print_it == None:
+        print_it = verbose
+    if not print_it:
+        return
     prefix = "OpenCortex >>> "
     if not isinstance(text, str):
         text = text.decode("ascii")
-    if print_it:
-        print("%s%s" % (prefix, text.replace("\n", "\n" + prefix)))
+    if args != None:
+        text = text % args
+    print("%s%s" % (prefix, text.replace("\n", "\n" + prefix)))
 
 
 def set_verbose(value=True):
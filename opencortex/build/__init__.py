@@ -9,6 +9,7 @@
 ###
 ##############################################################
 
+import hashlib
 import json
 import math
 import neuroml
@@ -18,24 +19,45 @@ import numpy as np
 import opencortex
 import operator
 import os
-import pyneuroml
-from pyneuroml import pynml
-import pyneuroml.lems
-from pyneuroml.lems.LEMSSimulation import LEMSSimulation
 import random
 import shutil
 import sys
+import warnings
+import weakref
+
+from opencortex.build import cell_cache
+from opencortex.build import containers
+from opencortex.build import expressions
+from opencortex.build import morphology
+from opencortex.build import partition
+from opencortex.build import sampling
+from opencortex.build import spatial
+from opencortex.build import sparse
+from opencortex.build import streaming
+from opencortex.build import tracing
 
 all_cells = {}
 all_included_files = []
 
 cell_ids_vs_nml_docs = {}
 
+### Seeds of the networks, set by opencortex.core.generate_network(); see get_element_rng()
+network_seeds = weakref.WeakKeyDictionary()
+
 to_be_copied_on_save = []
 
 ##############################################################################################
 
 
+def __getattr__(name):
+    """Imports the slow modules of pyNeuroML (e.g. pynml) when they are first used"""
+
+    return opencortex._get_lazy_attribute(__name__, name)
+
+
+##############################################################################################
+
+
 def _add_connection(
     projection,
     id,
@@ -55,8 +77,8 @@ def _add_connection(
     """
 
     opencortex.print_comment(
-        "Adding single conn %s in proj %s: %s(%s:%s:%s) -> %s(%s:%s:%s), delay: %sms, weight: %s"
-        % (
+        "Adding single conn %s in proj %s: %s(%s:%s:%s) -> %s(%s:%s:%s), delay: %sms, weight: %s",
+        args=(
             id,
             projection.id,
             presynaptic_population.id,
@@ -69,9 +91,32 @@ def _add_connection(
             post_fraction,
             delay,
             weight,
-        )
+        ),
     )
 
+    if isinstance(projection.connection_wds, containers.ConnectionColumns):
+        projection.connection_wds.set_cell_formats(
+            containers.cell_id_format(presynaptic_population),
+            containers.cell_id_format(postsynaptic_population),
+        )
+        try:
+            projection.connection_wds.add(
+                id,
+                pre_cell_id,
+                post_cell_id,
+                pre_seg_id,
+                post_seg_id,
+                pre_fraction,
+                post_fraction,
+                weight,
+                delay,
+            )
+            return
+
+        except (TypeError, ValueError):
+            # e.g. delay given with units; stored as a ConnectionWD object below
+            pass
+
     connection = neuroml.ConnectionWD(
         id=id,
         pre_cell_id="../%s/%i/%s"
@@ -88,6 +133,11 @@ def _add_connection(
 
     projection.connection_wds.append(connection)
 
+    if tracing.enabled and not isinstance(
+        projection.connection_wds, containers.ConnectionColumns
+    ):
+        tracing.count("connections")
+
 
 ##############################################################################################
 
@@ -110,8 +160,8 @@ def add_elect_connection(
     """
 
     opencortex.print_comment(
-        "Adding single electrical conn %s in proj %s: %s(%s:%s:%s) -> %s(%s:%s:%s)"
-        % (
+        "Adding single electrical conn %s in proj %s: %s(%s:%s:%s) -> %s(%s:%s:%s)",
+        args=(
             id,
             projection.id,
             presynaptic_population.id,
@@ -122,9 +172,31 @@ def add_elect_connection(
             post_cell_id,
             post_seg_id,
             post_fraction,
-        )
+        ),
     )
 
+    connections = projection.electrical_connection_instance_ws
+
+    if isinstance(connections, containers.ConnectionColumns):
+        if connections.synapse == None:
+            connections.synapse = gap_junction_id
+
+        if connections.synapse == gap_junction_id:
+            connections.set_cell_formats(
+                containers.cell_id_format(presynaptic_population),
+                containers.cell_id_format(postsynaptic_population),
+            )
+            connections.add(
+                id,
+                pre_cell_id,
+                post_cell_id,
+                pre_seg_id,
+                post_seg_id,
+                pre_fraction,
+                post_fraction,
+            )
+            return
+
     connection = neuroml.ElectricalConnectionInstanceW(
         id=id,
         pre_cell="../%s/%i/%s"
@@ -141,10 +213,297 @@ def add_elect_connection(
 
     projection.electrical_connection_instance_ws.append(connection)
 
+    if tracing.enabled and not isinstance(connections, containers.ConnectionColumns):
+        tracing.count("connections")
+
+
+##############################################################################################
+
+
+def _get_rng():
+    """
+    Returns a NumPy random generator seeded from the state of the global `random` module, so that the vectorized
+    builders are reproducible given the network seed set in opencortex.core.generate_network()
+    """
+
+    return np.random.default_rng(random.getrandbits(64))
+
+
+##############################################################################################
+
+
+def set_network_seed(net, network_seed):
+    """Sets the seed from which the random streams of the populations, projections and input lists of `net` are derived, see get_element_rng()"""
+
+    network_seeds[net] = network_seed
+
+
+def get_network_seed(net):
+    """Returns the seed set with set_network_seed() for `net`, or None"""
+
+    if net == None:
+        return None
+
+    return network_seeds.get(net, None)
+
+
+def _element_seed_sequence(network_seed, element_id):
+    """Returns a numpy.random.SeedSequence which depends only on `network_seed` and the (string) id of the element"""
+
+    key = np.frombuffer(
+        hashlib.sha256(str(element_id).encode("utf-8")).digest(), dtype=np.uint32
+    )
+
+    return np.random.SeedSequence(
+        entropy=int(network_seed) % 2**64, spawn_key=tuple(int(k) for k in key)
+    )
+
+
+def get_element_rng(net, element_id):
+    """
+    Returns a NumPy random generator for the element (population, projection, input list...) with id `element_id` of `net`,
+    derived from the network seed of `net` and `element_id` only; if no network seed has been set for `net` the generator is
+    seeded from the global `random` module as in _get_rng().
+
+    The builders draw all the random numbers of an element from its generator, so the element is the same whatever was built
+    before it (or in parallel/in another process), and the global `random` and `numpy.random` states are left alone.
+    """
+
+    network_seed = get_network_seed(net)
+
+    if network_seed == None:
+        return _get_rng()
+
+    return np.random.default_rng(_element_seed_sequence(network_seed, element_id))
+
+
+def _get_projection_rng(net, proj_array):
+    """Returns the generator (see get_element_rng()) of a projection built into the projections of `proj_array` (one per synapse),
+    using the id of the first one"""
+
+    if proj_array != None and len(proj_array) > 0:
+        return get_element_rng(net, proj_array[0].id)
+
+    return _get_rng()
+
+
+def _get_cell_blocks(
+    net, element_id, targeting_mode, postsynaptic_population, num_cells, rng
+):
+    """
+    Generator of the blocks of the cells looped over by the targeted and spatial projection builders, as (first cell, end cell, owned,
+    rng), where owned is the boolean array of the cells of the block whose connections are kept, or None if all of them are, and rng
+    is the generator to draw the connections of the block from.
+
+    Without a rank set (see opencortex.build.partition) there is a single block of all `num_cells` cells, drawn from `rng` (the generator
+    of the projection). Otherwise the projection must be convergent and the blocks are those with postsynaptic cells owned by the rank;
+    each block is drawn from its own generator (see get_element_rng()), so that the connections made do not depend on the partition.
+    """
+
+    owned = partition.get_owned_cells(net, postsynaptic_population)
+
+    if owned is None:
+        yield 0, num_cells, None, rng
+
+        return
+
+    if targeting_mode != "convergent":
+        raise Exception(
+            "Error! Projection %s is %s, but only convergent projections can be built for a rank of a partitioned network"
+            % (element_id, targeting_mode)
+        )
+
+    if get_network_seed(net) == None:
+        raise Exception(
+            "Error! Projection %s cannot be built for a rank of a partitioned network without a network seed"
+            % element_id
+        )
+
+    for block, start, end, mask in partition.get_blocks(owned, num_cells):
+        yield (
+            start,
+            end,
+            mask,
+            get_element_rng(net, partition.get_block_id(element_id, block)),
+        )
+
+
+def _get_connected_pairs(
+    net,
+    element_id,
+    presynaptic_population,
+    postsynaptic_population,
+    connection_probability,
+    rng,
+):
+    """
+    Generator of the pairs of cells (other than a cell with itself) connected with probability `connection_probability`, as (rng,
+    pre_cell_ids, post_cell_ids, kept): `rng` is the generator to draw the values of the connections from (`rng`, the generator of
+    the projection, unless a rank is set) and `kept` indexes the pairs (and values drawn for them) to add, which are those onto the
+    postsynaptic cells owned by the current rank, if one is set (see _get_cell_blocks()).
+    """
+
+    exclude_self = presynaptic_population.id == postsynaptic_population.id
+
+    if partition.get_owned_cells(net, postsynaptic_population) is None:
+        for pre_ids, post_ids in sampling.bernoulli_pairs(
+            rng,
+            presynaptic_population.size,
+            postsynaptic_population.size,
+            connection_probability,
+            exclude_self=exclude_self,
+        ):
+            yield rng, pre_ids, post_ids, slice(None)
+
+        return
+
+    for start, end, owned, rng in _get_cell_blocks(
+        net,
+        element_id,
+        "convergent",
+        postsynaptic_population,
+        postsynaptic_population.size,
+        rng,
+    ):
+        for pre_ids, post_ids in sampling.bernoulli_pairs(
+            rng, presynaptic_population.size, end - start, connection_probability
+        ):
+            post_ids = post_ids + start
+
+            if exclude_self:
+                not_self = pre_ids != post_ids
+
+                pre_ids = pre_ids[not_self]
+
+                post_ids = post_ids[not_self]
+
+            yield rng, pre_ids, post_ids, owned[post_ids - start]
+
+
+##############################################################################################
+
+
+def _get_target_segments_per_cell(
+    post_seg_target_dict, pre_seg_target_dict, subset_dict, num_cells, rng=None
+):
+    """
+    Rounds the (possibly fractional) numbers of connections in `subset_dict` up or down at random for each of `num_cells` cells
+    and draws the post target segments of all cells at once with get_target_segments_for_cells(); pre target segments are only
+    drawn if `pre_seg_target_dict` has a single group (e.g. distal_axon), otherwise the pre lists contain None.
+
+    Returns the lists (one entry per cell) of total connections, post segment ids, post fractions along, pre segment ids and pre fractions along
+    """
+
+    if rng == None:
+        rng = _get_rng()
+
+    if isinstance(subset_dict, dict):
+        numberConnections = {}
+
+        for subset in subset_dict.keys():
+            numberConnections[subset] = int(subset_dict[subset])
+
+    if isinstance(subset_dict, int) or isinstance(subset_dict, float):
+        numberConnections = int(subset_dict)
+
+    conn_subsets_per_cell = []
+
+    total_conns_per_cell = []
+
+    for i in range(0, num_cells):
+        total_conns = 0
+
+        if isinstance(subset_dict, dict):
+            conn_subsets = {}
+
+            for subset in subset_dict.keys():
+                if subset_dict[subset] != numberConnections[subset]:
+                    if rng.random() < subset_dict[subset] - numberConnections[subset]:
+                        conn_subsets[subset] = numberConnections[subset] + 1
+
+                    else:
+                        conn_subsets[subset] = numberConnections[subset]
+
+                else:
+                    conn_subsets[subset] = numberConnections[subset]
+
+                total_conns = total_conns + conn_subsets[subset]
+
+        if isinstance(subset_dict, float) or isinstance(subset_dict, int):
+            conn_subsets = 0
+
+            if subset_dict != numberConnections:
+                if rng.random() < subset_dict - numberConnections:
+                    conn_subsets = numberConnections + 1
+
+                else:
+                    conn_subsets = numberConnections
+
+            else:
+                conn_subsets = numberConnections
+
+            total_conns = total_conns + conn_subsets
+
+        conn_subsets_per_cell.append(conn_subsets)
+
+        total_conns_per_cell.append(total_conns)
+
+    post_segs_per_cell, post_fractions_per_cell = get_target_segments_for_cells(
+        post_seg_target_dict, conn_subsets_per_cell, rng
+    )
+
+    ##### allows only one pre segment group per presynaptic population e.g. distal_axon
+    if pre_seg_target_dict != None and len(pre_seg_target_dict.keys()) == 1:
+        pre_group = list(pre_seg_target_dict.keys())[0]
+
+        pre_segs_per_cell, pre_fractions_per_cell = get_target_segments_for_cells(
+            pre_seg_target_dict,
+            [{pre_group: total_conns} for total_conns in total_conns_per_cell],
+            rng,
+        )
+
+    else:
+        pre_segs_per_cell = [None] * num_cells
+
+        pre_fractions_per_cell = [None] * num_cells
+
+    return (
+        total_conns_per_cell,
+        post_segs_per_cell,
+        post_fractions_per_cell,
+        pre_segs_per_cell,
+        pre_fractions_per_cell,
+    )
+
+
+##############################################################################################
+
+
+def _sample_values(rng, mean, std, size, clip="none"):
+    """
+    Returns the values for delays or weights of `size` connections: `mean` if `std` is None, otherwise an array of values
+    drawn from the (optionally clipped) gaussian distribution N(`mean`, `std`); see opencortex.build.sampling.clipped_normal()
+    """
+
+    if std == None:
+        return mean
+
+    return sampling.clipped_normal(rng, mean, std, size, clip)
+
+
+def _select_values(values, kept):
+    """Returns the values returned by _sample_values() of the connections indexed by `kept`"""
+
+    if isinstance(values, np.ndarray):
+        return values[kept]
+
+    return values
+
 
 ##############################################################################################
 
 
+@tracing.traced()
 def add_probabilistic_projection_list(
     net,
     presynaptic_population,
@@ -171,16 +530,27 @@ def add_probabilistic_projection_list(
     proj_components = {}
 
     for synapse_id in synapse_list:
-        proj = neuroml.Projection(
+        proj = containers.ColumnarProjection(
             id="%s_%s_%s"
             % (synapse_id, presynaptic_population.id, postsynaptic_population.id),
             presynaptic_population=presynaptic_population.id,
             postsynaptic_population=postsynaptic_population.id,
             synapse=synapse_id,
+            pre_cell_format=containers.cell_id_format(
+                presynaptic_population, presynaptic_population_list
+            ),
+            post_cell_format=containers.cell_id_format(
+                postsynaptic_population, postsynaptic_population_list
+            ),
+            delay_format="%f ms",
         )
 
         proj_components[synapse_id] = proj
 
+    rng = _get_projection_rng(
+        net, [proj_components[synapse_id] for synapse_id in synapse_list]
+    )
+
     count = 0
 
     ######### check whether delay and weight varies with a synaptic component
@@ -219,185 +589,63 @@ def add_probabilistic_projection_list(
                 )
                 quit()
 
-    for i in range(0, presynaptic_population.size):
-        for j in range(0, postsynaptic_population.size):
-            if i != j or presynaptic_population.id != postsynaptic_population.id:
-                if (
-                    connection_probability >= 1
-                    or random.random() < connection_probability
-                ):
-                    if not isinstance(delay, list):
-                        if std_delay != None:
-                            if clipped_distributions:
-                                found_positive_delay = False
-
-                                while not found_positive_delay:
-                                    del_val = random.gauss(delay, std_delay)
-                                    if del_val >= 0:
-                                        found_positive_delay = True
-                            else:
-                                del_val = random.gauss(delay, std_delay)
-                        else:
-                            del_val = delay
+    delay_clip = "positive" if clipped_distributions else "none"
 
-                    if not isinstance(weight, list):
-                        if std_weight != None:
-                            if clipped_distributions:
-                                found_signed_weight = False
-                                while not found_signed_weight:
-                                    w_val = random.gauss(weight, std_weight)
-                                    if weight > 0:
-                                        if w_val >= 0:
-                                            found_signed_weight = True
+    weight_clip = "signed" if clipped_distributions else "none"
 
-                                    elif weight < 0:
-                                        if w_val <= 0:
-                                            found_signed_weight = True
-
-                                    else:
-                                        found_signed_weight = True
-
-                            else:
-                                w_val = random.gauss(weight, std_weight)
+    for rng, pre_ids, post_ids, kept in _get_connected_pairs(
+        net,
+        proj_components[synapse_list[0]].id if len(synapse_list) > 0 else None,
+        presynaptic_population,
+        postsynaptic_population,
+        connection_probability,
+        rng,
+    ):
+        num_conns = len(pre_ids)
 
-                        else:
-                            w_val = weight
+        if num_conns == 0:
+            continue
 
-                    syn_counter = 0
+        ######### values are drawn for all the pairs, so that they do not depend on which pairs are kept
 
-                    for synapse_id in synapse_list:
-                        if isinstance(delay, list):
-                            if std_delay != None:
-                                if isinstance(std_delay, list):
-                                    if clipped_distributions:
-                                        found_positive_delay = False
-                                        while not found_positive_delay:
-                                            del_val = random.gauss(
-                                                delay[syn_counter],
-                                                std_delay[syn_counter],
-                                            )
-                                            if del_val >= 0:
-                                                found_positive_delay = True
-                                    else:
-                                        del_val = random.gauss(
-                                            delay[syn_counter], std_delay[syn_counter]
-                                        )
-
-                                else:
-                                    if clipped_distributions:
-                                        found_positive_delay = False
-                                        while not found_positive_delay:
-                                            del_val = random.gauss(
-                                                delay[syn_counter], std_delay
-                                            )
-
-                                            if del_val >= 0:
-                                                found_positive_delay = True
-                                    else:
-                                        del_val = random.gauss(
-                                            delay[syn_counter], std_delay
-                                        )
-
-                            else:
-                                del_val = delay[syn_counter]
-
-                        if isinstance(weight, list):
-                            if std_weight != None:
-                                if isinstance(std_weight, list):
-                                    if clipped_distributions:
-                                        found_signed_weight = False
-
-                                        while not found_signed_weight:
-                                            w_val = random.gauss(
-                                                weight[syn_counter],
-                                                std_weight[syn_counter],
-                                            )
-
-                                            if weight[syn_counter] > 0:
-                                                if w_val >= 0:
-                                                    found_signed_weight = True
-
-                                            elif weight[syn_counter] < 0:
-                                                if w_val <= 0:
-                                                    found_signed_weight = True
-
-                                            else:
-                                                found_signed_weight = True
-                                    else:
-                                        w_val = random.gauss(
-                                            weight[syn_counter], std_weight[syn_counter]
-                                        )
-
-                                else:
-                                    if clipped_distributions:
-                                        found_signed_weight = False
-                                        while not found_signed_weight:
-                                            w_val = random.gauss(
-                                                weight[syn_counter], std_weight
-                                            )
-
-                                            if weight[syn_counter] > 0:
-                                                if w_val >= 0:
-                                                    found_signed_weight = True
-
-                                            elif weight[syn_counter] < 0:
-                                                if w_val <= 0:
-                                                    found_signed_weight = True
-
-                                            else:
-                                                found_signed_weight = True
-
-                                    else:
-                                        w_val = random.gauss(
-                                            weight[syn_counter], std_weight
-                                        )
-
-                            else:
-                                w_val = weight[syn_counter]
-
-                        if presynaptic_population_list:
-                            pre_cell_string = "../%s/%i/%s" % (
-                                presynaptic_population.id,
-                                i,
-                                presynaptic_population.component,
-                            )
+        num_kept = len(pre_ids[kept])
 
-                        else:
-                            pre_cell_string = "../%s[%i]" % (
-                                presynaptic_population.id,
-                                i,
-                            )
+        ######### a single value per pair of cells, shared by all synaptic components
 
-                        if postsynaptic_population_list:
-                            post_cell_string = "../%s/%i/%s" % (
-                                postsynaptic_population.id,
-                                j,
-                                postsynaptic_population.component,
-                            )
+        if not isinstance(delay, list):
+            del_vals = _sample_values(rng, delay, std_delay, num_conns, delay_clip)
 
-                        else:
-                            post_cell_string = "../%s[%i]" % (
-                                postsynaptic_population.id,
-                                j,
-                            )
+        if not isinstance(weight, list):
+            w_vals = _sample_values(rng, weight, std_weight, num_conns, weight_clip)
 
-                        connection = neuroml.ConnectionWD(
-                            id=count,
-                            pre_cell_id=pre_cell_string,
-                            pre_segment_id=0,
-                            pre_fraction_along=0.5,
-                            post_cell_id=post_cell_string,
-                            post_segment_id=0,
-                            post_fraction_along=0.5,
-                            delay="%f ms" % del_val,
-                            weight=w_val,
-                        )
+        for syn_counter, synapse_id in enumerate(synapse_list):
+            if isinstance(delay, list):
+                syn_std_delay = (
+                    std_delay[syn_counter] if isinstance(std_delay, list) else std_delay
+                )
+                del_vals = _sample_values(
+                    rng, delay[syn_counter], syn_std_delay, num_conns, delay_clip
+                )
 
-                        proj_components[synapse_id].connection_wds.append(connection)
+            if isinstance(weight, list):
+                syn_std_weight = (
+                    std_weight[syn_counter]
+                    if isinstance(std_weight, list)
+                    else std_weight
+                )
+                w_vals = _sample_values(
+                    rng, weight[syn_counter], syn_std_weight, num_conns, weight_clip
+                )
 
-                        syn_counter += 1
+            proj_components[synapse_id].connection_wds.add(
+                np.arange(count, count + num_kept),
+                pre_ids[kept],
+                post_ids[kept],
+                weights=_select_values(w_vals, kept),
+                delays=_select_values(del_vals, kept),
+            )
 
-                    count += 1
+        count += num_kept
 
     return_proj_components = []
 
@@ -406,6 +654,8 @@ def add_probabilistic_projection_list(
             net.projections.append(proj_components[synapse_id])
             return_proj_components.append(proj_components[synapse_id])
 
+        streaming.flush(net)
+
         return return_proj_components
 
     else:
@@ -417,21 +667,172 @@ def add_probabilistic_projection_list(
 
 def _evaluate_expression(expr):
     """
-    For example for string expression for weights, e.g. '3*random()'
+    For example for string expression for weights, e.g. '3*random()'; see opencortex.build.expressions for the allowed expressions
     """
-    expr2 = (
-        str(expr)
-        .replace("random", "random.random")
-        .replace("normal", "np.random.normal")
-    )
-    val = eval(expr2)
-    opencortex.print_comment("Evaluated %s as %s" % (expr, val))
+    val = expressions.evaluate_expression(expr)
+    opencortex.print_comment("Evaluated %s as %s", args=(expr, val))
     return val
 
 
+def _evaluate_expression_array(expr, size, rng):
+    """
+    Vectorized version of _evaluate_expression(): returns an array of `size` values of the number or string expression `expr`, with
+    the random values drawn from the NumPy generator `rng`
+    """
+    vals = expressions.evaluate_expression(expr, size=size, rng=rng)
+    opencortex.print_comment("Evaluated %s for %i values", args=(expr, size))
+    return vals
+
+
 ##############################################################################################
 
 
+def _get_synapse_values(synapse_list, values_dict, default):
+    """
+    Returns a list with the value (number or string expression) in `values_dict` (e.g. delays_dict or weights_dict) for each synapse in `synapse_list`;
+    keys of `values_dict` match the synapse ids containing them, e.g. {'NMDA':5} applies to 'NMDA_syn'. Expressions are compiled once here.
+    """
+
+    values = []
+
+    for synapse_id in synapse_list:
+        value = default
+
+        if values_dict != None:
+            for synapseComp in values_dict.keys():
+                if synapseComp in synapse_id:
+                    value = values_dict[synapseComp]
+
+        if isinstance(value, str):
+            expressions.compile_expression(value, ())
+
+        values.append(value)
+
+    return values
+
+
+def _add_connections_of_block(
+    proj_array,
+    count,
+    presynaptic_population,
+    postsynaptic_population,
+    connections,
+    keep,
+    synapse_delays,
+    synapse_weights,
+    rng,
+):
+    """
+    Adds the connections drawn for a block of cells to the projections of `proj_array` (one per synapse of `synapse_delays` and
+    `synapse_weights`, see _get_synapse_values()) and returns the new number of connections. `connections` is the list of
+    (pre_cell, post_cell, pre_segment, post_segment, pre_fraction, post_fraction) arrays of all the connections drawn and `keep`
+    the boolean array of those added (see _get_cell_blocks()); the delays and weights of each synapse are evaluated once for all
+    the connections drawn, so that they do not depend on which connections are kept.
+    """
+
+    pre_cells, post_cells, pre_segs, post_segs, pre_fractions, post_fractions = [
+        np.asarray(column)[keep] for column in connections
+    ]
+
+    num_drawn = len(keep)
+
+    num_kept = len(pre_cells)
+
+    ids = np.arange(count, count + num_kept)
+
+    for syn_counter, proj in enumerate(proj_array[: len(synapse_weights)]):
+        delays = _evaluate_expression_array(
+            synapse_delays[syn_counter], num_drawn, rng
+        )[keep]
+
+        weights = _evaluate_expression_array(
+            synapse_weights[syn_counter], num_drawn, rng
+        )[keep]
+
+        if num_kept == 0:
+            continue
+
+        if isinstance(proj.connection_wds, containers.ConnectionColumns):
+            proj.connection_wds.set_cell_formats(
+                containers.cell_id_format(presynaptic_population),
+                containers.cell_id_format(postsynaptic_population),
+            )
+
+            proj.connection_wds.add(
+                ids,
+                pre_cells,
+                post_cells,
+                pre_segs,
+                post_segs,
+                pre_fractions,
+                post_fractions,
+                weights,
+                delays,
+            )
+
+            continue
+
+        for index in range(num_kept):
+            _add_connection(
+                proj,
+                int(ids[index]),
+                presynaptic_population,
+                int(pre_cells[index]),
+                int(pre_segs[index]),
+                postsynaptic_population,
+                int(post_cells[index]),
+                int(post_segs[index]),
+                delay=float(delays[index]),
+                weight=float(weights[index]),
+                pre_fraction=float(pre_fractions[index]),
+                post_fraction=float(post_fractions[index]),
+            )
+
+    return count + num_kept
+
+
+def _get_connections_of_cell(
+    cell_id,
+    partner_ids,
+    targeting_mode,
+    post_segs,
+    post_fractions,
+    pre_segs,
+    pre_fractions,
+):
+    """
+    Returns the (pre_cell, post_cell, pre_segment, post_segment, pre_fraction, post_fraction) lists of the connections of the cell
+    `cell_id` with the cells `partner_ids`, on the first of the target segments drawn for the cell (see _get_target_segments_per_cell())
+    """
+
+    num_conns = len(partner_ids)
+
+    if targeting_mode == "divergent":
+        pre_cells, post_cells = [cell_id] * num_conns, partner_ids
+
+    else:
+        pre_cells, post_cells = partner_ids, [cell_id] * num_conns
+
+    if pre_segs != None and pre_fractions != None:
+        pre_segs, pre_fractions = pre_segs[:num_conns], pre_fractions[:num_conns]
+
+    else:
+        pre_segs, pre_fractions = [0] * num_conns, [0.5] * num_conns
+
+    return (
+        pre_cells,
+        post_cells,
+        pre_segs,
+        post_segs[:num_conns],
+        pre_fractions,
+        post_fractions[:num_conns],
+    )
+
+
+##############################################################################################
+
+
+@tracing.traced()
 def add_targeted_projection_by_dicts(
     net,
     proj_array,
@@ -475,7 +876,10 @@ def add_targeted_projection_by_dicts(
 
     delays_dict - optional dictionary that specifies the delays (in ms) for individual synapse components, e.g. {'NMDA':5.0} or {'AMPA':3.0,'NMDA':5};
 
-    weights_dict - optional dictionary that specifies the weights for individual synapse components, e.g. {'NMDA':1} or {'NMDA':1,'AMPA':2}."""
+    weights_dict - optional dictionary that specifies the weights for individual synapse components, e.g. {'NMDA':1} or {'NMDA':1,'AMPA':2}.
+    """
+
+    rng = _get_projection_rng(net, proj_array)
 
     opencortex.print_comment_v(
         "Adding %s projection with %s conns: %s: %s -> %s, %s"
@@ -507,180 +911,96 @@ def add_targeted_projection_by_dicts(
 
         pop2_id = presynaptic_population.id
 
-    if isinstance(subset_dict, dict):
-        numberConnections = {}
-
-        for subset in subset_dict.keys():
-            numberConnections[subset] = int(subset_dict[subset])
+    synapse_delays = _get_synapse_values(synapse_list, delays_dict, 0)
 
-    if isinstance(subset_dict, int) or isinstance(subset_dict, float):
-        numberConnections = int(subset_dict)
+    synapse_weights = _get_synapse_values(synapse_list, weights_dict, 1)
 
     count = 0
 
-    for i in range(0, pop1_size):
-        total_conns = 0
-
-        if isinstance(subset_dict, dict):
-            conn_subsets = {}
-
-            for subset in subset_dict.keys():
-                if subset_dict[subset] != numberConnections[subset]:
-                    if (
-                        random.random()
-                        < subset_dict[subset] - numberConnections[subset]
-                    ):
-                        conn_subsets[subset] = numberConnections[subset] + 1
-
-                    else:
-                        conn_subsets[subset] = numberConnections[subset]
-
-                else:
-                    conn_subsets[subset] = numberConnections[subset]
-
-                total_conns = total_conns + conn_subsets[subset]
-
-        if isinstance(subset_dict, float) or isinstance(subset_dict, int):
-            conn_subsets = 0
-
-            if subset_dict != numberConnections:
-                if random.random() < subset_dict - numberConnections:
-                    conn_subsets = numberConnections + 1
-
-                else:
-                    conn_subsets = numberConnections
-
-            else:
-                conn_subsets = numberConnections
-
-            total_conns = total_conns + conn_subsets
-
-        if total_conns != 0:
-            ##### allows only one pre segment group per presynaptic population e.g. distal_axon
-            if pre_seg_target_dict != None and len(pre_seg_target_dict.keys()) == 1:
-                pre_subset_dict = {}
-
-                pre_subset_dict[list(pre_seg_target_dict.keys())[0]] = total_conns
-
-            else:
-                pre_subset_dict = None
-
-            pop2_cell_ids = list(range(0, pop2_size))
-
-            if pop1_id == pop2_id:
-                pop2_cell_ids.remove(i)
-
-            if pop2_cell_ids != []:
-                if len(pop2_cell_ids) >= total_conns:
-                    ##### get unique set of cells
-                    pop2_cells = random.sample(pop2_cell_ids, total_conns)
-
-                else:
-                    #### any cell might appear several times
-                    pop2_cells = []
+    for block_start, block_end, owned, rng in _get_cell_blocks(
+        net, proj_array[0].id, targeting_mode, postsynaptic_population, pop1_size, rng
+    ):
+        (
+            total_conns_per_cell,
+            post_segs_per_cell,
+            post_fractions_per_cell,
+            pre_segs_per_cell,
+            pre_fractions_per_cell,
+        ) = _get_target_segments_per_cell(
+            post_seg_target_dict,
+            pre_seg_target_dict,
+            subset_dict,
+            block_end - block_start,
+            rng,
+        )
 
-                    for value in range(0, total_conns):
-                        cell_id = random.sample(pop2_cell_ids, 1)
+        ##### the partners of all the cells of the block at once: distinct cells if there are enough of them, otherwise any cell might appear several times
+        cell_ids, partner_ids = sampling.sample_partners(
+            rng,
+            total_conns_per_cell,
+            pop2_size,
+            exclude_self=pop1_id == pop2_id,
+            first_cell=block_start,
+        )
 
-                        pop2_cells.extend(cell_id)
+        partner_starts = np.searchsorted(
+            cell_ids, np.arange(block_start, block_end + 1)
+        ).tolist()
+
+        connections = [[] for column in range(6)]
+
+        keep = []
+
+        for i in range(block_start, block_end):
+            pop2_cells = partner_ids[
+                partner_starts[i - block_start] : partner_starts[i - block_start + 1]
+            ].tolist()
+
+            if len(pop2_cells) > 0:
+                for column, values in zip(
+                    connections,
+                    _get_connections_of_cell(
+                        i,
+                        pop2_cells,
+                        targeting_mode,
+                        post_segs_per_cell[i - block_start],
+                        post_fractions_per_cell[i - block_start],
+                        pre_segs_per_cell[i - block_start],
+                        pre_fractions_per_cell[i - block_start],
+                    ),
+                ):
+                    column.extend(values)
 
-                post_target_seg_array, post_target_fractions = get_target_segments(
-                    post_seg_target_dict, conn_subsets
+                ##### connections onto cells not owned by the rank are drawn but not added, so that those of the others do not change
+                keep.extend(
+                    [owned is None or bool(owned[i - block_start])] * len(pop2_cells)
                 )
 
-                if pre_subset_dict != None:
-                    pre_target_seg_array, pre_target_fractions = get_target_segments(
-                        pre_seg_target_dict, pre_subset_dict
-                    )
-
-                else:
-                    pre_target_seg_array = None
-
-                    pre_target_fractions = None
-
-                for j in pop2_cells:
-                    post_seg_id = post_target_seg_array[0]
-
-                    del post_target_seg_array[0]
-
-                    post_fraction_along = post_target_fractions[0]
-
-                    del post_target_fractions[0]
-
-                    if pre_target_seg_array != None and pre_target_fractions != None:
-                        pre_seg_id = pre_target_seg_array[0]
-
-                        del pre_target_seg_array[0]
-
-                        pre_fraction_along = pre_target_fractions[0]
-
-                        del pre_target_fractions[0]
-
-                    else:
-                        pre_seg_id = 0
-
-                        pre_fraction_along = 0.5
-
-                    if targeting_mode == "divergent":
-                        pre_cell_id = i
-
-                        post_cell_id = j
-
-                    if targeting_mode == "convergent":
-                        pre_cell_id = j
-
-                        post_cell_id = i
-
-                    syn_counter = 0
-
-                    for synapse_id in synapse_list:
-                        delay = 0
-
-                        weight = 1
-
-                        if delays_dict != None:
-                            for synapseComp in delays_dict.keys():
-                                if synapseComp in synapse_id:
-                                    delay = _evaluate_expression(
-                                        delays_dict[synapseComp]
-                                    )
-
-                        if weights_dict != None:
-                            for synapseComp in weights_dict.keys():
-                                if synapseComp in synapse_id:
-                                    weight = _evaluate_expression(
-                                        weights_dict[synapseComp]
-                                    )
-
-                        _add_connection(
-                            proj_array[syn_counter],
-                            count,
-                            presynaptic_population,
-                            pre_cell_id,
-                            pre_seg_id,
-                            postsynaptic_population,
-                            post_cell_id,
-                            post_seg_id,
-                            delay=delay,
-                            weight=weight,
-                            pre_fraction=pre_fraction_along,
-                            post_fraction=post_fraction_along,
-                        )
-
-                        syn_counter += 1
-
-                    count += 1
+        count = _add_connections_of_block(
+            proj_array,
+            count,
+            presynaptic_population,
+            postsynaptic_population,
+            connections,
+            np.asarray(keep, dtype=bool),
+            synapse_delays,
+            synapse_weights,
+            rng,
+        )
 
     if count != 0:
         for synapse_ind in range(0, len(synapse_list)):
             net.projections.append(proj_array[synapse_ind])
 
+        streaming.flush(net)
+
     return proj_array
 
 
 ##############################################################################################
 
 
+@tracing.traced()
 def _add_elect_projection(
     net,
     proj_array,
@@ -718,7 +1038,10 @@ def _add_elect_projection(
 
     Case II, targeting mode = 'convergent' - the number of synaptic connections per target segment group per each postsynaptic cell;
 
-    alternatively, subset_dict can be a number that specifies the total number of synaptic connections (either divergent or convergent) irrespective of target segment groups."""
+    alternatively, subset_dict can be a number that specifies the total number of synaptic connections (either divergent or convergent) irrespective of target segment groups.
+    """
+
+    rng = _get_projection_rng(net, proj_array)
 
     if targeting_mode == "divergent":
         pop1_size = presynaptic_population.size
@@ -736,95 +1059,56 @@ def _add_elect_projection(
 
         pop2_size = presynaptic_population.size
 
-        pop2_id = presynaptic_population.id
-
-    count = 0
-
-    if isinstance(subset_dict, dict):
-        numberConnections = {}
-
-        for subset in subset_dict.keys():
-            numberConnections[subset] = int(subset_dict[subset])
-
-    if isinstance(subset_dict, int) or isinstance(subset_dict, float):
-        numberConnections = int(subset_dict)
-
-    for i in range(0, pop1_size):
-        total_conns = 0
-
-        if isinstance(subset_dict, dict):
-            conn_subsets = {}
-
-            for subset in subset_dict.keys():
-                if subset_dict[subset] != numberConnections[subset]:
-                    if (
-                        random.random()
-                        < subset_dict[subset] - numberConnections[subset]
-                    ):
-                        conn_subsets[subset] = numberConnections[subset] + 1
-
-                    else:
-                        conn_subsets[subset] = numberConnections[subset]
-
-                else:
-                    conn_subsets[subset] = numberConnections[subset]
-
-                total_conns = total_conns + conn_subsets[subset]
-
-        if isinstance(subset_dict, float) or isinstance(subset_dict, int):
-            conn_subsets = 0
-
-            if subset_dict != numberConnections:
-                if random.random() < subset_dict - numberConnections:
-                    conn_subsets = numberConnections + 1
-
-                else:
-                    conn_subsets = numberConnections
-
-            else:
-                conn_subsets = numberConnections
-
-            total_conns = total_conns + conn_subsets
-
-        if total_conns != 0:
-            if pre_seg_target_dict != None and len(pre_seg_target_dict.keys()) == 1:
-                pre_subset_dict = {}
-
-                pre_subset_dict[list(pre_seg_target_dict.keys())[0]] = total_conns
-
-            else:
-                pre_subset_dict = None
+        pop2_id = presynaptic_population.id
 
-            pop2_cell_ids = list(range(0, pop2_size))
+    count = 0
 
-            if pop1_id == pop2_id:
-                pop2_cell_ids.remove(i)
+    for block_start, block_end, owned, rng in _get_cell_blocks(
+        net, proj_array[0].id, targeting_mode, postsynaptic_population, pop1_size, rng
+    ):
+        (
+            total_conns_per_cell,
+            post_segs_per_cell,
+            post_fractions_per_cell,
+            pre_segs_per_cell,
+            pre_fractions_per_cell,
+        ) = _get_target_segments_per_cell(
+            post_seg_target_dict,
+            pre_seg_target_dict,
+            subset_dict,
+            block_end - block_start,
+            rng,
+        )
 
-            if pop2_cell_ids != []:
-                if len(pop2_cell_ids) >= total_conns:
-                    pop2_cells = random.sample(pop2_cell_ids, total_conns)
+        ##### the partners of all the cells of the block at once: distinct cells if there are enough of them, otherwise any cell might appear several times
+        cell_ids, partner_ids = sampling.sample_partners(
+            rng,
+            total_conns_per_cell,
+            pop2_size,
+            exclude_self=pop1_id == pop2_id,
+            first_cell=block_start,
+        )
 
-                else:
-                    pop2_cells = []
+        partner_starts = np.searchsorted(
+            cell_ids, np.arange(block_start, block_end + 1)
+        ).tolist()
 
-                    for value in range(0, total_conns):
-                        cell_id = random.sample(pop2_cell_ids, 1)
+        for i in range(block_start, block_end):
+            pop2_cells = partner_ids[
+                partner_starts[i - block_start] : partner_starts[i - block_start + 1]
+            ].tolist()
 
-                        pop2_cells.extend(cell_id)
+            if len(pop2_cells) > 0:
+                post_target_seg_array = post_segs_per_cell[i - block_start]
 
-                post_target_seg_array, post_target_fractions = get_target_segments(
-                    post_seg_target_dict, conn_subsets
-                )
+                post_target_fractions = post_fractions_per_cell[i - block_start]
 
-                if pre_subset_dict != None:
-                    pre_target_seg_array, pre_target_fractions = get_target_segments(
-                        pre_seg_target_dict, pre_subset_dict
-                    )
+                pre_target_seg_array = pre_segs_per_cell[i - block_start]
 
-                else:
-                    pre_target_seg_array = None
+                pre_target_fractions = pre_fractions_per_cell[i - block_start]
 
-                    pre_target_fractions = None
+                if owned is not None and not owned[i - block_start]:
+                    continue
 
                 for j in pop2_cells:
                     post_seg_id = post_target_seg_array[0]
@@ -884,12 +1168,15 @@ def _add_elect_projection(
         for synapse_ind in range(0, len(synapse_list)):
             net.electrical_projections.append(proj_array[synapse_ind])
 
+        streaming.flush(net)
+
     return proj_array
 
 
 ##############################################################################################
 
 
+@tracing.traced()
 def add_chem_spatial_projection(
     net,
     proj_array,
@@ -905,6 +1192,8 @@ def add_chem_spatial_projection(
     post_cell_positions,
     delays_dict,
     weights_dict,
+    cutoff_radius=None,
+    spatial_index_cache=None,
 ):
     """This method adds the divergent distance-dependent chemical projection. The input arguments are as follows:
 
@@ -935,13 +1224,14 @@ def add_chem_spatial_projection(
 
     alternatively, subset_dict can be a number that specifies the total number of synaptic connections (either divergent or convergent) irrespective of target segment groups.
 
-    Note: the chemical connection is made only if distance-dependent probability is higher than some random number random.random(); thus, the actual numbers of connections made
+    Note: the chemical connection is made only if distance-dependent probability is higher than some uniform random number; thus, the actual numbers of connections made
 
     according to the distance-dependent rule might be smaller than the numbers of connections specified by subset_dict; subset_dict defines the upper bound for the
 
     number of connections.
 
     distance_rule - string which defines the distance dependent rule of connectivity - soma to soma distance must be represented by the string character 'r';
+    the rule is compiled with opencortex.build.expressions and evaluated for all candidate cells at once;
 
     pre_cell_positions- array specifying the cell positions for the presynaptic population; the format is an array of [ x coordinate, y coordinate, z coordinate];
 
@@ -949,7 +1239,15 @@ def add_chem_spatial_projection(
 
     delays_dict - optional dictionary that specifies the delays (in ms) for individual synapse components, e.g. {'NMDA':5.0} or {'AMPA':3.0,'NMDA':5};
 
-    weights_dict - optional dictionary that specifies the weights for individual synapse components, e.g. {'NMDA':1} or {'NMDA':1,'AMPA':2}."""
+    weights_dict - optional dictionary that specifies the weights for individual synapse components, e.g. {'NMDA':1} or {'NMDA':1,'AMPA':2};
+
+    cutoff_radius - optional distance beyond which the distance_rule is assumed to be 0; if specified, the candidate cells are found with a radius query on
+    a spatial index (see opencortex.build.spatial) instead of testing all pairs of cells;
+
+    spatial_index_cache - optional dictionary in which the spatial indices are cached, so that they can be shared across projections, e.g. by opencortex.utils.build_connectivity().
+    """
+
+    rng = _get_projection_rng(net, proj_array)
 
     if targeting_mode == "divergent":
         pop1_size = presynaptic_population.size
@@ -958,12 +1256,12 @@ def add_chem_spatial_projection(
 
         pop1_cell_positions = pre_cell_positions
 
-        pop2_size = postsynaptic_population.size
-
         pop2_id = postsynaptic_population.size
 
         pop2_cell_positions = post_cell_positions
 
+        pop2_population = postsynaptic_population
+
     if targeting_mode == "convergent":
         pop1_size = postsynaptic_population.size
 
@@ -971,198 +1269,128 @@ def add_chem_spatial_projection(
 
         pop1_cell_positions = post_cell_positions
 
-        pop2_size = presynaptic_population.size
-
         pop2_id = presynaptic_population.id
 
         pop2_cell_positions = pre_cell_positions
 
-    if isinstance(subset_dict, dict):
-        numberConnections = {}
-
-        for subset in subset_dict.keys():
-            numberConnections[subset] = int(subset_dict[subset])
-
-    if isinstance(subset_dict, int) or isinstance(subset_dict, float):
-        numberConnections = int(subset_dict)
+        pop2_population = presynaptic_population
 
     count = 0
 
-    for i in range(0, pop1_size):
-        total_conns = 0
-
-        if isinstance(subset_dict, dict):
-            conn_subsets = {}
-
-            for subset in subset_dict.keys():
-                if subset_dict[subset] != numberConnections[subset]:
-                    if (
-                        random.random()
-                        < subset_dict[subset] - numberConnections[subset]
-                    ):
-                        conn_subsets[subset] = numberConnections[subset] + 1
-
-                    else:
-                        conn_subsets[subset] = numberConnections[subset]
-
-                else:
-                    conn_subsets[subset] = numberConnections[subset]
-
-                total_conns = total_conns + conn_subsets[subset]
-
-        if isinstance(subset_dict, float) or isinstance(subset_dict, int):
-            conn_subsets = 0
-
-            if subset_dict != numberConnections:
-                if random.random() < subset_dict - numberConnections:
-                    conn_subsets = numberConnections + 1
+    synapse_delays = _get_synapse_values(synapse_list, delays_dict, 0)
 
-                else:
-                    conn_subsets = numberConnections
+    synapse_weights = _get_synapse_values(synapse_list, weights_dict, 1)
 
-            else:
-                conn_subsets = numberConnections
+    distance_rule_expression = expressions.compile_expression(distance_rule)
 
-            total_conns = total_conns + conn_subsets
+    pop2_cell_positions = np.asarray(pop2_cell_positions, dtype=float)
 
-        if total_conns != 0:
-            if pre_seg_target_dict != None and len(pre_seg_target_dict.keys()) == 1:
-                pre_subset_dict = {}
+    if cutoff_radius != None:
+        spatial_index = spatial.get_spatial_index(
+            pop2_cell_positions,
+            cutoff_radius,
+            spatial_index_cache,
+            pop2_population.id,
+        )
 
-                pre_subset_dict[list(pre_seg_target_dict.keys())[0]] = total_conns
+    else:
+        spatial_index = None
 
-            else:
-                pre_subset_dict = None
+    for block_start, block_end, owned, rng in _get_cell_blocks(
+        net, proj_array[0].id, targeting_mode, postsynaptic_population, pop1_size, rng
+    ):
+        (
+            total_conns_per_cell,
+            post_segs_per_cell,
+            post_fractions_per_cell,
+            pre_segs_per_cell,
+            pre_fractions_per_cell,
+        ) = _get_target_segments_per_cell(
+            post_seg_target_dict,
+            pre_seg_target_dict,
+            subset_dict,
+            block_end - block_start,
+            rng,
+        )
 
-            pop2_cell_ids = list(range(0, pop2_size))
+        connections = [[] for column in range(6)]
 
-            if pop1_id == pop2_id:
-                pop2_cell_ids.remove(i)
+        keep = []
 
-            if pop2_cell_ids != []:
-                cell1_position = pop1_cell_positions[i]
+        for i in range(block_start, block_end):
+            total_conns = total_conns_per_cell[i - block_start]
 
-                post_target_seg_array, post_fractions_along = get_target_segments(
-                    post_seg_target_dict, conn_subsets
+            if total_conns != 0:
+                pop2_cell_ids, pop2_distances = spatial.cells_within_radius(
+                    pop2_cell_positions,
+                    pop1_cell_positions[i],
+                    cutoff_radius,
+                    spatial_index,
                 )
 
-                if pre_subset_dict != None:
-                    pre_target_seg_array, pre_target_fractions = get_target_segments(
-                        pre_seg_target_dict, pre_subset_dict
-                    )
-
-                else:
-                    pre_target_seg_array = None
+                if pop1_id == pop2_id:
+                    not_self = pop2_cell_ids != i
 
-                    pre_target_fractions = None
+                    pop2_cell_ids = pop2_cell_ids[not_self]
 
-                conn_counter = 0
+                    pop2_distances = pop2_distances[not_self]
 
-                for j in pop2_cell_ids:
-                    cell2_position = pop2_cell_positions[j]
+                if len(pop2_cell_ids) > 0:
+                    conn_probabilities = distance_rule_expression.evaluate(
+                        {"r": pop2_distances}, size=len(pop2_cell_ids), rng=rng
+                    )
 
-                    r = math.sqrt(
-                        sum(
-                            [
-                                (a - b) ** 2
-                                for a, b in zip(cell1_position, cell2_position)
-                            ]
-                        )
+                    connected = (conn_probabilities >= 1) | (
+                        rng.random(len(pop2_cell_ids)) < conn_probabilities
                     )
 
-                    if eval(distance_rule) >= 1 or random.random() < eval(
-                        distance_rule
+                    pop2_cells = pop2_cell_ids[connected][:total_conns].tolist()
+
+                    for column, values in zip(
+                        connections,
+                        _get_connections_of_cell(
+                            i,
+                            pop2_cells,
+                            targeting_mode,
+                            post_segs_per_cell[i - block_start],
+                            post_fractions_per_cell[i - block_start],
+                            pre_segs_per_cell[i - block_start],
+                            pre_fractions_per_cell[i - block_start],
+                        ),
                     ):
-                        conn_counter += 1
-
-                        post_seg_id = post_target_seg_array[0]
-
-                        del post_target_seg_array[0]
-
-                        post_fraction_along = post_fractions_along[0]
-
-                        del post_fractions_along[0]
-
-                        if (
-                            pre_target_seg_array != None
-                            and pre_target_fractions != None
-                        ):
-                            pre_seg_id = pre_target_seg_array[0]
-
-                            del pre_target_seg_array[0]
-
-                            pre_fraction_along = pre_target_fractions[0]
-
-                            del pre_target_fractions[0]
-
-                        else:
-                            pre_seg_id = 0
-
-                            pre_fraction_along = 0.5
-
-                        if targeting_mode == "divergent":
-                            pre_cell_id = i
-
-                            post_cell_id = j
-
-                        if targeting_mode == "convergent":
-                            pre_cell_id = j
-
-                            post_cell_id = i
-
-                        syn_counter = 0
-
-                        for synapse_id in synapse_list:
-                            delay = 0
-
-                            weight = 1
-
-                            if delays_dict != None:
-                                for synapseComp in delays_dict.keys():
-                                    if synapseComp in synapse_id:
-                                        delay = _evaluate_expression(
-                                            delays_dict[synapseComp]
-                                        )
-
-                            if weights_dict != None:
-                                for synapseComp in weights_dict.keys():
-                                    if synapseComp in synapse_id:
-                                        weight = _evaluate_expression(
-                                            weights_dict[synapseComp]
-                                        )
-
-                            _add_connection(
-                                proj_array[syn_counter],
-                                count,
-                                presynaptic_population,
-                                pre_cell_id,
-                                pre_seg_id,
-                                postsynaptic_population,
-                                post_cell_id,
-                                post_seg_id,
-                                delay=delay,
-                                weight=weight,
-                                pre_fraction=pre_fraction_along,
-                                post_fraction=post_fraction_along,
-                            )
-
-                            syn_counter += 1
+                        column.extend(values)
 
-                        count += 1
+                    ##### connections onto cells not owned by the rank are drawn but not added, so that those of the others do not change
+                    keep.extend(
+                        [owned is None or bool(owned[i - block_start])]
+                        * len(pop2_cells)
+                    )
 
-                    if conn_counter == total_conns:
-                        break
+        count = _add_connections_of_block(
+            proj_array,
+            count,
+            presynaptic_population,
+            postsynaptic_population,
+            connections,
+            np.asarray(keep, dtype=bool),
+            synapse_delays,
+            synapse_weights,
+            rng,
+        )
 
     if count != 0:
         for synapse_ind in range(0, len(synapse_list)):
             net.projections.append(proj_array[synapse_ind])
 
+        streaming.flush(net)
+
     return proj_array
 
 
 ##############################################################################################
 
 
+@tracing.traced()
 def add_elect_spatial_projection(
     net,
     proj_array,
@@ -1176,6 +1404,8 @@ def add_elect_spatial_projection(
     distance_rule,
     pre_cell_positions,
     post_cell_positions,
+    cutoff_radius=None,
+    spatial_index_cache=None,
 ):
     """This method adds the divergent or convergent electrical projection depending on the input argument targeting_mode. The input arguments are as follows:
 
@@ -1205,17 +1435,26 @@ def add_elect_spatial_projection(
 
     alternatively, subset_dict can be a number that specifies the total number of synaptic connections (either divergent or convergent) irrespective of target segment groups.
 
-    Note: the electrical connection is made only if distance-dependent probability is higher than some random number random.random(); thus, the actual numbers of connections made
+    Note: the electrical connection is made only if distance-dependent probability is higher than some uniform random number; thus, the actual numbers of connections made
 
     according to the distance-dependent rule might be smaller than the numbers of connections specified by subset_dict; subset_dict defines the upper bound for the
 
     number of connections.
 
     distance_rule - string which defines the distance dependent rule of connectivity - soma to soma distance must be represented by the string character 'r';
+    the rule is compiled with opencortex.build.expressions and evaluated for all candidate cells at once;
 
     pre_cell_positions- array specifying the cell positions for the presynaptic population; the format is an array of [ x coordinate, y coordinate, z coordinate];
 
-    post_cell_positions- array specifying the cell positions for the postsynaptic population; the format is an array of [ x coordinate, y coordinate, z coordinate];"""
+    post_cell_positions- array specifying the cell positions for the postsynaptic population; the format is an array of [ x coordinate, y coordinate, z coordinate];
+
+    cutoff_radius - optional distance beyond which the distance_rule is assumed to be 0; if specified, the candidate cells are found with a radius query on
+    a spatial index (see opencortex.build.spatial) instead of testing all pairs of cells;
+
+    spatial_index_cache - optional dictionary in which the spatial indices are cached, so that they can be shared across projections, e.g. by opencortex.utils.build_connectivity().
+    """
+
+    rng = _get_projection_rng(net, proj_array)
 
     if targeting_mode == "divergent":
         pop1_size = presynaptic_population.size
@@ -1224,12 +1463,12 @@ def add_elect_spatial_projection(
 
         pop1_cell_positions = pre_cell_positions
 
-        pop2_size = postsynaptic_population.size
-
         pop2_id = postsynaptic_population.size
 
         pop2_cell_positions = post_cell_positions
 
+        pop2_population = postsynaptic_population
+
     if targeting_mode == "convergent":
         pop1_size = postsynaptic_population.size
 
@@ -1237,110 +1476,85 @@ def add_elect_spatial_projection(
 
         pop1_cell_positions = post_cell_positions
 
-        pop2_size = presynaptic_population.size
-
         pop2_id = presynaptic_population.id
 
         pop2_cell_positions = pre_cell_positions
 
-    count = 0
-
-    if isinstance(subset_dict, dict):
-        numberConnections = {}
-
-        for subset in subset_dict.keys():
-            numberConnections[subset] = int(subset_dict[subset])
-
-    if isinstance(subset_dict, int) or isinstance(subset_dict, float):
-        numberConnections = int(subset_dict)
-
-    for i in range(0, pop1_size):
-        total_conns = 0
-
-        if isinstance(subset_dict, dict):
-            conn_subsets = {}
-
-            for subset in subset_dict.keys():
-                if subset_dict[subset] != numberConnections[subset]:
-                    if (
-                        random.random()
-                        < subset_dict[subset] - numberConnections[subset]
-                    ):
-                        conn_subsets[subset] = numberConnections[subset] + 1
+        pop2_population = presynaptic_population
 
-                    else:
-                        conn_subsets[subset] = numberConnections[subset]
+    count = 0
 
-                else:
-                    conn_subsets[subset] = numberConnections[subset]
+    distance_rule_expression = expressions.compile_expression(distance_rule)
 
-                total_conns = total_conns + conn_subsets[subset]
+    pop2_cell_positions = np.asarray(pop2_cell_positions, dtype=float)
 
-        if isinstance(subset_dict, float) or isinstance(subset_dict, int):
-            conn_subsets = 0
+    if cutoff_radius != None:
+        spatial_index = spatial.get_spatial_index(
+            pop2_cell_positions,
+            cutoff_radius,
+            spatial_index_cache,
+            pop2_population.id,
+        )
 
-            if subset_dict != numberConnections:
-                if random.random() < subset_dict - numberConnections:
-                    conn_subsets = numberConnections + 1
+    else:
+        spatial_index = None
 
-                else:
-                    conn_subsets = numberConnections
+    for block_start, block_end, owned, rng in _get_cell_blocks(
+        net, proj_array[0].id, targeting_mode, postsynaptic_population, pop1_size, rng
+    ):
+        (
+            total_conns_per_cell,
+            post_segs_per_cell,
+            post_fractions_per_cell,
+            pre_segs_per_cell,
+            pre_fractions_per_cell,
+        ) = _get_target_segments_per_cell(
+            post_seg_target_dict,
+            pre_seg_target_dict,
+            subset_dict,
+            block_end - block_start,
+            rng,
+        )
 
-            else:
-                conn_subsets = numberConnections
+        for i in range(block_start, block_end):
+            total_conns = total_conns_per_cell[i - block_start]
 
-            total_conns = total_conns + conn_subsets
+            if total_conns != 0:
+                pop2_cell_ids, pop2_distances = spatial.cells_within_radius(
+                    pop2_cell_positions,
+                    pop1_cell_positions[i],
+                    cutoff_radius,
+                    spatial_index,
+                )
 
-        if total_conns != 0:
-            if pre_seg_target_dict != None and len(pre_seg_target_dict.keys()) == 1:
-                pre_subset_dict = {}
+                if pop1_id == pop2_id:
+                    not_self = pop2_cell_ids != i
 
-                pre_subset_dict[list(pre_seg_target_dict.keys())[0]] = total_conns
+                    pop2_cell_ids = pop2_cell_ids[not_self]
 
-            else:
-                pre_subset_dict = None
+                    pop2_distances = pop2_distances[not_self]
 
-            pop2_cell_ids = list(range(0, pop2_size))
+                if len(pop2_cell_ids) > 0:
+                    post_target_seg_array = post_segs_per_cell[i - block_start]
 
-            if pop1_id == pop2_id:
-                pop2_cell_ids.remove(i)
+                    post_target_fractions = post_fractions_per_cell[i - block_start]
 
-            if pop2_cell_ids != []:
-                cell1_position = pop1_cell_positions[i]
+                    pre_target_seg_array = pre_segs_per_cell[i - block_start]
 
-                post_target_seg_array, post_target_fractions = get_target_segments(
-                    post_seg_target_dict, conn_subsets
-                )
+                    pre_target_fractions = pre_fractions_per_cell[i - block_start]
 
-                if pre_subset_dict != None:
-                    pre_target_seg_array, pre_target_fractions = get_target_segments(
-                        pre_seg_target_dict, pre_subset_dict
+                    conn_probabilities = distance_rule_expression.evaluate(
+                        {"r": pop2_distances}, size=len(pop2_cell_ids), rng=rng
                     )
 
-                else:
-                    pre_target_seg_array = None
-
-                    pre_target_fractions = None
-
-                conn_counter = 0
-
-                for j in pop2_cell_ids:
-                    cell2_position = pop2_cell_positions[j]
-
-                    r = math.sqrt(
-                        sum(
-                            [
-                                (a - b) ** 2
-                                for a, b in zip(cell1_position, cell2_position)
-                            ]
-                        )
+                    connected = (conn_probabilities >= 1) | (
+                        rng.random(len(pop2_cell_ids)) < conn_probabilities
                     )
 
-                    if eval(distance_rule) >= 1 or random.random() < eval(
-                        distance_rule
-                    ):
-                        conn_counter += 1
+                    if owned is not None and not owned[i - block_start]:
+                        continue
 
+                    for j in pop2_cell_ids[connected][:total_conns].tolist():
                         post_seg_id = post_target_seg_array[0]
 
                         del post_target_seg_array[0]
@@ -1397,13 +1611,12 @@ def add_elect_spatial_projection(
 
                         count += 1
 
-                    if conn_counter == total_conns:
-                        break
-
     if count != 0:
         for synapse_ind in range(0, len(synapse_list)):
             net.electrical_projections.append(proj_array[synapse_ind])
 
+        streaming.flush(net)
+
     return proj_array
 
 
@@ -1418,27 +1631,30 @@ def make_target_dict(cell_object, target_segs):
     target_segs - a dictionary in the format returned by the method extract_seg_ids(); the keys are the ids of target segment groups or names of individual segments and
     the values are lists of corresponding target segment ids."""
 
-    targetDict = {}
-    for target in target_segs.keys():
-        targetDict[target] = {}
-        lengths, segment_list = get_seg_lengths(cell_object, target_segs[target])
-        targetDict[target]["LengthDist"] = lengths
-        targetDict[target]["SegList"] = segment_list
-    return targetDict
+    return morphology.get_morphology_index(cell_object).make_target_dict(target_segs)
 
 
 ############################################################################################################################
 
 
+def _sample_cells(rng, cells, num_cells):
+    if rng == None:
+        return random.sample(cells, num_cells)
+
+    return [cells[index] for index in rng.permutation(len(cells))[:num_cells].tolist()]
+
+
 def get_target_cells(
     population,
     fraction_to_target,
     list_of_xvectors=None,
     list_of_yvectors=None,
     list_of_zvectors=None,
+    rng=None,
 ):
     """This method returns the list of target cells according to which fraction of randomly selected cells is targeted and whether these cells are localized in the specific
     rectangular regions of the network. These regions are specified by list_of_xvectors, list_of_yvectors and list_of_zvectors. These lists must have the same length.
+    The cells are selected with random.sample(), or drawn from the NumPy generator `rng` if given.
 
     The input variable list_of_xvectors stores the lists whose elements define the left and right margins of the target rectangular regions along the x dimension.
 
@@ -1446,8 +1662,10 @@ def get_target_cells(
     the y and z dimensions, respectively."""
 
     if list_of_xvectors == None or list_of_yvectors == None or list_of_zvectors == None:
-        target_cells = random.sample(
-            range(population.size), int(round(fraction_to_target * population.size))
+        target_cells = _sample_cells(
+            rng,
+            range(population.size),
+            int(round(fraction_to_target * population.size)),
         )
 
     else:
@@ -1473,7 +1691,8 @@ def get_target_cells(
                         ):
                             region_specific_targets_per_cell_group.append(cell)
 
-        target_cells = random.sample(
+        target_cells = _sample_cells(
+            rng,
             region_specific_targets_per_cell_group,
             int(
                 round(fraction_to_target * len(region_specific_targets_per_cell_group))
@@ -1488,41 +1707,10 @@ def get_target_cells(
 
 def get_seg_lengths(cell_object, target_segments):
     """This method constructs the cumulative distribution of target segments and the corresponding list of target segment ids.
-    Input arguments: cell_object - object created using libNeuroML API which corresponds to the target cell; target_segments - the list of target segment ids."""
-
-    cumulative_length_dist = []
-    segment_list = []
-    totalLength = 0
-    for seg in cell_object.morphology.segments:
-        for target_seg in target_segments:
-            if target_seg == seg.id:
-                if seg.distal != None:
-                    xd = seg.distal.x
-                    yd = seg.distal.y
-                    zd = seg.distal.z
-
-                if seg.proximal != None:
-                    xp = seg.proximal.x
-                    yp = seg.proximal.y
-                    zp = seg.proximal.z
-                else:
-                    if seg.parent != None:
-                        get_segment_parent = seg.parent
-                        get_segment_parent_id = get_segment_parent.segments
-                        for segment_parent in cell_object.morphology.segments:
-                            if segment_parent.id == get_segment_parent_id:
-                                xp = segment_parent.distal.x
-                                yp = segment_parent.distal.y
-                                zp = segment_parent.distal.z
-                dist = [xd, yd, zd]
-                prox = [xp, yp, zp]
-                length = math.sqrt(sum([(a - b) ** 2 for a, b in zip(dist, prox)]))
-
-                segment_list.append(target_seg)
-                totalLength = totalLength + length
-                cumulative_length_dist.append(totalLength)
+    Input arguments: cell_object - object created using libNeuroML API which corresponds to the target cell; target_segments - the list of target segment ids.
+    """
 
-    return cumulative_length_dist, segment_list
+    return morphology.get_morphology_index(cell_object).get_seg_lengths(target_segments)
 
 
 ##############################################################################################
@@ -1530,63 +1718,37 @@ def get_seg_lengths(cell_object, target_segments):
 
 def extract_seg_ids(cell_object, target_compartment_array, targeting_mode):
     """This method extracts the segment ids that map on the target segment groups or individual segments.
-    cell_object is the loaded cell object using neuroml.loaders.NeuroMLLoader, target_compartment_array is an array of target compartment names (e.g. segment group ids or individual segment names) and targeting_mode is one of the strings: "segments" or "segGroups"."""
-
-    segment_id_array = []
-    segment_group_array = {}
-    cell_segment_array = []
-
-    for segment in cell_object.morphology.segments:
-        segment_id_array.append(segment.id)
-        segment_name_and_id = []
-        segment_name_and_id.append(segment.name)
-        segment_name_and_id.append(segment.id)
-        cell_segment_array.append(segment_name_and_id)
-
-    for segment_group in cell_object.morphology.segment_groups:
-        pooled_segment_group_data = {}
-        segment_list = []
-        segment_group_list = []
+    cell_object is the loaded cell object using neuroml.loaders.NeuroMLLoader, target_compartment_array is an array of target compartment names (e.g. segment group ids or individual segment names) and targeting_mode is one of the strings: "segments" or "segGroups".
+    """
 
-        segment_list = cell_object.get_all_segments_in_group(segment_group)
+    index = morphology.get_morphology_index(cell_object)
 
-        for included_segment_group in segment_group.includes:
-            segment_group_list.append(included_segment_group.segment_groups)
+    target_counts = {}
 
-        pooled_segment_group_data["segments"] = segment_list
-        pooled_segment_group_data["groups"] = segment_group_list
-        segment_group_array[segment_group.id] = pooled_segment_group_data
+    for target in target_compartment_array:
+        target_counts[target] = target_counts.get(target, 0) + 1
 
     target_segment_array = {}
 
     found_target_groups = []
 
     if targeting_mode == "segments":
-        for segment_counter in range(0, len(cell_segment_array)):
-            for target_segment in range(0, len(target_compartment_array)):
-                if (
-                    cell_segment_array[segment_counter][0]
-                    == target_compartment_array[target_segment]
-                ):
-                    target_segment_array[target_compartment_array[target_segment]] = [
-                        cell_segment_array[segment_counter][1]
-                    ]
-                    found_target_groups.append(target_compartment_array[target_segment])
+        for row, segment_name in enumerate(index.segment_names):
+            if segment_name in target_counts:
+                target_segment_array[segment_name] = [int(index.segment_ids[row])]
+
+                found_target_groups.extend([segment_name] * target_counts[segment_name])
 
     if targeting_mode == "segGroups":
-        for segment_group in segment_group_array.keys():
-            for target_group in range(0, len(target_compartment_array)):
-                if target_compartment_array[target_group] == segment_group:
-                    segment_target_array = []
-                    found_target_groups.append(target_compartment_array[target_group])
-                    if segment_group_array[segment_group]["segments"] != []:
-                        for segment in segment_group_array[segment_group]["segments"]:
-                            if segment not in segment_target_array:
-                                segment_target_array.append(segment)
-
-                    target_segment_array[target_compartment_array[target_group]] = (
-                        segment_target_array
-                    )
+        for segment_group in index.group_ids:
+            if segment_group in target_counts:
+                target_segment_array[segment_group] = index.segments_in_group(
+                    segment_group
+                ).tolist()
+
+                found_target_groups.extend(
+                    [segment_group] * target_counts[segment_group]
+                )
 
     if len(found_target_groups) != len(target_compartment_array):
         groups_not_found = list(
@@ -1600,170 +1762,62 @@ def extract_seg_ids(cell_object, target_compartment_array, targeting_mode):
 
         quit()
 
-    return target_segment_array
-
-
-######################################################################################
-
-
-def get_target_segments(seg_specifications, subset_dict):
-    """This method generates the list of target segments and target fractions per cell according to two types of input dictionaries:
-    seg_specifications - a dictionary in the format returned by make_target_dict(); keys are target group names or individual segment names
-    and the corresponding values are dictionaries with keys 'LengthDist' and 'SegList', as returned by the get_seg_lengths;
-    subset_dict - a dictionary whose keys are target group names or individual segment names; each key stores the corresponding number of connections per target group."""
-
-    # opencortex.print_comment_v("get_target_segments(): %s; %s"%(seg_specifications.keys(), subset_dict))
-    target_segs_per_cell = []
-    target_fractions_along_per_cell = []
-
-    if isinstance(subset_dict, dict):
-        for target_group in subset_dict.keys():
-            no_per_target_group = subset_dict[target_group]
-
-            if target_group in seg_specifications.keys():
-                target_segs_per_group = []
-
-                target_fractions_along_per_group = []
-
-                cumulative_length_dist = seg_specifications[target_group]["LengthDist"]
-
-                segment_list = seg_specifications[target_group]["SegList"]
-
-                # opencortex.print_comment_v("cumulative_length_dist: %s; segment_list: %s"%(cumulative_length_dist, segment_list))
-
-                not_selected = True
-
-                while not_selected:
-                    p = random.random()
-
-                    loc = p * cumulative_length_dist[-1]
-
-                    if len(segment_list) == len(cumulative_length_dist):
-                        for seg_index in range(0, len(segment_list)):
-                            current_dist_value = cumulative_length_dist[seg_index]
-
-                            if seg_index == 0:
-                                previous_dist_value = 0
-
-                            else:
-                                previous_dist_value = cumulative_length_dist[
-                                    seg_index - 1
-                                ]
-
-                            if loc >= previous_dist_value and loc <= current_dist_value:
-                                segment_length = (
-                                    current_dist_value - previous_dist_value
-                                )
-
-                                length_within_seg = loc - previous_dist_value
-
-                                post_fraction_along = (
-                                    float(length_within_seg) / segment_length
-                                    if segment_length > 0
-                                    else 0.5
-                                )
-
-                                target_segs_per_group.append(segment_list[seg_index])
-
-                                target_fractions_along_per_group.append(
-                                    post_fraction_along
-                                )
-
-                                break
-
-                    if len(target_segs_per_group) == no_per_target_group:
-                        not_selected = False
-                        break
-
-                target_segs_per_cell.extend(target_segs_per_group)
-
-                target_fractions_along_per_cell.extend(target_fractions_along_per_group)
-
-    if isinstance(subset_dict, float) or isinstance(subset_dict, int):
-        total_num_per_target_groups = int(subset_dict)
-
-        not_selected = True
-
-        while not_selected:
-            random_target_group = random.sample(list(seg_specifications.keys()), 1)[0]
-
-            cumulative_length_dist = seg_specifications[random_target_group][
-                "LengthDist"
-            ]
-
-            segment_list = seg_specifications[random_target_group]["SegList"]
-
-            p = random.random()
-
-            loc = p * cumulative_length_dist[-1]
-
-            if len(segment_list) == len(cumulative_length_dist):
-                for seg_index in range(0, len(segment_list)):
-                    current_dist_value = cumulative_length_dist[seg_index]
-
-                    if seg_index == 0:
-                        previous_dist_value = 0
-
-                    else:
-                        previous_dist_value = cumulative_length_dist[seg_index - 1]
-
-                    if loc > previous_dist_value and loc < current_dist_value:
-                        segment_length = current_dist_value - previous_dist_value
-
-                        length_within_seg = loc - previous_dist_value
-
-                        post_fraction_along = float(length_within_seg) / segment_length
+    return target_segment_array
 
-                        target_segs_per_cell.append(segment_list[seg_index])
 
-                        target_fractions_along_per_cell.append(post_fraction_along)
+######################################################################################
 
-                        break
 
-            if len(target_segs_per_cell) == total_num_per_target_groups:
-                not_selected = False
+def get_target_segments(seg_specifications, subset_dict):
+    """This method generates the list of target segments and target fractions per cell according to two types of input dictionaries:
+    seg_specifications - a dictionary in the format returned by make_target_dict(); keys are target group names or individual segment names
+    and the corresponding values are dictionaries with keys 'LengthDist' and 'SegList', as returned by the get_seg_lengths;
+    subset_dict - a dictionary whose keys are target group names or individual segment names; each key stores the corresponding number of connections per target group.
+    """
 
-                break
+    # opencortex.print_comment_v("get_target_segments(): %s; %s"%(seg_specifications.keys(), subset_dict))
+    target_segs_per_cell, target_fractions_along_per_cell = (
+        get_target_segments_for_cells(seg_specifications, [subset_dict])
+    )
 
-    return target_segs_per_cell, target_fractions_along_per_cell
+    return target_segs_per_cell[0], target_fractions_along_per_cell[0]
 
 
 ###########################################################################################################################
 
 
-def get_pre_and_post_segment_ids(proj):
-    """This method extracts the lists of pre and post segment ids per given projection. Can be used when substituting the cell types from one NeuroML2 network to the other.
+def get_target_segments_for_cells(seg_specifications, subset_dicts, rng=None):
+    """Batched version of get_target_segments() which draws the target segments and fractions of many cells at once:
+    seg_specifications - a dictionary in the format returned by make_target_dict();
+    subset_dicts - a list with, for each cell, a dictionary with the number of connections per target group or a total number of connections;
+    rng - optional NumPy random generator (by default one seeded from the global random module is used).
 
-    return pre_segment_ids, post_segment_ids"""
+    Returns two lists with, for each cell, the list of target segment ids and the list of fractions along.
+    """
 
-    pre_segment_ids = []
+    if rng == None:
+        rng = _get_rng()
 
-    post_segment_ids = []
+    segment_ids_per_cell, fractions_per_cell = sampling.SegmentSampler(
+        seg_specifications
+    ).sample(rng, subset_dicts)
 
-    if hasattr(proj, "connection_wds"):
-        if proj.connection_wds != []:
-            connections = proj.connection_wds
+    return [segment_ids.tolist() for segment_ids in segment_ids_per_cell], [
+        fractions.tolist() for fractions in fractions_per_cell
+    ]
 
-    elif hasattr(proj, "connections"):
-        if proj.connections != []:
-            connections = proj.connections
 
-    elif hasattr(proj, "electrical_connection_instances"):
-        if proj.electrical_connection_instances != []:
-            connections = proj.electrical_connection_instances
+###########################################################################################################################
 
-    else:
-        if proj.electrical_connections != []:
-            connections = proj.electrical_connections
 
-    for conn_counter in range(0, len(connections)):
-        connection = connections[conn_counter]
+def get_pre_and_post_segment_ids(proj):
+    """This method extracts the lists of pre and post segment ids per given projection. Can be used when substituting the cell types from one NeuroML2 network to the other.
 
-        pre_segment_ids.append(connection.pre_segment_id)
+    return pre_segment_ids, post_segment_ids"""
 
-        post_segment_ids.append(connection.post_segment_id)
+    columns = sparse.get_connection_columns(proj)
 
-    return pre_segment_ids, post_segment_ids
+    return columns["pre_segment"].tolist(), columns["post_segment"].tolist()
 
 
 ##################################################################################################################################
@@ -1928,7 +1982,7 @@ def _include_neuroml2_cell(nml_doc, cell_nml2_path, cell_id, channels_also=True)
     This could be called from opencortex.core
     """
 
-    nml2_doc_cell = pynml.read_neuroml2_file(cell_nml2_path, include_includes=False)
+    nml2_doc_cell = cell_cache.load_cell_document(cell_nml2_path)
 
     for cell in _get_cells_of_all_known_types(nml2_doc_cell):
         if cell.id == cell_id:
@@ -1979,7 +2033,7 @@ def _add_cell_and_channels(nml_doc, cell_nml2_rel_path, cell_id, use_prototypes=
     else:
         cell_nml2_path = cell_nml2_rel_path
 
-    nml2_doc_cell = pynml.read_neuroml2_file(cell_nml2_path, include_includes=False)
+    nml2_doc_cell = cell_cache.load_cell_document(cell_nml2_path)
 
     for cell in _get_cells_of_all_known_types(nml2_doc_cell):
         if cell.id == cell_id:
@@ -2021,7 +2075,9 @@ def _add_cell_and_channels(nml_doc, cell_nml2_rel_path, cell_id, use_prototypes=
                     nml_doc.includes.append(neuroml.IncludeType(new_loc))
                     all_included_files.append(new_loc)
 
-    nml2_doc_cell_full = pynml.read_neuroml2_file(cell_nml2_path, include_includes=True)
+    nml2_doc_cell_full = cell_cache.load_cell_document(
+        cell_nml2_path, include_includes=True
+    )
 
     cell_ids_vs_nml_docs[cell_id] = nml2_doc_cell_full
 
@@ -2036,6 +2092,8 @@ def remove_component_dirs(
 
     Target directory is specified by the input argument dir_to_project_nml2."""
 
+    from pyneuroml import pynml
+
     list_of_cell_file_names = []
 
     for cell_id in list_of_cell_ids:
@@ -2233,6 +2291,95 @@ def _add_spike_source_poisson(nml_doc, id, start, duration, rate):
 ##############################################################################################
 
 
+def _get_overlap_grid(population_dictionary, cell_diameter_dict):
+    """Returns a spatial.OverlapGrid with the positions of the cells of the populations in population_dictionary (in the format returned by
+    opencortex.utils.add_populations_in_rectangular_layers()), each with the soma diameter of its cell type as exclusion radius
+    """
+
+    overlap_grid = spatial.OverlapGrid(max(cell_diameter_dict.values()))
+
+    if population_dictionary == None:
+        return overlap_grid
+
+    for pop_id in population_dictionary.keys():
+        if (
+            population_dictionary[pop_id] != {}
+            and population_dictionary[pop_id]["Positions"] is not None
+        ):
+            cell_component = population_dictionary[pop_id]["PopObj"].component
+
+            overlap_grid.add_positions(
+                population_dictionary[pop_id]["Positions"],
+                cell_diameter_dict[cell_component],
+            )
+
+    return overlap_grid
+
+
+def _poisson_disk_placement(
+    pop_id,
+    cell_id,
+    size,
+    low,
+    high,
+    inside,
+    population_dictionary,
+    cell_diameter_dict,
+    rng,
+):
+    """Returns an (size, 3) array of positions in the box [low, high] (and for which inside(position) is True, if inside is not None) drawn with
+    Poisson-disk sampling from the generator `rng`: the cells are at least the soma diameter of cell_id apart and do not overlap the cells in
+    population_dictionary
+    """
+
+    if cell_diameter_dict == None or cell_id not in cell_diameter_dict:
+        raise Exception(
+            "Error! The soma diameter of %s must be given in cell_diameter_dict for placement='poisson_disk' of population %s"
+            % (cell_id, pop_id)
+        )
+
+    if size == 0:
+        return np.zeros((0, 3))
+
+    positions = spatial.poisson_disk_positions(
+        rng,
+        low,
+        high,
+        cell_diameter_dict[cell_id],
+        inside=inside,
+        occupied=_get_overlap_grid(population_dictionary, cell_diameter_dict),
+    )
+
+    if len(positions) < size:
+        raise Exception(
+            "Error! Only %i cells of %s with soma diameter %s fit in the region of population %s without overlapping, not %i"
+            % (len(positions), cell_id, cell_diameter_dict[cell_id], pop_id, size)
+        )
+
+    return positions[:size]
+
+
+def _get_random_position(rng, x_min, y_min, z_min, x_size, y_size, z_size):
+    """Returns a position [x, y, z] drawn uniformly from `rng` in the box of corner (x_min, y_min, z_min) and sides x_size, y_size and z_size"""
+
+    return (
+        np.array([x_min, y_min, z_min])
+        + np.array([x_size, y_size, z_size]) * rng.random(3)
+    ).tolist()
+
+
+def _check_placement(placement):
+    if placement not in ["random", "poisson_disk"]:
+        raise Exception(
+            "Error! The placement of cells must be 'random' or 'poisson_disk', not '%s'"
+            % placement
+        )
+
+
+##############################################################################################
+
+
+@tracing.traced()
 def _add_population_in_rectangular_region(
     net,
     pop_id,
@@ -2249,12 +2396,17 @@ def _add_population_in_rectangular_region(
     population_dictionary=None,
     cell_diameter_dict=None,
     color=None,
+    placement="random",
 ):
     """
     See info at opencortex.core.add_population_in_rectangular_region()
 
     """
 
+    _check_placement(placement)
+
+    rng = get_element_rng(net, pop_id)
+
     pop = neuroml.Population(
         id=pop_id, component=cell_id, type="populationList", size=size
     )
@@ -2287,12 +2439,37 @@ def _add_population_in_rectangular_region(
     else:
         cellPositions = []
 
-    for i in range(0, size):
+    if placement == "poisson_disk":
+        positions = _poisson_disk_placement(
+            pop_id,
+            cell_id,
+            size,
+            [x_min, y_min, z_min],
+            [x_min + x_size, y_min + y_size, z_min + z_size],
+            None,
+            population_dictionary,
+            cell_diameter_dict,
+            rng,
+        )
+
+        for i in range(0, size):
+            X, Y, Z = positions[i].tolist()
+
+            inst = neuroml.Instance(id=i)
+            inst.location = neuroml.Location(x="%.5f" % X, y="%.5f" % Y, z="%.5f" % Z)
+            pop.instances.append(inst)
+
+            cellPositions.append([X, Y, Z])
+
+    elif not cell_bodies_overlap:
+        overlap_grid = _get_overlap_grid(population_dictionary, cell_diameter_dict)
+
+    for i in range(0, size if placement == "random" else 0):
         if cell_bodies_overlap:
             inst = neuroml.Instance(id=i)
-            X = x_min + (x_size) * random.random()
-            Y = y_min + (y_size) * random.random()
-            Z = z_min + (z_size) * random.random()
+            X, Y, Z = _get_random_position(
+                rng, x_min, y_min, z_min, x_size, y_size, z_size
+            )
             inst.location = neuroml.Location(x="%.5f" % X, y="%.5f" % Y, z="%.5f" % Z)
             # inst.location = neuroml.Location(x=str(X), y=str(Y), z=str(Z))
             pop.instances.append(inst)
@@ -2308,48 +2485,13 @@ def _add_population_in_rectangular_region(
             cell_position_found = False
 
             while not cell_position_found:
-                X = x_min + (x_size) * random.random()
-                Y = y_min + (y_size) * random.random()
-                Z = z_min + (z_size) * random.random()
+                X, Y, Z = _get_random_position(
+                    rng, x_min, y_min, z_min, x_size, y_size, z_size
+                )
 
                 try_cell_position = [X, Y, Z]
 
-                count_overlaps = 0
-
-                for cell_index in range(0, len(cellPositions)):
-                    cell_loc = cellPositions[cell_index]
-
-                    if (
-                        distance(try_cell_position, cell_loc)
-                        < (cell_diameter_dict[cell_id] + cell_diameter_dict[cell_id])
-                        / 2
-                    ):
-                        count_overlaps += 1
-
-                for pop_id in population_dictionary.keys():
-                    if population_dictionary[pop_id] != {}:
-                        added_cell_positions = population_dictionary[pop_id][
-                            "Positions"
-                        ]
-
-                        cell_component = population_dictionary[pop_id][
-                            "PopObj"
-                        ].component
-
-                        for cell_index in range(0, len(added_cell_positions)):
-                            cell_loc = added_cell_positions[cell_index]
-
-                            if (
-                                distance(try_cell_position, cell_loc)
-                                < (
-                                    cell_diameter_dict[cell_component]
-                                    + cell_diameter_dict[cell_component]
-                                )
-                                / 2
-                            ):
-                                count_overlaps += 1
-
-                if count_overlaps == 0:
+                if not overlap_grid.overlaps(try_cell_position):
                     inst = neuroml.Instance(id=i)
                     inst.location = neuroml.Location(
                         x="%.5f" % X, y="%.5f" % Y, z="%.5f" % Z
@@ -2359,8 +2501,12 @@ def _add_population_in_rectangular_region(
 
                     cellPositions.append(try_cell_position)
 
+                    overlap_grid.add(try_cell_position, cell_diameter_dict[cell_id])
+
                     cell_position_found = True
 
+    tracing.count("cells", len(pop.instances))
+
     if store_soma:
         return pop, cellPositions
 
@@ -2371,6 +2517,7 @@ def _add_population_in_rectangular_region(
 ##############################################################################################
 
 
+@tracing.traced()
 def add_population_in_cylindrical_region(
     net,
     pop_id,
@@ -2389,6 +2536,7 @@ def add_population_in_cylindrical_region(
     positions_of_vertices=None,
     constants_of_sides=None,
     color=None,
+    placement="random",
 ):
     """Method which create a cell population in the  NeuroML2 network and distributes these cells in the cylindrical region. Input arguments are as follows:
 
@@ -2412,7 +2560,8 @@ def add_population_in_cylindrical_region(
 
     cell_bodies_overlap -  boolean value which defines whether cell somata can overlap; default is set to True;
 
-    store_soma -boolean value which specifies whether soma positions have to be stored in the output array; default is set to False;
+    store_soma -boolean value which specifies whether soma positions have to be stored in the output array; default is set to False; the positions are returned as an (N, 3)
+    NumPy array of [x, y, z] positions, all of which are generated in one vectorized batch when cell_bodies_overlap is True;
 
     population_dictionary - optional argument in the format returned by add_populations_in_rectangular_layers; default value is None but it must be specified when cell_bodies_overlap
     is set to False;
@@ -2426,15 +2575,22 @@ def add_population_in_cylindrical_region(
     positions_of_vertices - optional argument which specifies the list of coordinates [dim1, dim2] of vertices of a regular polygon; must be specified if num_of_polygon_sides is not
     None; automatic generation of this list is wrapped inside the utils method add_populations_in_cylindrical_layers();
 
-    constants_of_sides - optional argument which specifies the list of y=ax +b coefficients [a, b] which define the lines between vertices of a regular polygon;
-    if y= b for all values then list element should specify as [None, b]; if x= b for all values of y then list element should specify as [b, None];
-    Note that constants_of_sides must be specified if num_of_polygon_sides is not None;
-    automatic generation of this list is wrapped inside the utils method add_populations_in_cylindrical_layers();
+    constants_of_sides - deprecated and ignored: the polygon is defined by positions_of_vertices only; a DeprecationWarning is issued if it is given.
 
     color - optional color, default is None.
 
+    placement - 'random' (default), to draw the position of each cell uniformly in the region (rejecting positions where the cell body would overlap
+    another one if cell_bodies_overlap is False), or 'poisson_disk', to place the cells with Poisson-disk sampling so that their somata are at least the
+    soma diameter of cell_id apart and do not overlap the cells in population_dictionary (if given); cell_diameter_dict must be specified for 'poisson_disk'.
+
     """
 
+    _check_placement(placement)
+
+    _warn_constants_of_sides(constants_of_sides)
+
+    rng = get_element_rng(net, pop_id)
+
     pop = neuroml.Population(
         id=pop_id, component=cell_id, type="populationList", size=size
     )
@@ -2448,16 +2604,11 @@ def add_population_in_cylindrical_region(
     if size > 0:
         net.populations.append(pop)
 
-    if store_soma:
-        cellPositions = []
-
-    if (num_of_polygon_sides != None) and (
-        positions_of_vertices == None or constants_of_sides == None
-    ):
+    if (num_of_polygon_sides != None) and (positions_of_vertices == None):
         opencortex.print_comment_v(
-            "Error! Method opencortex.build.%s() called with num_of_polygon_sides set to %d but positions_of_vertices or constants_of_sides "
-            "is None !. Execution will terminate." % num_of_polygon_sides,
-            sys._getframe().f_code.co_name,
+            "Error! Method opencortex.build.%s() called with num_of_polygon_sides set to %d but positions_of_vertices "
+            "is None !. Execution will terminate."
+            % (sys._getframe().f_code.co_name, num_of_polygon_sides)
         )
 
         quit()
@@ -2472,9 +2623,6 @@ def add_population_in_cylindrical_region(
 
         quit()
 
-    else:
-        cellPositions = []
-
     all_dims = ["x", "y", "z"]
 
     for dim in all_dims:
@@ -2483,99 +2631,82 @@ def add_population_in_cylindrical_region(
 
     map_xyz = {base_dim1: "dim1", base_dim2: "dim2", all_dims[0]: "dim3"}
 
-    for i in range(0, size):
-        if cell_bodies_overlap:
-            dim_dict = find_constrained_cell_position(
-                num_of_polygon_sides,
-                cyl_radius,
-                lower_bound_dim3,
-                upper_bound_dim3,
-                positions_of_vertices,
-                constants_of_sides,
-            )
+    ### columns of the [dim1, dim2, dim3] positions which give x, y and z
+    xyz_columns = [int(map_xyz[axis][3]) - 1 for axis in ["x", "y", "z"]]
 
-            X = dim_dict[map_xyz["x"]]
+    vertices = positions_of_vertices if num_of_polygon_sides != None else None
 
-            Y = dim_dict[map_xyz["y"]]
+    if placement == "poisson_disk":
+        low = np.array([-cyl_radius, -cyl_radius, lower_bound_dim3])
 
-            Z = dim_dict[map_xyz["z"]]
+        high = np.array([cyl_radius, cyl_radius, upper_bound_dim3])
 
-            inst = neuroml.Instance(id=i)
+        dim_columns = [xyz_columns.index(dim) for dim in range(0, 3)]
 
-            inst.location = neuroml.Location(x=str(X), y=str(Y), z=str(Z))
-            pop.instances.append(inst)
+        def inside(position):
+            dim1, dim2 = position[dim_columns[0]], position[dim_columns[1]]
 
-            if store_soma:
-                cell_position = []
-                cell_position.append(X)
-                cell_position.append(Y)
-                cell_position.append(Z)
-                cellPositions.append(cell_position)
+            if dim1 * dim1 + dim2 * dim2 > cyl_radius * cyl_radius:
+                return False
 
-        else:
-            cell_position_found = False
+            return (
+                vertices is None
+                or spatial.points_in_polygon([[dim1, dim2]], vertices)[0]
+            )
 
-            while not cell_position_found:
-                dim_dict = find_constrained_cell_position(
-                    num_of_polygon_sides,
-                    cyl_radius,
-                    lower_bound_dim3,
-                    upper_bound_dim3,
-                    positions_of_vertices,
-                    constants_of_sides,
-                )
+        cellPositions = _poisson_disk_placement(
+            pop_id,
+            cell_id,
+            size,
+            low[xyz_columns],
+            high[xyz_columns],
+            inside,
+            population_dictionary,
+            cell_diameter_dict,
+            rng,
+        )
 
-                X = dim_dict[map_xyz["x"]]
+    elif cell_bodies_overlap:
+        cellPositions = spatial.sample_column_positions(
+            rng, size, cyl_radius, lower_bound_dim3, upper_bound_dim3, vertices
+        )[:, xyz_columns]
 
-                Y = dim_dict[map_xyz["y"]]
+    else:
+        overlap_grid = _get_overlap_grid(population_dictionary, cell_diameter_dict)
 
-                Z = dim_dict[map_xyz["z"]]
+        cellPositions = np.zeros((size, 3))
 
-                try_cell_position = [X, Y, Z]
+        placed = 0
 
-                count_overlaps = 0
+        while placed < size:
+            candidates = spatial.sample_column_positions(
+                rng,
+                size - placed,
+                cyl_radius,
+                lower_bound_dim3,
+                upper_bound_dim3,
+                vertices,
+            )[:, xyz_columns]
 
-                for cell_index in range(0, len(cellPositions)):
-                    cell_loc = cellPositions[cell_index]
+            for try_cell_position in candidates:
+                if not overlap_grid.overlaps(try_cell_position):
+                    cellPositions[placed] = try_cell_position
 
-                    if (
-                        distance(try_cell_position, cell_loc)
-                        < (cell_diameter_dict[cell_id] + cell_diameter_dict[cell_id])
-                        / 2
-                    ):
-                        count_overlaps += 1
-
-                for pop_id in population_dictionary.keys():
-                    if population_dictionary[pop_id] != {}:
-                        added_cell_positions = population_dictionary[pop_id][
-                            "Positions"
-                        ]
-
-                        cell_component = population_dictionary[pop_id][
-                            "PopObj"
-                        ].component
-
-                        for cell_index in range(0, len(added_cell_positions)):
-                            cell_loc = added_cell_positions[cell_index]
-
-                            if (
-                                distance(try_cell_position, cell_loc)
-                                < (
-                                    cell_diameter_dict[cell_component]
-                                    + cell_diameter_dict[cell_component]
-                                )
-                                / 2
-                            ):
-                                count_overlaps += 1
-
-                if count_overlaps == 0:
-                    inst = neuroml.Instance(id=i)
-                    inst.location = neuroml.Location(x=str(X), y=str(Y), z=str(Z))
-                    pop.instances.append(inst)
+                    overlap_grid.add(try_cell_position, cell_diameter_dict[cell_id])
 
-                    cellPositions.append(try_cell_position)
+                    placed += 1
 
-                    cell_position_found = True
+                    if placed == size:
+                        break
+
+    for i, (X, Y, Z) in enumerate(cellPositions.tolist()):
+        pop.instances.append(
+            neuroml.Instance(
+                id=i, location=neuroml.Location(x=str(X), y=str(Y), z=str(Z))
+            )
+        )
+
+    tracing.count("cells", len(pop.instances))
 
     if store_soma:
         return pop, cellPositions
@@ -2587,141 +2718,43 @@ def add_population_in_cylindrical_region(
 ##############################################################################################
 
 
+def _warn_constants_of_sides(constants_of_sides):
+    if constants_of_sides != None:
+        warnings.warn(
+            "The argument constants_of_sides is deprecated and ignored: the polygon is defined by positions_of_vertices",
+            DeprecationWarning,
+            stacklevel=3,
+        )
+
+
+##############################################################################################
+
+
 def find_constrained_cell_position(
     num_of_polygon_sides,
     cyl_radius,
     lower_bound_dim3,
     upper_bound_dim3,
     positions_of_vertices,
-    constants_of_sides,
+    constants_of_sides=None,
 ):
     """
-    Method to find a constrained position of the cell; used inside the method add_population_in_cylindrical_region().
+    Method to find a constrained position of the cell, returned as a dictionary {'dim1': ..., 'dim2': ..., 'dim3': ...}; see add_population_in_cylindrical_region() for the
+    arguments (constants_of_sides is deprecated and ignored, the polygon is defined by positions_of_vertices).
     """
 
-    if num_of_polygon_sides == None:
-        found_cell_inside_cylinder = False
-
-        dim3_val = (
-            lower_bound_dim3 + (upper_bound_dim3 - lower_bound_dim3) * random.random()
-        )
-
-        while not found_cell_inside_cylinder:
-            dim_dict = {}
-
-            dim1_min = -cyl_radius
-
-            dim2_min = -cyl_radius
-
-            dim1_val = dim1_min + (2 * cyl_radius) * random.random()
-
-            dim2_val = dim2_min + (2 * cyl_radius) * random.random()
-
-            test_point_inside_cylinder = [dim1_val, dim2_val]
-
-            if distance(test_point_inside_cylinder, [0, 0]) <= cyl_radius:
-                dim_dict = {"dim1": dim1_val, "dim2": dim2_val, "dim3": dim3_val}
-
-                found_cell_inside_cylinder = True
-    else:
-        found_constrained_cell_loc = False
-
-        while not found_constrained_cell_loc:
-            found_cell_inside_cylinder = False
-
-            dim3_val = (
-                lower_bound_dim3
-                + (upper_bound_dim3 - lower_bound_dim3) * random.random()
-            )
-
-            while not found_cell_inside_cylinder:
-                dim1_min = -cyl_radius
-
-                dim2_min = -cyl_radius
-
-                dim1_val = dim1_min + (2 * cyl_radius) * random.random()
-
-                dim2_val = dim2_min + (2 * cyl_radius) * random.random()
-
-                test_point_inside_cylinder = [dim1_val, dim2_val]
-
-                if distance(test_point_inside_cylinder, [0, 0]) <= cyl_radius:
-                    test_point = test_point_inside_cylinder
-
-                    found_cell_inside_cylinder = True
-
-            count_intersections = 0
-
-            for side_index in range(0, len(constants_of_sides)):
-                if (
-                    abs(
-                        positions_of_vertices[side_index][1]
-                        - positions_of_vertices[side_index - 1][1]
-                    )
-                    > 0.0000001
-                ):
-                    if (
-                        test_point[1] < positions_of_vertices[side_index][1]
-                        and test_point[1] > positions_of_vertices[side_index - 1][1]
-                    ):
-                        opencortex.print_comment_v(
-                            "Checking a point inside a regular polygon"
-                        )
-
-                        if (
-                            constants_of_sides[side_index][0] != None
-                            and constants_of_sides[side_index][1] == None
-                        ):
-                            if dim1_val <= constants_of_sides[side_index][0]:
-                                count_intersections += 1
-
-                        if (
-                            constants_of_sides[side_index][0] != None
-                            and constants_of_sides[side_index][1] != None
-                        ):
-                            if (
-                                dim1_val
-                                <= (dim2_val - constants_of_sides[side_index][1])
-                                / constants_of_sides[side_index][0]
-                            ):
-                                count_intersections += 1
-
-                    if (
-                        test_point[1] < positions_of_vertices[side_index - 1][1]
-                        and test_point[1] > positions_of_vertices[side_index][1]
-                    ):
-                        opencortex.print_comment_v(
-                            "Checking a point inside a regular polygon"
-                        )
-
-                        if (
-                            constants_of_sides[side_index][0] != None
-                            and constants_of_sides[side_index][1] == None
-                        ):
-                            if dim1_val <= constants_of_sides[side_index][0]:
-                                count_intersections += 1
-
-                        if (
-                            constants_of_sides[side_index][0] != None
-                            and constants_of_sides[side_index][1] != None
-                        ):
-                            if (
-                                dim1_val
-                                <= (dim2_val - constants_of_sides[side_index][1])
-                                / constants_of_sides[side_index][0]
-                            ):
-                                count_intersections += 1
-
-            if count_intersections == 1:
-                dim_dict = {"dim1": dim1_val, "dim2": dim2_val, "dim3": dim3_val}
+    _warn_constants_of_sides(constants_of_sides)
 
-                opencortex.print_comment_v(
-                    "Selected a cell locus inside regular polygon."
-                )
+    dim1_val, dim2_val, dim3_val = spatial.sample_column_positions(
+        _get_rng(),
+        1,
+        cyl_radius,
+        lower_bound_dim3,
+        upper_bound_dim3,
+        positions_of_vertices if num_of_polygon_sides != None else None,
+    )[0].tolist()
 
-                found_constrained_cell_loc = True
-
-    return dim_dict
+    return {"dim1": dim1_val, "dim2": dim2_val, "dim3": dim3_val}
 
 
 ##############################################################################################
@@ -2745,7 +2778,10 @@ def get_soma_diameter(cell_name, cell_type=None, dir_to_cell=None):
     else:
         cell_nml_file = os.path.join(dir_to_cell, "%s.cell.nml" % cell_name)
 
-    document_cell = neuroml.loaders.NeuroMLLoader.load(cell_nml_file)
+    if cell_type == None:
+        return cell_cache.get_soma_diameter(cell_nml_file)
+
+    document_cell = cell_cache.load_cell_document(cell_nml_file)
 
     if cell_type != None:
         if cell_type == "cell2CaPools":
@@ -2774,6 +2810,7 @@ def get_soma_diameter(cell_name, cell_type=None, dir_to_cell=None):
 ##############################################################################################
 
 
+@tracing.traced()
 def add_advanced_inputs_to_population(
     net,
     id,
@@ -2819,6 +2856,8 @@ def add_advanced_inputs_to_population(
     weight_dict - id of cell vs weight for each connection
     """
 
+    rng = get_element_rng(net, id)
+
     if all_cells and only_cells is not None:
         opencortex.print_comment_v(
             "Error! Method opencortex.build.%s() called with both arguments all_cells and only_cells set!"
@@ -2835,167 +2874,173 @@ def add_advanced_inputs_to_population(
             return
         cell_ids = only_cells
 
-    input_list_array_final = []
+    cell_ids = np.asarray(cell_ids, dtype=np.int64).reshape(-1)
+
+    target_segs, target_fractions, counts = _get_input_locations(
+        cell_ids,
+        seg_length_dict,
+        subset_dict,
+        universal_target_segment,
+        universal_fraction_along,
+        rng,
+    )
 
-    input_counters_final = []
+    input_list_array_final = []
 
     for input_cell in range(0, len(input_id_list)):
         input_list_array = []
 
-        input_counters = []
-
         for input_index in range(0, len(input_id_list[input_cell])):
-            input_list = neuroml.InputList(
+            input_list = containers.ColumnarInputList(
                 id=id + "_%d_%d" % (input_cell, input_index),
                 component=input_id_list[input_cell][input_index],
                 populations=population.id,
+                target_format=containers.cell_id_format(population),
+                has_location=target_segs is not None,
             )
 
             input_list_array.append(input_list)
 
-            input_counters.append(0)
-
         input_list_array_final.append(input_list_array)
 
-        input_counters_final.append(input_counters)
+    weights = np.ones(len(cell_ids))
 
-    cell_counter = 0
+    if weight_dict:
+        ######### the weights of all the cells with the same weight (expression) are evaluated at once
+        cells_of_weights = {}
 
-    for cell_id in cell_ids:
-        if len(input_id_list) == len(cell_ids):
-            cell_index = cell_counter
+        for cell_counter, cell_id in enumerate(cell_ids.tolist()):
+            if cell_id in weight_dict:
+                cells_of_weights.setdefault(weight_dict[cell_id], []).append(
+                    cell_counter
+                )
 
-        else:
-            cell_index = 0
+        for weight, cell_counters in cells_of_weights.items():
+            weights[cell_counters] = _evaluate_expression_array(
+                weight, len(cell_counters), rng
+            )
 
-        weight = (
-            1
-            if (not weight_dict or cell_id not in weight_dict)
-            else _evaluate_expression(weight_dict[cell_id])
-        )
+    ######### cells share the input lists input_id_list[0] unless each cell has its own list of input components
 
-        if (
-            subset_dict != None
-            and seg_length_dict == None
-            and universal_target_segment == None
-            and universal_fraction_along == None
-        ):
-            if None in subset_dict.keys() and len(subset_dict.keys()) == 1:
-                for target_point in range(0, subset_dict[None]):
-                    for input_index in range(
-                        0, len(input_list_array_final[cell_index])
-                    ):
-                        if weight == 1:
-                            input = neuroml.Input(
-                                id=input_counters_final[cell_index][input_index],
-                                target="../%s/%i/%s"
-                                % (population.id, cell_id, population.component),
-                                destination="synapses",
-                            )
+    if len(input_id_list) == len(cell_ids):
+        cell_groups = [[cell_counter] for cell_counter in range(len(cell_ids))]
 
-                            input_list_array_final[cell_index][
-                                input_index
-                            ].input.append(input)
-                        else:
-                            input = neuroml.InputW(
-                                id=input_counters_final[cell_index][input_index],
-                                target="../%s/%i/%s"
-                                % (population.id, cell_id, population.component),
-                                destination="synapses",
-                                weight=weight,
-                            )
+    else:
+        cell_groups = [list(range(len(cell_ids)))]
 
-                            input_list_array_final[cell_index][
-                                input_index
-                            ].input_ws.append(input)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
 
-                        input_counters_final[cell_index][input_index] += 1
+    for cell_index, cell_group in enumerate(cell_groups):
+        if len(cell_group) == 1:
+            rows = np.arange(offsets[cell_group[0]], offsets[cell_group[0] + 1])
 
-        elif (
-            seg_length_dict != None
-            and subset_dict != None
-            and universal_target_segment == None
-            and universal_fraction_along == None
-        ):
-            target_seg_array, target_fractions = get_target_segments(
-                seg_length_dict, subset_dict
-            )
+            cells = np.full(len(rows), cell_group[0])
 
-            for target_point in range(0, len(target_seg_array)):
-                for input_index in range(0, len(input_list_array_final[cell_index])):
-                    if weight == 1:
-                        input = neuroml.Input(
-                            id=input_counters_final[cell_index][input_index],
-                            target="../%s/%i/%s"
-                            % (population.id, cell_id, population.component),
-                            destination="synapses",
-                            segment_id="%d" % target_seg_array[target_point],
-                            fraction_along="%f" % target_fractions[target_point],
-                        )
+        else:
+            rows = np.arange(offsets[-1])
 
-                        input_list_array_final[cell_index][input_index].input.append(
-                            input
-                        )
-                    else:
-                        input = neuroml.InputW(
-                            id=input_counters_final[cell_index][input_index],
-                            target="../%s/%i/%s"
-                            % (population.id, cell_id, population.component),
-                            destination="synapses",
-                            segment_id="%d" % target_seg_array[target_point],
-                            fraction_along="%f" % target_fractions[target_point],
-                            weight=weight,
-                        )
+            cells = np.repeat(np.arange(len(cell_ids)), counts)
 
-                        input_list_array_final[cell_index][input_index].input_ws.append(
-                            input
-                        )
+        weighted = weights[cells] != 1
 
-                    input_counters_final[cell_index][input_index] += 1
+        ids = np.arange(len(rows))
 
-        else:
-            for input_index in range(0, len(input_list_array_final[cell_index])):
-                if weight == 1:
-                    input = neuroml.Input(
-                        id=input_counters_final[cell_index][input_index],
-                        target="../%s/%i/%s"
-                        % (population.id, cell_id, population.component),
-                        destination="synapses",
-                        segment_id="%d" % universal_target_segment,
-                        fraction_along="%f" % universal_fraction_along,
-                    )
+        if target_segs is not None:
+            segment_ids = target_segs[rows]
 
-                    input_list_array_final[cell_index][input_index].input.append(input)
+            fractions = target_fractions[rows]
 
-                else:
-                    input = neuroml.InputW(
-                        id=input_counters_final[cell_index][input_index],
-                        target="../%s/%i/%s"
-                        % (population.id, cell_id, population.component),
-                        destination="synapses",
-                        segment_id="%d" % universal_target_segment,
-                        fraction_along="%f" % universal_fraction_along,
-                        weight=weight,
-                    )
+        else:
+            segment_ids = np.zeros(len(rows), dtype=np.int64)
 
-                    input_list_array_final[cell_index][input_index].input_ws.append(
-                        input
-                    )
+            fractions = np.full(len(rows), 0.5)
 
-                input_counters_final[cell_index][input_index] += 1
+        ######### all of the input components of the list are mapped on the same points of the cells
 
-        cell_counter += 1
+        for input_list in input_list_array_final[cell_index]:
+            input_list.input.add(
+                ids[~weighted],
+                cell_ids[cells[~weighted]],
+                segment_ids[~weighted],
+                fractions[~weighted],
+            )
+
+            input_list.input_ws.add(
+                ids[weighted],
+                cell_ids[cells[weighted]],
+                segment_ids[weighted],
+                fractions[weighted],
+                weights[cells[weighted]],
+            )
 
     for input_cell in range(0, len(input_list_array_final)):
         for input_index in range(0, len(input_list_array_final[input_cell])):
             net.input_lists.append(input_list_array_final[input_cell][input_index])
 
+    streaming.flush(net)
+
     return input_list_array_final
 
 
 ##############################################################################################
 
 
+def _get_input_locations(
+    cell_ids,
+    seg_length_dict,
+    subset_dict,
+    universal_target_segment,
+    universal_fraction_along,
+    rng,
+):
+    """
+    Returns the target segment ids and fractions along (drawn from the generator `rng`) of the inputs of all the cells in `cell_ids` (the
+    inputs of the first cell, followed by those of the second cell...) and the number of inputs per cell, for add_advanced_inputs_to_population()
+    and add_projection_based_inputs(). The segment ids and fractions along are None if the inputs have no specific location, i.e.
+    if subset_dict is {None: number of inputs per cell} and there is no seg_length_dict. Fractions along are rounded to 6 decimals,
+    as they were written as '%f'.
+    """
+
+    num_cells = len(cell_ids)
+
+    if (
+        subset_dict != None
+        and seg_length_dict == None
+        and universal_target_segment == None
+        and universal_fraction_along == None
+    ):
+        num_per_cell = 0
+
+        if None in subset_dict.keys() and len(subset_dict.keys()) == 1:
+            num_per_cell = subset_dict[None]
+
+        return None, None, np.full(num_cells, num_per_cell, dtype=np.int64)
+
+    if (
+        seg_length_dict != None
+        and subset_dict != None
+        and universal_target_segment == None
+        and universal_fraction_along == None
+    ):
+        target_segs, target_fractions, counts = sampling.SegmentSampler(
+            seg_length_dict
+        ).sample_flat(rng, [subset_dict] * num_cells)
+
+        return target_segs, np.round(target_fractions, 6), counts
+
+    counts = np.ones(num_cells, dtype=np.int64)
+
+    return (
+        np.full(num_cells, int(universal_target_segment), dtype=np.int64),
+        np.full(num_cells, round(float(universal_fraction_along), 6)),
+        counts,
+    )
+
+
+##############################################################################################
+
+
+@tracing.traced()
 def add_projection_based_inputs(
     net,
     id,
@@ -3040,7 +3085,10 @@ def add_projection_based_inputs(
 
     all_cells - default value is set to False; if all_cells==True then all cells in a given population will receive the inputs;
 
-    only_cells - optional variable which stores the list of ids of specific target cells; cannot be set together with all_cells."""
+    only_cells - optional variable which stores the list of ids of specific target cells; cannot be set together with all_cells.
+    """
+
+    rng = get_element_rng(net, id)
 
     if all_cells and only_cells is not None:
         opencortex.print_comment_v(
@@ -3058,19 +3106,26 @@ def add_projection_based_inputs(
             return
         cell_ids = only_cells
 
+    cell_ids = np.asarray(cell_ids, dtype=np.int64).reshape(-1)
+
+    target_segs, target_fractions, counts = _get_input_locations(
+        cell_ids,
+        seg_length_dict,
+        subset_dict,
+        universal_target_segment,
+        universal_fraction_along,
+        rng,
+    )
+
     spike_source_pops_final = []
 
     spike_source_projections_final = []
 
-    spike_source_counters_final = []
-
     for input_cell in range(0, len(input_id_list)):
         spike_source_pops = []
 
         spike_source_projections = []
 
-        spike_source_counters = []
-
         for input_index in range(0, len(input_id_list[input_cell])):
             spike_source_pop = neuroml.Population(
                 id="Pop_" + id + "_%d_%d" % (input_cell, input_index),
@@ -3085,121 +3140,67 @@ def add_projection_based_inputs(
 
             net.populations.append(spike_source_pop)
 
-            proj = neuroml.Projection(
+            proj = containers.ColumnarProjection(
                 id="Proj_%s_%s" % (spike_source_pop.id, population.id),
                 presynaptic_population=spike_source_pop.id,
                 postsynaptic_population=population.id,
                 synapse=synapse_id,
+                pre_cell_format=containers.cell_id_format(
+                    spike_source_pop, population_list=False
+                ),
+                post_cell_format=containers.cell_id_format(population),
             )
 
             spike_source_projections.append(proj)
 
             spike_source_pops.append(spike_source_pop)
 
-            spike_source_counters.append(0)
-
         spike_source_pops_final.append(spike_source_pops)
 
-        spike_source_counters_final.append(spike_source_counters)
-
         spike_source_projections_final.append(spike_source_projections)
 
-    cell_counter = 0
+    ######### cells share the input components input_id_list[0] unless each cell has its own list of input components
 
-    for cell_id in cell_ids:
-        if len(input_id_list) == len(cell_ids):
-            cell_index = cell_counter
+    if len(input_id_list) == len(cell_ids):
+        cell_groups = [[cell_counter] for cell_counter in range(len(cell_ids))]
 
-        else:
-            cell_index = 0
+    else:
+        cell_groups = [list(range(len(cell_ids)))]
 
-        if (
-            subset_dict != None
-            and seg_length_dict == None
-            and universal_target_segment == None
-            and universal_fraction_along == None
-        ):
-            if None in subset_dict.keys() and len(subset_dict.keys()) == 1:
-                for target_point in range(0, subset_dict[None]):
-                    for input_index in range(
-                        0, len(spike_source_pops_final[cell_index])
-                    ):
-                        conn = neuroml.ConnectionWD(
-                            id=spike_source_counters_final[cell_index][input_index],
-                            pre_cell_id="../%s[%s]"
-                            % (
-                                spike_source_pops_final[cell_index][input_index].id,
-                                spike_source_counters_final[cell_index][input_index],
-                            ),
-                            post_cell_id="../%s/%i/%s"
-                            % (population.id, cell_id, population.component),
-                            weight=weight_list[cell_index][input_index],
-                            delay="0 ms",
-                        )
+    offsets = np.concatenate(([0], np.cumsum(counts)))
 
-                        spike_source_projections_final[cell_index][
-                            input_index
-                        ].connection_wds.append(conn)
+    for cell_index, cell_group in enumerate(cell_groups):
+        if len(cell_group) == 1:
+            rows = np.arange(offsets[cell_group[0]], offsets[cell_group[0] + 1])
 
-                        spike_source_counters_final[cell_index][input_index] += 1
+            cells = np.full(len(rows), cell_group[0])
 
-        elif (
-            seg_length_dict != None
-            and subset_dict != None
-            and universal_target_segment == None
-            and universal_fraction_along == None
-        ):
-            target_seg_array, target_fractions = get_target_segments(
-                seg_length_dict, subset_dict
-            )
+        else:
+            rows = np.arange(offsets[-1])
 
-            for target_point in range(0, len(target_seg_array)):
-                for input_index in range(0, len(spike_source_pops_final[cell_index])):
-                    conn = neuroml.ConnectionWD(
-                        id=spike_source_counters_final[cell_index][input_index],
-                        pre_cell_id="../%s[%s]"
-                        % (
-                            spike_source_pops_final[cell_index][input_index].id,
-                            spike_source_counters_final[cell_index][input_index],
-                        ),
-                        post_cell_id="../%s/%i/%s"
-                        % (population.id, cell_id, population.component),
-                        post_segment_id="%d" % target_seg_array[target_point],
-                        post_fraction_along="%f" % target_fractions[target_point],
-                        weight=weight_list[cell_index][input_index],
-                        delay="0 ms",
-                    )
+            cells = np.repeat(np.arange(len(cell_ids)), counts)
 
-                    spike_source_projections_final[cell_index][
-                        input_index
-                    ].connection_wds.append(conn)
+        if target_segs is not None:
+            segment_ids = target_segs[rows]
 
-                    spike_source_counters_final[cell_index][input_index] += 1
+            fractions = target_fractions[rows]
 
         else:
-            for input_index in range(0, len(spike_source_pops_final[cell_index])):
-                conn = neuroml.ConnectionWD(
-                    id=spike_source_counters_final[cell_index][input_index],
-                    pre_cell_id="../%s[%s]"
-                    % (
-                        spike_source_pops_final[cell_index][input_index].id,
-                        spike_source_counters_final[cell_index][input_index],
-                    ),
-                    post_cell_id="../%s/%i/%s"
-                    % (population.id, cell_id, population.component),
-                    post_segment_id="%d" % universal_target_segment,
-                    post_fraction_along="%f" % universal_fraction_along,
-                    weight=weight_list[cell_index][input_index],
-                    delay="0 ms",
-                )
+            segment_ids = 0
 
-                spike_source_projections_final[cell_index][
-                    input_index
-                ].connection_wds.append(conn)
+            fractions = 0.5
 
-                spike_source_counters_final[cell_index][input_index] += 1
+        ######### the i-th connection of each projection is from the i-th cell of its spike source population
 
-        cell_counter += 1
+        for input_index, proj in enumerate(spike_source_projections_final[cell_index]):
+            proj.connection_wds.add(
+                np.arange(len(rows)),
+                np.arange(len(rows)),
+                cell_ids[cells],
+                post_segment_ids=segment_ids,
+                post_fractions=fractions,
+                weights=weight_list[cell_index][input_index],
+            )
 
     for input_cell in range(0, len(spike_source_projections_final)):
         for input_index in range(0, len(spike_source_projections_final[input_cell])):
@@ -3207,4 +3208,6 @@ def add_projection_based_inputs(
                 spike_source_projections_final[input_cell][input_index]
             )
 
+    streaming.flush(net)
+
     return spike_source_pops_final
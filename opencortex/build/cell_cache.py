@@ -0,0 +1,310 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Persistent cache of parsed NeuroML2 cell files.
+
+Parsing the XML of a large cell morphology can take seconds. The documents read with load_cell_document() are pickled into a
+cache directory (by default ~/.cache/opencortex/cells, or the directory in the environment variable OPENCORTEX_CELL_CACHE; see
+set_cache_dir()) in files named after the absolute path and the SHA-256 hash of the content of the cell file, so that later
+builds, e.g. the runs of a parameter sweep, do not parse the XML again. A document read with its includes is only reused while
+the (transitively) included files are unchanged too. Data derived from a cell, e.g. its segment groups, soma diameter or the
+cumulative lengths of the segments of its segment groups, are stored with the document (see get_derived()).
+
+The documents are also kept in memory for the lifetime of the process. The documents returned by load_cell_document() are
+shared and must not be modified, unless copy=True is used.
+"""
+
+import copy as copy_module
+import hashlib
+import os
+import pickle
+
+from neuroml.nml.nml import GeneratedsSuper
+
+import opencortex
+
+_cache_dir = os.environ.get(
+    "OPENCORTEX_CELL_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "opencortex", "cells"),
+)
+
+### Cache entries used in this process, by key: {'File': ..., 'Dependencies': {path: hash}, 'Document': pickled document, 'Derived': {...}}
+_entries = {}
+
+### Unpickled (shared) documents, by key
+_documents = {}
+
+
+##############################################################################################
+
+
+def set_cache_dir(cache_dir):
+    """Sets the directory of the persistent cache; if `cache_dir` is None the parsed cells are only cached in memory"""
+
+    global _cache_dir
+
+    _cache_dir = cache_dir
+
+
+def get_cache_dir():
+    return _cache_dir
+
+
+def clear_memory_cache():
+    """Forgets the cells cached in memory (the persistent cache is kept)"""
+
+    _entries.clear()
+
+    _documents.clear()
+
+
+##############################################################################################
+
+
+def file_hash(file_name):
+    """Returns the SHA-256 hash (hex digest) of the content of the file"""
+
+    with open(file_name, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _get_key(file_name, include_includes):
+    return hashlib.sha256(
+        ("%s|%s|%s" % (file_name, file_hash(file_name), bool(include_includes))).encode(
+            "utf-8"
+        )
+    ).hexdigest()
+
+
+def _get_cache_file(key):
+    return os.path.join(_cache_dir, "%s.pickle" % key)
+
+
+def _strip_element_tree(document):
+    """Removes the references to the lxml elements (which cannot be pickled) kept by the parser in the objects of `document`"""
+
+    pending = [document]
+
+    visited = set()
+
+    while len(pending) > 0:
+        item = pending.pop()
+
+        if id(item) in visited:
+            continue
+
+        visited.add(id(item))
+
+        if isinstance(item, list):
+            pending.extend(item)
+
+        elif isinstance(item, GeneratedsSuper):
+            attributes = item.__dict__
+
+            if "gds_elementtree_node_" in attributes:
+                attributes["gds_elementtree_node_"] = None
+
+            if "gds_collector_" in attributes:
+                attributes["gds_collector_"] = None
+
+            for value in attributes.values():
+                if isinstance(value, (list, GeneratedsSuper)):
+                    pending.append(value)
+
+
+def _get_included_files(file_name):
+    """Returns the absolute paths of the existing files included (transitively) by `file_name`"""
+
+    included_files = []
+
+    pending = [file_name]
+
+    while len(pending) > 0:
+        current = pending.pop()
+
+        for included in load_cell_document(current).includes:
+            path = os.path.abspath(
+                os.path.join(os.path.dirname(current), included.href)
+            )
+
+            if path not in included_files and os.path.isfile(path):
+                included_files.append(path)
+
+                pending.append(path)
+
+    return included_files
+
+
+def _dependencies_unchanged(entry):
+    for path, content_hash in entry["Dependencies"].items():
+        if not os.path.isfile(path) or file_hash(path) != content_hash:
+            return False
+
+    return True
+
+
+def _save_entry(key, entry):
+    if _cache_dir == None:
+        return
+
+    cache_file = _get_cache_file(key)
+
+    try:
+        if not os.path.isdir(_cache_dir):
+            os.makedirs(_cache_dir, exist_ok=True)
+
+        ### write to a temporary file first, so that concurrent builds never read a partially written entry
+        temp_file = "%s.%i.tmp" % (cache_file, os.getpid())
+
+        with open(temp_file, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_file, cache_file)
+
+    except OSError as error:
+        opencortex.print_comment_v(
+            "Could not write %s to the cell cache: %s" % (entry["File"], error)
+        )
+
+
+def _load_entry(key):
+    if _cache_dir == None or not os.path.isfile(_get_cache_file(key)):
+        return None
+
+    try:
+        with open(_get_cache_file(key), "rb") as f:
+            return pickle.load(f)
+
+    except Exception as error:
+        opencortex.print_comment_v(
+            "Ignoring the unreadable cell cache file %s: %s"
+            % (_get_cache_file(key), error)
+        )
+
+        return None
+
+
+def _get_entry(file_name, include_includes):
+    """Returns the key and the cache entry of the document in `file_name`, parsing the file only if there is no valid entry"""
+
+    file_name = os.path.abspath(file_name)
+
+    key = _get_key(file_name, include_includes)
+
+    entry = _entries.get(key)
+
+    if entry == None:
+        entry = _load_entry(key)
+
+    if entry != None and _dependencies_unchanged(entry):
+        _entries[key] = entry
+
+        return key, entry
+
+    opencortex.print_comment_v("Parsing %s for the cell cache" % file_name)
+
+    from pyneuroml import pynml
+
+    document = pynml.read_neuroml2_file(
+        file_name, include_includes=include_includes, verbose=False
+    )
+
+    _strip_element_tree(document)
+
+    dependencies = {}
+
+    if include_includes:
+        for path in _get_included_files(file_name):
+            dependencies[path] = file_hash(path)
+
+    entry = {
+        "File": file_name,
+        "Dependencies": dependencies,
+        "Document": pickle.dumps(document, protocol=pickle.HIGHEST_PROTOCOL),
+        "Derived": {},
+    }
+
+    _entries[key] = entry
+
+    _documents[key] = document
+
+    _save_entry(key, entry)
+
+    return key, entry
+
+
+##############################################################################################
+
+
+def load_cell_document(file_name, include_includes=False, copy=False):
+    """Returns the NeuroMLDocument in `file_name` (read as by pyneuroml.pynml.read_neuroml2_file()), from the cache if possible.
+
+    The document returned is shared by all callers unless `copy` is True, in which case a private copy, which can be modified, is returned.
+    """
+
+    key, entry = _get_entry(file_name, include_includes)
+
+    if copy:
+        return pickle.loads(entry["Document"])
+
+    if key not in _documents:
+        _documents[key] = pickle.loads(entry["Document"])
+
+    return _documents[key]
+
+
+def get_derived(file_name, name, compute, include_includes=False):
+    """Returns compute(document) for the document in `file_name`; the (picklable) result is stored in the cache under `name`,
+    so that the document does not even need to be loaded the next time. A copy of the stored value is returned.
+    """
+
+    key, entry = _get_entry(file_name, include_includes)
+
+    if name not in entry["Derived"]:
+        if key not in _documents:
+            _documents[key] = pickle.loads(entry["Document"])
+
+        entry["Derived"][name] = compute(_documents[key])
+
+        _save_entry(key, entry)
+
+    return copy_module.deepcopy(entry["Derived"][name])
+
+
+##############################################################################################
+
+
+def _get_soma_diameter(document):
+    for segment in document.cells[0].morphology.segments:
+        if segment.id == 0:
+            return max(segment.distal.diameter, segment.proximal.diameter)
+
+    return 0
+
+
+def get_soma_diameter(file_name):
+    """Returns the soma diameter (the larger of the proximal and distal diameters of segment 0) of the first cell in `file_name`"""
+
+    return get_derived(file_name, "SomaDiameter", _get_soma_diameter)
+
+
+def get_segment_groups(file_name):
+    """Returns the ids of the segment groups of the first cell in `file_name`"""
+
+    return get_derived(
+        file_name,
+        "SegmentGroups",
+        lambda document: [
+            segment_group.id
+            for segment_group in document.cells[0].morphology.segment_groups
+        ],
+    )
@@ -0,0 +1,978 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Array backed (columnar) containers for the connections of projections and the inputs of input lists in opencortex.build.
+
+The connections/inputs are stored in contiguous typed NumPy arrays; generateDS objects (e.g. neuroml.ConnectionWD or
+neuroml.InputW) are only created when they are requested, e.g. when iterating over `proj.connection_wds` or exporting to
+XML. Changes made to these objects (e.g. `conn.weight = 2`) are written through to the arrays.
+"""
+
+import neuroml
+import numpy as np
+
+from opencortex.build import tracing
+
+CHEMICAL = "chemical"
+ELECTRICAL = "electrical"
+
+COLUMN_DTYPES = [
+    ("id", np.int64),
+    ("pre_cell", np.int64),
+    ("post_cell", np.int64),
+    ("pre_segment", np.int64),
+    ("post_segment", np.int64),
+    ("pre_fraction", np.float64),
+    ("post_fraction", np.float64),
+    ("weight", np.float64),
+    ("delay", np.float64),
+]
+
+INPUT_COLUMN_DTYPES = [
+    ("id", np.int64),
+    ("target_cell", np.int64),
+    ("segment", np.int64),
+    ("fraction", np.float64),
+    ("weight", np.float64),
+]
+
+INITIAL_CAPACITY = 64
+
+# Number of connections (or inputs) converted to the float32 HDF5 layout and written at once when exporting to HDF5
+WRITE_BLOCK_SIZE = 2**16
+
+
+##############################################################################################
+
+
+def cell_id_format(population, population_list=True):
+    """Returns the format string (with a single `%i` for the cell index) used to refer to cells of `population`
+    in connections, i.e. "../pop/%i/component" if `population_list` is True, otherwise "../pop[%i]".
+    """
+
+    if population_list:
+        return "../%s/%%i/%s" % (population.id, population.component)
+
+    return "../%s[%%i]" % population.id
+
+
+def _infer_cell_id_format(cell_string):
+    if "[" in cell_string:
+        return cell_string.split("[")[0] + "[%i]"
+
+    parts = cell_string.split("/")
+
+    parts[2] = "%i"
+
+    return "/".join(parts)
+
+
+##############################################################################################
+
+
+class _ColumnsView(object):
+    """Mixin for connection objects created by ConnectionColumns: attribute changes are written through to the columns"""
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+
+        columns = self.__dict__.get("_columns")
+
+        if columns is not None:
+            columns._write_back(self.__dict__["_columns_index"], self)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+
+        state.pop("_columns", None)
+
+        state.pop("_columns_index", None)
+
+        return state
+
+
+class ConnectionWDView(_ColumnsView, neuroml.ConnectionWD):
+    pass
+
+
+class ElectricalConnectionInstanceWView(
+    _ColumnsView, neuroml.ElectricalConnectionInstanceW
+):
+    pass
+
+
+##############################################################################################
+
+
+class _Columns(object):
+    """Base class of the list-like containers whose items are stored as columns of NumPy arrays (one array per name in
+    `column_dtypes`). Subclasses define how an item object is stored in (_store()) and created from (_create()) a row of the
+    columns; items which cannot be recreated exactly from the columns are kept as objects (in `_overrides`).
+    """
+
+    column_dtypes = []
+
+    item_name = "item"
+
+    def _init_columns(self):
+        self._size = 0
+
+        self._data = {}
+
+        for name, dtype in self.column_dtypes:
+            self._data[name] = np.zeros(INITIAL_CAPACITY, dtype=dtype)
+
+        self._overrides = {}
+
+    def _reserve(self, extra):
+        required = self._size + extra
+
+        capacity = len(self._data[self.column_dtypes[0][0]])
+
+        if required <= capacity:
+            return
+
+        ### grow geometrically, but allocate exactly what is needed for a single large batch
+        capacity = max(required, 2 * capacity)
+
+        for name, dtype in self.column_dtypes:
+            grown = np.zeros(capacity, dtype=dtype)
+
+            grown[: self._size] = self._data[name][: self._size]
+
+            self._data[name] = grown
+
+    def _add_rows(self, num, values):
+        """Adds `num` rows with the arrays (or scalars, which are broadcast) in the dictionary `values`, by column name"""
+
+        if num == 0:
+            return
+
+        self._reserve(num)
+
+        start = self._size
+
+        end = start + num
+
+        for name, dtype in self.column_dtypes:
+            self._data[name][start:end] = values[name]
+
+        self._size = end
+
+        if tracing.enabled:
+            tracing.count(self.item_name + "s", num)
+
+    def _prepare_append(self, item):
+        """Called before the item object `item` is appended, e.g. to infer the formats of the strings of the items"""
+
+        pass
+
+    def append(self, item):
+        """Adds a single item object"""
+
+        self._prepare_append(item)
+
+        index = self._size
+
+        try:
+            self._add_rows(1, dict((name, 0) for name, dtype in self.column_dtypes))
+
+            self._store(index, item)
+
+        except (TypeError, ValueError, IndexError):
+            self._overrides[index] = item
+
+            return
+
+        if not self._matches_columns(index, item):
+            self._overrides[index] = item
+
+    def _write_back(self, index, item):
+        try:
+            self._store(index, item)
+
+        except (TypeError, ValueError, IndexError):
+            self._overrides[index] = item
+
+            return
+
+        if not self._matches_columns(index, item):
+            self._overrides[index] = item
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def clear(self):
+        """Removes all the items and releases the memory used by the columns"""
+
+        self._init_columns()
+
+    def _sync(self):
+        """Writes back the values of item objects which are not created by this container (and so may have
+        been modified without the changes being written through)"""
+
+        for index, item in self._overrides.items():
+            try:
+                self._store(index, item)
+
+            except (TypeError, ValueError, IndexError):
+                pass
+
+    def columns(self):
+        """Returns a dict of the (read only) column arrays, by column name"""
+
+        self._sync()
+
+        columns = {}
+
+        for name, dtype in self.column_dtypes:
+            column = self._data[name][: self._size]
+
+            column.flags.writeable = False
+
+            columns[name] = column
+
+        return columns
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+
+        if index < 0:
+            index += self._size
+
+        if index < 0 or index >= self._size:
+            raise IndexError("%s index out of range" % self.item_name)
+
+        if index in self._overrides:
+            return self._overrides[index]
+
+        return self._create(index)
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    def __eq__(self, other):
+        if isinstance(other, _Columns):
+            return self is other
+
+        if isinstance(other, list):
+            return len(other) == self._size and (self._size == 0 or list(self) == other)
+
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+
+        if equal is NotImplemented:
+            return equal
+
+        return not equal
+
+    __hash__ = None
+
+    def __getstate__(self):
+        self._sync()
+
+        state = self.__dict__.copy()
+
+        state["_data"] = dict(
+            (name, column[: max(self._size, 1)].copy())
+            for name, column in self._data.items()
+        )
+
+        return state
+
+    def _view(self, view, index):
+        object.__setattr__(view, "_columns_index", index)
+
+        object.__setattr__(view, "_columns", self)
+
+        return view
+
+
+##############################################################################################
+
+
+class ConnectionColumns(_Columns):
+    """List-like container of the connections of a single projection, stored as columns of NumPy arrays.
+
+    Supports `len()`, indexing, iteration, `append()`/`extend()` of connection objects and comparison with lists,
+    so it can stand in for the `connection_wds` list of a neuroml.Projection (`connection_type` "chemical") or
+    for the `electrical_connection_instance_ws` list of a neuroml.ElectricalProjection (`connection_type` "electrical").
+    Use add() to add many connections at once from arrays without creating any objects.
+    """
+
+    column_dtypes = COLUMN_DTYPES
+
+    item_name = "connection"
+
+    def __init__(
+        self,
+        connection_type=CHEMICAL,
+        pre_cell_format=None,
+        post_cell_format=None,
+        synapse=None,
+        delay_format="%s ms",
+    ):
+        self.connection_type = connection_type
+
+        self.pre_cell_format = pre_cell_format
+
+        self.post_cell_format = post_cell_format
+
+        self.synapse = synapse
+
+        self.delay_format = delay_format
+
+        self._init_columns()
+
+    def set_cell_formats(self, pre_cell_format, post_cell_format):
+        """Sets the formats used for the pre and post cell strings (see cell_id_format()); these cannot be changed
+        once connections have been added with different formats."""
+
+        if (
+            self.pre_cell_format == pre_cell_format
+            and self.post_cell_format == post_cell_format
+        ):
+            return
+
+        if self._size > 0 and self.pre_cell_format != None:
+            raise Exception(
+                "Error! Cannot change the cell formats of connections from (%s, %s) to (%s, %s) after connections have been added"
+                % (
+                    self.pre_cell_format,
+                    self.post_cell_format,
+                    pre_cell_format,
+                    post_cell_format,
+                )
+            )
+
+        self.pre_cell_format = pre_cell_format
+
+        self.post_cell_format = post_cell_format
+
+    def add(
+        self,
+        ids,
+        pre_cell_ids,
+        post_cell_ids,
+        pre_segment_ids=0,
+        post_segment_ids=0,
+        pre_fractions=0.5,
+        post_fractions=0.5,
+        weights=1,
+        delays=0,
+    ):
+        """Adds connections from arrays (or scalars, which are broadcast) of connection ids, pre and post cell indices,
+        segment ids, fractions along, weights and delays (in ms; ignored for electrical connections).
+        """
+
+        pre_cell_ids = np.atleast_1d(np.asarray(pre_cell_ids, dtype=np.int64))
+
+        self._add_rows(
+            len(pre_cell_ids),
+            {
+                "id": ids,
+                "pre_cell": pre_cell_ids,
+                "post_cell": post_cell_ids,
+                "pre_segment": pre_segment_ids,
+                "post_segment": post_segment_ids,
+                "pre_fraction": pre_fractions,
+                "post_fraction": post_fractions,
+                "weight": weights,
+                "delay": delays,
+            },
+        )
+
+    def _prepare_append(self, connection):
+        if self.connection_type == CHEMICAL:
+            pre_cell_string = connection.pre_cell_id
+
+            post_cell_string = connection.post_cell_id
+
+        else:
+            pre_cell_string = connection.pre_cell
+
+            post_cell_string = connection.post_cell
+
+            if self.synapse == None:
+                self.synapse = connection.synapse
+
+        if self.pre_cell_format == None and self._size == 0:
+            self.pre_cell_format = _infer_cell_id_format(pre_cell_string)
+
+            self.post_cell_format = _infer_cell_id_format(post_cell_string)
+
+    def _store(self, index, connection):
+        data = self._data
+
+        data["id"][index] = int(connection.id)
+
+        data["pre_cell"][index] = connection.get_pre_cell_id()
+
+        data["post_cell"][index] = connection.get_post_cell_id()
+
+        data["pre_fraction"][index] = float(connection.pre_fraction_along)
+
+        data["post_fraction"][index] = float(connection.post_fraction_along)
+
+        if self.connection_type == CHEMICAL:
+            data["pre_segment"][index] = int(connection.pre_segment_id)
+
+            data["post_segment"][index] = int(connection.post_segment_id)
+
+            data["weight"][index] = float(connection.weight)
+
+            data["delay"][index] = connection.get_delay_in_ms()
+
+        else:
+            data["pre_segment"][index] = int(connection.pre_segment)
+
+            data["post_segment"][index] = int(connection.post_segment)
+
+            data["weight"][index] = connection.get_weight()
+
+    def _matches_columns(self, index, connection):
+        """Whether the object `connection` can be exactly recreated from the columns at `index`"""
+
+        data = self._data
+
+        pre_cell_string = self.pre_cell_format % data["pre_cell"][index]
+
+        post_cell_string = self.post_cell_format % data["post_cell"][index]
+
+        if self.connection_type == CHEMICAL:
+            return (
+                pre_cell_string == connection.pre_cell_id
+                and post_cell_string == connection.post_cell_id
+                and self._format_delay(data["delay"][index]) == connection.delay
+            )
+
+        return (
+            pre_cell_string == connection.pre_cell
+            and post_cell_string == connection.post_cell
+            and self.synapse == connection.synapse
+        )
+
+    def _format_delay(self, delay):
+        delay = float(delay)
+
+        if delay.is_integer() and "%s" in self.delay_format:
+            delay = int(delay)
+
+        return self.delay_format % delay
+
+    def _create(self, index):
+        data = self._data
+
+        if self.connection_type == CHEMICAL:
+            connection = ConnectionWDView(
+                id=int(data["id"][index]),
+                pre_cell_id=self.pre_cell_format % data["pre_cell"][index],
+                pre_segment_id=int(data["pre_segment"][index]),
+                pre_fraction_along=float(data["pre_fraction"][index]),
+                post_cell_id=self.post_cell_format % data["post_cell"][index],
+                post_segment_id=int(data["post_segment"][index]),
+                post_fraction_along=float(data["post_fraction"][index]),
+                delay=self._format_delay(data["delay"][index]),
+                weight=float(data["weight"][index]),
+            )
+
+        else:
+            connection = ElectricalConnectionInstanceWView(
+                id=int(data["id"][index]),
+                pre_cell=self.pre_cell_format % data["pre_cell"][index],
+                post_cell=self.post_cell_format % data["post_cell"][index],
+                synapse=self.synapse,
+                pre_segment=int(data["pre_segment"][index]),
+                post_segment=int(data["post_segment"][index]),
+                pre_fraction_along=float(data["pre_fraction"][index]),
+                post_fraction_along=float(data["post_fraction"][index]),
+                weight=float(data["weight"][index]),
+            )
+
+        return self._view(connection, index)
+
+    def columns(self):
+        """Returns a dict of the (read only) column arrays: id, pre_cell, post_cell, pre_segment, post_segment,
+        pre_fraction, post_fraction, weight and delay (in ms)"""
+
+        return super(ConnectionColumns, self).columns()
+
+    def __repr__(self):
+        return "ConnectionColumns(%s, %i connections)" % (
+            self.connection_type,
+            self._size,
+        )
+
+
+##############################################################################################
+
+
+class InputWView(_ColumnsView, neuroml.InputW):
+    pass
+
+
+class InputView(_ColumnsView, neuroml.Input):
+    pass
+
+
+##############################################################################################
+
+
+class InputColumns(_Columns):
+    """List-like container of the inputs of an input list, stored as columns of NumPy arrays: the `input` (if `weighted`
+    is False) or the `input_ws` (if `weighted` is True) of a neuroml.InputList.
+
+    The targets of the inputs are `target_format` % (index of the target cell), see cell_id_format(). If `has_location`
+    is False the inputs have no segment id and fraction along (i.e. they are on segment 0, at fraction 0.5).
+    Use add() to add many inputs at once from arrays without creating any objects.
+    """
+
+    column_dtypes = INPUT_COLUMN_DTYPES
+
+    item_name = "input"
+
+    def __init__(
+        self,
+        weighted=False,
+        target_format=None,
+        destination="synapses",
+        has_location=True,
+    ):
+        self.weighted = weighted
+
+        self.target_format = target_format
+
+        self.destination = destination
+
+        self.has_location = has_location
+
+        self._init_columns()
+
+    def add(self, ids, target_cell_ids, segment_ids=0, fractions=0.5, weights=1):
+        """Adds inputs from arrays (or scalars, which are broadcast) of input ids, target cell indices, segment ids,
+        fractions along and weights (ignored unless the container is `weighted`)"""
+
+        target_cell_ids = np.atleast_1d(np.asarray(target_cell_ids, dtype=np.int64))
+
+        self._add_rows(
+            len(target_cell_ids),
+            {
+                "id": ids,
+                "target_cell": target_cell_ids,
+                "segment": segment_ids,
+                "fraction": fractions,
+                "weight": weights,
+            },
+        )
+
+    def _prepare_append(self, input):
+        if self.target_format == None and self._size == 0:
+            self.target_format = _infer_cell_id_format(input.target)
+
+            self.destination = input.destination
+
+            self.has_location = input.segment_id != None
+
+    def _store(self, index, input):
+        data = self._data
+
+        data["id"][index] = int(input.id)
+
+        data["target_cell"][index] = input.get_target_cell_id()
+
+        data["segment"][index] = (
+            int(input.segment_id) if input.segment_id != None else 0
+        )
+
+        data["fraction"][index] = (
+            float(input.fraction_along) if input.fraction_along != None else 0.5
+        )
+
+        data["weight"][index] = input.get_weight() if self.weighted else 1
+
+    def _matches_columns(self, index, input):
+        """Whether the object `input` can be exactly recreated from the columns at `index`"""
+
+        return (
+            self.target_format % self._data["target_cell"][index] == input.target
+            and self.destination == input.destination
+            and self.has_location == (input.segment_id != None)
+            and self.has_location == (input.fraction_along != None)
+            and self.weighted == isinstance(input, neuroml.InputW)
+        )
+
+    def _create(self, index):
+        data = self._data
+
+        values = {
+            "id": int(data["id"][index]),
+            "target": self.target_format % data["target_cell"][index],
+            "destination": self.destination,
+        }
+
+        if self.has_location:
+            values["segment_id"] = int(data["segment"][index])
+
+            values["fraction_along"] = float(data["fraction"][index])
+
+        if self.weighted:
+            input = InputWView(weight=float(data["weight"][index]), **values)
+
+        else:
+            input = InputView(**values)
+
+        return self._view(input, index)
+
+    def columns(self):
+        """Returns a dict of the (read only) column arrays: id, target_cell, segment, fraction and weight"""
+
+        return super(InputColumns, self).columns()
+
+    def __repr__(self):
+        return "InputColumns(%s, %i inputs)" % (
+            "weighted" if self.weighted else "unweighted",
+            self._size,
+        )
+
+
+##############################################################################################
+
+
+class ColumnarProjection(neuroml.Projection):
+    """A neuroml.Projection whose `connection_wds` are stored in a ConnectionColumns container"""
+
+    def __init__(self, *args, **kwargs):
+        pre_cell_format = kwargs.pop("pre_cell_format", None)
+
+        post_cell_format = kwargs.pop("post_cell_format", None)
+
+        delay_format = kwargs.pop("delay_format", "%s ms")
+
+        kwargs["connection_wds"] = ConnectionColumns(
+            CHEMICAL,
+            pre_cell_format=pre_cell_format,
+            post_cell_format=post_cell_format,
+            delay_format=delay_format,
+        )
+
+        super(ColumnarProjection, self).__init__(*args, **kwargs)
+
+    def exportHdf5(self, h5file, h5Group):
+        """Export to HDF5 directly from the column arrays, in the same layout as neuroml.Projection.exportHdf5()"""
+
+        if len(self.connections) > 0 or not isinstance(
+            self.connection_wds, ConnectionColumns
+        ):
+            return super(ColumnarProjection, self).exportHdf5(h5file, h5Group)
+
+        proj_group = h5file.create_group(h5Group, "projection_" + self.id)
+        proj_group._f_setattr("id", self.id)
+        proj_group._f_setattr("type", "projection")
+        proj_group._f_setattr("presynapticPopulation", self.presynaptic_population)
+        proj_group._f_setattr("postsynapticPopulation", self.postsynaptic_population)
+        proj_group._f_setattr("synapse", self.synapse)
+
+        if len(self.connection_wds) == 0:
+            return
+
+        _write_connection_array(
+            h5file, proj_group, self.id, self.connection_wds.columns(), CHEMICAL
+        )
+
+    def to_sparse(self, values="weight", shape=None, format="coo"):
+        """Returns the connections as a scipy.sparse matrix (presynaptic x postsynaptic cells), see opencortex.build.sparse.to_sparse()"""
+
+        from opencortex.build import sparse
+
+        return sparse.to_sparse(self, values, shape, format)
+
+
+##############################################################################################
+
+
+class ColumnarElectricalProjection(neuroml.ElectricalProjection):
+    """A neuroml.ElectricalProjection whose `electrical_connection_instance_ws` are stored in a ConnectionColumns container"""
+
+    def __init__(self, *args, **kwargs):
+        pre_cell_format = kwargs.pop("pre_cell_format", None)
+
+        post_cell_format = kwargs.pop("post_cell_format", None)
+
+        synapse = kwargs.pop("synapse", None)
+
+        kwargs["electrical_connection_instance_ws"] = ConnectionColumns(
+            ELECTRICAL,
+            pre_cell_format=pre_cell_format,
+            post_cell_format=post_cell_format,
+            synapse=synapse,
+        )
+
+        super(ColumnarElectricalProjection, self).__init__(*args, **kwargs)
+
+    def exportHdf5(self, h5file, h5Group):
+        """Export to HDF5 directly from the column arrays, in the same layout as neuroml.ElectricalProjection.exportHdf5()"""
+
+        connections = self.electrical_connection_instance_ws
+
+        if (
+            len(self.electrical_connections) > 0
+            or len(self.electrical_connection_instances) > 0
+            or not isinstance(connections, ConnectionColumns)
+            or len(connections) == 0
+        ):
+            return super(ColumnarElectricalProjection, self).exportHdf5(h5file, h5Group)
+
+        proj_group = h5file.create_group(h5Group, "projection_" + self.id)
+        proj_group._f_setattr("id", self.id)
+        proj_group._f_setattr("type", "electricalProjection")
+        proj_group._f_setattr("presynapticPopulation", self.presynaptic_population)
+        proj_group._f_setattr("postsynapticPopulation", self.postsynaptic_population)
+        proj_group._f_setattr("synapse", connections[0].synapse)
+
+        _write_connection_array(
+            h5file, proj_group, self.id, connections.columns(), ELECTRICAL
+        )
+
+    def to_sparse(self, values="weight", shape=None, format="coo"):
+        """Returns the connections as a scipy.sparse matrix (presynaptic x postsynaptic cells), see opencortex.build.sparse.to_sparse()"""
+
+        from opencortex.build import sparse
+
+        return sparse.to_sparse(self, values, shape, format)
+
+
+##############################################################################################
+
+
+class ColumnarInputList(neuroml.InputList):
+    """A neuroml.InputList whose `input` and `input_ws` are stored in InputColumns containers; the keyword arguments
+    target_format, destination and has_location are passed to the containers"""
+
+    def __init__(self, *args, **kwargs):
+        target_format = kwargs.pop("target_format", None)
+
+        destination = kwargs.pop("destination", "synapses")
+
+        has_location = kwargs.pop("has_location", True)
+
+        kwargs["input"] = InputColumns(False, target_format, destination, has_location)
+
+        kwargs["input_ws"] = InputColumns(
+            True, target_format, destination, has_location
+        )
+
+        super(ColumnarInputList, self).__init__(*args, **kwargs)
+
+    def exportHdf5(self, h5file, h5Group):
+        """Export to HDF5 directly from the column arrays, in the same layout as neuroml.InputList.exportHdf5()"""
+
+        if not isinstance(self.input, InputColumns) or not isinstance(
+            self.input_ws, InputColumns
+        ):
+            return super(ColumnarInputList, self).exportHdf5(h5file, h5Group)
+
+        il_group = h5file.create_group(h5Group, "inputList_" + self.id)
+        il_group._f_setattr("id", self.id)
+        il_group._f_setattr("component", self.component)
+        il_group._f_setattr("population", self.populations)
+
+        if len(self.input) + len(self.input_ws) == 0:
+            return
+
+        _write_input_array(
+            h5file, il_group, self.id, self.input.columns(), self.input_ws.columns()
+        )
+
+
+##############################################################################################
+
+
+def connection_column_names(connection_type, include_segment_fraction=True):
+    """Returns the names of the columns of the HDF5 connection array for the given type of projection, in the order
+    used by libNeuroML"""
+
+    if connection_type == ELECTRICAL:
+        return [
+            "id",
+            "pre_cell_id",
+            "post_cell_id",
+            "pre_segment_id",
+            "post_segment_id",
+            "pre_fraction_along",
+            "post_fraction_along",
+            "weight",
+        ]
+
+    names = ["pre_cell_id", "post_cell_id"]
+
+    if include_segment_fraction:
+        names += [
+            "pre_segment_id",
+            "post_segment_id",
+            "pre_fraction_along",
+            "post_fraction_along",
+        ]
+
+    return names + ["weight", "delay"]
+
+
+def has_segment_fraction_info(columns):
+    """Vectorized version of neuroml.utils.has_segment_fraction_info() for a dict of connection columns"""
+
+    return bool(
+        np.any(columns["pre_segment"] != 0)
+        or np.any(columns["post_segment"] != 0)
+        or np.any(columns["pre_fraction"] != 0.5)
+        or np.any(columns["post_fraction"] != 0.5)
+    )
+
+
+def connection_array(columns, connection_type, include_segment_fraction=None):
+    """Returns the float32 (num connections x num columns) array written to HDF5 for a dict of connection columns"""
+
+    if include_segment_fraction == None:
+        include_segment_fraction = (
+            connection_type == ELECTRICAL or has_segment_fraction_info(columns)
+        )
+
+    source = {
+        "id": columns["id"],
+        "pre_cell_id": columns["pre_cell"],
+        "post_cell_id": columns["post_cell"],
+        "pre_segment_id": columns["pre_segment"],
+        "post_segment_id": columns["post_segment"],
+        "pre_fraction_along": columns["pre_fraction"],
+        "post_fraction_along": columns["post_fraction"],
+        "weight": columns["weight"],
+        "delay": columns["delay"],
+    }
+
+    names = connection_column_names(connection_type, include_segment_fraction)
+
+    array = np.empty((len(columns["id"]), len(names)), dtype=np.float32)
+
+    for index, name in enumerate(names):
+        array[:, index] = source[name]
+
+    return array
+
+
+def _write_connection_array(
+    h5file, proj_group, proj_id, columns, connection_type, block_size=WRITE_BLOCK_SIZE
+):
+    """Writes the connection columns to a chunked (and compressed, if the file has compression filters) array in
+    `proj_group`, converting at most `block_size` connections to the float32 layout at a time
+    """
+
+    import tables
+
+    include_segment_fraction = (
+        connection_type == ELECTRICAL or has_segment_fraction_info(columns)
+    )
+
+    names = connection_column_names(connection_type, include_segment_fraction)
+
+    num_connections = len(columns["id"])
+
+    h5_array = h5file.create_carray(
+        proj_group,
+        proj_id,
+        atom=tables.Float32Atom(),
+        shape=(num_connections, len(names)),
+        title="Connections of cells in " + proj_id,
+    )
+
+    for start in range(0, num_connections, block_size):
+        end = min(num_connections, start + block_size)
+
+        block = dict((name, column[start:end]) for name, column in columns.items())
+
+        h5_array[start:end] = connection_array(
+            block, connection_type, include_segment_fraction
+        )
+
+    for index, name in enumerate(names):
+        h5_array._f_setattr("column_%i" % index, name)
+
+
+##############################################################################################
+
+
+def input_column_names(weighted):
+    """Returns the names of the columns of the HDF5 array of an input list, in the order used by libNeuroML"""
+
+    names = ["id", "target_cell_id", "segment_id", "fraction_along"]
+
+    if weighted:
+        names.append("weight")
+
+    return names
+
+
+def _write_input_array(
+    h5file, il_group, il_id, input_columns, input_w_columns, block_size=WRITE_BLOCK_SIZE
+):
+    """Writes the columns of the unweighted inputs followed by those of the weighted inputs to a chunked (and compressed, if
+    the file has compression filters) array in `il_group`, converting at most `block_size` inputs to the float32 layout at a time.
+    As in neuroml.InputList.exportHdf5() the weight column is only written if there are weighted inputs; it is 1 for the others.
+    """
+
+    import tables
+
+    weighted = len(input_w_columns["id"]) > 0
+
+    names = input_column_names(weighted)
+
+    num_unweighted = len(input_columns["id"])
+
+    num_inputs = num_unweighted + len(input_w_columns["id"])
+
+    h5_array = h5file.create_carray(
+        il_group,
+        il_id,
+        atom=tables.Float32Atom(),
+        shape=(num_inputs, len(names)),
+        title="Locations of inputs in " + il_id,
+    )
+
+    for columns, offset, weights_column in [
+        (input_columns, 0, False),
+        (input_w_columns, num_unweighted, True),
+    ]:
+        for start in range(0, len(columns["id"]), block_size):
+            end = min(len(columns["id"]), start + block_size)
+
+            block = np.zeros((end - start, len(names)), dtype=np.float32)
+
+            block[:, 0] = columns["id"][start:end]
+            block[:, 1] = columns["target_cell"][start:end]
+            block[:, 2] = columns["segment"][start:end]
+            block[:, 3] = columns["fraction"][start:end]
+
+            if weighted:
+                block[:, 4] = columns["weight"][start:end] if weights_column else 1
+
+            h5_array[offset + start : offset + end] = block
+
+    for index, name in enumerate(names):
+        h5_array._f_setattr("column_%i" % index, name)
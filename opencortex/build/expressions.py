@@ -0,0 +1,404 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Restricted expression engine for the string expressions used in opencortex, e.g. distance dependent connection rules
+like '0.5*math.exp(-r/100)' or weights and delays like '3*random()' or 'normal(2, 0.5)'.
+
+Expressions are parsed once with the Python ast module; only arithmetic, comparisons, conditional expressions, the
+variables given when compiling (e.g. `r`), numbers, the functions and constants of the math module (also accessible via
+`np.`) and the random distributions random(), uniform(a, b), normal(mu, sigma), gauss(mu, sigma) and exponential(scale)
+are allowed. Anything else (attribute access, imports, names of other objects...) is rejected, so that expressions read
+from files cannot execute arbitrary code.
+
+The compiled expressions evaluate using NumPy, i.e. on whole arrays of values at once.
+"""
+
+import ast
+import math
+import numpy as np
+import operator
+import random
+
+_BINARY_OPERATORS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.float_power,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: np.negative,
+    ast.Not: np.logical_not,
+}
+
+_COMPARISON_OPERATORS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+_FUNCTIONS = {
+    "exp": np.exp,
+    "expm1": np.expm1,
+    "log": np.log,
+    "log10": np.log10,
+    "log2": np.log2,
+    "log1p": np.log1p,
+    "sqrt": np.sqrt,
+    "pow": np.float_power,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "asin": np.arcsin,
+    "acos": np.arccos,
+    "atan": np.arctan,
+    "atan2": np.arctan2,
+    "arcsin": np.arcsin,
+    "arccos": np.arccos,
+    "arctan": np.arctan,
+    "arctan2": np.arctan2,
+    "sinh": np.sinh,
+    "cosh": np.cosh,
+    "tanh": np.tanh,
+    "fabs": np.fabs,
+    "abs": np.abs,
+    "floor": np.floor,
+    "ceil": np.ceil,
+    "hypot": np.hypot,
+    "min": np.minimum,
+    "max": np.maximum,
+    "minimum": np.minimum,
+    "maximum": np.maximum,
+    "where": np.where,
+}
+
+### functions which can be called without the math./np. prefix
+_BUILTIN_FUNCTIONS = ["abs", "min", "max", "pow", "exp", "log", "sqrt"]
+
+_CONSTANTS = {"pi": math.pi, "e": math.e, "inf": math.inf}
+
+_DISTRIBUTIONS = ["random", "uniform", "normal", "gauss", "exponential"]
+
+_MODULES = ["math", "np", "numpy"]
+
+_compiled_expressions = {}
+
+
+##############################################################################################
+
+
+def _scalar_sample(distribution, args):
+    """Draws a single value in the same way as the original (eval based) evaluation of expressions"""
+
+    if distribution == "random":
+        return random.random()
+
+    if distribution == "uniform":
+        return random.uniform(*args)
+
+    if distribution == "gauss":
+        return random.gauss(*args)
+
+    if distribution == "normal":
+        return np.random.normal(*args)
+
+    return np.random.exponential(*args)
+
+
+def _array_sample(rng, distribution, args, size):
+    if distribution == "random":
+        return rng.random(size)
+
+    if distribution == "uniform":
+        return rng.uniform(args[0], args[1], size)
+
+    if distribution in ["normal", "gauss"]:
+        return rng.normal(args[0], args[1], size)
+
+    return rng.exponential(args[0] if len(args) > 0 else 1.0, size)
+
+
+##############################################################################################
+
+
+class Expression(object):
+    """An expression compiled with compile_expression(); call evaluate() to evaluate it"""
+
+    def __init__(self, expression, variables):
+        self.expression = expression.strip()
+
+        self.variables = tuple(variables)
+
+        self.is_random = False
+
+        try:
+            tree = ast.parse(self.expression, mode="eval")
+
+        except SyntaxError as error:
+            raise Exception(
+                "Error! Cannot parse the expression '%s': %s" % (expression, error)
+            )
+
+        self._evaluate = self._compile(tree.body)
+
+        self.is_constant = not self.is_random and not self._uses_variables(tree)
+
+    def _uses_variables(self, tree):
+        return any(
+            isinstance(node, ast.Name) and node.id in self.variables
+            for node in ast.walk(tree)
+        )
+
+    def _error(self, node, reason):
+        return Exception(
+            "Error! %s is not allowed in the expression '%s'"
+            % (reason, self.expression)
+        )
+
+    def _text(self, node):
+        return ast.get_source_segment(self.expression, node)
+
+    def _function_name(self, node):
+        """Returns the name of the allowed function or distribution referred to by `node`, e.g. for math.exp, np.random.normal, random"""
+
+        if isinstance(node, ast.Name):
+            if node.id in _DISTRIBUTIONS or node.id in _BUILTIN_FUNCTIONS:
+                return node.id
+
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+            if node.value.id in _MODULES and node.attr in _FUNCTIONS:
+                return node.attr
+
+            if node.value.id == "random" and node.attr in _DISTRIBUTIONS:
+                return node.attr
+
+        if (
+            isinstance(node, ast.Attribute)
+            and isinstance(node.value, ast.Attribute)
+            and isinstance(node.value.value, ast.Name)
+            and node.value.value.id in ["np", "numpy"]
+            and node.value.attr == "random"
+            and node.attr in _DISTRIBUTIONS
+        ):
+            return node.attr
+
+        raise self._error(node, "The function '%s'" % self._text(node))
+
+    def _compile(self, node):
+        """Returns a function of (variables, size, rng) which evaluates the expression tree `node`"""
+
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+                raise self._error(node, "The constant %r" % (node.value,))
+
+            value = node.value
+
+            return lambda variables, size, rng: value
+
+        if isinstance(node, ast.Name):
+            name = node.id
+
+            if name in self.variables:
+                return lambda variables, size, rng: variables[name]
+
+            if name in _CONSTANTS:
+                value = _CONSTANTS[name]
+
+                return lambda variables, size, rng: value
+
+            raise self._error(node, "The name '%s'" % name)
+
+        if isinstance(node, ast.Attribute):
+            if (
+                isinstance(node.value, ast.Name)
+                and node.value.id in _MODULES
+                and node.attr in _CONSTANTS
+            ):
+                value = _CONSTANTS[node.attr]
+
+                return lambda variables, size, rng: value
+
+            raise self._error(node, "The attribute '%s'" % self._text(node))
+
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+            function = _BINARY_OPERATORS[type(node.op)]
+
+            left = self._compile(node.left)
+
+            right = self._compile(node.right)
+
+            return lambda variables, size, rng: function(
+                left(variables, size, rng), right(variables, size, rng)
+            )
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+            function = _UNARY_OPERATORS[type(node.op)]
+
+            operand = self._compile(node.operand)
+
+            return lambda variables, size, rng: function(operand(variables, size, rng))
+
+        if isinstance(node, ast.Compare):
+            functions = [_COMPARISON_OPERATORS.get(type(op)) for op in node.ops]
+
+            if None in functions:
+                raise self._error(node, "The comparison '%s'" % self._text(node))
+
+            operands = [
+                self._compile(operand) for operand in [node.left] + node.comparators
+            ]
+
+            def compare(variables, size, rng):
+                values = [operand(variables, size, rng) for operand in operands]
+
+                result = functions[0](values[0], values[1])
+
+                for index in range(1, len(functions)):
+                    result = np.logical_and(
+                        result, functions[index](values[index], values[index + 1])
+                    )
+
+                return result
+
+            return compare
+
+        if isinstance(node, ast.BoolOp):
+            function = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+            operands = [self._compile(operand) for operand in node.values]
+
+            def combine(variables, size, rng):
+                result = operands[0](variables, size, rng)
+
+                for operand in operands[1:]:
+                    result = function(result, operand(variables, size, rng))
+
+                return result
+
+            return combine
+
+        if isinstance(node, ast.IfExp):
+            test = self._compile(node.test)
+
+            body = self._compile(node.body)
+
+            orelse = self._compile(node.orelse)
+
+            def choose(variables, size, rng):
+                condition = test(variables, size, rng)
+
+                if np.ndim(condition) == 0:
+                    if condition:
+                        return body(variables, size, rng)
+
+                    return orelse(variables, size, rng)
+
+                return np.where(
+                    condition, body(variables, size, rng), orelse(variables, size, rng)
+                )
+
+            return choose
+
+        if isinstance(node, ast.Call):
+            if node.keywords:
+                raise self._error(node, "Keyword arguments in '%s'" % self._text(node))
+
+            name = self._function_name(node.func)
+
+            args = [self._compile(arg) for arg in node.args]
+
+            if name in _DISTRIBUTIONS:
+                self.is_random = True
+
+                def sample(variables, size, rng):
+                    values = [arg(variables, size, rng) for arg in args]
+
+                    if size == None:
+                        return _scalar_sample(name, values)
+
+                    return _array_sample(rng, name, values, size)
+
+                return sample
+
+            function = _FUNCTIONS[name]
+
+            return lambda variables, size, rng: function(
+                *[arg(variables, size, rng) for arg in args]
+            )
+
+        raise self._error(node, "The syntax '%s'" % self._text(node))
+
+    def evaluate(self, variables=None, size=None, rng=None):
+        """Evaluates the expression.
+
+        `variables` is a dictionary with the values (numbers or NumPy arrays) of the variables of the expression, e.g. {'r': distances}.
+        If `size` is None a single value is returned and random values are drawn as in the original eval based implementation
+        (with `random` and `np.random`); otherwise an array of `size` values is returned, with random values drawn from the
+        NumPy generator `rng`."""
+
+        if variables == None:
+            variables = {}
+
+        if size != None and rng == None:
+            rng = np.random.default_rng(random.getrandbits(64))
+
+        value = self._evaluate(variables, size, rng)
+
+        if size == None:
+            if isinstance(value, np.ndarray) and value.ndim == 0:
+                return value.item()
+
+            if isinstance(value, np.generic):
+                return value.item()
+
+            return value
+
+        return np.array(np.broadcast_to(np.asarray(value, dtype=np.float64), (size,)))
+
+    def __repr__(self):
+        return "Expression('%s')" % self.expression
+
+
+##############################################################################################
+
+
+def compile_expression(expression, variables=("r",)):
+    """Parses and compiles the string `expression` (see the module documentation for what is allowed); compiled expressions are cached.
+    `variables` are the names of the variables which can be used in the expression."""
+
+    key = (str(expression), tuple(variables))
+
+    if key not in _compiled_expressions:
+        _compiled_expressions[key] = Expression(str(expression), variables)
+
+    return _compiled_expressions[key]
+
+
+def evaluate_expression(expression, variables=None, size=None, rng=None):
+    """Compiles (see compile_expression()) and evaluates `expression`; see Expression.evaluate() for the arguments"""
+
+    if isinstance(expression, (int, float)) and not isinstance(expression, bool):
+        if size == None:
+            return expression
+
+        return np.full(size, expression, dtype=np.float64)
+
+    names = tuple(variables.keys()) if variables != None else ()
+
+    return compile_expression(expression, names).evaluate(variables, size, rng)
@@ -0,0 +1,222 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Precomputed index of the morphology of a cell, used to look up the segments of segment groups and the lengths of segments.
+
+A MorphologyIndex holds NumPy arrays with the segment ids, the proximal and distal points, the lengths and the parents of
+the segments, and the (recursively resolved) segments of each segment group in compressed sparse row (CSR) form, so that
+the segments of a group are found in O(size of the group). get_morphology_index() builds the index of a cell once and
+reuses it for as long as the cell object exists.
+"""
+
+import numpy as np
+import weakref
+
+### Indices of the cells seen so far, by cell object
+_morphology_indices = weakref.WeakKeyDictionary()
+
+
+##############################################################################################
+
+
+class MorphologyIndex(object):
+    """Index of the segments and segment groups of the morphology of the libNeuroML cell `cell`.
+
+    segment_ids, proximal, distal, lengths and parents are arrays with one row per segment, in the order of the segments in the
+    morphology; parents holds the row of the parent segment, or -1. A segment without a proximal point starts at the distal point
+    of its parent. The segments of group i are group_segments[group_pointers[i]:group_pointers[i+1]], in the order returned by
+    neuroml.Cell.get_all_segments_in_group()."""
+
+    def __init__(self, cell):
+        segments = cell.morphology.segments
+
+        num_segments = len(segments)
+
+        self.cell_id = cell.id
+
+        self.segment_ids = np.array(
+            [segment.id for segment in segments], dtype=np.int64
+        ).reshape(-1)
+
+        self.segment_names = [segment.name for segment in segments]
+
+        self.row_of_segment = dict(
+            (segment_id, row)
+            for row, segment_id in enumerate(self.segment_ids.tolist())
+        )
+
+        self.proximal = np.full((num_segments, 3), np.nan)
+
+        self.distal = np.full((num_segments, 3), np.nan)
+
+        self.parents = np.full(num_segments, -1, dtype=np.int64)
+
+        for row, segment in enumerate(segments):
+            if segment.distal != None:
+                self.distal[row] = [
+                    segment.distal.x,
+                    segment.distal.y,
+                    segment.distal.z,
+                ]
+
+            if segment.proximal != None:
+                self.proximal[row] = [
+                    segment.proximal.x,
+                    segment.proximal.y,
+                    segment.proximal.z,
+                ]
+
+            if segment.parent != None:
+                self.parents[row] = self.row_of_segment.get(segment.parent.segments, -1)
+
+        from_parent = np.isnan(self.proximal[:, 0]) & (self.parents >= 0)
+
+        self.proximal[from_parent] = self.distal[self.parents[from_parent]]
+
+        self.lengths = np.nan_to_num(
+            np.sqrt(np.sum((self.distal - self.proximal) ** 2, axis=1)), nan=0.0
+        )
+
+        groups_by_id = {}
+
+        for segment_group in cell.morphology.segment_groups:
+            groups_by_id[segment_group.id] = segment_group
+
+        self.group_ids = list(groups_by_id.keys())
+
+        self.row_of_group = dict(
+            (group_id, row) for row, group_id in enumerate(self.group_ids)
+        )
+
+        resolved = {}
+
+        for group_id in self.group_ids:
+            self._resolve_group(groups_by_id, group_id, resolved, [])
+
+        self.group_pointers = np.zeros(len(self.group_ids) + 1, dtype=np.int64)
+
+        self.group_pointers[1:] = np.cumsum(
+            [len(resolved[group_id]) for group_id in self.group_ids]
+        )
+
+        self.group_segments = np.array(
+            [
+                segment_id
+                for group_id in self.group_ids
+                for segment_id in resolved[group_id]
+            ],
+            dtype=np.int64,
+        )
+
+    def _resolve_group(self, groups_by_id, group_id, resolved, resolving):
+        """Returns the list of the (unique) segment ids of the group: its members followed by the segments of the included groups"""
+
+        if group_id in resolved:
+            return resolved[group_id]
+
+        if group_id not in groups_by_id:
+            raise Exception(
+                "Error! No segment group %s found in cell %s" % (group_id, self.cell_id)
+            )
+
+        if group_id in resolving:
+            raise Exception(
+                "Error! The segment group %s of cell %s includes itself"
+                % (group_id, self.cell_id)
+            )
+
+        resolving.append(group_id)
+
+        segment_group = groups_by_id[group_id]
+
+        segment_ids = []
+
+        included = set()
+
+        for segment_id in [member.segments for member in segment_group.members]:
+            if segment_id not in included:
+                included.add(segment_id)
+                segment_ids.append(segment_id)
+
+        for include in segment_group.includes:
+            for segment_id in self._resolve_group(
+                groups_by_id, include.segment_groups, resolved, resolving
+            ):
+                if segment_id not in included:
+                    included.add(segment_id)
+                    segment_ids.append(segment_id)
+
+        resolving.pop()
+
+        resolved[group_id] = segment_ids
+
+        return segment_ids
+
+    def has_group(self, group_id):
+        return group_id in self.row_of_group
+
+    def segments_in_group(self, group_id):
+        """Returns the array of the ids of the segments in the segment group `group_id`"""
+
+        if group_id not in self.row_of_group:
+            raise Exception(
+                "Error! No segment group %s found in cell %s" % (group_id, self.cell_id)
+            )
+
+        row = self.row_of_group[group_id]
+
+        return self.group_segments[
+            self.group_pointers[row] : self.group_pointers[row + 1]
+        ]
+
+    def get_seg_lengths(self, target_segments):
+        """Returns the cumulative lengths of the segments in `target_segments` and the list of their ids, in the order of the
+        segments in the morphology (see opencortex.build.get_seg_lengths())"""
+
+        rows = [
+            self.row_of_segment[segment_id]
+            for segment_id in target_segments
+            if segment_id in self.row_of_segment
+        ]
+
+        rows = np.sort(np.array(rows, dtype=np.int64), kind="stable")
+
+        return (
+            np.cumsum(self.lengths[rows]).tolist(),
+            self.segment_ids[rows].tolist(),
+        )
+
+    def make_target_dict(self, target_segs):
+        """Returns the dictionary {target: {'LengthDist': ..., 'SegList': ...}} for the lists of segment ids in `target_segs`
+        (see opencortex.build.make_target_dict())"""
+
+        target_dict = {}
+
+        for target in target_segs.keys():
+            lengths, segment_list = self.get_seg_lengths(target_segs[target])
+
+            target_dict[target] = {"LengthDist": lengths, "SegList": segment_list}
+
+        return target_dict
+
+
+##############################################################################################
+
+
+def get_morphology_index(cell):
+    """Returns the MorphologyIndex of the libNeuroML cell `cell`, which is built on the first call for each cell object.
+    The index is not updated if the morphology of the cell is changed afterwards."""
+
+    if cell not in _morphology_indices:
+        _morphology_indices[cell] = MorphologyIndex(cell)
+
+    return _morphology_indices[cell]
@@ -0,0 +1,257 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Partitions of networks into ranks, for builds of networks too big for the memory of a single node.
+
+A Partition assigns each cell of a network to a rank, either by ranges of global cell ids (gids: the cells are numbered
+population after population, in the order of the populations of the network) or by a map from populations to ranks. After
+set_rank(partition, rank), the projection builders of opencortex.build and opencortex.core only generate the connections
+onto the (postsynaptic) cells owned by the rank: the projections are built convergently, so each rank makes exactly the
+incoming connections of its own cells. All the populations are still placed by every rank (their positions are needed by
+distance-dependent projections, and are the same on every rank).
+
+So that the connections do not depend on how the cells are split into ranks, the postsynaptic cells of a projection are
+built in blocks of BLOCK_SIZE cells, each with its own random stream derived from the network seed and the ids of the
+projection and of the block (see opencortex.build.get_element_rng()). The union of the connections made by the ranks is then the
+same for any partition (including a single rank), though not the same as that of a build without a partition.
+
+See opencortex.utils.distributed for running the ranks (e.g. in local processes) and merging the shards they write.
+"""
+
+import numpy as np
+
+from opencortex.build import containers
+
+### Number of postsynaptic cells of a projection built with the same random stream
+BLOCK_SIZE = 256
+
+### The (partition, rank) of the networks built in this process, see set_rank()
+_current = None
+
+
+##############################################################################################
+
+
+class Partition(object):
+    """Assignment of the cells of a network to `num_ranks` ranks.
+
+    If `population_ranks` (a dictionary {population id: rank}) is given, all the cells of a population belong to its rank. Otherwise
+    the cells are assigned by their global ids: rank r owns the gids in gid_ranges[r] = (start, end), by default ranges of (almost)
+    equal numbers of cells of all the populations of the network.
+    """
+
+    def __init__(self, num_ranks, population_ranks=None, gid_ranges=None):
+        if num_ranks < 1:
+            raise Exception("Error! A partition needs at least one rank")
+
+        if population_ranks != None and gid_ranges != None:
+            raise Exception(
+                "Error! A partition is defined either by population_ranks or by gid_ranges, not both"
+            )
+
+        if gid_ranges != None and len(gid_ranges) != num_ranks:
+            raise Exception(
+                "Error! %i gid ranges given for %i ranks" % (len(gid_ranges), num_ranks)
+            )
+
+        if population_ranks != None:
+            for population_id, rank in population_ranks.items():
+                if rank < 0 or rank >= num_ranks:
+                    raise Exception(
+                        "Error! Population %s is assigned to rank %i, but there are %i ranks"
+                        % (population_id, rank, num_ranks)
+                    )
+
+        self.num_ranks = num_ranks
+
+        self.population_ranks = population_ranks
+
+        self.gid_ranges = gid_ranges
+
+    def get_gid_offsets(self, net):
+        """Returns the gid of the first cell of each population of `net`, by population id, and the total number of cells"""
+
+        offsets = {}
+
+        total = 0
+
+        for population in net.populations:
+            offsets[population.id] = total
+
+            total += population.size
+
+        return offsets, total
+
+    def get_gid_range(self, net, rank):
+        """Returns the (start, end) gids of the cells of `net` owned by `rank`, when the partition is by gids"""
+
+        if self.gid_ranges != None:
+            return tuple(self.gid_ranges[rank])
+
+        offsets, total = self.get_gid_offsets(net)
+
+        return (
+            rank * total // self.num_ranks,
+            (rank + 1) * total // self.num_ranks,
+        )
+
+    def get_owned_cells(self, net, population, rank):
+        """Returns the (sorted) indices of the cells of `population` (in `net`) owned by `rank`"""
+
+        if self.population_ranks != None:
+            if population.id not in self.population_ranks:
+                raise Exception(
+                    "Error! Population %s is not assigned to a rank of the partition"
+                    % population.id
+                )
+
+            if self.population_ranks[population.id] == rank:
+                return np.arange(population.size, dtype=np.int64)
+
+            return np.zeros(0, dtype=np.int64)
+
+        offsets, total = self.get_gid_offsets(net)
+
+        if population.id not in offsets:
+            raise Exception(
+                "Error! Population %s is not in network %s" % (population.id, net.id)
+            )
+
+        start, end = self.get_gid_range(net, rank)
+
+        first = min(max(start - offsets[population.id], 0), population.size)
+
+        last = min(max(end - offsets[population.id], 0), population.size)
+
+        return np.arange(first, last, dtype=np.int64)
+
+
+##############################################################################################
+
+
+def set_rank(partition, rank):
+    """Makes the networks built from now on in this process the slice of `partition` owned by `rank`"""
+
+    global _current
+
+    if rank < 0 or rank >= partition.num_ranks:
+        raise Exception(
+            "Error! Rank %i is not in a partition of %i ranks"
+            % (rank, partition.num_ranks)
+        )
+
+    _current = (partition, rank)
+
+
+def clear_rank():
+    """Builds whole networks again"""
+
+    global _current
+
+    _current = None
+
+
+def get_rank():
+    """Returns the (partition, rank) set with set_rank(), or (None, None)"""
+
+    if _current == None:
+        return None, None
+
+    return _current
+
+
+def get_owned_cells(net, population):
+    """Returns the indices of the cells of `population` owned by the current rank, or None if no rank is set"""
+
+    if _current == None:
+        return None
+
+    partition, rank = _current
+
+    return partition.get_owned_cells(net, population, rank)
+
+
+def get_blocks(owned, size):
+    """Returns the blocks of BLOCK_SIZE cells of a population of `size` cells containing the (sorted) cells `owned`: a list of
+    (index of the block, first cell, end cell, boolean array of the cells of the block which are owned)
+    """
+
+    blocks = []
+
+    for block in np.unique(owned // BLOCK_SIZE).tolist():
+        start = block * BLOCK_SIZE
+
+        end = min(size, start + BLOCK_SIZE)
+
+        mask = np.zeros(end - start, dtype=bool)
+
+        first, last = np.searchsorted(owned, [start, end])
+
+        mask[owned[first:last] - start] = True
+
+        blocks.append((block, start, end, mask))
+
+    return blocks
+
+
+def get_block_id(element_id, block):
+    """Returns the id from which the random stream of a block of cells of the element (e.g. projection) is derived"""
+
+    return "%s/block_%i" % (element_id, block)
+
+
+##############################################################################################
+
+
+def restrict_inputs(net):
+    """Removes from the input lists of `net` the inputs onto cells not owned by the current rank (if a rank is set); the inputs
+    kept have the ids they had in the whole input list"""
+
+    if _current == None:
+        return
+
+    populations = dict((population.id, population) for population in net.populations)
+
+    for input_list in net.input_lists:
+        owned = get_owned_cells(net, populations[input_list.populations])
+
+        for name in ["input", "input_ws"]:
+            inputs = getattr(input_list, name)
+
+            if isinstance(inputs, containers.InputColumns):
+                columns = inputs.columns()
+
+                kept = np.isin(columns["target_cell"], owned)
+
+                if np.all(kept):
+                    continue
+
+                columns = dict(
+                    (column, values[kept].copy()) for column, values in columns.items()
+                )
+
+                inputs.clear()
+
+                inputs.add(
+                    columns["id"],
+                    columns["target_cell"],
+                    segment_ids=columns["segment"],
+                    fractions=columns["fraction"],
+                    weights=columns["weight"],
+                )
+
+            else:
+                owned_set = set(owned.tolist())
+
+                inputs[:] = [
+                    input for input in inputs if input.get_target_cell_id() in owned_set
+                ]
@@ -0,0 +1,439 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Vectorized (NumPy based) random samplers used by the network builders in opencortex.build
+"""
+
+import numpy as np
+
+# Maximum number of (pre, post) pairs which are considered at once when sampling
+# connections; bounds the memory used irrespective of the size of the populations
+BLOCK_SIZE = 2**22
+
+# Below this connection probability geometric skip sampling is used instead of
+# drawing one uniform number per (pre, post) pair
+SPARSE_PROBABILITY = 0.1
+
+
+##############################################################################################
+
+
+def bernoulli_pairs(
+    rng, pre_size, post_size, probability, exclude_self=False, block_size=BLOCK_SIZE
+):
+    """Generator which samples the (pre, post) cell pairs connected with independent probability `probability`.
+
+    Yields tuples of int64 arrays (pre_cell_ids, post_cell_ids), with at most ~`block_size` pairs considered per block.
+    The pairs are returned ordered by pre cell id first and post cell id second, i.e. the same order as the double loop
+    over `range(pre_size)` and `range(post_size)`. If `exclude_self` is True, pairs with pre cell id == post cell id are dropped.
+
+    For sparse probabilities the gaps between successive connected pairs are drawn from the geometric distribution,
+    so the work done is proportional to the number of connections rather than the number of pairs.
+    """
+
+    total_pairs = pre_size * post_size
+
+    if total_pairs == 0 or probability <= 0:
+        return
+
+    if probability >= 1:
+        rows_per_block = max(1, block_size // post_size)
+
+        for row_start in range(0, pre_size, rows_per_block):
+            row_end = min(pre_size, row_start + rows_per_block)
+
+            pair_ids = np.arange(row_start * post_size, row_end * post_size)
+
+            yield _split_pair_ids(pair_ids, post_size, exclude_self)
+
+    elif probability <= SPARSE_PROBABILITY:
+        last_pair = -1
+
+        while last_pair < total_pairs - 1:
+            expected = (total_pairs - 1 - last_pair) * probability
+
+            batch = int(min(block_size, max(1024, expected * 1.05 + 64)))
+
+            pair_ids = last_pair + np.cumsum(
+                rng.geometric(probability, size=batch), dtype=np.int64
+            )
+
+            last_pair = pair_ids[-1]
+
+            pair_ids = pair_ids[pair_ids < total_pairs]
+
+            if len(pair_ids) > 0:
+                yield _split_pair_ids(pair_ids, post_size, exclude_self)
+
+    else:
+        rows_per_block = max(1, block_size // post_size)
+
+        for row_start in range(0, pre_size, rows_per_block):
+            row_end = min(pre_size, row_start + rows_per_block)
+
+            connected = rng.random((row_end - row_start, post_size)) < probability
+
+            pre_ids, post_ids = np.nonzero(connected)
+
+            pre_ids = pre_ids.astype(np.int64) + row_start
+
+            post_ids = post_ids.astype(np.int64)
+
+            if exclude_self:
+                keep = pre_ids != post_ids
+
+                pre_ids = pre_ids[keep]
+
+                post_ids = post_ids[keep]
+
+            yield pre_ids, post_ids
+
+
+def _split_pair_ids(pair_ids, post_size, exclude_self):
+    pre_ids = pair_ids // post_size
+
+    post_ids = pair_ids - pre_ids * post_size
+
+    if exclude_self:
+        keep = pre_ids != post_ids
+
+        pre_ids = pre_ids[keep]
+
+        post_ids = post_ids[keep]
+
+    return pre_ids, post_ids
+
+
+##############################################################################################
+
+
+def sample_partners(rng, num_partners, pop_size, exclude_self=False, first_cell=0):
+    """Draws the partners of a batch of cells: `num_partners[r]` of the cells range(`pop_size`) for the cell `first_cell` + r, e.g.
+    the presynaptic cells of each postsynaptic cell of a convergent projection. If `exclude_self` is True (both cells are in the same
+    population) a cell is never its own partner.
+
+    The partners of a cell are distinct if there are enough candidates (as with random.sample()) and are drawn
+    with replacement otherwise. Distinct partners are drawn by vectorized rejection (duplicates are redrawn until none remain) for the
+    cells with at most half as many partners as candidates, and are the first of a random permutation of the candidates for the others.
+    The cell itself is excluded by drawing among `pop_size` - 1 candidates and shifting those from the cell onwards by one.
+
+    Returns the int64 arrays (cell_ids, partner_ids) of all the pairs, grouped by cell (in increasing order).
+    """
+
+    num_partners = np.asarray(num_partners, dtype=np.int64)
+
+    num_cells = len(num_partners)
+
+    num_candidates = pop_size - 1 if exclude_self else pop_size
+
+    if num_candidates <= 0:
+        num_partners = np.zeros(num_cells, dtype=np.int64)
+
+    rows = np.repeat(np.arange(num_cells, dtype=np.int64), num_partners)
+
+    if len(rows) == 0:
+        return rows, np.zeros(0, dtype=np.int64)
+
+    partner_ids = rng.integers(0, num_candidates, size=len(rows), dtype=np.int64)
+
+    distinct = num_partners <= num_candidates
+
+    dense = distinct & (2 * num_partners > num_candidates)
+
+    sparse = distinct & ~dense
+
+    ##### rejection: redraw the repeated partners of the cells (all but the first occurrence), then check those cells again
+
+    checked = np.nonzero(sparse[rows])[0]
+
+    while len(checked) > 0:
+        keys = rows[checked] * num_candidates + partner_ids[checked]
+
+        order = np.argsort(keys, kind="stable")
+
+        repeated = order[1:][keys[order[1:]] == keys[order[:-1]]]
+
+        if len(repeated) == 0:
+            break
+
+        redrawn = checked[repeated]
+
+        partner_ids[redrawn] = rng.integers(
+            0, num_candidates, size=len(redrawn), dtype=np.int64
+        )
+
+        checked = checked[np.isin(rows[checked], rows[redrawn])]
+
+    starts = np.concatenate(([0], np.cumsum(num_partners)))
+
+    for row in np.nonzero(dense)[0].tolist():
+        partner_ids[starts[row] : starts[row + 1]] = rng.permutation(num_candidates)[
+            : num_partners[row]
+        ]
+
+    cell_ids = rows + first_cell
+
+    if exclude_self:
+        partner_ids += partner_ids >= cell_ids
+
+    return cell_ids, partner_ids
+
+
+##############################################################################################
+
+
+def clipped_normal(rng, mean, std, size, clip="none"):
+    """Draws `size` values from the normal distribution N(`mean`, `std`).
+
+    `clip` is one of "none", "positive" (values must be >= 0, e.g. for delays) or "signed" (values must have the same
+    sign as `mean`, e.g. for weights); values which violate the constraint are redrawn, as in the original rejection loops
+    in add_probabilistic_projection_list()."""
+
+    values = rng.normal(mean, std, size)
+
+    if clip == "positive" or (clip == "signed" and mean > 0):
+        bad = np.nonzero(values < 0)[0]
+
+        while len(bad) > 0:
+            values[bad] = rng.normal(mean, std, len(bad))
+
+            bad = bad[values[bad] < 0]
+
+    elif clip == "signed" and mean < 0:
+        bad = np.nonzero(values > 0)[0]
+
+        while len(bad) > 0:
+            values[bad] = rng.normal(mean, std, len(bad))
+
+            bad = bad[values[bad] > 0]
+
+    return values
+
+
+##############################################################################################
+
+
+class SegmentSampler(object):
+    """Batched sampler of synapse locations on the segments of a cell.
+
+    `seg_specifications` is a dictionary in the format returned by make_target_dict(): keys are target group names and the
+    values are dictionaries with the segment ids ('SegList') and the cumulative segment lengths ('LengthDist') of the group.
+    Locations are drawn uniformly along the total length of a group and mapped to segments with np.searchsorted() over the
+    cumulative lengths, so drawing n locations costs O(n log(number of segments))."""
+
+    def __init__(self, seg_specifications):
+        self.groups = {}
+
+        for target_group in seg_specifications.keys():
+            segment_list = np.asarray(
+                seg_specifications[target_group]["SegList"], dtype=np.int64
+            )
+
+            cumulative_length_dist = np.asarray(
+                seg_specifications[target_group]["LengthDist"], dtype=np.float64
+            )
+
+            self.groups[target_group] = (segment_list, cumulative_length_dist)
+
+    def _get_group(self, target_group):
+        segment_list, cumulative_length_dist = self.groups[target_group]
+
+        if len(segment_list) == 0 or len(segment_list) != len(cumulative_length_dist):
+            raise Exception(
+                "Error! The SegList and LengthDist of the target group %s must be non empty and of the same length"
+                % target_group
+            )
+
+        return segment_list, cumulative_length_dist
+
+    def sample_group(self, rng, target_group, size):
+        """Draws `size` locations on the segment group `target_group`; returns the arrays of segment ids and fractions along.
+
+        A location which falls on the boundary of two segments is assigned to the first one and locations on zero length
+        segments get the fraction 0.5, as in the original get_target_segments()."""
+
+        segment_list, cumulative_length_dist = self._get_group(target_group)
+
+        locations = rng.random(size) * cumulative_length_dist[-1]
+
+        seg_indices = np.searchsorted(cumulative_length_dist, locations, side="left")
+
+        seg_indices = np.minimum(seg_indices, len(segment_list) - 1)
+
+        previous_dist_values = np.concatenate(([0.0], cumulative_length_dist))[
+            seg_indices
+        ]
+
+        segment_lengths = cumulative_length_dist[seg_indices] - previous_dist_values
+
+        fractions_along = np.full(size, 0.5)
+
+        np.divide(
+            locations - previous_dist_values,
+            segment_lengths,
+            out=fractions_along,
+            where=segment_lengths > 0,
+        )
+
+        return segment_list[seg_indices], fractions_along
+
+    def sample_any_group(self, rng, size):
+        """Draws `size` locations, each on a segment group chosen at random with equal probability (not weighted by length);
+        returns the arrays of segment ids and fractions along.
+
+        Only locations strictly inside a segment are accepted (others are redrawn), as in the original get_target_segments()
+        when the number of connections is not split between groups."""
+
+        groups = [
+            self.groups[target_group]
+            for target_group in self.groups.keys()
+            if len(self.groups[target_group][0]) > 0
+            and len(self.groups[target_group][0]) == len(self.groups[target_group][1])
+            and np.any(np.diff(self.groups[target_group][1], prepend=0.0) > 0)
+        ]
+
+        segment_ids = np.zeros(size, dtype=np.int64)
+
+        fractions_along = np.zeros(size)
+
+        if size == 0:
+            return segment_ids, fractions_along
+
+        if len(groups) == 0:
+            raise Exception(
+                "Error! None of the target groups %s contains a segment of non zero length"
+                % list(self.groups.keys())
+            )
+
+        remaining = np.arange(size)
+
+        while len(remaining) > 0:
+            group_indices = rng.integers(0, len(groups), size=len(remaining))
+
+            accepted = np.zeros(len(remaining), dtype=bool)
+
+            for group_index in np.unique(group_indices):
+                rows = np.nonzero(group_indices == group_index)[0]
+
+                segment_list, cumulative_length_dist = groups[group_index]
+
+                locations = rng.random(len(rows)) * cumulative_length_dist[-1]
+
+                seg_indices = np.searchsorted(
+                    cumulative_length_dist, locations, side="right"
+                )
+
+                inside = seg_indices < len(segment_list)
+
+                seg_indices = np.minimum(seg_indices, len(segment_list) - 1)
+
+                previous_dist_values = np.concatenate(([0.0], cumulative_length_dist))[
+                    seg_indices
+                ]
+
+                inside &= locations > previous_dist_values
+
+                rows = rows[inside]
+
+                seg_indices = seg_indices[inside]
+
+                segment_ids[remaining[rows]] = segment_list[seg_indices]
+
+                fractions_along[remaining[rows]] = (
+                    locations[inside] - previous_dist_values[inside]
+                ) / (cumulative_length_dist[seg_indices] - previous_dist_values[inside])
+
+                accepted[rows] = True
+
+            remaining = remaining[~accepted]
+
+        return segment_ids, fractions_along
+
+    def sample_flat(self, rng, subset_dicts):
+        """Draws the synapse locations of a number of cells at once, as sample(), but returns the locations of all cells in one pair of
+        arrays: the segment ids and the fractions along (the locations of the first cell, followed by those of the second cell...), and
+        the array with the number of locations of each cell."""
+
+        num_cells = len(subset_dicts)
+
+        if num_cells == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0, dtype=np.int64)
+
+        if isinstance(subset_dicts[0], dict):
+            target_groups = [
+                target_group
+                for target_group in subset_dicts[0].keys()
+                if target_group in self.groups
+            ]
+
+            cell_counts = np.zeros(num_cells, dtype=np.int64)
+
+            cells = []
+
+            segment_ids = []
+
+            fractions_along = []
+
+            for target_group in target_groups:
+                counts = np.array(
+                    [int(subset_dict[target_group]) for subset_dict in subset_dicts],
+                    dtype=np.int64,
+                )
+
+                group_segment_ids, group_fractions_along = self.sample_group(
+                    rng, target_group, int(counts.sum())
+                )
+
+                cell_counts += counts
+
+                cells.append(np.repeat(np.arange(num_cells), counts))
+
+                segment_ids.append(group_segment_ids)
+
+                fractions_along.append(group_fractions_along)
+
+            if len(target_groups) == 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0), cell_counts
+
+            ### the locations of each cell, in the order of the groups
+            order = np.argsort(np.concatenate(cells), kind="stable")
+
+            return (
+                np.concatenate(segment_ids)[order],
+                np.concatenate(fractions_along)[order],
+                cell_counts,
+            )
+
+        counts = np.array(
+            [int(subset_dict) for subset_dict in subset_dicts], dtype=np.int64
+        )
+
+        segment_ids, fractions_along = self.sample_any_group(rng, int(counts.sum()))
+
+        return segment_ids, fractions_along, counts
+
+    def sample(self, rng, subset_dicts):
+        """Draws the synapse locations of a number of cells at once.
+
+        `subset_dicts` is a list with one entry per cell, either a dictionary with the number of locations per target group
+        (groups not in the seg_specifications are skipped) or a number of locations on randomly chosen groups, as for
+        get_target_segments(). Returns two lists with, for each cell, the array of segment ids and the array of fractions along.
+        """
+
+        if len(subset_dicts) == 0:
+            return [], []
+
+        segment_ids, fractions_along, counts = self.sample_flat(rng, subset_dicts)
+
+        splits = np.cumsum(counts)[:-1]
+
+        return np.split(segment_ids, splits), np.split(fractions_along, splits)
@@ -0,0 +1,328 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Sparse matrix (scipy.sparse) views of the connections of projections, and the arrays from which projections are built from sparse
+matrices (see opencortex.core.add_projection_from_sparse()).
+
+A projection from a population of M cells onto a population of N cells is viewed as an M x N matrix whose entry (i, j) is e.g. the
+weight of the connection from presynaptic cell i to postsynaptic cell j. The connections of the projections built by opencortex are
+read directly from their columns (see opencortex.build.containers), those of projections loaded from HDF5 with the optimized loader
+from their arrays; only the connections of other projections (e.g. read from XML) are read from their objects, once.
+
+scipy is only imported by the functions which create or read sparse matrices.
+"""
+
+import numpy as np
+
+from opencortex.build import containers
+
+### Lists of connections of the (chemical, electrical and continuous) projections of libNeuroML
+CONNECTION_LISTS = [
+    "connections",
+    "connection_wds",
+    "electrical_connections",
+    "electrical_connection_instances",
+    "electrical_connection_instance_ws",
+    "continuous_connections",
+    "continuous_connection_instances",
+    "continuous_connection_instance_ws",
+]
+
+### Column of the connection columns for each column of the HDF5 arrays, and the value of the columns missing from an array
+HDF5_COLUMNS = {
+    "id": "id",
+    "pre_cell_id": "pre_cell",
+    "post_cell_id": "post_cell",
+    "pre_segment_id": "pre_segment",
+    "post_segment_id": "post_segment",
+    "pre_fraction_along": "pre_fraction",
+    "post_fraction_along": "post_fraction",
+    "weight": "weight",
+    "delay": "delay",
+}
+
+COLUMN_DEFAULTS = {
+    "pre_segment": 0,
+    "post_segment": 0,
+    "pre_fraction": 0.5,
+    "post_fraction": 0.5,
+    "weight": 1,
+    "delay": 0,
+}
+
+SPARSE_FORMATS = ["coo", "csr", "csc"]
+
+
+##############################################################################################
+
+
+def _get_columns_of_array(connection_list):
+    """Returns the columns of the array of an optimized list of connections (neuroml.hdf5.NetworkContainer.ConnectionList)"""
+
+    array = connection_list.array
+
+    num_conns = len(connection_list)
+
+    columns = {}
+
+    for name, dtype in containers.COLUMN_DTYPES:
+        columns[name] = np.full(num_conns, COLUMN_DEFAULTS.get(name, 0), dtype=dtype)
+
+    columns["id"] = np.arange(num_conns, dtype=np.int64)
+
+    for hdf5_name, index in connection_list.indices.items():
+        if hdf5_name in HDF5_COLUMNS and num_conns > 0:
+            columns[HDF5_COLUMNS[hdf5_name]][:] = array[:, index]
+
+    ### as in ConnectionList.__getitem__(), the cells are in columns 1 and 2 of arrays without column attributes
+    for hdf5_name, index in [("pre_cell_id", 1), ("post_cell_id", 2)]:
+        if hdf5_name not in connection_list.indices and num_conns > 0:
+            columns[HDF5_COLUMNS[hdf5_name]][:] = array[:, index]
+
+    return columns
+
+
+def _get_columns_of_objects(connections):
+    """Returns the columns of a list of connection objects"""
+
+    values = dict((name, []) for name, dtype in containers.COLUMN_DTYPES)
+
+    for connection in connections:
+        values["id"].append(int(connection.id))
+
+        values["pre_cell"].append(connection.get_pre_cell_id())
+
+        values["post_cell"].append(connection.get_post_cell_id())
+
+        values["pre_segment"].append(connection.get_pre_segment_id())
+
+        values["post_segment"].append(connection.get_post_segment_id())
+
+        values["pre_fraction"].append(connection.get_pre_fraction_along())
+
+        values["post_fraction"].append(connection.get_post_fraction_along())
+
+        if hasattr(connection, "get_weight"):
+            values["weight"].append(connection.get_weight())
+
+        else:
+            values["weight"].append(float(getattr(connection, "weight", 1)))
+
+        values["delay"].append(
+            connection.get_delay_in_ms()
+            if hasattr(connection, "get_delay_in_ms")
+            else 0
+        )
+
+    return dict(
+        (name, np.array(values[name], dtype=dtype))
+        for name, dtype in containers.COLUMN_DTYPES
+    )
+
+
+def get_connection_columns(proj):
+    """Returns a dict of the arrays id, pre_cell, post_cell, pre_segment, post_segment, pre_fraction, post_fraction, weight and
+    delay (in ms) of all the connections of the projection `proj` (chemical, electrical or continuous)
+    """
+
+    parts = []
+
+    for name in CONNECTION_LISTS:
+        connections = getattr(proj, name, None)
+
+        if connections == None or len(connections) == 0:
+            continue
+
+        if isinstance(connections, containers.ConnectionColumns):
+            parts.append(connections.columns())
+
+        elif isinstance(getattr(connections, "array", None), np.ndarray):
+            parts.append(_get_columns_of_array(connections))
+
+        else:
+            parts.append(_get_columns_of_objects(connections))
+
+    if len(parts) == 1:
+        return parts[0]
+
+    if len(parts) == 0:
+        return dict(
+            (name, np.zeros(0, dtype=dtype)) for name, dtype in containers.COLUMN_DTYPES
+        )
+
+    return dict(
+        (name, np.concatenate([part[name] for part in parts]))
+        for name, dtype in containers.COLUMN_DTYPES
+    )
+
+
+##############################################################################################
+
+
+def get_projection_shape(net, proj):
+    """Returns the (number of presynaptic cells, number of postsynaptic cells) of the projection `proj` of the network `net`"""
+
+    sizes = dict((population.id, population.size) for population in net.populations)
+
+    for population_id in [proj.presynaptic_population, proj.postsynaptic_population]:
+        if population_id not in sizes:
+            raise Exception(
+                "Error! Population %s of projection %s is not in network %s"
+                % (population_id, proj.id, net.id)
+            )
+
+    return (
+        sizes[proj.presynaptic_population],
+        sizes[proj.postsynaptic_population],
+    )
+
+
+def _to_format(matrix, format):
+    if format not in SPARSE_FORMATS:
+        raise Exception(
+            "Error! Unknown sparse matrix format %s, expected one of %s"
+            % (format, SPARSE_FORMATS)
+        )
+
+    if format == "coo":
+        return matrix
+
+    return matrix.asformat(format)
+
+
+def to_sparse(proj, values="weight", shape=None, format="coo", columns=None):
+    """Returns the connections of the projection `proj` as a scipy.sparse matrix (presynaptic x postsynaptic cells) in `format`
+    ('coo', 'csr' or 'csc').
+
+    `values` is the column of the entries (e.g. 'weight', 'delay' or 'post_segment', see get_connection_columns()), or None for 1
+    per connection. The COO matrix has an entry per connection, in the order of the connections; the CSR and CSC matrices sum the
+    entries of the connections between the same cells (e.g. the weight of all the synapses from one cell onto another), so use
+    'coo' for values which should not be summed. `shape` is by default (largest pre cell index + 1, largest post cell index + 1);
+    pass get_projection_shape(net, proj) for the full populations. `columns` are the columns of `proj` if already available.
+    """
+
+    import scipy.sparse
+
+    if columns == None:
+        columns = get_connection_columns(proj)
+
+    pre_cells = columns["pre_cell"]
+
+    post_cells = columns["post_cell"]
+
+    if values == None:
+        data = np.ones(len(pre_cells))
+
+    elif values in columns:
+        data = columns[values]
+
+    else:
+        raise Exception(
+            "Error! Unknown column %s of the connections of %s, expected one of %s"
+            % (values, proj.id, sorted(columns.keys()))
+        )
+
+    if shape == None:
+        shape = (
+            int(pre_cells.max()) + 1 if len(pre_cells) > 0 else 0,
+            int(post_cells.max()) + 1 if len(post_cells) > 0 else 0,
+        )
+
+    matrix = scipy.sparse.coo_matrix((data, (pre_cells, post_cells)), shape=shape)
+
+    return _to_format(matrix, format)
+
+
+def to_sparse_layers(proj, layers=("weight", "delay"), shape=None, format="coo"):
+    """Returns a dict of the sparse matrices (see to_sparse()) of the connections of `proj` with the values of each column in
+    `layers`; the connections are read once"""
+
+    columns = get_connection_columns(proj)
+
+    return dict(
+        (
+            layer,
+            to_sparse(proj, layer, shape=shape, format=format, columns=columns),
+        )
+        for layer in layers
+    )
+
+
+##############################################################################################
+
+
+def _get_values_of_entries(values, pre_cells, post_cells, shape, name):
+    """Returns the values (e.g. delays) of the entries (pre_cells, post_cells) of a sparse matrix: `values` is a scalar, an array
+    with a value per entry, or a sparse (or dense) matrix of the same shape which is indexed at the entries
+    """
+
+    import scipy.sparse
+
+    if np.isscalar(values):
+        return np.full(len(pre_cells), values, dtype=np.float64)
+
+    if scipy.sparse.issparse(values) or (
+        isinstance(values, np.ndarray) and values.ndim == 2
+    ):
+        if values.shape != shape:
+            raise Exception(
+                "Error! The matrix of %s has shape %s, but the projection has shape %s"
+                % (name, values.shape, shape)
+            )
+
+        if scipy.sparse.issparse(values):
+            values = values.tocsr()
+
+        return np.asarray(values[pre_cells, post_cells], dtype=np.float64).ravel()
+
+    values = np.asarray(values, dtype=np.float64)
+
+    if values.shape != pre_cells.shape:
+        raise Exception(
+            "Error! %i %s given for %i connections"
+            % (len(values), name, len(pre_cells))
+        )
+
+    return values
+
+
+def from_sparse(matrix, delays=0, shape=None):
+    """Returns the arrays (pre_cells, post_cells, weights, delays) of the connections of the sparse (or dense) matrix `matrix`:
+    a connection per stored entry, with the entry as weight. Connections between the same cells are kept if `matrix` is in COO
+    format and has duplicate entries. `delays` (in ms) is a scalar, an array with a value per stored entry or a matrix of the same
+    shape as `matrix`. If `shape` is given it is the expected (number of presynaptic cells, number of postsynaptic cells).
+    """
+
+    import scipy.sparse
+
+    if not scipy.sparse.issparse(matrix):
+        matrix = scipy.sparse.coo_matrix(np.asarray(matrix))
+
+    if shape != None and tuple(matrix.shape) != tuple(shape):
+        raise Exception(
+            "Error! The matrix has shape %s, but the populations have shape %s"
+            % (matrix.shape, tuple(shape))
+        )
+
+    coo = matrix.tocoo()
+
+    pre_cells = np.asarray(coo.row, dtype=np.int64)
+
+    post_cells = np.asarray(coo.col, dtype=np.int64)
+
+    weights = np.asarray(coo.data, dtype=np.float64)
+
+    delays = _get_values_of_entries(
+        delays, pre_cells, post_cells, matrix.shape, "delays"
+    )
+
+    return pre_cells, post_cells, weights, delays
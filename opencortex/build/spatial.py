@@ -0,0 +1,390 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Spatial indices over the positions of cells: SpatialIndex, used for radius queries when building distance-dependent projections,
+and OverlapGrid, used to check that the cell bodies do not overlap when placing cells, together with Poisson-disk placement
+"""
+
+import math
+import numpy as np
+
+##############################################################################################
+
+
+class SpatialIndex(object):
+    """Uniform grid index over an (N, 3) array of cell positions.
+
+    Cells are binned in cubic grid cells of side `cell_size`; a radius query only visits the grid cells which overlap the
+    bounding box of the query sphere. A `cell_size` equal to the typical query radius works well.
+    """
+
+    def __init__(self, positions, cell_size):
+        if cell_size <= 0:
+            raise Exception(
+                "Error! The cell size of a SpatialIndex must be positive, not %s"
+                % cell_size
+            )
+
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+
+        self.cell_size = float(cell_size)
+
+        if len(self.positions) == 0:
+            self.origin = np.zeros(3)
+
+            self.dims = np.ones(3, dtype=np.int64)
+
+        else:
+            self.origin = self.positions.min(axis=0)
+
+            self.dims = self._grid_coords(self.positions.max(axis=0)) + 1
+
+        grid_coords = self._grid_coords(self.positions)
+
+        keys = self._linear_keys(
+            grid_coords[:, 0], grid_coords[:, 1], grid_coords[:, 2]
+        )
+
+        self.order = np.argsort(keys, kind="stable")
+
+        self.sorted_keys = keys[self.order]
+
+    def _grid_coords(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def _linear_keys(self, x, y, z):
+        return (x * self.dims[1] + y) * self.dims[2] + z
+
+    def query_radius(self, point, radius):
+        """Returns the indices (in ascending order) of the cells within distance `radius` of `point` and their distances"""
+
+        point = np.asarray(point, dtype=np.float64)
+
+        low = np.maximum(self._grid_coords(point - radius), 0)
+
+        high = np.minimum(self._grid_coords(point + radius), self.dims - 1)
+
+        if np.any(low > high):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        grid_x, grid_y = np.meshgrid(
+            np.arange(low[0], high[0] + 1),
+            np.arange(low[1], high[1] + 1),
+            indexing="ij",
+        )
+
+        grid_x = grid_x.ravel()
+
+        grid_y = grid_y.ravel()
+
+        ### grid cells with the same x and y coordinates and consecutive z coordinates have consecutive keys
+
+        starts = np.searchsorted(
+            self.sorted_keys, self._linear_keys(grid_x, grid_y, low[2]), side="left"
+        )
+
+        ends = np.searchsorted(
+            self.sorted_keys, self._linear_keys(grid_x, grid_y, high[2]), side="right"
+        )
+
+        candidates = np.concatenate(
+            [self.order[start:end] for start, end in zip(starts, ends) if end > start]
+            or [np.zeros(0, dtype=np.int64)]
+        )
+
+        candidates.sort()
+
+        distances = np.sqrt(np.sum((self.positions[candidates] - point) ** 2, axis=1))
+
+        within = distances <= radius
+
+        return candidates[within], distances[within]
+
+
+##############################################################################################
+
+
+def get_spatial_index(positions, cell_size, cache=None, key=None):
+    """Returns a SpatialIndex over `positions`, reusing the one stored in the dictionary `cache` under (`key`, `cell_size`)
+    if present, e.g. so that all projections built in one run of opencortex.utils.build_connectivity() share the index of a population
+    """
+
+    if cache == None or key == None:
+        return SpatialIndex(positions, cell_size)
+
+    cache_key = (key, float(cell_size), len(positions))
+
+    if cache_key not in cache:
+        cache[cache_key] = SpatialIndex(positions, cell_size)
+
+    return cache[cache_key]
+
+
+def cells_within_radius(positions, point, radius=None, spatial_index=None):
+    """Returns the indices (in ascending order) of the cells in `positions` within distance `radius` of `point` together with
+    their distances; all cells are returned if `radius` is None. `spatial_index` is an optional SpatialIndex over `positions`.
+    """
+
+    if radius == None:
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+
+        distances = np.sqrt(np.sum((positions - np.asarray(point)) ** 2, axis=1))
+
+        return np.arange(len(positions)), distances
+
+    if spatial_index == None:
+        spatial_index = SpatialIndex(positions, radius)
+
+    return spatial_index.query_radius(point, radius)
+
+
+##############################################################################################
+
+
+class OverlapGrid(object):
+    """Uniform spatial hash of the positions of placed cell bodies, used to check whether a new cell would overlap them.
+
+    Each stored position has an exclusion radius (e.g. the soma diameter of its cell type); a point overlaps a stored
+    position if it is closer than that radius. Positions are binned in cubic grid cells of side `cell_size` (e.g. the largest
+    soma diameter), so a query only visits the grid cells around the point and takes O(1) time.
+    """
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise Exception(
+                "Error! The cell size of an OverlapGrid must be positive, not %s"
+                % cell_size
+            )
+
+        self.cell_size = float(cell_size)
+
+        self.cells = {}
+
+        self.max_radius = 0.0
+
+        self.size = 0
+
+    def _key(self, position):
+        return (
+            int(math.floor(position[0] / self.cell_size)),
+            int(math.floor(position[1] / self.cell_size)),
+            int(math.floor(position[2] / self.cell_size)),
+        )
+
+    def add(self, position, radius):
+        """Stores `position` (x, y, z) with the exclusion radius `radius`"""
+
+        key = self._key(position)
+
+        if key not in self.cells:
+            self.cells[key] = []
+
+        self.cells[key].append(
+            (float(position[0]), float(position[1]), float(position[2]), float(radius))
+        )
+
+        self.max_radius = max(self.max_radius, float(radius))
+
+        self.size += 1
+
+    def add_positions(self, positions, radius):
+        for position in positions:
+            self.add(position, radius)
+
+    def overlaps(self, position, radius=0):
+        """Whether `position` is closer to a stored position than the exclusion radius of that position (or than `radius`, if larger)"""
+
+        x, y, z = float(position[0]), float(position[1]), float(position[2])
+
+        reach = int(math.ceil(max(self.max_radius, radius) / self.cell_size))
+
+        key_x, key_y, key_z = self._key(position)
+
+        for i in range(key_x - reach, key_x + reach + 1):
+            for j in range(key_y - reach, key_y + reach + 1):
+                for k in range(key_z - reach, key_z + reach + 1):
+                    for other_x, other_y, other_z, other_radius in self.cells.get(
+                        (i, j, k), ()
+                    ):
+                        limit = max(other_radius, radius)
+
+                        if (x - other_x) ** 2 + (y - other_y) ** 2 + (
+                            z - other_z
+                        ) ** 2 < limit * limit:
+                            return True
+
+        return False
+
+
+##############################################################################################
+
+
+def poisson_disk_positions(
+    rng, low, high, radius, inside=None, occupied=None, attempts=30
+):
+    """Poisson-disk (blue noise) sampling of the box [`low`, `high`] with Bridson's algorithm.
+
+    Returns an (N, 3) array of positions, in random order, which are at least `radius` apart from each other, which do not
+    overlap the positions in the OverlapGrid `occupied` (which is not modified) and for which the optional function `inside`
+    of a position returns True. The region is filled up to the maximal density: each new position is searched for around an
+    active position with at most `attempts` candidates, so the number of draws is bounded by about `attempts` times the
+    number of positions returned."""
+
+    low = np.asarray(low, dtype=np.float64)
+
+    high = np.asarray(high, dtype=np.float64)
+
+    if inside == None:
+        inside = lambda position: True
+
+    def accept(position, own):
+        return (
+            np.all(position >= low)
+            and np.all(position <= high)
+            and inside(position)
+            and not own.overlaps(position, radius)
+            and (occupied == None or not occupied.overlaps(position))
+        )
+
+    own = OverlapGrid(radius)
+
+    positions = []
+
+    active = []
+
+    ### initial positions: uniform draws in the box
+    for attempt in range(0, attempts):
+        position = low + (high - low) * rng.random(3)
+
+        if accept(position, own):
+            own.add(position, 0)
+
+            positions.append(position)
+
+            active.append(position)
+
+            break
+
+    while len(active) > 0:
+        index = int(rng.integers(len(active)))
+
+        centre = active[index]
+
+        ### candidates uniformly distributed in the spherical shell between radius and 2*radius around the active position
+        directions = rng.normal(size=(attempts, 3))
+
+        directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+        distances = radius * np.cbrt(1 + 7 * rng.random(attempts))
+
+        found = False
+
+        for candidate in centre + directions * distances[:, np.newaxis]:
+            if accept(candidate, own):
+                own.add(candidate, 0)
+
+                positions.append(candidate)
+
+                active.append(candidate)
+
+                found = True
+
+                break
+
+        if not found:
+            active[index] = active[-1]
+
+            active.pop()
+
+    if len(positions) == 0:
+        return np.zeros((0, 3))
+
+    positions = np.array(positions)
+
+    return positions[rng.permutation(len(positions))]
+
+
+##############################################################################################
+
+
+def points_in_polygon(points, vertices):
+    """Returns a boolean array which is True for the points of the (N, 2) array `points` inside the polygon with the (M, 2) array of
+    `vertices`, using the even-odd (ray crossing) rule vectorized over all points and sides
+    """
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+
+    x = points[:, 0][:, np.newaxis]
+
+    y = points[:, 1][:, np.newaxis]
+
+    x1 = vertices[:, 0]
+
+    y1 = vertices[:, 1]
+
+    x2 = np.roll(x1, 1)
+
+    y2 = np.roll(y1, 1)
+
+    ### sides crossed by the horizontal line through each point; horizontal sides are never crossed
+    crossed = (y1 > y) != (y2 > y)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_crossing = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+
+    crossings = np.count_nonzero(crossed & (x < x_crossing), axis=1)
+
+    return crossings % 2 == 1
+
+
+def sample_column_positions(rng, size, radius, low, high, vertices=None):
+    """Returns an (size, 3) array of positions [dim1, dim2, dim3] drawn uniformly from a column: a disk of `radius` centred on the origin
+    in (dim1, dim2), or the polygon with `vertices` (which is assumed to be inscribed in that disk) if given, and [`low`, `high`] along dim3.
+
+    Points are drawn directly in the disk; for polygonal columns the points outside the polygon are rejected in whole batches.
+    """
+
+    batches = []
+
+    count = 0
+
+    while count < size:
+        remaining = size - count
+
+        ### oversample, so that a regular polygon with few sides is usually filled in one batch
+        batch_size = remaining if vertices is None else int(1.5 * remaining) + 16
+
+        r = radius * np.sqrt(rng.random(batch_size))
+
+        theta = 2 * np.pi * rng.random(batch_size)
+
+        batch = np.empty((batch_size, 3))
+
+        batch[:, 0] = r * np.cos(theta)
+
+        batch[:, 1] = r * np.sin(theta)
+
+        batch[:, 2] = low + (high - low) * rng.random(batch_size)
+
+        if vertices is not None:
+            batch = batch[points_in_polygon(batch[:, :2], vertices)]
+
+        batches.append(batch[:remaining])
+
+        count += len(batches[-1])
+
+    if len(batches) == 0:
+        return np.zeros((0, 3))
+
+    return np.concatenate(batches)
@@ -0,0 +1,195 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Streaming writer of networks to NeuroML HDF5 files.
+
+Once a StreamingHdf5Writer has been opened for a network, the projections and input lists added to the network by the
+builders in opencortex.build and opencortex.core are written to the (chunked, compressed) HDF5 file as soon as they have
+been generated and their connections/inputs are then released from memory, so the peak memory use follows the largest
+single projection rather than the whole network. The file is completed (populations and the top level NeuroML elements
+are written) by close(), which is called by opencortex.core.save_network(format="hdf5").
+
+The files have the same layout as those written by neuroml.writers.NeuroMLHdf5Writer and can be read with
+neuroml.loaders.NeuroMLHdf5Loader.
+"""
+
+import io
+
+import neuroml
+from neuroml.writers import NeuroMLWriter
+
+from opencortex.build import containers
+
+### Open writers, by id() of the network: (network, writer)
+_writers = {}
+
+
+##############################################################################################
+
+
+class StreamingHdf5Writer(object):
+    """Writes the network `network` of the NeuroMLDocument `nml_doc` to the HDF5 file `file_name` incrementally.
+
+    Call write_pending() (or opencortex.build.streaming.flush()) to write the projections, electrical projections and input
+    lists of the network which have not been written yet; they stay in the network (e.g. so that they can be referred to
+    when generating LEMS files) but their connections/inputs are released if `release` is True. Call close() to finish the file.
+    """
+
+    def __init__(self, file_name, nml_doc, network, compress=True, release=True):
+        import tables
+
+        filters = (
+            tables.Filters(complib="zlib", complevel=5)
+            if compress
+            else tables.Filters()
+        )
+
+        self.file_name = file_name
+
+        self.nml_doc = nml_doc
+
+        self.network = network
+
+        self.release = release
+
+        self.h5file = tables.open_file(
+            file_name, mode="w", title=nml_doc.id, filters=filters
+        )
+
+        self.root_group = self.h5file.create_group("/", "neuroml", "Root NeuroML group")
+
+        self.net_group = self.h5file.create_group(self.root_group, "network")
+
+        self.written = set()
+
+        _writers[id(network)] = (network, self)
+
+    def _write_element(self, element):
+        if id(element) in self.written:
+            return
+
+        element.exportHdf5(self.h5file, self.net_group)
+
+        self.h5file.flush()
+
+        self.written.add(id(element))
+
+        if self.release:
+            _release(element)
+
+    def write_pending(self):
+        """Writes the projections, electrical projections and input lists of the network not yet written to the file"""
+
+        for element_list in [
+            self.network.projections,
+            self.network.electrical_projections,
+            self.network.continuous_projections,
+            self.network.input_lists,
+        ]:
+            for element in element_list:
+                self._write_element(element)
+
+    def close(self):
+        """Writes the remaining elements of the network, its populations and the top level NeuroML elements of the document
+        (embedded as XML, as done by neuroml.writers.NeuroMLHdf5Writer) and closes the file
+        """
+
+        if len(self.network.synaptic_connections) > 0:
+            raise Exception(
+                "Error! <synapticConnection> not yet supported in HDF5 export"
+            )
+
+        if len(self.network.explicit_inputs) > 0:
+            raise Exception("Error! <explicitInput> not yet supported in HDF5 export")
+
+        self.write_pending()
+
+        for population in self.network.populations:
+            population.exportHdf5(self.h5file, self.net_group)
+
+        self.net_group._f_setattr("id", self.network.id)
+        self.net_group._f_setattr("notes", self.network.notes)
+
+        if self.network.temperature:
+            self.net_group._f_setattr("temperature", self.network.temperature)
+
+        self.root_group._f_setattr("id", self.nml_doc.id)
+        self.root_group._f_setattr("notes", self.nml_doc.notes)
+        self.root_group._f_setattr(
+            "GENERATED_BY", "libNeuroML v%s" % (neuroml.__version__)
+        )
+
+        networks = self.nml_doc.networks
+
+        self.nml_doc.networks = []
+
+        try:
+            top_level = io.StringIO()
+
+            NeuroMLWriter.write(self.nml_doc, top_level, close=False)
+
+            self.root_group._f_setattr("neuroml_top_level", top_level.getvalue())
+
+        finally:
+            self.nml_doc.networks = networks
+
+        self.h5file.close()
+
+        _writers.pop(id(self.network), None)
+
+
+##############################################################################################
+
+
+def _release(element):
+    """Releases the connections/inputs of a projection or input list which has been written to file"""
+
+    for name in [
+        "connections",
+        "connection_wds",
+        "electrical_connections",
+        "electrical_connection_instances",
+        "electrical_connection_instance_ws",
+        "continuous_connections",
+        "continuous_connection_instances",
+        "continuous_connection_instance_ws",
+        "input",
+        "input_ws",
+    ]:
+        items = getattr(element, name, None)
+
+        if isinstance(items, (containers.ConnectionColumns, containers.InputColumns)):
+            items.clear()
+
+        elif isinstance(items, list):
+            del items[:]
+
+
+##############################################################################################
+
+
+def get_writer(network):
+    """Returns the StreamingHdf5Writer open for `network`, or None"""
+
+    if id(network) not in _writers:
+        return None
+
+    return _writers[id(network)][1]
+
+
+def flush(network):
+    """Writes the projections and input lists of `network` generated so far to its StreamingHdf5Writer, if one is open"""
+
+    writer = get_writer(network)
+
+    if writer != None:
+        writer.write_pending()
@@ -0,0 +1,336 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Tracing of network builds: per-stage wall times, counters (e.g. connections made, cells placed, bytes written) and, optionally,
+the memory allocated in each stage, as measured with tracemalloc.
+
+Tracing is disabled by default, in which case stage() returns a shared context manager which does nothing, count() returns
+immediately and the functions decorated with traced() are called directly, so builds pay (almost) nothing for it. After enable(),
+the builders of opencortex.core, opencortex.build and opencortex.utils report through this module and print_report() gives the
+breakdown of the build by stage, e.g.
+
+    import opencortex.build.tracing as oc_tracing
+
+    oc_tracing.enable(memory=True)
+    ... build and save the network ...
+    oc_tracing.print_report()
+
+Stages nest: a stage entered within another one is reported under the path 'outer/inner', and its time and memory are included
+in those of the outer stage. Only the stages of the current process are traced (not those run in the worker processes of
+opencortex.utils.build_connectivity(n_jobs=...)).
+"""
+
+import functools
+import time
+import tracemalloc
+
+enabled = False
+
+### Whether the memory allocated in each stage is measured with tracemalloc
+memory_enabled = False
+
+### Statistics by stage path: {'Calls': ..., 'Time': ..., 'Counters': {...}, 'Allocated': ..., 'Peak': ...}
+_stages = {}
+
+### Stages currently entered (innermost last)
+_stack = []
+
+### Whether tracemalloc was started by enable() (and so should be stopped by disable())
+_started_tracemalloc = False
+
+
+##############################################################################################
+
+
+def enable(memory=False):
+    """Enables tracing; if `memory` is True, the memory allocated in each stage is also measured (with tracemalloc, which slows down
+    the build considerably)"""
+
+    global enabled, memory_enabled, _started_tracemalloc
+
+    enabled = True
+
+    memory_enabled = memory
+
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+        _started_tracemalloc = True
+
+
+def disable():
+    """Disables tracing (the statistics gathered so far are kept until reset())"""
+
+    global enabled, memory_enabled, _started_tracemalloc
+
+    enabled = False
+
+    memory_enabled = False
+
+    if _started_tracemalloc:
+        tracemalloc.stop()
+
+        _started_tracemalloc = False
+
+
+def reset():
+    """Forgets the statistics gathered so far"""
+
+    _stages.clear()
+
+
+def _get_stage_stats(path):
+    if path not in _stages:
+        _stages[path] = {
+            "Calls": 0,
+            "Time": 0.0,
+            "Counters": {},
+            "Allocated": 0,
+            "Peak": 0,
+            "Order": len(_stages),
+        }
+
+    return _stages[path]
+
+
+##############################################################################################
+
+
+class _NullStage(object):
+    """Context manager returned by stage() when tracing is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+class _Stage(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.path = "%s/%s" % (_stack[-1].path, self.name) if _stack else self.name
+
+        self.stats = _get_stage_stats(self.path)
+
+        self.memory = memory_enabled and tracemalloc.is_tracing()
+
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+
+            ### the peak of the enclosing stage so far is kept before the peak is reset for this stage
+            if _stack:
+                _stack[-1].peak = max(_stack[-1].peak, peak)
+
+            tracemalloc.reset_peak()
+
+            self.start_memory = current
+
+            self.peak = current
+
+        _stack.append(self)
+
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+
+        _stack.pop()
+
+        stats = self.stats
+
+        stats["Calls"] += 1
+
+        stats["Time"] += elapsed
+
+        if self.memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+
+            self.peak = max(self.peak, peak)
+
+            stats["Allocated"] += current - self.start_memory
+
+            stats["Peak"] = max(stats["Peak"], self.peak - self.start_memory)
+
+            if _stack:
+                _stack[-1].peak = max(_stack[-1].peak, self.peak)
+
+        return False
+
+
+def stage(name):
+    """Returns a context manager which records the time (and memory) spent in it as the stage `name`"""
+
+    if not enabled:
+        return _null_stage
+
+    return _Stage(name)
+
+
+def count(counter, value=1):
+    """Adds `value` to the counter `counter` (e.g. 'connections', 'cells', 'inputs' or 'bytes written') of the current stage"""
+
+    if not enabled:
+        return
+
+    path = _stack[-1].path if _stack else ""
+
+    counters = _get_stage_stats(path)["Counters"]
+
+    counters[counter] = counters.get(counter, 0) + value
+
+
+def traced(name=None):
+    """Decorator which records each call of the function as the stage `name` (by default the name of the function)"""
+
+    def decorator(function):
+        stage_name = name if name != None else function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+
+            with _Stage(stage_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+##############################################################################################
+
+
+def get_report():
+    """Returns a copy of the statistics by stage path: {path: {'Calls': ..., 'Time': seconds, 'Counters': {...}, 'Allocated': bytes,
+    'Peak': bytes}}; counters made outside any stage are under the path ''"""
+
+    report = {}
+
+    for path, stats in _stages.items():
+        report[path] = dict(stats)
+
+        del report[path]["Order"]
+
+        report[path]["Counters"] = dict(stats["Counters"])
+
+    return report
+
+
+def get_totals():
+    """Returns the sums of the counters over all stages"""
+
+    totals = {}
+
+    for stats in _stages.values():
+        for counter, value in stats["Counters"].items():
+            totals[counter] = totals.get(counter, 0) + value
+
+    return totals
+
+
+def _format_bytes(num_bytes):
+    for unit in ["B", "kB", "MB"]:
+        if abs(num_bytes) < 1024:
+            return "%.1f %s" % (num_bytes, unit)
+
+        num_bytes /= 1024.0
+
+    return "%.1f GB" % num_bytes
+
+
+def _sort_key(path):
+    """Orders the stages as a tree: each stage after its enclosing stage, the stages at the same level in the order first entered"""
+
+    if path == "":
+        return ()
+
+    parts = path.split("/")
+
+    return tuple(
+        (
+            _stages["/".join(parts[: i + 1])]["Order"]
+            if "/".join(parts[: i + 1]) in _stages
+            else -1
+        )
+        for i in range(0, len(parts))
+    )
+
+
+def format_report():
+    """Returns the report of the stages as a table: calls, total time, counters with their rates per second and, if measured, the
+    memory allocated (and not freed) and the peak memory of each stage"""
+
+    lines = []
+
+    show_memory = any(stats["Peak"] > 0 for stats in _stages.values())
+
+    header = "%-60s %7s %10s" % ("Stage", "Calls", "Time (s)")
+
+    if show_memory:
+        header += " %12s %12s" % ("Allocated", "Peak")
+
+    lines.append(header + "  Counters")
+
+    for path in sorted(_stages.keys(), key=_sort_key):
+        stats = _stages[path]
+
+        line = "%-60s %7i %10.3f" % (
+            "  " * path.count("/") + (path.split("/")[-1] if path else "(no stage)"),
+            stats["Calls"],
+            stats["Time"],
+        )
+
+        if show_memory:
+            line += " %12s %12s" % (
+                _format_bytes(stats["Allocated"]),
+                _format_bytes(stats["Peak"]),
+            )
+
+        counters = []
+
+        for counter in sorted(stats["Counters"].keys()):
+            value = stats["Counters"][counter]
+
+            if stats["Time"] > 0:
+                counters.append(
+                    "%s: %i (%.0f/s)" % (counter, value, value / stats["Time"])
+                )
+            else:
+                counters.append("%s: %i" % (counter, value))
+
+        lines.append(line + "  " + ", ".join(counters))
+
+    totals = get_totals()
+
+    if len(totals) > 0:
+        lines.append(
+            "Totals: %s"
+            % ", ".join(
+                "%s: %i" % (counter, totals[counter])
+                for counter in sorted(totals.keys())
+            )
+        )
+
+    return "\n".join(lines)
+
+
+def print_report():
+    print(format_report())
@@ -23,14 +23,17 @@ import opencortex.build as oc_build
 import operator
 import os
 import pyneuroml
-from pyneuroml import pynml
-import pyneuroml.lems
-from pyneuroml.lems.LEMSSimulation import LEMSSimulation
 import random
 import shutil
 import sys
 
 
+def __getattr__(name):
+    """Imports the slow modules of pyNeuroML (e.g. pynml) when they are first used"""
+
+    return opencortex._get_lazy_attribute(__name__, name)
+
+
 def include_cell_prototype(nml_doc, cell_nml2_path):
     """
     Add a NeuroML2 file containing a cell definition
@@ -245,6 +248,7 @@ def add_spike_source_poisson(nml_doc, id, start, duration, rate):
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_single_cell_population(net, pop_id, cell_id, x=0, y=0, z=0, color=None):
     """
     Add a population with id `pop_id` containing a single instance of cell `cell_id`.
@@ -267,12 +271,15 @@ def add_single_cell_population(net, pop_id, cell_id, x=0, y=0, z=0, color=None):
     inst.location = neuroml.Location(x=x, y=y, z=z)
     pop.instances.append(inst)
 
+    oc_build.tracing.count("cells")
+
     return pop
 
 
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_population_in_rectangular_region(
     net,
     pop_id,
@@ -289,6 +296,7 @@ def add_population_in_rectangular_region(
     population_dictionary=None,
     cell_diameter_dict=None,
     color=None,
+    placement="random",
 ):
     """
     Method which creates a cell population in the NeuroML2 network and distributes these cells in the rectangular region. Input arguments are:
@@ -338,6 +346,10 @@ def add_population_in_rectangular_region(
     `color`
         optional color (which will be put through to annotation in generated NeuroML); RGB format, 3 floats 0->1, e.g. 1 0 0 for red; default is None
 
+    `placement`
+        'random' (default) draws the position of each cell uniformly in the region; 'poisson_disk' places the cells with Poisson-disk sampling so that their somata are at least
+        the soma diameter of cell_id apart and do not overlap the cells in population_dictionary; cell_diameter_dict must be specified for 'poisson_disk'
+
     """
 
     return oc_build._add_population_in_rectangular_region(
@@ -356,12 +368,14 @@ def add_population_in_rectangular_region(
         population_dictionary,
         cell_diameter_dict,
         color,
+        placement,
     )
 
 
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_probabilistic_projection(
     net,
     prefix,
@@ -404,44 +418,133 @@ def add_probabilistic_projection(
     if presynaptic_population.size == 0 or postsynaptic_population.size == 0:
         return None
 
-    proj = neuroml.Projection(
+    proj = oc_build.containers.ColumnarProjection(
         id="%s_%s_%s" % (prefix, presynaptic_population.id, postsynaptic_population.id),
         presynaptic_population=presynaptic_population.id,
         postsynaptic_population=postsynaptic_population.id,
         synapse=synapse_id,
+        pre_cell_format=oc_build.containers.cell_id_format(presynaptic_population),
+        post_cell_format=oc_build.containers.cell_id_format(postsynaptic_population),
     )
 
     count = 0
 
-    for i in range(0, presynaptic_population.size):
-        for j in range(0, postsynaptic_population.size):
-            if i != j or presynaptic_population.id != postsynaptic_population.id:
-                if (
-                    connection_probability >= 1
-                    or random.random() < connection_probability
-                ):
-                    oc_build._add_connection(
-                        proj,
-                        count,
-                        presynaptic_population,
-                        i,
-                        0,
-                        postsynaptic_population,
-                        j,
-                        0,
-                        delay=delay,
-                        weight=weight,
-                    )
-                    count += 1
+    for rng, pre_ids, post_ids, kept in oc_build._get_connected_pairs(
+        net,
+        proj.id,
+        presynaptic_population,
+        postsynaptic_population,
+        connection_probability,
+        oc_build.get_element_rng(net, proj.id),
+    ):
+        pre_ids = pre_ids[kept]
+
+        proj.connection_wds.add(
+            np.arange(count, count + len(pre_ids)),
+            pre_ids,
+            post_ids[kept],
+            weights=weight,
+            delays=delay,
+        )
+
+        count += len(pre_ids)
 
     net.projections.append(proj)
 
+    oc_build.streaming.flush(net)
+
     return proj
 
 
 ##############################################################################################
 
 
+def add_projection_from_sparse(
+    net,
+    prefix,
+    presynaptic_population,
+    postsynaptic_population,
+    synapse_id,
+    weights,
+    delays=0,
+):
+    """
+    Add a projection between `presynaptic_population` and `postsynaptic_population` with a connection from presynaptic cell i to postsynaptic cell j for each stored entry (i, j) of the sparse matrix `weights`. Attributes:
+
+    `net`
+        reference to the network object previously created
+
+    `prefix`
+        prefix to use in the id of the projection
+
+    `presynaptic_population`
+        presynaptic population e.g. added via add_population_in_rectangular_region()
+
+    `postsynaptic_population`
+        postsynaptic population e.g. added via add_population_in_rectangular_region()
+
+    `synapse_id`
+        id of synapse previously added, e.g. added with add_exp_two_syn()
+
+    `weights`
+        scipy.sparse matrix (or dense array, whose nonzero entries are used) with presynaptic_population.size rows and postsynaptic_population.size columns,
+        whose entries are the weights of the connections, e.g. from opencortex.build.sparse.to_sparse() after pruning or rewiring a projection
+
+    `delays`
+        optional delay for each connection: a single value, an array with a value per stored entry of `weights` or a matrix of the same shape, default 0 ms
+
+    """
+
+    if presynaptic_population.size == 0 or postsynaptic_population.size == 0:
+        return None
+
+    proj = oc_build.containers.ColumnarProjection(
+        id="%s_%s_%s" % (prefix, presynaptic_population.id, postsynaptic_population.id),
+        presynaptic_population=presynaptic_population.id,
+        postsynaptic_population=postsynaptic_population.id,
+        synapse=synapse_id,
+        pre_cell_format=oc_build.containers.cell_id_format(presynaptic_population),
+        post_cell_format=oc_build.containers.cell_id_format(postsynaptic_population),
+    )
+
+    pre_ids, post_ids, weight_values, delay_values = oc_build.sparse.from_sparse(
+        weights,
+        delays,
+        shape=(presynaptic_population.size, postsynaptic_population.size),
+    )
+
+    owned = oc_build.partition.get_owned_cells(net, postsynaptic_population)
+
+    if owned is not None:
+        kept = np.isin(post_ids, owned)
+
+        pre_ids = pre_ids[kept]
+
+        post_ids = post_ids[kept]
+
+        weight_values = weight_values[kept]
+
+        delay_values = delay_values[kept]
+
+    proj.connection_wds.add(
+        np.arange(len(pre_ids)),
+        pre_ids,
+        post_ids,
+        weights=weight_values,
+        delays=delay_values,
+    )
+
+    net.projections.append(proj)
+
+    oc_build.streaming.flush(net)
+
+    return proj
+
+
+##############################################################################################
+
+
+@oc_build.tracing.traced()
 def add_targeted_projection(
     net,
     prefix,
@@ -559,7 +662,7 @@ def add_targeted_projection(
             )
         )
 
-        proj = neuroml.Projection(
+        proj = oc_build.containers.ColumnarProjection(
             id=proj_id,
             presynaptic_population=presynaptic_population.id,
             postsynaptic_population=postsynaptic_population.id,
@@ -592,6 +695,7 @@ def add_targeted_projection(
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_targeted_electrical_projection(
     nml_doc,
     net,
@@ -641,7 +745,7 @@ def add_targeted_electrical_projection(
             % (proj_id, pre_cell.id, pre_segs, post_cell.id, post_segs)
         )
 
-        proj = neuroml.ElectricalProjection(
+        proj = oc_build.containers.ColumnarElectricalProjection(
             id=proj_id,
             presynaptic_population=presynaptic_population.id,
             postsynaptic_population=postsynaptic_population.id,
@@ -671,6 +775,7 @@ def add_targeted_electrical_projection(
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_inputs_to_population(
     net,
     id,
@@ -755,63 +860,57 @@ def add_inputs_to_population(
             return
         cell_ids = only_cells
 
-    input_list = neuroml.InputList(
-        id=id, component=input_comp_id, populations=population.id
+    cell_ids = np.asarray(cell_ids, dtype=np.int64).reshape(-1)
+
+    input_list = oc_build.containers.ColumnarInputList(
+        id=id,
+        component=input_comp_id,
+        populations=population.id,
+        target_format=oc_build.containers.cell_id_format(population),
     )
-    count = 0
-    for cell_id in cell_ids:
-        for i in range(number_per_cell):
-            segment_id = -1
-            if len(segment_ids) == 1:
-                segment_id = segment_ids[0]
-            else:
-                segment_id = segment_ids[i]
-
-            fraction_along = -1
-            if len(fraction_alongs) == 1:
-                fraction_along = fraction_alongs[0]
-            else:
-                fraction_along = fraction_alongs[i]
-
-            if fraction_along < 0 or fraction_along > 1:
-                error = "Error! Attribute fraction_along should be >=0 and <=1"
-                opencortex.print_comment_v(error)
-                raise Exception(error)
-
-            if weights == 1:
-                input = neuroml.Input(
-                    id=count,
-                    target="../%s/%i/%s"
-                    % (population.id, cell_id, population.component),
-                    segment_id=segment_id,
-                    fraction_along=fraction_along,
-                    destination="synapses",
-                )
-                input_list.input.append(input)
-            else:
-                input = neuroml.InputW(
-                    id=count,
-                    target="../%s/%i/%s"
-                    % (population.id, cell_id, population.component),
-                    segment_id=segment_id,
-                    fraction_along=fraction_along,
-                    destination="synapses",
-                    weight=oc_build._evaluate_expression(weights),
-                )
-
-                input_list.input_ws.append(input)
-
-            count += 1
+
+    count = len(cell_ids) * number_per_cell
 
     if count > 0:
+        if min(fraction_alongs) < 0 or max(fraction_alongs) > 1:
+            error = "Error! Attribute fraction_along should be >=0 and <=1"
+            opencortex.print_comment_v(error)
+            raise Exception(error)
+
+        ######### the inputs of each cell are consecutive; all cells have the same segment ids and fractions along
+
+        target_cell_ids = np.repeat(cell_ids, number_per_cell)
+
+        segment_id_array = np.tile(segment_ids, count // len(segment_ids))
+
+        fraction_array = np.tile(fraction_alongs, count // len(fraction_alongs))
+
+        if weights == 1:
+            input_list.input.add(
+                np.arange(count), target_cell_ids, segment_id_array, fraction_array
+            )
+        else:
+            input_list.input_ws.add(
+                np.arange(count),
+                target_cell_ids,
+                segment_id_array,
+                fraction_array,
+                oc_build._evaluate_expression_array(
+                    weights, count, oc_build.get_element_rng(net, id)
+                ),
+            )
+
         net.input_lists.append(input_list)
 
+        oc_build.streaming.flush(net)
+
     return input_list
 
 
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_targeted_inputs_to_population(
     net,
     id,
@@ -884,43 +983,43 @@ def add_targeted_inputs_to_population(
             return
         cell_ids = only_cells
 
-    input_list = neuroml.InputList(
-        id=id, component=input_comp_id, populations=population.id
+    cell_ids = np.asarray(cell_ids, dtype=np.int64).reshape(-1)
+
+    input_list = oc_build.containers.ColumnarInputList(
+        id=id,
+        component=input_comp_id,
+        populations=population.id,
+        target_format=oc_build.containers.cell_id_format(population),
     )
-    count = 0
-    for cell_id in cell_ids:
-        target_seg_array, target_fractions = oc_build.get_target_segments(
-            seg_target_dict, subset_dict
-        )
 
-        for i in range(number_per_cell):
-            if weights == 1:
-                input = neuroml.Input(
-                    id=count,
-                    target="../%s/%i/%s"
-                    % (population.id, cell_id, population.component),
-                    segment_id=target_seg_array[i],
-                    fraction_along=target_fractions[i],
-                    destination="synapses",
-                )
-                input_list.input.append(input)
-            else:
-                input = neuroml.InputW(
-                    id=count,
-                    target="../%s/%i/%s"
-                    % (population.id, cell_id, population.component),
-                    segment_id=target_seg_array[i],
-                    fraction_along=target_fractions[i],
-                    destination="synapses",
-                    weight=oc_build._evaluate_expression(weights),
-                )
-                input_list.input_ws.append(input)
-
-            count += 1
+    rng = oc_build.get_element_rng(net, id)
+
+    target_segs, target_fractions, counts = oc_build.sampling.SegmentSampler(
+        seg_target_dict
+    ).sample_flat(rng, [subset_dict] * len(cell_ids))
+
+    count = len(target_segs)
 
     if count > 0:
+        target_cell_ids = np.repeat(cell_ids, counts)
+
+        if weights == 1:
+            input_list.input.add(
+                np.arange(count), target_cell_ids, target_segs, target_fractions
+            )
+        else:
+            input_list.input_ws.add(
+                np.arange(count),
+                target_cell_ids,
+                target_segs,
+                target_fractions,
+                oc_build._evaluate_expression_array(weights, count, rng),
+            )
+
         net.input_lists.append(input_list)
 
+        oc_build.streaming.flush(net)
+
     return input_list
 
 
@@ -935,13 +1034,17 @@ def generate_network(reference, network_seed=1234, temperature="32degC"):
         the reference to use as the id for the network
 
     `network_seed`
-        optional, will be used for random elements of the network, e.g. placement of cells in 3D
+        optional, will be used for random elements of the network, e.g. placement of cells in 3D. Each population, projection and input list
+        is built with random numbers derived from this seed and its id only (see opencortex.build.get_element_rng()), so it does not change
+        when other elements are added, removed or reordered
 
     `temperature`
         optional, will be specified in network and used in temperature dependent elements, e.g. ion channels with Q10. Default: 32degC
 
     """
 
+    opencortex.print_notice()
+
     del oc_build.all_included_files[:]
     oc_build.all_cells.clear()
 
@@ -959,6 +1062,8 @@ def generate_network(reference, network_seed=1234, temperature="32degC"):
     network.type = "networkWithTemperature"
     network.temperature = temperature
 
+    oc_build.set_network_seed(network, network_seed)
+
     nml_doc.networks.append(network)
 
     opencortex.print_comment_v(
@@ -971,6 +1076,32 @@ def generate_network(reference, network_seed=1234, temperature="32degC"):
 ##############################################################################################
 
 
+def stream_network_to_hdf5(
+    nml_doc, network, nml_file_name, target_dir="./", compress=True
+):
+    """
+    Start writing the network to the HDF5 file `nml_file_name` (in `target_dir`) while it is being built: each projection
+    or input list added to the network by the functions in opencortex.core and opencortex.build is written to the file as
+    soon as it is generated and its connections/inputs are then released from memory, so that the memory needed follows the
+    largest single projection rather than the whole network. Call save_network() with the same file name and target_dir and
+    format="hdf5" to complete the file. Returns the opencortex.build.streaming.StreamingHdf5Writer.
+    """
+
+    abs_path = os.path.abspath(target_dir + "/" + nml_file_name)
+
+    opencortex.print_comment_v(
+        "Streaming the network %s to the HDF5 file: %s" % (network.id, abs_path)
+    )
+
+    return oc_build.streaming.StreamingHdf5Writer(
+        abs_path, nml_doc, network, compress=compress
+    )
+
+
+##############################################################################################
+
+
+@oc_build.tracing.traced()
 def save_network(
     nml_doc,
     nml_file_name,
@@ -984,6 +1115,22 @@ def save_network(
     Save the contents of the built NeuroML document, including the network to the file specified by `nml_file_name`, optionally specifying the `target_dir`
     """
 
+    stream_writers = [
+        oc_build.streaming.get_writer(network)
+        for network in nml_doc.networks
+        if oc_build.streaming.get_writer(network) != None
+    ]
+
+    ######### the connections written by a streaming writer have been released, so the network can only be completed in its HDF5 file
+    if format != "hdf5" and len(stream_writers) > 0:
+        for writer in stream_writers:
+            writer.close()
+
+        raise Exception(
+            "Error! The network is being streamed to %s and cannot be saved in the %s format; the HDF5 file has been completed instead"
+            % (", ".join(writer.file_name for writer in stream_writers), format)
+        )
+
     oc_build._finalise_copy_to_dir_for_model(
         nml_doc, target_dir, use_subfolder=use_subfolder
     )
@@ -1005,7 +1152,18 @@ def save_network(
     if format == "xml":
         writers.NeuroMLWriter.write(nml_doc, abs_path)
     elif format == "hdf5":
-        writers.NeuroMLHdf5Writer.write(nml_doc, abs_path)
+        if len(stream_writers) > 0:
+            for writer in stream_writers:
+                if os.path.abspath(writer.file_name) != abs_path:
+                    raise Exception(
+                        "Error! The network is being streamed to %s, not to %s"
+                        % (writer.file_name, abs_path)
+                    )
+
+                writer.close()
+
+        else:
+            writers.NeuroMLHdf5Writer.write(nml_doc, abs_path)
 
     opencortex.print_comment_v(
         "Saved NeuroML with id: %s to file: %s" % (nml_doc.id, abs_path)
@@ -1013,6 +1171,8 @@ def save_network(
     if not os.path.isfile(abs_path):
         raise Exception("Problem creating file: %s" % (abs_path))
 
+    oc_build.tracing.count("bytes written", os.path.getsize(abs_path))
+
     if validate:
         from pyneuroml.pynml import validate_neuroml2
 
@@ -1058,6 +1218,8 @@ def generate_lems_simulation(
     jNeuroML (or converted to simulator specific formats, e.g. NEURON, and run)
     """
 
+    import pyneuroml.lems
+
     if not lems_file_name:
         lems_file_name = "LEMS_%s.xml" % network.id
 
@@ -1113,6 +1275,8 @@ def simulate_network(
     Run a simulation of the LEMS file `lems_file_name` using target platform `simulator`
     """
 
+    from pyneuroml import pynml
+
     if simulator == "jNeuroML":
         results = pynml.run_lems_with_jneuroml(
             lems_file_name,
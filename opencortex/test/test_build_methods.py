@@ -5362,3 +5362,130 @@ class TestNetConnectionMethods(unittest.TestCase):
                         and connection.get_delay_in_ms() > 0
                         and connection.get_delay_in_ms() < 2
                     )
+
+    #########################################################################
+    def test_add_advanced_inputs_to_population(self):
+        random.seed(1234)
+
+        network = neuroml.Network(id="Net0")
+
+        population = neuroml.Population(
+            id="Pop0", component="L23PyrRS", type="populationList", size=6
+        )
+
+        seg_length_dict = {
+            "dendrite_group": {"SegList": [1, 2, 3], "LengthDist": [10, 30, 40]}
+        }
+
+        ######## Test 1 one list of input components shared by all cells; cell 2 has a weight
+
+        input_list_array = oc_build.add_advanced_inputs_to_population(
+            network,
+            "Input0",
+            population,
+            [["pg0", "pg1"]],
+            seg_length_dict,
+            {"dendrite_group": 3},
+            None,
+            None,
+            all_cells=True,
+            weight_dict={2: 1.5},
+        )
+
+        self.assertEqual(len(network.input_lists), 2)
+
+        for input_list in input_list_array[0]:
+            self.assertEqual(len(input_list.input), 15)
+
+            self.assertEqual(len(input_list.input_ws), 3)
+
+            inputs = sorted(
+                list(input_list.input) + list(input_list.input_ws),
+                key=lambda input: input.id,
+            )
+
+            self.assertEqual([input.id for input in inputs], list(range(18)))
+
+            for index, input in enumerate(inputs):
+                self.assertEqual(input.target, "../Pop0/%i/L23PyrRS" % (index // 3))
+
+                self.assertTrue(int(input.segment_id) in [1, 2, 3])
+
+                self.assertTrue(0 <= float(input.fraction_along) <= 1)
+
+            for input in input_list.input_ws:
+                self.assertEqual(input.get_target_cell_id(), 2)
+
+                self.assertEqual(input.weight, 1.5)
+
+        ### all of the input components are mapped on the same points
+
+        self.assertEqual(
+            [input.segment_id for input in input_list_array[0][0].input],
+            [input.segment_id for input in input_list_array[0][1].input],
+        )
+
+        ######## Test 2 a list of input components per cell, inputs without a location
+
+        network.input_lists = []
+
+        input_list_array = oc_build.add_advanced_inputs_to_population(
+            network,
+            "Input1",
+            population,
+            [["pg0"], ["pg1"]],
+            None,
+            {None: 2},
+            None,
+            None,
+            only_cells=[4, 5],
+        )
+
+        self.assertEqual(len(network.input_lists), 2)
+
+        for cell_index, cell_id in enumerate([4, 5]):
+            inputs = list(input_list_array[cell_index][0].input)
+
+            self.assertEqual([input.id for input in inputs], [0, 1])
+
+            for input in inputs:
+                self.assertEqual(input.target, "../Pop0/%i/L23PyrRS" % cell_id)
+
+                self.assertEqual(input.segment_id, None)
+
+                self.assertEqual(input.fraction_along, None)
+
+        ######## Test 3 projection based inputs on a single segment
+
+        spike_source_pops = oc_build.add_projection_based_inputs(
+            network,
+            "Input2",
+            population,
+            [["ss0"]],
+            [[2]],
+            "AMPA",
+            None,
+            None,
+            3,
+            0.25,
+            all_cells=True,
+        )
+
+        self.assertEqual(spike_source_pops[0][0].id, "Pop_Input2_0_0")
+
+        projection = network.projections[0]
+
+        self.assertEqual(len(projection.connection_wds), 6)
+
+        for index, connection in enumerate(projection.connection_wds):
+            self.assertEqual(connection.pre_cell_id, "../Pop_Input2_0_0[%i]" % index)
+
+            self.assertEqual(connection.post_cell_id, "../Pop0/%i/L23PyrRS" % index)
+
+            self.assertEqual(connection.post_segment_id, 3)
+
+            self.assertEqual(connection.post_fraction_along, 0.25)
+
+            self.assertEqual(connection.weight, 2)
+
+            self.assertEqual(connection.delay, "0 ms")
@@ -0,0 +1,185 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.utils as oc_utils
+import opencortex.utils.build_plan as oc_build_plan
+
+import io
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+def _make_plan(weight):
+    plan = oc_build_plan.BuildPlan("Net0", network_seed=5)
+
+    popDict = {}
+    popDict["CG3D_L23PyrRS"] = (100, "L23", "Test", "single", None)
+    popDict["CG3D_L23PyrFRB"] = (20, "L23", "Test2", "single", None)
+
+    pops = plan.add_stage(
+        "populations",
+        oc_utils.add_populations_in_rectangular_layers,
+        args=(oc_build_plan.NETWORK, {"L23": [0, -500]}, popDict, [0, 500], [0, 500]),
+    )
+
+    plan.add_probability_based_connectivity(
+        "conns",
+        pops,
+        popDict.keys(),
+        probability_matrix=[[0.1, 0.5], [0.9, 0.0]],
+        synapse_matrix=[[["Syn1"], ["Syn1", "Syn2"]], [["Syn1", "Syn2"], None]],
+        weight_matrix=[[1.0, weight], [1.0, None]],
+        delay_matrix=[[0.05, 0.05], [0.05, 0.05]],
+        tags_on_populations=["L23PyrRS", "L23PyrFRB"],
+    )
+
+    plan.add_stage(
+        "pulse_generator",
+        oc.add_pulse_generator,
+        args=(oc_build_plan.DOCUMENT,),
+        kwargs={"id": "pg0", "delay": "10ms", "duration": "50ms", "amplitude": "0.2nA"},
+    )
+
+    plan.add_stage(
+        "inputs",
+        oc.add_inputs_to_population,
+        args=(oc_build_plan.NETWORK, "Input0", pops["CG3D_L23PyrRS"]["PopObj"], "pg0"),
+        kwargs={"all_cells": True, "weights": "random()"},
+        after=["pulse_generator"],
+    )
+
+    return plan
+
+
+def _to_xml(nml_doc):
+    xml = io.StringIO()
+
+    nml_doc.export(xml, 0)
+
+    return xml.getvalue()
+
+
+class TestBuildPlanMethods(unittest.TestCase):
+    #########################################################################
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+        self.previous_cache_dir = oc_build_plan.get_cache_dir()
+
+        oc_build_plan.set_cache_dir(self.cache_dir)
+
+        oc_build_plan.clear_memory_cache()
+
+    def tearDown(self):
+        oc_build_plan.set_cache_dir(self.previous_cache_dir)
+
+        oc_build_plan.clear_memory_cache()
+
+        shutil.rmtree(self.cache_dir)
+
+    #########################################################################
+    def test_incremental_build(self):
+        plan = _make_plan(2.0)
+
+        nml_doc, network = plan.build()
+
+        self.assertEqual(len(plan.executed_stages), 6)
+
+        self.assertEqual(plan.cached_stages, [])
+
+        self.assertEqual(len(network.projections), 5)
+
+        self.assertEqual(len(network.input_lists), 1)
+
+        xml = _to_xml(nml_doc)
+
+        ### a new plan with the same stages is loaded from the cache on disk
+
+        oc_build_plan.clear_memory_cache()
+
+        plan = _make_plan(2.0)
+
+        nml_doc, network = plan.build()
+
+        self.assertEqual(plan.executed_stages, [])
+
+        self.assertEqual(_to_xml(nml_doc), xml)
+
+        self.assertTrue(
+            network.get_by_id("Input0").populations
+            == network.get_by_id("CG3D_L23PyrRS").id
+        )
+
+        ### changing one entry of the weight matrix only rebuilds one projection
+
+        plan = _make_plan(4.0)
+
+        nml_doc, network = plan.build()
+
+        self.assertEqual(plan.executed_stages, ["conns_CG3D_L23PyrFRB_CG3D_L23PyrRS"])
+
+        for projection in network.projections:
+            if projection.presynaptic_population == "CG3D_L23PyrFRB":
+                for connection in projection.connection_wds:
+                    self.assertEqual(connection.weight, 4.0)
+
+        xml = _to_xml(nml_doc)
+
+        ### the network is the same as one built without the cache
+
+        oc_build_plan.set_cache_dir(None)
+
+        oc_build_plan.clear_memory_cache()
+
+        plan = _make_plan(4.0)
+
+        nml_doc, network = plan.build()
+
+        self.assertEqual(len(plan.executed_stages), 6)
+
+        self.assertEqual(_to_xml(nml_doc), xml)
+
+    #########################################################################
+    def test_stage_hashes(self):
+        plan = _make_plan(2.0)
+
+        hashes = plan.get_stage_hashes()
+
+        self.assertEqual(hashes, _make_plan(2.0).get_stage_hashes())
+
+        changed = _make_plan(3.0).get_stage_hashes()
+
+        self.assertNotEqual(
+            hashes["conns_CG3D_L23PyrFRB_CG3D_L23PyrRS"],
+            changed["conns_CG3D_L23PyrFRB_CG3D_L23PyrRS"],
+        )
+
+        self.assertEqual(hashes["populations"], changed["populations"])
+
+        self.assertEqual(hashes["inputs"], changed["inputs"])
+
+        ### stages can only use the outputs of earlier stages
+
+        self.assertRaises(
+            Exception,
+            plan.add_stage,
+            "later",
+            oc.add_inputs_to_population,
+            args=(
+                oc_build_plan.NETWORK,
+                "Input1",
+                oc_build_plan.StageOutput("missing"),
+                "pg0",
+            ),
+        )
+
+        self.assertRaises(
+            Exception, plan.add_stage, "populations", oc.add_pulse_generator
+        )
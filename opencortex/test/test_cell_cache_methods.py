@@ -0,0 +1,146 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.build as oc_build
+import opencortex.build.cell_cache as oc_cell_cache
+import opencortex.utils as oc_utils
+from pyneuroml import pynml
+
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestCellCacheMethods(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+        self.cell_dir = os.path.join(self.temp_dir, "cells")
+
+        source_dir = os.path.join(
+            os.path.dirname(__file__), "..", "..", "NeuroML2", "prototypes", "acnet2"
+        )
+
+        shutil.copytree(source_dir, self.cell_dir)
+
+        self.cell_file = os.path.join(self.cell_dir, "pyr_4_sym.cell.nml")
+
+        self.previous_cache_dir = oc_cell_cache.get_cache_dir()
+
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+
+        oc_cell_cache.set_cache_dir(self.cache_dir)
+
+        oc_cell_cache.clear_memory_cache()
+
+    def tearDown(self):
+        oc_cell_cache.set_cache_dir(self.previous_cache_dir)
+
+        oc_cell_cache.clear_memory_cache()
+
+        shutil.rmtree(self.temp_dir)
+
+    #########################################################################
+    def test_load_cell_document(self):
+        parsed = pynml.read_neuroml2_file(self.cell_file, include_includes=True)
+
+        document = oc_cell_cache.load_cell_document(
+            self.cell_file, include_includes=True
+        )
+
+        self.assertEqual(len(os.listdir(self.cache_dir)), 8)
+
+        self.assertTrue(
+            document is oc_cell_cache.load_cell_document(self.cell_file, True)
+        )
+
+        self.assertFalse(
+            document
+            is oc_cell_cache.load_cell_document(self.cell_file, True, copy=True)
+        )
+
+        ### a new process would only read the pickled documents
+        oc_cell_cache.clear_memory_cache()
+
+        cached = oc_cell_cache.load_cell_document(self.cell_file, include_includes=True)
+
+        self.assertEqual(len(os.listdir(self.cache_dir)), 8)
+
+        self.assertEqual(cached.cells[0].id, parsed.cells[0].id)
+
+        self.assertEqual(
+            len(cached.cells[0].morphology.segments),
+            len(parsed.cells[0].morphology.segments),
+        )
+
+        self.assertEqual(
+            sorted(channel.id for channel in cached.ion_channel),
+            sorted(channel.id for channel in parsed.ion_channel),
+        )
+
+        ### changing an included file invalidates the document read with its includes
+        channel_file = os.path.join(self.cell_dir, "Kdr_pyr.channel.nml")
+
+        with open(channel_file) as f:
+            channel = f.read()
+
+        with open(channel_file, "w") as f:
+            f.write(channel.replace('id="Kdr_pyr"', 'id="Kdr_pyr_modified"'))
+
+        oc_cell_cache.clear_memory_cache()
+
+        cached = oc_cell_cache.load_cell_document(self.cell_file, include_includes=True)
+
+        self.assertTrue(
+            "Kdr_pyr_modified" in [channel.id for channel in cached.ion_channel]
+        )
+
+    #########################################################################
+    def test_derived_data(self):
+        document = pynml.read_neuroml2_file(self.cell_file)
+
+        segment_groups = oc_utils.get_segment_groups("pyr_4_sym", self.cell_dir)
+
+        self.assertEqual(
+            segment_groups,
+            [
+                segment_group.id
+                for segment_group in document.cells[0].morphology.segment_groups
+            ],
+        )
+
+        soma = document.cells[0].morphology.segments[0]
+
+        self.assertEqual(
+            oc_build.get_soma_diameter("pyr_4_sym", dir_to_cell=self.cell_dir),
+            max(soma.proximal.diameter, soma.distal.diameter),
+        )
+
+        target_segments = oc_build.extract_seg_ids(
+            cell_object=document.cells[0],
+            target_compartment_array=["dendrite_group"],
+            targeting_mode="segGroups",
+        )
+
+        expected = oc_build.make_target_dict(
+            cell_object=document.cells[0], target_segs=target_segments
+        )
+
+        for attempt in range(0, 2):
+            oc_cell_cache.clear_memory_cache()
+
+            seg_length_dict, cached_dicts = oc_utils.check_cached_dicts(
+                "pyr_4_sym", {}, ["dendrite_group"], path_to_nml2=self.cell_dir
+            )
+
+            self.assertEqual(seg_length_dict, expected)
+
+        entry = list(oc_cell_cache._entries.values())[0]
+
+        self.assertTrue(("TargetDict", ("dendrite_group",)) in entry["Derived"])
@@ -0,0 +1,102 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.utils as oc_utils
+import opencortex.utils.connectivity as oc_connectivity
+
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestConnectivityMethods(unittest.TestCase):
+    #########################################################################
+    def test_read_connectivity_table(self):
+        table = oc_connectivity.ConnectivityTable.from_txt("ConnListTest")
+
+        self.assertTrue(len(table) > 0)
+
+        self.assertTrue(
+            oc_connectivity.get_connectivity_table("ConnListTest")
+            is oc_connectivity.get_connectivity_table("ConnListTest")
+        )
+
+        for pre_pop, post_pop in table.pairs():
+            proj_summary = table.get(pre_pop, post_pop, exact=True)
+
+            self.assertTrue(len(proj_summary) > 0)
+
+            self.assertEqual(
+                proj_summary,
+                oc_utils.read_connectivity(pre_pop, post_pop, "ConnListTest"),
+            )
+
+            for proj_info in proj_summary:
+                self.assertTrue(proj_info["Type"] in ["Chem", "Elect"])
+
+                self.assertTrue("NumPerPostCell" in proj_info)
+
+                self.assertFalse(proj_info["LocOnPostCell"].endswith("\n"))
+
+        proj_summary = table.get("L23PyrRS", "L23PyrFRB")
+
+        self.assertEqual(
+            len(proj_summary), len(table.get("CG3D_L23PyrRS", "CG3D_L23PyrFRB"))
+        )
+
+        self.assertEqual(proj_summary[0]["PreCellGroup"], "L23PyrRS")
+
+        synapses = table.get("CG3D_L23PyrRS", "CG3D_L23PyrFRB")[0]["SynapseList"]
+
+        ignoring = oc_connectivity.ConnectivityTable.from_txt(
+            "ConnListTest", ignore_synapses=synapses[:1]
+        )
+
+        self.assertEqual(
+            ignoring.get("CG3D_L23PyrRS", "CG3D_L23PyrFRB")[0]["SynapseList"],
+            synapses[1:],
+        )
+
+        self.assertEqual(table.get("CG3D_L23PyrRS", "CG3D_Unknown"), [])
+
+    #########################################################################
+    def test_read_csv_summary(self):
+        temp_dir = tempfile.mkdtemp()
+
+        try:
+            csv_file = os.path.join(temp_dir, "summary.csv")
+
+            with open(csv_file, "w") as f:
+                f.write("# connectivity of a test network\n")
+                f.write(
+                    "PreCellGroup,PostCellGroup,SynapseList,NumPerPostCell,LocOnPostCell\n"
+                )
+                f.write("Pop0,Pop1,[AMPA;NMDA],2.5,dendrite_group\n")
+                f.write("Pop1,Pop1,Syn_Elect_Pop1,0.5,soma_group\n")
+                f.write("Pop0,Pop1,GABAA,1,soma_group\n")
+
+            table = oc_connectivity.ConnectivityTable.read(csv_file, ["NMDA"])
+
+            self.assertEqual(table.pairs(), [("Pop0", "Pop1"), ("Pop1", "Pop1")])
+
+            proj_summary = table.get("Pop0", "Pop1")
+
+            self.assertEqual(
+                [proj_info["SynapseList"] for proj_info in proj_summary],
+                [["AMPA"], ["GABAA"]],
+            )
+
+            self.assertEqual(proj_summary[0]["NumPerPostCell"], "2.5")
+
+            self.assertEqual(proj_summary[0]["Type"], "Chem")
+
+            self.assertEqual(table.get("Pop1", "Pop1")[0]["Type"], "Elect")
+
+        finally:
+            shutil.rmtree(temp_dir)
@@ -0,0 +1,310 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.build as oc_build
+import opencortex.build.containers as oc_containers
+import neuroml
+import numpy as np
+
+import os
+import pickle
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestContainersMethods(unittest.TestCase):
+    #########################################################################
+    def test_columnar_projection(self):
+        pop_pre = neuroml.Population(id="Pop0", component="L23PyrRS", size=4)
+
+        pop_post = neuroml.Population(id="Pop1", component="L23PyrFRB", size=4)
+
+        proj = oc_containers.ColumnarProjection(
+            id="Proj0",
+            presynaptic_population=pop_pre.id,
+            postsynaptic_population=pop_post.id,
+            synapse="AMPA",
+        )
+
+        self.assertTrue(proj.connection_wds == [])
+
+        for conn_id in range(0, 3):
+            oc_build._add_connection(
+                proj, conn_id, pop_pre, conn_id, 2, pop_post, conn_id + 1, 5, 1.5, 2
+            )
+
+        proj.connection_wds.add([3, 4], [3, 3], [0, 1], weights=[3, 4], delays=2)
+
+        self.assertEqual(len(proj.connection_wds), 5)
+
+        self.assertTrue(proj.connection_wds != [])
+
+        connection = proj.connection_wds[1]
+
+        self.assertEqual(connection.pre_cell_id, "../Pop0/1/L23PyrRS")
+
+        self.assertEqual(connection.post_cell_id, "../Pop1/2/L23PyrFRB")
+
+        self.assertEqual(connection.pre_segment_id, 2)
+
+        self.assertEqual(connection.post_segment_id, 5)
+
+        self.assertEqual(connection.get_delay_in_ms(), 1.5)
+
+        self.assertEqual(connection.weight, 2)
+
+        self.assertEqual(proj.connection_wds[-1].weight, 4)
+
+        self.assertEqual(proj.connection_wds[-1].delay, "2 ms")
+
+        ### modifications to the objects are written through to the columns
+
+        connection.weight = 0.5
+
+        connection.post_cell_id = "../Pop1/3/L23PyrFRB"
+
+        columns = proj.connection_wds.columns()
+
+        self.assertEqual(columns["weight"][1], 0.5)
+
+        self.assertEqual(columns["post_cell"][1], 3)
+
+        self.assertEqual(proj.connection_wds[1].weight, 0.5)
+
+        ### cell references which do not follow the format of the projection are kept
+
+        proj.connection_wds[2].pre_cell_id = "../Pop2/2/L23PyrRS"
+
+        self.assertEqual(proj.connection_wds[2].pre_cell_id, "../Pop2/2/L23PyrRS")
+
+        copy = pickle.loads(pickle.dumps(proj))
+
+        self.assertEqual(len(copy.connection_wds), 5)
+
+        self.assertEqual(copy.connection_wds[1].weight, 0.5)
+
+        self.assertEqual(copy.connection_wds[2].pre_cell_id, "../Pop2/2/L23PyrRS")
+
+    #########################################################################
+    def test_columnar_elect_projection(self):
+        pop_pre = neuroml.Population(id="Pop0", component="L23PyrRS", size=4)
+
+        pop_post = neuroml.Population(id="Pop1", component="L23PyrFRB", size=4)
+
+        proj = oc_containers.ColumnarElectricalProjection(
+            id="Proj0",
+            presynaptic_population=pop_pre.id,
+            postsynaptic_population=pop_post.id,
+        )
+
+        for conn_id in range(0, 3):
+            oc_build.add_elect_connection(
+                proj, conn_id, pop_pre, conn_id, 0, pop_post, conn_id, 1, "gj1"
+            )
+
+        self.assertEqual(len(proj.electrical_connection_instance_ws), 3)
+
+        connection = proj.electrical_connection_instance_ws[2]
+
+        self.assertEqual(connection.pre_cell, "../Pop0/2/L23PyrRS")
+
+        self.assertEqual(connection.post_segment, 1)
+
+        self.assertEqual(connection.synapse, "gj1")
+
+        self.assertEqual(connection.get_weight(), 1)
+
+    #########################################################################
+    def test_export_hdf5(self):
+        nml_doc = neuroml.NeuroMLDocument(id="TestColumns")
+
+        net = neuroml.Network(id="TestColumns")
+
+        nml_doc.networks.append(net)
+
+        pop_pre = neuroml.Population(id="Pop0", component="L23PyrRS", size=10)
+
+        pop_post = neuroml.Population(id="Pop1", component="L23PyrFRB", size=10)
+
+        net.populations.append(pop_pre)
+
+        net.populations.append(pop_post)
+
+        proj = oc_containers.ColumnarProjection(
+            id="Proj0",
+            presynaptic_population=pop_pre.id,
+            postsynaptic_population=pop_post.id,
+            synapse="AMPA",
+            pre_cell_format=oc_containers.cell_id_format(pop_pre),
+            post_cell_format=oc_containers.cell_id_format(pop_post),
+        )
+
+        proj.connection_wds.add(
+            np.arange(10),
+            np.arange(10),
+            np.arange(10)[::-1],
+            post_segment_ids=np.arange(10) % 3,
+            post_fractions=0.25,
+            weights=np.linspace(1, 2, 10),
+            delays=3,
+        )
+
+        net.projections.append(proj)
+
+        file_name = os.path.join(tempfile.mkdtemp(), "TestColumns.net.nml.h5")
+
+        neuroml.writers.NeuroMLHdf5Writer.write(nml_doc, file_name)
+
+        loaded_doc = neuroml.loaders.NeuroMLHdf5Loader.load(file_name)
+
+        loaded_proj = loaded_doc.networks[0].projections[0]
+
+        self.assertEqual(len(loaded_proj.connection_wds), 10)
+
+        for index, connection in enumerate(loaded_proj.connection_wds):
+            self.assertEqual(connection.get_pre_cell_id(), index)
+
+            self.assertEqual(connection.get_post_cell_id(), 9 - index)
+
+            self.assertEqual(connection.post_segment_id, index % 3)
+
+            self.assertAlmostEqual(connection.post_fraction_along, 0.25)
+
+            self.assertAlmostEqual(connection.weight, 1 + index / 9.0, places=5)
+
+            self.assertAlmostEqual(connection.get_delay_in_ms(), 3)
+
+    #########################################################################
+    def test_columnar_input_list(self):
+        pop = neuroml.Population(id="Pop0", component="L23PyrRS", size=4)
+
+        input_list = oc_containers.ColumnarInputList(
+            id="Input0",
+            component="pg0",
+            populations=pop.id,
+            target_format=oc_containers.cell_id_format(pop),
+        )
+
+        self.assertTrue(input_list.input == [])
+
+        input_list.input.add([0, 1, 2], [0, 1, 3], [0, 2, 5], [0.5, 0.25, 0.0])
+
+        input_list.input_ws.add([3], [2], weights=2.5)
+
+        self.assertEqual(len(input_list.input), 3)
+
+        input = input_list.input[1]
+
+        self.assertEqual(input.target, "../Pop0/1/L23PyrRS")
+
+        self.assertEqual(input.destination, "synapses")
+
+        self.assertEqual(input.segment_id, 2)
+
+        self.assertEqual(input.fraction_along, 0.25)
+
+        self.assertEqual(input_list.input[2].fraction_along, 0.0)
+
+        self.assertEqual(input_list.input_ws[0].get_weight(), 2.5)
+
+        ### modifications to the objects are written through to the columns
+
+        input.segment_id = 4
+
+        input.target = "../Pop0/2/L23PyrRS"
+
+        columns = input_list.input.columns()
+
+        self.assertEqual(columns["segment"][1], 4)
+
+        self.assertEqual(columns["target_cell"][1], 2)
+
+        ### inputs appended as objects are stored in the columns when possible
+
+        input_list.input.append(
+            neuroml.Input(
+                id=4,
+                target="../Pop0/0/L23PyrRS",
+                destination="synapses",
+                segment_id=1,
+                fraction_along=0.75,
+            )
+        )
+
+        input_list.input.append(
+            neuroml.Input(id=5, target="../Pop1/0/L23PyrRS", destination="synapses")
+        )
+
+        self.assertEqual(input_list.input.columns()["fraction"][3], 0.75)
+
+        self.assertEqual(input_list.input[4].target, "../Pop1/0/L23PyrRS")
+
+        self.assertEqual(input_list.input[4].segment_id, None)
+
+        copy = pickle.loads(pickle.dumps(input_list))
+
+        self.assertEqual(len(copy.input), 5)
+
+        self.assertEqual(copy.input[1].segment_id, 4)
+
+    #########################################################################
+    def test_export_input_list_hdf5(self):
+        nml_doc = neuroml.NeuroMLDocument(id="TestInputColumns")
+
+        net = neuroml.Network(id="TestInputColumns")
+
+        nml_doc.networks.append(net)
+
+        pop = neuroml.Population(id="Pop0", component="L23PyrRS", size=10)
+
+        net.populations.append(pop)
+
+        input_list = oc_containers.ColumnarInputList(
+            id="Input0",
+            component="pg0",
+            populations=pop.id,
+            target_format=oc_containers.cell_id_format(pop),
+        )
+
+        input_list.input.add(np.arange(5), np.arange(5), 1, 0.25)
+
+        input_list.input_ws.add(
+            np.arange(5, 10), np.arange(5, 10), np.arange(5) % 3, 0.75, weights=2
+        )
+
+        net.input_lists.append(input_list)
+
+        file_name = os.path.join(tempfile.mkdtemp(), "TestInputColumns.net.nml.h5")
+
+        neuroml.writers.NeuroMLHdf5Writer.write(nml_doc, file_name)
+
+        loaded_doc = neuroml.loaders.NeuroMLHdf5Loader.load(file_name)
+
+        loaded_list = loaded_doc.networks[0].input_lists[0]
+
+        inputs = sorted(
+            list(loaded_list.input) + list(loaded_list.input_ws),
+            key=lambda input: int(input.id),
+        )
+
+        self.assertEqual(len(inputs), 10)
+
+        for index, input in enumerate(inputs):
+            self.assertEqual(input.get_target_cell_id(), index)
+
+            self.assertEqual(
+                input.get_segment_id(), 1 if index < 5 else (index - 5) % 3
+            )
+
+            self.assertAlmostEqual(
+                input.get_fraction_along(), 0.25 if index < 5 else 0.75
+            )
+
+            weight = input.get_weight() if isinstance(input, neuroml.InputW) else 1
+
+            self.assertAlmostEqual(weight, 1 if index < 5 else 2)
@@ -0,0 +1,370 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.build as oc_build
+import opencortex.build.partition as oc_partition
+import opencortex.utils.distributed as oc_distributed
+
+import numpy as np
+import neuroml.loaders as loaders
+import os
+import shutil
+import tables
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+def generate(num_cells=300):
+    """Builds a network with probabilistic, targeted and distance-dependent projections and inputs"""
+
+    nml_doc, network = oc.generate_network("Distributed", network_seed=1234)
+
+    oc.add_spike_source_poisson(nml_doc, "ssp", "0ms", "100ms", "10Hz")
+
+    pop_a = oc.add_population_in_rectangular_region(
+        network, "popA", "ssp", num_cells, 0, 0, 0, 100, 100, 100
+    )
+
+    pop_b = oc.add_population_in_rectangular_region(
+        network, "popB", "ssp", num_cells // 2, 0, 0, 0, 100, 100, 100
+    )
+
+    oc.add_probabilistic_projection(network, "prob", pop_a, pop_a, "syn0", 0.05)
+
+    oc_build.add_probabilistic_projection_list(
+        network, pop_a, pop_b, ["syn1", "syn2"], 0.1, weight=1.0, std_weight=0.2
+    )
+
+    target_dict = {"soma_group": {"SegList": [0], "LengthDist": [1.0]}}
+
+    proj_array = [
+        oc_build.containers.ColumnarProjection(
+            id="targeted_popB_popA",
+            presynaptic_population="popB",
+            postsynaptic_population="popA",
+            synapse="syn3",
+        )
+    ]
+
+    oc_build.add_targeted_projection_by_dicts(
+        network,
+        proj_array,
+        pop_b,
+        pop_a,
+        "convergent",
+        ["syn3"],
+        None,
+        target_dict,
+        {"soma_group": 2.5},
+        weights_dict={"syn3": "2*random()"},
+    )
+
+    positions = dict(
+        (
+            pop.id,
+            np.array(
+                [
+                    [instance.location.x, instance.location.y, instance.location.z]
+                    for instance in pop.instances
+                ]
+            ),
+        )
+        for pop in [pop_a, pop_b]
+    )
+
+    proj_array = [
+        oc_build.containers.ColumnarProjection(
+            id="spatial_popA_popB",
+            presynaptic_population="popA",
+            postsynaptic_population="popB",
+            synapse="syn4",
+        )
+    ]
+
+    oc_build.add_chem_spatial_projection(
+        network,
+        proj_array,
+        pop_a,
+        pop_b,
+        "convergent",
+        ["syn4"],
+        None,
+        target_dict,
+        {"soma_group": 3},
+        "exp(-r/40)",
+        positions["popA"],
+        positions["popB"],
+        None,
+        None,
+        cutoff_radius=50,
+    )
+
+    oc.add_inputs_to_population(network, "input_popA", pop_a, "ssp", all_cells=True)
+
+    return nml_doc, network
+
+
+def generate_divergent():
+    nml_doc, network = oc.generate_network("Divergent")
+
+    pop = oc.add_population_in_rectangular_region(
+        network, "pop", "ssp", 10, 0, 0, 0, 100, 100, 100
+    )
+
+    proj_array = [
+        oc_build.containers.ColumnarProjection(
+            id="divergent", presynaptic_population="pop", postsynaptic_population="pop"
+        )
+    ]
+
+    oc_build.add_targeted_projection_by_dicts(
+        network,
+        proj_array,
+        pop,
+        pop,
+        "divergent",
+        ["syn"],
+        None,
+        {"soma_group": {"SegList": [0], "LengthDist": [1.0]}},
+        {"soma_group": 1},
+    )
+
+    return nml_doc
+
+
+def read_network(file_name):
+    """Returns the arrays of the projections and input lists of a NeuroML HDF5 file, by group name"""
+
+    arrays = {}
+
+    with tables.open_file(file_name, mode="r") as h5file:
+        for group in h5file.root.neuroml.network._f_iter_nodes("Group"):
+            for array in group._f_iter_nodes("Array"):
+                arrays[group._v_name] = array.read()
+
+    return arrays
+
+
+class TestDistributedMethods(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        oc_partition.clear_rank()
+
+        shutil.rmtree(self.dir)
+
+    def _build(self, partition, name, max_workers=None):
+        merged_file_name = os.path.join(self.dir, "%s.net.nml.h5" % name)
+
+        shards = oc_distributed.build_partitioned(
+            generate,
+            partition,
+            os.path.join(self.dir, name + ".rank%i.net.nml.h5"),
+            merged_file_name=merged_file_name,
+            max_workers=max_workers,
+        )
+
+        self.assertEqual(len(shards), partition.num_ranks)
+
+        return shards, read_network(merged_file_name)
+
+    #########################################################################
+    def test_partition(self):
+        nml_doc, network = generate(num_cells=300)
+
+        ### 450 cells: 300 in popA then 150 in popB
+
+        partition = oc_partition.Partition(4)
+
+        self.assertEqual(partition.get_gid_range(network, 1), (112, 225))
+
+        pop_a, pop_b = network.populations
+
+        owned = [partition.get_owned_cells(network, pop_a, rank) for rank in range(4)]
+
+        self.assertEqual(np.concatenate(owned).tolist(), list(range(0, pop_a.size)))
+
+        self.assertEqual(len(partition.get_owned_cells(network, pop_b, 0)), 0)
+
+        self.assertEqual(
+            partition.get_owned_cells(network, pop_b, 2).tolist(), list(range(0, 37))
+        )
+
+        partition = oc_partition.Partition(2, population_ranks={"popA": 1, "popB": 0})
+
+        self.assertEqual(len(partition.get_owned_cells(network, pop_a, 0)), 0)
+
+        self.assertEqual(len(partition.get_owned_cells(network, pop_a, 1)), 300)
+
+        blocks = oc_partition.get_blocks(np.arange(250, 600), 700)
+
+        self.assertEqual(
+            [block[:3] for block in blocks], [(0, 0, 256), (1, 256, 512), (2, 512, 700)]
+        )
+
+        self.assertEqual(int(np.sum(blocks[0][3])), 6)
+
+        self.assertRaises(Exception, oc_partition.Partition, 2, None, [(0, 10)])
+
+        self.assertRaises(
+            Exception, oc_partition.Partition, 2, population_ranks={"popA": 2}
+        )
+
+    #########################################################################
+    def test_build_partitioned(self):
+        shards, whole = self._build(oc_partition.Partition(1), "Whole")
+
+        self.assertEqual(
+            sorted(whole.keys()),
+            [
+                "inputList_input_popA",
+                "population_popA",
+                "population_popB",
+                "projection_prob_popA_popA",
+                "projection_spatial_popA_popB",
+                "projection_syn1_popA_popB",
+                "projection_syn2_popA_popB",
+                "projection_targeted_popB_popA",
+            ],
+        )
+
+        ### the same network is built whatever the partition
+
+        for partition in [
+            oc_partition.Partition(3),
+            oc_partition.Partition(2, population_ranks={"popA": 1, "popB": 0}),
+            oc_partition.Partition(2, gid_ranges=[(0, 100), (100, 450)]),
+        ]:
+            shards, merged = self._build(partition, "Merged", max_workers=2)
+
+            self.assertEqual(sorted(merged.keys()), sorted(whole.keys()))
+
+            for name in whole.keys():
+                self.assertTrue(np.array_equal(merged[name], whole[name]), name)
+
+        ### each shard has the connections and inputs onto the cells of its rank
+
+        partition = oc_partition.Partition(3)
+
+        shards, merged = self._build(partition, "Shards")
+
+        for rank, shard in enumerate(shards):
+            start, end = rank * 150, (rank + 1) * 150
+
+            arrays = read_network(shard)
+
+            for name in ["projection_prob_popA_popA", "inputList_input_popA"]:
+                post_cells = arrays.get(name, np.zeros((0, 2)))[:, 1]
+
+                self.assertTrue(np.all((post_cells >= start) & (post_cells < end)))
+
+                self.assertEqual(len(post_cells) > 0, rank < 2)
+
+            self.assertEqual("projection_syn1_popA_popB" in arrays, rank == 2)
+
+        ### the merged network can be loaded as a whole
+
+        nml_doc = loaders.NeuroMLHdf5Loader.load(
+            os.path.join(self.dir, "Shards.net.nml.h5")
+        )
+
+        network = nml_doc.networks[0]
+
+        self.assertEqual([pop.size for pop in network.populations], [300, 150])
+
+        self.assertEqual(len(network.input_lists[0].input), 300)
+
+        self.assertEqual(
+            sum(len(proj.connection_wds) for proj in network.projections),
+            sum(
+                len(whole[name])
+                for name in whole.keys()
+                if name.startswith("projection_")
+            ),
+        )
+
+    #########################################################################
+    def test_merge_shards_in_blocks(self):
+        shards, whole = self._build(oc_partition.Partition(3), "Whole")
+
+        ### the rows are merged a few at a time, the shards not sorted by postsynaptic cell are sorted in runs, and the arrays
+        ### with more rows than FLOAT32_EXACT_INTEGERS are written in float64
+
+        settings = (
+            oc_build.containers.WRITE_BLOCK_SIZE,
+            oc_distributed.SORT_RUN_SIZE,
+            oc_distributed.FLOAT32_EXACT_INTEGERS,
+        )
+
+        (
+            oc_build.containers.WRITE_BLOCK_SIZE,
+            oc_distributed.SORT_RUN_SIZE,
+            oc_distributed.FLOAT32_EXACT_INTEGERS,
+        ) = (64, 500, 1000)
+
+        try:
+            merged_file_name = oc_distributed.merge_shards(
+                shards, os.path.join(self.dir, "Blocks.net.nml.h5")
+            )
+
+        finally:
+            (
+                oc_build.containers.WRITE_BLOCK_SIZE,
+                oc_distributed.SORT_RUN_SIZE,
+                oc_distributed.FLOAT32_EXACT_INTEGERS,
+            ) = settings
+
+        self.assertEqual(
+            sorted(os.listdir(self.dir)),
+            sorted(
+                [os.path.basename(shard) for shard in shards]
+                + ["Whole.net.nml.h5", "Blocks.net.nml.h5"]
+            ),
+        )
+
+        merged = read_network(merged_file_name)
+
+        self.assertEqual(sorted(merged.keys()), sorted(whole.keys()))
+
+        for name in whole.keys():
+            self.assertTrue(np.array_equal(merged[name], whole[name]), name)
+
+            self.assertEqual(
+                merged[name].dtype,
+                np.float64 if len(merged[name]) > 1000 else np.float32,
+            )
+
+        self.assertTrue(len(merged["projection_prob_popA_popA"]) > 1000)
+
+        self.assertTrue(np.all(np.diff(merged["projection_prob_popA_popA"][:, 1]) >= 0))
+
+        nml_doc = loaders.NeuroMLHdf5Loader.load(merged_file_name)
+
+        self.assertEqual(
+            sum(len(proj.connection_wds) for proj in nml_doc.networks[0].projections),
+            sum(
+                len(whole[name])
+                for name in whole.keys()
+                if name.startswith("projection_")
+            ),
+        )
+
+    #########################################################################
+    def test_divergent(self):
+        self.assertRaises(
+            Exception,
+            oc_distributed.build_rank,
+            generate_divergent,
+            oc_partition.Partition(2),
+            0,
+            os.path.join(self.dir, "Divergent.net.nml.h5"),
+        )
+
+        self.assertEqual(oc_partition.get_rank(), (None, None))
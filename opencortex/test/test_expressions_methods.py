@@ -0,0 +1,102 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.build as oc_build
+import opencortex.build.expressions as oc_expressions
+import numpy as np
+
+import math
+import random
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestExpressionsMethods(unittest.TestCase):
+    #########################################################################
+    def test_evaluate_expression(self):
+        distances = np.array([0.0, 10.0, 100.0, 300.0])
+
+        rules = [
+            "0.5*math.exp(-r/100)",
+            "- 17.45 + 18.36 / (math.exp((r-267.)/39.) +1)",
+            "1 if r < 50 else 0.2",
+            "np.sqrt(r) + abs(-2)**2 - 3 % 2",
+            "0 < r <= 100",
+            "max(0, 1 - r/200)",
+        ]
+
+        for rule in rules:
+            values = oc_expressions.evaluate_expression(
+                rule, {"r": distances}, size=len(distances)
+            )
+
+            self.assertEqual(values.shape, (4,))
+
+            for index, r in enumerate(distances.tolist()):
+                expected = eval(rule, {"math": math, "np": np}, {"r": r})
+
+                self.assertAlmostEqual(values[index], float(expected))
+
+                self.assertAlmostEqual(
+                    oc_expressions.evaluate_expression(rule, {"r": r}),
+                    float(expected),
+                )
+
+        self.assertEqual(oc_expressions.evaluate_expression("2"), 2)
+
+        self.assertEqual(oc_expressions.evaluate_expression(0.5), 0.5)
+
+        self.assertEqual(oc_expressions.evaluate_expression("2**-1"), 0.5)
+
+        self.assertTrue(
+            oc_expressions.compile_expression("1+1", ())
+            is oc_expressions.compile_expression("1+1", ())
+        )
+
+    #########################################################################
+    def test_random_expressions(self):
+        random.seed(1234)
+
+        value = oc_build._evaluate_expression("3*random()")
+
+        random.seed(1234)
+
+        self.assertEqual(value, 3 * random.random())
+
+        rng = np.random.default_rng(1234)
+
+        values = oc_expressions.evaluate_expression(
+            "normal(5, 0.5)", size=10000, rng=rng
+        )
+
+        self.assertTrue(abs(np.mean(values) - 5) < 0.05)
+
+        self.assertTrue(abs(np.std(values) - 0.5) < 0.05)
+
+        values = oc_expressions.evaluate_expression(
+            "uniform(1, 2) + random()", size=1000, rng=rng
+        )
+
+        self.assertTrue(np.all(values >= 1) and np.all(values < 3))
+
+    #########################################################################
+    def test_rejected_expressions(self):
+        for expression in [
+            "__import__('os').system('ls')",
+            "open('file.txt')",
+            "r.__class__",
+            "math.__dict__",
+            "(lambda: 1)()",
+            "[1, 2]",
+            "'a'",
+            "x + 1",
+            "random.seed(1)",
+            "1 +",
+        ]:
+            self.assertRaises(
+                Exception, oc_expressions.compile_expression, expression, ("r",)
+            )
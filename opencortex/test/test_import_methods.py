@@ -0,0 +1,59 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import os
+import subprocess
+import sys
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestImportMethods(unittest.TestCase):
+    #########################################################################
+    def test_import(self):
+        package_dir = os.path.dirname(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+
+        env = dict(os.environ)
+
+        env["PYTHONPATH"] = os.pathsep.join(
+            [package_dir] + ([env["PYTHONPATH"]] if "PYTHONPATH" in env else [])
+        )
+
+        ### importing opencortex prints nothing and does not load the simulation modules of pyNeuroML
+        output = subprocess.check_output(
+            [
+                sys.executable,
+                "-c",
+                "import sys; import opencortex.core, opencortex.build, opencortex.utils; "
+                "print(sorted(m for m in ['pyneuroml.pynml', 'pyneuroml.lems', 'matplotlib'] if m in sys.modules))",
+            ],
+            env=env,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+
+        self.assertEqual(output.strip(), "[]")
+
+        ### the modules are loaded when first used
+        output = subprocess.check_output(
+            [
+                sys.executable,
+                "-c",
+                "import opencortex.core as oc; print(oc.pynml.__name__); print(oc.LEMSSimulation.__name__)",
+            ],
+            env=env,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+
+        self.assertEqual(output.split(), ["pyneuroml.pynml", "LEMSSimulation"])
+
+        import opencortex.core as oc
+
+        self.assertRaises(AttributeError, getattr, oc, "not_an_attribute")
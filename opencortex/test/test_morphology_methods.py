@@ -0,0 +1,151 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.build as oc_build
+import opencortex.build.morphology as oc_morphology
+import neuroml
+import numpy as np
+
+import math
+import os
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestMorphologyMethods(unittest.TestCase):
+    def _make_cell(self):
+        cell = neuroml.Cell(id="TestCell")
+
+        cell.morphology = neuroml.Morphology(id="morphology")
+
+        soma = neuroml.Segment(
+            id=0,
+            name="Soma",
+            proximal=neuroml.Point3DWithDiam(x=0, y=0, z=0, diameter=10),
+            distal=neuroml.Point3DWithDiam(x=0, y=10, z=0, diameter=10),
+        )
+
+        dend1 = neuroml.Segment(
+            id=1,
+            name="Dend1",
+            parent=neuroml.SegmentParent(segments=0),
+            distal=neuroml.Point3DWithDiam(x=0, y=30, z=0, diameter=2),
+        )
+
+        dend2 = neuroml.Segment(
+            id=2,
+            name="Dend2",
+            parent=neuroml.SegmentParent(segments=1),
+            proximal=neuroml.Point3DWithDiam(x=0, y=30, z=0, diameter=2),
+            distal=neuroml.Point3DWithDiam(x=3, y=34, z=0, diameter=2),
+        )
+
+        cell.morphology.segments.extend([soma, dend1, dend2])
+
+        groups = {
+            "soma_group": ([0], []),
+            "dend_a": ([2, 1], []),
+            "dend_b": ([1], ["dend_a"]),
+            "all": ([], ["soma_group", "dend_b"]),
+        }
+
+        for group_id, (members, includes) in groups.items():
+            segment_group = neuroml.SegmentGroup(id=group_id)
+
+            for segment_id in members:
+                segment_group.members.append(neuroml.Member(segments=segment_id))
+
+            for included in includes:
+                segment_group.includes.append(neuroml.Include(segment_groups=included))
+
+            cell.morphology.segment_groups.append(segment_group)
+
+        return cell
+
+    #########################################################################
+    def test_morphology_index(self):
+        cell = self._make_cell()
+
+        index = oc_morphology.get_morphology_index(cell)
+
+        self.assertTrue(index is oc_morphology.get_morphology_index(cell))
+
+        self.assertTrue(np.allclose(index.lengths, [10, 20, 5]))
+
+        self.assertEqual(index.parents.tolist(), [-1, 0, 1])
+
+        for group in cell.morphology.segment_groups:
+            self.assertEqual(
+                index.segments_in_group(group.id).tolist(),
+                cell.get_all_segments_in_group(group),
+            )
+
+        self.assertRaises(Exception, index.segments_in_group, "axon_group")
+
+        lengths, segments = oc_build.get_seg_lengths(cell, [2, 0, 7])
+
+        self.assertEqual(segments, [0, 2])
+
+        self.assertTrue(np.allclose(lengths, [10, 15]))
+
+        target_segs = oc_build.extract_seg_ids(cell, ["dend_b", "all"], "segGroups")
+
+        self.assertEqual(target_segs, {"dend_b": [1, 2], "all": [0, 1, 2]})
+
+        target_dict = oc_build.make_target_dict(cell, target_segs)
+
+        self.assertEqual(target_dict["all"]["SegList"], [0, 1, 2])
+
+        self.assertTrue(np.allclose(target_dict["all"]["LengthDist"], [10, 30, 35]))
+
+        self.assertEqual(
+            oc_build.extract_seg_ids(cell, ["Dend2", "Soma"], "segments"),
+            {"Soma": [0], "Dend2": [2]},
+        )
+
+    #########################################################################
+    def test_morphology_index_of_cell_file(self):
+        cell_file = os.path.join(
+            os.path.dirname(__file__),
+            "..",
+            "..",
+            "NeuroML2",
+            "prototypes",
+            "acnet2",
+            "pyr_4_sym.cell.nml",
+        )
+
+        cell = neuroml.loaders.NeuroMLLoader.load(cell_file).cells[0]
+
+        index = oc_morphology.MorphologyIndex(cell)
+
+        for group in cell.morphology.segment_groups:
+            self.assertEqual(
+                index.segments_in_group(group.id).tolist(),
+                cell.get_all_segments_in_group(group),
+            )
+
+        segments_by_id = dict(
+            (segment.id, segment) for segment in cell.morphology.segments
+        )
+
+        for row, segment_id in enumerate(index.segment_ids.tolist()):
+            segment = segments_by_id[segment_id]
+
+            proximal = (
+                segment.proximal
+                if segment.proximal != None
+                else segments_by_id[segment.parent.segments].distal
+            )
+
+            length = math.sqrt(
+                (segment.distal.x - proximal.x) ** 2
+                + (segment.distal.y - proximal.y) ** 2
+                + (segment.distal.z - proximal.z) ** 2
+            )
+
+            self.assertAlmostEqual(index.lengths[row], length)
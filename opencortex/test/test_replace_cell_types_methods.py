@@ -0,0 +1,365 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.build as oc_build
+import opencortex.utils as oc_utils
+
+import neuroml
+import neuroml.loaders as loaders
+import neuroml.writers as writers
+import numpy as np
+import os
+import shutil
+import tables
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestReplaceCellTypesMethods(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+        self.components_dir = os.path.join(self.dir, "components")
+
+        os.mkdir(self.components_dir)
+
+        ### a cell with a soma and three dendritic segments
+
+        cell = neuroml.Cell(id="Ball", morphology=neuroml.Morphology(id="morphology"))
+
+        proximal = neuroml.Point3DWithDiam(x=0, y=0, z=0, diameter=10)
+
+        for index in range(4):
+            distal = neuroml.Point3DWithDiam(x=0, y=10 * (index + 1), z=0, diameter=2)
+
+            segment = neuroml.Segment(
+                id=index, name="Seg%i" % index, proximal=proximal, distal=distal
+            )
+
+            if index > 0:
+                segment.parent = neuroml.SegmentParent(segments=index - 1)
+
+            cell.morphology.segments.append(segment)
+
+            proximal = distal
+
+        for group_id, segment_ids in [
+            ("soma_group", [0]),
+            ("dendrite_group", [1, 2, 3]),
+        ]:
+            group = neuroml.SegmentGroup(id=group_id)
+
+            for segment_id in segment_ids:
+                group.members.append(neuroml.Member(segments=segment_id))
+
+            cell.morphology.segment_groups.append(group)
+
+        cell_doc = neuroml.NeuroMLDocument(id="Ball")
+
+        cell_doc.cells.append(cell)
+
+        writers.NeuroMLWriter.write(
+            cell_doc, os.path.join(self.components_dir, "Ball.cell.nml")
+        )
+
+        ### a network of point cells, saved in HDF5
+
+        self.nml_doc, self.net = oc.generate_network("ReplaceNet", network_seed=1234)
+
+        for cell_id in ["iaf", "iaf2"]:
+            self.nml_doc.iaf_cells.append(
+                neuroml.IafCell(
+                    id=cell_id,
+                    C="1nF",
+                    thresh="-50mV",
+                    reset="-65mV",
+                    leak_conductance="10nS",
+                    leak_reversal="-65mV",
+                )
+            )
+
+        oc.add_exp_two_syn(self.nml_doc, "ampa", "1nS", "0mV", "0.5ms", "5ms")
+
+        oc.add_pulse_generator(self.nml_doc, "pulse", "10ms", "100ms", "0.2nA")
+
+        self.pop_pre = oc.add_population_in_rectangular_region(
+            self.net, "Pre_iaf", "iaf", 30, 0, 0, 0, 100, 100, 100
+        )
+
+        self.pop_post = oc.add_population_in_rectangular_region(
+            self.net, "Post_iaf", "iaf", 20, 0, 0, 0, 100, 100, 100
+        )
+
+        self.pop_other = oc.add_population_in_rectangular_region(
+            self.net, "Other", "iaf2", 10, 0, 0, 0, 100, 100, 100
+        )
+
+        self.proj = oc.add_probabilistic_projection(
+            self.net,
+            "proj",
+            self.pop_pre,
+            self.pop_post,
+            "ampa",
+            0.3,
+            weight=2,
+        )
+
+        self.other_proj = oc.add_probabilistic_projection(
+            self.net, "proj", self.pop_other, self.pop_post, "ampa", 0.5
+        )
+
+        oc.add_inputs_to_population(
+            self.net, "input", self.pop_post, "pulse", all_cells=True
+        )
+
+        oc.add_inputs_to_population(
+            self.net,
+            "dendrite_input",
+            self.pop_post,
+            "pulse",
+            all_cells=True,
+            segment_ids=[1],
+        )
+
+        oc.save_network(
+            self.nml_doc,
+            "ReplaceNet.net.nml.h5",
+            validate=False,
+            format="hdf5",
+            target_dir=self.dir + "/",
+        )
+
+        self.columns = self.proj.connection_wds.columns()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _read_array(self, h5file, group_name, array_name):
+        array = h5file.get_node("/neuroml/network/%s/%s" % (group_name, array_name))
+
+        indices = dict(
+            (str(array._v_attrs["column_%i" % index]), index)
+            for index in range(array.shape[1])
+        )
+
+        rows = array.read()
+
+        return dict((name, rows[:, index]) for name, index in indices.items())
+
+    #########################################################################
+    def test_replace_cell_types_hdf5(self):
+        ### the arrays are rewritten in blocks of a few rows
+        block_size = oc_build.containers.WRITE_BLOCK_SIZE
+
+        oc_build.containers.WRITE_BLOCK_SIZE = 7
+
+        try:
+            new_file_name = oc_utils.replace_cell_types_hdf5(
+                net_file_name="ReplaceNet",
+                path_to_net=self.dir,
+                new_net_id="ReplaceNetBall",
+                cell_types_to_be_replaced=["iaf"],
+                cell_types_replaced_by=["Ball"],
+                dir_to_new_components=self.components_dir,
+                dir_to_old_components=self.components_dir,
+                reduced_to_single_compartment=False,
+                connection_segment_groups=[
+                    {
+                        "PreCellType": "Ball",
+                        "PostCellType": "Ball",
+                        "Type": "Chem",
+                        "PreSegGroup": "soma_group",
+                        "PostSegGroup": "dendrite_group",
+                    }
+                ],
+                input_segment_groups=[
+                    {"PostCellType": "Ball", "PostSegGroup": "dendrite_group"}
+                ],
+                target_dir=self.dir,
+            )
+
+        finally:
+            oc_build.containers.WRITE_BLOCK_SIZE = block_size
+
+        self.assertEqual(
+            new_file_name, os.path.join(self.dir, "ReplaceNetBall.net.nml.h5")
+        )
+
+        with tables.open_file(new_file_name) as h5file:
+            network = h5file.root.neuroml.network
+
+            self.assertEqual(network._v_attrs["id"], "ReplaceNetBall")
+
+            self.assertEqual(
+                sorted(group._v_name for group in network._f_iter_nodes("Group")),
+                [
+                    "inputList_dendrite_input",
+                    "inputList_input",
+                    "population_Other",
+                    "population_Post_Ball",
+                    "population_Pre_Ball",
+                    "projection_proj_Other_Post_Ball",
+                    "projection_proj_Pre_Ball_Post_Ball",
+                ],
+            )
+
+            population = network.population_Pre_Ball
+
+            self.assertEqual(population._v_attrs["component"], "Ball")
+
+            self.assertEqual(population._v_attrs["size"], 30)
+
+            self.assertEqual(population.Pre_Ball.shape[0], 30)
+
+            self.assertEqual(network.population_Other._v_attrs["component"], "iaf2")
+
+            projection = network.projection_proj_Pre_Ball_Post_Ball
+
+            self.assertEqual(projection._v_attrs["presynapticPopulation"], "Pre_Ball")
+
+            self.assertEqual(projection._v_attrs["postsynapticPopulation"], "Post_Ball")
+
+            ### the connections are kept, on segments of the new segment groups
+
+            columns = self._read_array(
+                h5file, "projection_proj_Pre_Ball_Post_Ball", "proj_Pre_Ball_Post_Ball"
+            )
+
+            self.assertTrue(
+                np.array_equal(columns["pre_cell_id"], self.columns["pre_cell"])
+            )
+
+            self.assertTrue(
+                np.array_equal(columns["post_cell_id"], self.columns["post_cell"])
+            )
+
+            self.assertTrue(np.all(columns["weight"] == 2))
+
+            self.assertTrue(np.all(columns["pre_segment_id"] == 0))
+
+            self.assertTrue(np.all(np.isin(columns["post_segment_id"], [1, 2, 3])))
+
+            self.assertTrue(
+                np.all(
+                    (columns["post_fraction_along"] >= 0)
+                    & (columns["post_fraction_along"] <= 1)
+                )
+            )
+
+            ### only one population of proj_Other is replaced: its segments are unchanged
+
+            self.assertEqual(
+                network.projection_proj_Other_Post_Ball._v_attrs[
+                    "postsynapticPopulation"
+                ],
+                "Post_Ball",
+            )
+
+            other_columns = self._read_array(
+                h5file, "projection_proj_Other_Post_Ball", "proj_Other_Post_Ball"
+            )
+
+            self.assertEqual(
+                len(other_columns["pre_cell_id"]), len(self.other_proj.connection_wds)
+            )
+
+            self.assertFalse("post_segment_id" in other_columns)
+
+            input_list = network.inputList_input
+
+            self.assertEqual(input_list._v_attrs["population"], "Post_Ball")
+
+            inputs = self._read_array(h5file, "inputList_input", "input")
+
+            self.assertTrue(np.array_equal(inputs["target_cell_id"], np.arange(20)))
+
+            ### inputs on segment 0 stay there, as in replace_cell_types()
+
+            self.assertTrue(np.all(inputs["segment_id"] == 0))
+
+            dendrite_inputs = self._read_array(
+                h5file, "inputList_dendrite_input", "dendrite_input"
+            )
+
+            self.assertTrue(np.all(np.isin(dendrite_inputs["segment_id"], [1, 2, 3])))
+
+            self.assertEqual(len(np.unique(dendrite_inputs["fraction_along"])), 20)
+
+            top_level = h5file.root.neuroml._v_attrs["neuroml_top_level"]
+
+        top_level_doc = loaders.read_neuroml2_string(str(top_level))
+
+        self.assertEqual(top_level_doc.id, "ReplaceNetBall")
+
+        self.assertTrue(
+            "ReplaceNetBall/Ball.cell.nml"
+            in [include.href for include in top_level_doc.includes]
+        )
+
+        self.assertTrue(
+            os.path.exists(os.path.join(self.dir, "ReplaceNetBall", "Ball.cell.nml"))
+        )
+
+        self.assertEqual(
+            sorted(cell.id for cell in top_level_doc.iaf_cells), ["iaf", "iaf2"]
+        )
+
+        ### the network can be loaded
+
+        loaded = loaders.NeuroMLHdf5Loader.load(new_file_name)
+
+        self.assertEqual(
+            sorted(population.id for population in loaded.networks[0].populations),
+            ["Other", "Post_Ball", "Pre_Ball"],
+        )
+
+    #########################################################################
+    def test_replace_cell_types_hdf5_single_compartment(self):
+        new_file_name = oc_utils.replace_cell_types_hdf5(
+            net_file_name="ReplaceNet",
+            path_to_net=self.dir,
+            new_net_id="ReplaceNetSingle",
+            cell_types_to_be_replaced=["iaf"],
+            cell_types_replaced_by=["Ball"],
+            dir_to_new_components=self.components_dir,
+            dir_to_old_components=self.components_dir,
+            target_dir=self.dir,
+            compress=False,
+        )
+
+        with tables.open_file(new_file_name) as h5file:
+            columns = self._read_array(
+                h5file, "projection_proj_Pre_Ball_Post_Ball", "proj_Pre_Ball_Post_Ball"
+            )
+
+            ### the connections are on segment 0 already, so the array is copied as it is
+
+            self.assertFalse("post_segment_id" in columns)
+
+            self.assertTrue(
+                np.array_equal(columns["pre_cell_id"], self.columns["pre_cell"])
+            )
+
+            inputs = self._read_array(h5file, "inputList_input", "input")
+
+            self.assertTrue(np.all(inputs["segment_id"] == 0))
+
+            self.assertTrue(np.all(inputs["fraction_along"] == 0.5))
+
+        with self.assertRaises(Exception):
+            oc_utils.replace_cell_types_hdf5(
+                net_file_name="ReplaceNet",
+                path_to_net=self.dir,
+                new_net_id="ReplaceNetWrong",
+                cell_types_to_be_replaced=["iaf", "iaf2"],
+                cell_types_replaced_by=["Ball"],
+                dir_to_new_components=self.components_dir,
+                dir_to_old_components=self.components_dir,
+                target_dir=self.dir,
+            )
@@ -0,0 +1,195 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.utils.results as oc_results
+
+import numpy as np
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestResultsMethods(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+        ### pyNeuroML reads the network relative to the working directory
+
+        self.cwd = os.getcwd()
+
+        os.chdir(self.dir)
+
+        nml_doc, network = oc.generate_network("Results")
+
+        oc.add_spike_source_poisson(nml_doc, "ssp", "0ms", "100ms", "10Hz")
+
+        oc.add_population_in_rectangular_region(
+            network, "Pop0", "ssp", 3, 0, 0, 0, 100, 100, 100
+        )
+
+        nml_file_name = "Results.net.nml"
+
+        oc.save_network(nml_doc, nml_file_name, validate=False, target_dir=self.dir)
+
+        self.lems_file_name, lems_sim = oc.generate_lems_simulation(
+            nml_doc,
+            network,
+            nml_file_name,
+            duration=100,
+            dt=0.025,
+            target_dir=self.dir,
+            gen_plots_for_all_v=False,
+            gen_saves_for_all_v=False,
+            gen_saves_for_quantities={
+                "traces.dat": ["Pop0/%i/ssp/tsince" % i for i in range(3)]
+            },
+            gen_spike_saves_for_all_somas=True,
+        )
+
+        ### output files as the simulators would save them
+
+        self.t = np.arange(0, 0.1, 2.5e-5)
+
+        self.values = np.random.RandomState(1234).uniform(-1, 1, (len(self.t), 3))
+
+        with open(os.path.join(self.dir, "traces.dat"), "w") as f:
+            for i in range(len(self.t)):
+                f.write(
+                    "%s\t%s\n" % (self.t[i], "\t".join(str(v) for v in self.values[i]))
+                )
+
+        with open(os.path.join(self.dir, "Sim_Results.Pop0.spikes"), "w") as f:
+            f.write("0 0.0125\n2 0.02\n0 0.05\n1 0.0625\n0 0.075")
+
+        ### small chunks, to parse the files over many of them
+
+        self.chunk_size = oc_results.CHUNK_SIZE
+
+        oc_results.CHUNK_SIZE = 1000
+
+    def tearDown(self):
+        oc_results.CHUNK_SIZE = self.chunk_size
+
+        os.chdir(self.cwd)
+
+        shutil.rmtree(self.dir)
+
+    #########################################################################
+    def test_load_simulation_results(self):
+        from pyneuroml import pynml
+
+        traces, events = pynml.reload_saved_data(
+            self.lems_file_name, base_dir=self.dir, reload_events=True
+        )
+
+        results = oc_results.load_simulation_results(
+            self.lems_file_name, base_dir=self.dir
+        )
+
+        self.assertEqual(list(results.traces.keys()), ["traces.dat"])
+
+        trace_file = results.traces["traces.dat"]
+
+        self.assertEqual(trace_file.values.shape, (len(self.t), 3))
+
+        self.assertTrue(isinstance(trace_file.values, np.memmap))
+
+        self.assertTrue(np.array_equal(results["t"], traces["t"]))
+
+        for quantity in trace_file.columns:
+            self.assertTrue(np.array_equal(results[quantity], traces[quantity]))
+
+        self.assertTrue(np.array_equal(trace_file.values, self.values))
+
+        spikes = results.events["Sim_Results.Pop0.spikes"]
+
+        self.assertEqual(spikes.ids.tolist(), [0, 2, 0, 1, 0])
+
+        self.assertEqual(spikes.times.tolist(), [0.0125, 0.02, 0.05, 0.0625, 0.075])
+
+        self.assertEqual(spikes.to_dict(), events)
+
+        self.assertEqual(
+            results.get_events("Pop0/0/ssp").tolist(), events["Pop0/0/ssp"]
+        )
+
+    #########################################################################
+    def test_cache(self):
+        results = oc_results.load_simulation_results(
+            self.lems_file_name, base_dir=self.dir
+        )
+
+        info_file = os.path.join(self.dir, "traces.dat.json")
+
+        self.assertTrue(os.path.isfile(info_file))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, "traces.dat.npy")))
+
+        ### the cache is used while the output file is unchanged
+
+        written = os.stat(info_file).st_mtime_ns
+
+        results = oc_results.load_simulation_results(
+            self.lems_file_name, base_dir=self.dir, mmap=False
+        )
+
+        self.assertEqual(os.stat(info_file).st_mtime_ns, written)
+
+        self.assertFalse(isinstance(results.traces["traces.dat"].values, np.memmap))
+
+        ### and is written again when it changes
+
+        with open(os.path.join(self.dir, "traces.dat"), "w") as f:
+            f.write("0.0 1 2 3\n2.5e-5 4 5 6\n")
+
+        results = oc_results.load_simulation_results(
+            self.lems_file_name, base_dir=self.dir, events=False
+        )
+
+        self.assertEqual(results.events, {})
+
+        self.assertEqual(
+            results.traces["traces.dat"].values.tolist(), [[1, 2, 3], [4, 5, 6]]
+        )
+
+        ### caches can be kept elsewhere
+
+        cache_dir = os.path.join(self.dir, "cache")
+
+        results = oc_results.load_simulation_results(
+            self.lems_file_name, base_dir=self.dir, cache_dir=cache_dir
+        )
+
+        self.assertEqual(
+            sorted(os.listdir(cache_dir)),
+            [
+                "Sim_Results.Pop0.spikes.ids.npy",
+                "Sim_Results.Pop0.spikes.json",
+                "Sim_Results.Pop0.spikes.times.npy",
+                "traces.dat.json",
+                "traces.dat.npy",
+            ],
+        )
+
+    #########################################################################
+    def test_bad_output_file(self):
+        with open(os.path.join(self.dir, "traces.dat"), "w") as f:
+            f.write("0.0 1 2 3\n2.5e-5 4 5\n")
+
+        self.assertRaises(
+            Exception,
+            oc_results.load_simulation_results,
+            self.lems_file_name,
+            base_dir=self.dir,
+        )
+
+        self.assertEqual(
+            [f for f in os.listdir(self.dir) if f.startswith("traces.dat.")], []
+        )
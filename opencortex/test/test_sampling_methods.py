@@ -0,0 +1,269 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.build as oc_build
+import opencortex.core as oc
+import opencortex.build.sampling as oc_sampling
+import numpy as np
+
+import random
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestSamplingMethods(unittest.TestCase):
+    #########################################################################
+    def test_bernoulli_pairs(self):
+        for probability in [0.05, 0.5, 1]:
+            for exclude_self in [True, False]:
+                rng = np.random.default_rng(1234)
+
+                pairs = list(
+                    oc_sampling.bernoulli_pairs(
+                        rng, 60, 50, probability, exclude_self, block_size=500
+                    )
+                )
+
+                pre_ids = np.concatenate([pair[0] for pair in pairs])
+
+                post_ids = np.concatenate([pair[1] for pair in pairs])
+
+                self.assertTrue(np.all(pre_ids >= 0) and np.all(pre_ids < 60))
+
+                self.assertTrue(np.all(post_ids >= 0) and np.all(post_ids < 50))
+
+                linear_ids = pre_ids * 50 + post_ids
+
+                self.assertTrue(np.all(np.diff(linear_ids) > 0))
+
+                if exclude_self:
+                    self.assertFalse(np.any(pre_ids == post_ids))
+
+                max_pairs = 60 * 50 - (50 if exclude_self else 0)
+
+                if probability >= 1:
+                    self.assertEqual(len(linear_ids), max_pairs)
+
+                else:
+                    expected = max_pairs * probability
+
+                    self.assertTrue(
+                        abs(len(linear_ids) - expected) < 5 * np.sqrt(expected)
+                    )
+
+        self.assertEqual(list(oc_sampling.bernoulli_pairs(rng, 0, 10, 0.5)), [])
+
+        self.assertEqual(list(oc_sampling.bernoulli_pairs(rng, 10, 10, 0)), [])
+
+    #########################################################################
+    def test_sample_partners(self):
+        rng = np.random.default_rng(1234)
+
+        num_partners = rng.integers(0, 40, size=500)
+
+        num_partners[:4] = [0, 39, 50, 80]
+
+        for exclude_self in [True, False]:
+            cell_ids, partner_ids = oc_sampling.sample_partners(
+                rng, num_partners, 40, exclude_self=exclude_self, first_cell=10
+            )
+
+            self.assertTrue(np.all(np.diff(cell_ids) >= 0))
+
+            self.assertTrue(np.all(partner_ids >= 0) and np.all(partner_ids < 40))
+
+            if exclude_self:
+                self.assertFalse(np.any(cell_ids == partner_ids))
+
+            num_candidates = 39 if exclude_self else 40
+
+            for cell in range(0, 500):
+                partners = partner_ids[cell_ids == cell + 10]
+
+                self.assertEqual(len(partners), num_partners[cell])
+
+                if num_partners[cell] <= num_candidates:
+                    self.assertEqual(len(set(partners.tolist())), len(partners))
+
+        ### partners drawn uniformly
+
+        counts = np.zeros((10, 10))
+
+        for draw in range(0, 2000):
+            cell_ids, partner_ids = oc_sampling.sample_partners(
+                rng, [5, 3] * 5, 10, exclude_self=True
+            )
+
+            np.add.at(counts, (cell_ids, partner_ids), 1)
+
+        self.assertTrue(np.all(np.diag(counts) == 0))
+
+        expected = np.array([[5], [3]] * 5) * 2000 / 9.0
+
+        off_diagonal = ~np.eye(10, dtype=bool)
+
+        self.assertTrue(np.all(np.abs(counts - expected)[off_diagonal] < 150))
+
+        cell_ids, partner_ids = oc_sampling.sample_partners(
+            rng, [3, 2], 1, exclude_self=True
+        )
+
+        self.assertEqual(len(cell_ids), 0)
+
+        self.assertEqual(len(partner_ids), 0)
+
+    #########################################################################
+    def test_clipped_normal(self):
+        rng = np.random.default_rng(1234)
+
+        values = oc_sampling.clipped_normal(rng, 0.5, 1, 1000, "positive")
+
+        self.assertTrue(np.all(values >= 0))
+
+        values = oc_sampling.clipped_normal(rng, -0.5, 1, 1000, "signed")
+
+        self.assertTrue(np.all(values <= 0))
+
+        values = oc_sampling.clipped_normal(rng, 0.5, 1, 1000, "none")
+
+        self.assertTrue(np.any(values < 0))
+
+    #########################################################################
+    def test_get_rng(self):
+        random.seed(1234)
+
+        first = oc_build._get_rng().random(5)
+
+        random.seed(1234)
+
+        second = oc_build._get_rng().random(5)
+
+        self.assertTrue(np.array_equal(first, second))
+
+    #########################################################################
+    def test_element_random_streams(self):
+        def build(network_seed, pop_ids, proj_prefixes):
+            nml_doc, net = oc.generate_network("Net0", network_seed=network_seed)
+
+            pops = {}
+
+            for pop_id in pop_ids:
+                pops[pop_id] = oc.add_population_in_rectangular_region(
+                    net, pop_id, "iaf", 20, 0, 0, 0, 100, 100, 100
+                )
+
+            projections = {}
+
+            for prefix in proj_prefixes:
+                proj = oc.add_probabilistic_projection(
+                    net, prefix, pops["Pop0"], pops["Pop1"], "ampa", 0.3
+                )
+
+                projections[prefix] = [
+                    (conn.get_pre_cell_id(), conn.get_post_cell_id())
+                    for conn in proj.connection_wds
+                ]
+
+            positions = dict(
+                (
+                    pop_id,
+                    [
+                        (instance.location.x, instance.location.y, instance.location.z)
+                        for instance in pops[pop_id].instances
+                    ],
+                )
+                for pop_id in pop_ids
+            )
+
+            return positions, projections
+
+        positions, projections = build(1234, ["Pop0", "Pop1", "Pop2"], ["A", "B"])
+
+        ### elements do not depend on the other elements built before them
+
+        other_positions, other_projections = build(1234, ["Pop1", "Pop0"], ["B"])
+
+        self.assertEqual(positions["Pop0"], other_positions["Pop0"])
+
+        self.assertEqual(positions["Pop1"], other_positions["Pop1"])
+
+        self.assertEqual(projections["B"], other_projections["B"])
+
+        self.assertNotEqual(projections["A"], projections["B"])
+
+        other_positions, other_projections = build(4321, ["Pop0", "Pop1"], ["B"])
+
+        self.assertNotEqual(positions["Pop0"], other_positions["Pop0"])
+
+        nml_doc, net = oc.generate_network("Net0", network_seed=1234)
+
+        first = oc_build.get_element_rng(net, "Pop0").random(5)
+
+        self.assertTrue(
+            np.array_equal(first, oc_build.get_element_rng(net, "Pop0").random(5))
+        )
+
+        self.assertFalse(
+            np.array_equal(first, oc_build.get_element_rng(net, "Pop1").random(5))
+        )
+
+    #########################################################################
+    def test_segment_sampler(self):
+        seg_specifications = {
+            "dendrite_group": {"SegList": [3, 4, 5, 6], "LengthDist": [10, 10, 40, 50]},
+            "soma_group": {"SegList": [0], "LengthDist": [20]},
+        }
+
+        sampler = oc_sampling.SegmentSampler(seg_specifications)
+
+        rng = np.random.default_rng(1234)
+
+        segment_ids, fractions = sampler.sample_group(rng, "dendrite_group", 20000)
+
+        self.assertTrue(np.all(np.isin(segment_ids, [3, 5, 6])))
+
+        self.assertTrue(np.all(fractions >= 0) and np.all(fractions <= 1))
+
+        self.assertTrue(abs(np.mean(segment_ids == 5) - 0.6) < 0.02)
+
+        self.assertTrue(abs(np.mean(segment_ids == 6) - 0.2) < 0.02)
+
+        segment_ids, fractions = sampler.sample_any_group(rng, 20000)
+
+        self.assertTrue(np.all(np.isin(segment_ids, [0, 3, 5, 6])))
+
+        self.assertTrue(np.all(fractions > 0) and np.all(fractions < 1))
+
+        self.assertTrue(abs(np.mean(segment_ids == 0) - 0.5) < 0.02)
+
+        subset_dicts = [
+            {"soma_group": 1, "dendrite_group": cell, "axon_group": 2}
+            for cell in range(0, 5)
+        ]
+
+        segment_ids_per_cell, fractions_per_cell = sampler.sample(rng, subset_dicts)
+
+        for cell in range(0, 5):
+            self.assertEqual(len(segment_ids_per_cell[cell]), cell + 1)
+
+            self.assertEqual(len(fractions_per_cell[cell]), cell + 1)
+
+            self.assertEqual(segment_ids_per_cell[cell][0], 0)
+
+        segment_ids_per_cell, fractions_per_cell = sampler.sample(rng, [3, 0, 2])
+
+        self.assertEqual([len(ids) for ids in segment_ids_per_cell], [3, 0, 2])
+
+        random.seed(1234)
+
+        target_segs, target_fractions = oc_build.get_target_segments(
+            seg_specifications, {"soma_group": 2}
+        )
+
+        self.assertEqual(target_segs, [0, 0])
+
+        self.assertTrue(isinstance(target_fractions, list))
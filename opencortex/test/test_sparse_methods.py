@@ -0,0 +1,217 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.build as oc_build
+import opencortex.build.sparse as oc_sparse
+
+import neuroml
+import neuroml.loaders as loaders
+import neuroml.writers as writers
+import numpy as np
+import os
+import scipy.sparse
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestSparseMethods(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+        self.nml_doc, self.net = oc.generate_network("SparseNet", network_seed=1234)
+
+        self.pop_pre = oc.add_population_in_rectangular_region(
+            self.net, "Pre", "iaf", 30, 0, 0, 0, 100, 100, 100
+        )
+
+        self.pop_post = oc.add_population_in_rectangular_region(
+            self.net, "Post", "iaf", 20, 0, 0, 0, 100, 100, 100
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    #########################################################################
+    def test_to_sparse(self):
+        proj = oc.add_probabilistic_projection(
+            self.net, "proj", self.pop_pre, self.pop_post, "ampa", 0.3, weight=2
+        )
+
+        columns = proj.connection_wds.columns()
+
+        shape = oc_sparse.get_projection_shape(self.net, proj)
+
+        self.assertEqual(shape, (30, 20))
+
+        matrix = proj.to_sparse(shape=shape)
+
+        self.assertTrue(scipy.sparse.issparse(matrix))
+
+        self.assertEqual(matrix.shape, (30, 20))
+
+        self.assertEqual(matrix.nnz, len(proj.connection_wds))
+
+        self.assertTrue(np.array_equal(matrix.row, columns["pre_cell"]))
+
+        self.assertTrue(np.array_equal(matrix.col, columns["post_cell"]))
+
+        self.assertTrue(np.all(matrix.data == 2))
+
+        layers = oc_sparse.to_sparse_layers(
+            proj, layers=("weight", "delay"), shape=shape, format="csr"
+        )
+
+        self.assertEqual(layers["weight"].format, "csr")
+
+        self.assertEqual(layers["delay"].sum(), 0)
+
+        counts = oc_sparse.to_sparse(proj, values=None, shape=shape, format="csc")
+
+        self.assertTrue(
+            np.array_equal(
+                np.asarray(counts.sum(axis=0)).ravel(),
+                np.bincount(columns["post_cell"], minlength=20),
+            )
+        )
+
+        with self.assertRaises(Exception):
+            oc_sparse.to_sparse(proj, values="missing")
+
+        with self.assertRaises(Exception):
+            oc_sparse.to_sparse(proj, format="lil")
+
+        ### the same matrix from the connection objects read from XML and the arrays read from HDF5
+
+        expected = matrix.toarray()
+
+        writers.NeuroMLWriter.write(
+            self.nml_doc, os.path.join(self.dir, "SparseNet.net.nml")
+        )
+
+        writers.NeuroMLHdf5Writer.write(
+            self.nml_doc, os.path.join(self.dir, "SparseNet.net.nml.h5")
+        )
+
+        loaded_docs = [
+            loaders.NeuroMLLoader.load(os.path.join(self.dir, "SparseNet.net.nml")),
+            loaders.NeuroMLHdf5Loader.load(
+                os.path.join(self.dir, "SparseNet.net.nml.h5"), optimized=True
+            ),
+        ]
+
+        for loaded_doc in loaded_docs:
+            loaded_net = loaded_doc.networks[0]
+
+            loaded_proj = loaded_net.projections[0]
+
+            loaded = oc_sparse.to_sparse(
+                loaded_proj, shape=oc_sparse.get_projection_shape(loaded_net, proj)
+            )
+
+            self.assertTrue(np.array_equal(loaded.toarray(), expected))
+
+    #########################################################################
+    def test_add_projection_from_sparse(self):
+        rng = np.random.default_rng(1234)
+
+        weights = scipy.sparse.random(
+            30, 20, density=0.2, format="csr", random_state=rng
+        )
+
+        delays = weights.copy()
+
+        delays.data = np.round(rng.uniform(1, 5, size=weights.nnz), 1)
+
+        proj = oc.add_projection_from_sparse(
+            self.net, "sparse", self.pop_pre, self.pop_post, "ampa", weights, delays
+        )
+
+        self.assertEqual(len(proj.connection_wds), weights.nnz)
+
+        self.assertTrue(proj in self.net.projections)
+
+        self.assertTrue(
+            np.allclose(proj.to_sparse(shape=(30, 20)).toarray(), weights.toarray())
+        )
+
+        self.assertTrue(
+            np.allclose(
+                oc_sparse.to_sparse(proj, "delay", shape=(30, 20)).toarray(),
+                delays.toarray(),
+            )
+        )
+
+        connection = proj.connection_wds[0]
+
+        self.assertEqual(
+            connection.delay,
+            "%s ms"
+            % delays[connection.get_pre_cell_id(), connection.get_post_cell_id()],
+        )
+
+        ### dense arrays: a connection per nonzero entry
+
+        dense = np.zeros((30, 20))
+
+        dense[3, 4] = 0.5
+
+        dense[7, 1] = 1.5
+
+        proj = oc.add_projection_from_sparse(
+            self.net, "dense", self.pop_pre, self.pop_post, "ampa", dense, delays=2
+        )
+
+        self.assertEqual(
+            [
+                (conn.get_pre_cell_id(), conn.get_post_cell_id())
+                for conn in proj.connection_wds
+            ],
+            [(3, 4), (7, 1)],
+        )
+
+        self.assertEqual(proj.connection_wds[1].delay, "2 ms")
+
+        with self.assertRaises(Exception):
+            oc.add_projection_from_sparse(
+                self.net, "wrong", self.pop_pre, self.pop_post, "ampa", dense.T
+            )
+
+        with self.assertRaises(Exception):
+            oc.add_projection_from_sparse(
+                self.net, "wrong", self.pop_pre, self.pop_post, "ampa", dense, [1, 2, 3]
+            )
+
+    #########################################################################
+    def test_get_pre_and_post_segment_ids(self):
+        proj = oc_build.containers.ColumnarProjection(
+            id="proj",
+            presynaptic_population="Pre",
+            postsynaptic_population="Post",
+            synapse="ampa",
+        )
+
+        for index in range(5):
+            proj.connection_wds.append(
+                neuroml.ConnectionWD(
+                    id=index,
+                    pre_cell_id="../Pre/%i/iaf" % index,
+                    pre_segment_id=index,
+                    post_cell_id="../Post/%i/iaf" % index,
+                    post_segment_id=2 * index,
+                    weight=1,
+                    delay="0ms",
+                )
+            )
+
+        pre_segment_ids, post_segment_ids = oc_build.get_pre_and_post_segment_ids(proj)
+
+        self.assertEqual(pre_segment_ids, [0, 1, 2, 3, 4])
+
+        self.assertEqual(post_segment_ids, [0, 2, 4, 6, 8])
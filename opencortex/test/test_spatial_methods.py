@@ -0,0 +1,334 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.build as oc_build
+import opencortex.build.spatial as oc_spatial
+import opencortex.utils as oc_utils
+import neuroml
+import numpy as np
+
+import random
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestSpatialMethods(unittest.TestCase):
+    #########################################################################
+    def test_query_radius(self):
+        rng = np.random.default_rng(1234)
+
+        positions = rng.uniform(0, 500, size=(400, 3))
+
+        positions[:, 1] *= -1
+
+        index = oc_spatial.SpatialIndex(positions, 60)
+
+        for radius in [0, 30, 60, 150, 1000]:
+            for point in [positions[0], [250, -250, 250], [-100, 50, 700]]:
+                cell_ids, distances = index.query_radius(point, radius)
+
+                all_distances = np.sqrt(np.sum((positions - point) ** 2, axis=1))
+
+                expected = np.nonzero(all_distances <= radius)[0]
+
+                self.assertTrue(np.array_equal(cell_ids, expected))
+
+                self.assertTrue(np.allclose(distances, all_distances[expected]))
+
+        cache = {}
+
+        first = oc_spatial.get_spatial_index(positions, 60, cache, "Pop0")
+
+        second = oc_spatial.get_spatial_index(positions, 60, cache, "Pop0")
+
+        self.assertTrue(first is second)
+
+        cell_ids, distances = oc_spatial.cells_within_radius(positions, [0, 0, 0])
+
+        self.assertEqual(len(cell_ids), 400)
+
+    #########################################################################
+    def test_add_chem_spatial_projection_with_cutoff(self):
+        network = neuroml.Network(id="Net0")
+
+        pop_pre = neuroml.Population(id="Pop0", component="L23PyrRS", size=200)
+
+        pop_post = neuroml.Population(id="Pop1", component="L23PyrFRB", size=200)
+
+        pre_positions = [[10.0 * i, 0, 0] for i in range(0, 200)]
+
+        post_positions = [[10.0 * i, 20, 0] for i in range(0, 200)]
+
+        target_dict = {"soma_group": {"SegList": [0], "LengthDist": [10]}}
+
+        random.seed(1234)
+
+        proj_array = [
+            neuroml.Projection(
+                id="Proj0",
+                presynaptic_population=pop_pre.id,
+                postsynaptic_population=pop_post.id,
+                synapse="AMPA",
+            )
+        ]
+
+        cache = {}
+
+        proj_array = oc_build.add_chem_spatial_projection(
+            network,
+            proj_array,
+            pop_pre,
+            pop_post,
+            "convergent",
+            ["AMPA"],
+            None,
+            target_dict,
+            {"soma_group": 3},
+            "1 if r < 50 else 0",
+            pre_positions,
+            post_positions,
+            None,
+            None,
+            cutoff_radius=50,
+            spatial_index_cache=cache,
+        )
+
+        self.assertEqual(len(cache), 1)
+
+        self.assertEqual(len(proj_array[0].connection_wds), 3 * 200)
+
+        for connection in proj_array[0].connection_wds:
+            pre_cell_id = connection.get_pre_cell_id()
+
+            post_cell_id = connection.get_post_cell_id()
+
+            distance = np.sqrt(
+                np.sum(
+                    (
+                        np.array(pre_positions[pre_cell_id])
+                        - np.array(post_positions[post_cell_id])
+                    )
+                    ** 2
+                )
+            )
+
+            self.assertTrue(distance < 50)
+
+    #########################################################################
+    def test_overlap_grid(self):
+        rng = np.random.default_rng(4321)
+
+        positions = rng.uniform(-100, 100, size=(300, 3))
+
+        radii = rng.choice([5.0, 12.0], size=300)
+
+        grid = oc_spatial.OverlapGrid(12)
+
+        for position, radius in zip(positions, radii):
+            grid.add(position, radius)
+
+        self.assertEqual(grid.size, 300)
+
+        for point in rng.uniform(-120, 120, size=(200, 3)):
+            distances = np.sqrt(np.sum((positions - point) ** 2, axis=1))
+
+            self.assertEqual(grid.overlaps(point), bool(np.any(distances < radii)))
+
+            self.assertEqual(
+                grid.overlaps(point, 20),
+                bool(np.any(distances < np.maximum(radii, 20))),
+            )
+
+    #########################################################################
+    def test_poisson_disk_positions(self):
+        rng = np.random.default_rng(1234)
+
+        occupied = oc_spatial.OverlapGrid(20)
+
+        occupied.add([50, 50, 50], 20)
+
+        positions = oc_spatial.poisson_disk_positions(
+            rng,
+            [0, 0, 0],
+            [100, 100, 100],
+            10,
+            inside=lambda position: position[0] >= position[1],
+            occupied=occupied,
+        )
+
+        self.assertTrue(len(positions) > 200)
+
+        self.assertTrue(np.all(positions >= 0) and np.all(positions <= 100))
+
+        self.assertTrue(np.all(positions[:, 0] >= positions[:, 1]))
+
+        distances = np.sqrt(
+            np.sum((positions[:, np.newaxis] - positions[np.newaxis]) ** 2, axis=2)
+        )
+
+        np.fill_diagonal(distances, np.inf)
+
+        self.assertTrue(distances.min() >= 10)
+
+        self.assertTrue(np.all(np.sqrt(np.sum((positions - 50) ** 2, axis=1)) >= 20))
+
+    #########################################################################
+    def test_non_overlapping_placement(self):
+        cell_diameters = {"L23PyrRS": 12.0, "L23PyrFRB": 20.0}
+
+        for placement in ["random", "poisson_disk"]:
+            network = neuroml.Network(id="Net0")
+
+            random.seed(1234)
+
+            pops = oc_utils.add_populations_in_cylindrical_layers(
+                network,
+                {"L23": [0, 100], "L4": [100, 150]},
+                {
+                    "Pop0": (150, "L23", "L23PyrRS", "single", None),
+                    "Pop1": (60, "L4", "L23PyrFRB", "single", None),
+                    "Pop2": (40, "L23", "L23PyrFRB", "single", None),
+                },
+                100,
+                cellBodiesOverlap=False,
+                cellDiameterArray=cell_diameters,
+                numOfSides=6,
+                placement=placement,
+            )
+
+            positions = []
+
+            diameters = []
+
+            for pop_id in ["Pop0", "Pop1", "Pop2"]:
+                pop = pops[pop_id]["PopObj"]
+
+                self.assertEqual(len(pop.instances), pop.size)
+
+                positions.extend(pops[pop_id]["Positions"])
+
+                diameters.extend([cell_diameters[pop.component]] * pop.size)
+
+            positions = np.array(positions)
+
+            self.assertTrue(
+                np.all(np.sqrt(np.sum(positions[:, [0, 2]] ** 2, axis=1)) <= 100)
+            )
+
+            ### each cell is at least as far from the cells placed before it as their soma diameters
+            for index in range(1, len(positions)):
+                distances = np.sqrt(
+                    np.sum((positions[:index] - positions[index]) ** 2, axis=1)
+                )
+
+                self.assertTrue(np.all(distances >= np.array(diameters[:index]) - 1e-9))
+
+        network = neuroml.Network(id="Net0")
+
+        self.assertRaises(
+            Exception,
+            oc_build._add_population_in_rectangular_region,
+            network,
+            "Pop0",
+            "L23PyrRS",
+            1000,
+            0,
+            0,
+            0,
+            50,
+            50,
+            50,
+            cell_diameter_dict=cell_diameters,
+            placement="poisson_disk",
+        )
+
+    #########################################################################
+    def test_sample_column_positions(self):
+        rng = np.random.default_rng(1234)
+
+        square = [[-1, -1], [1, -1], [1, 1], [-1, 1]]
+
+        points = rng.uniform(-2, 2, size=(1000, 2))
+
+        expected = np.all(np.abs(points) < 1, axis=1)
+
+        self.assertTrue(
+            np.array_equal(oc_spatial.points_in_polygon(points, square), expected)
+        )
+
+        angles = np.linspace(0, 2 * np.pi * (1 - 1.0 / 6), 6)
+
+        hexagon = np.array([100 * np.cos(angles), 100 * np.sin(angles)]).T
+
+        for vertices in [None, hexagon]:
+            positions = oc_spatial.sample_column_positions(
+                rng, 20000, 100, -50, 50, vertices
+            )
+
+            self.assertEqual(positions.shape, (20000, 3))
+
+            self.assertTrue(np.all(np.sum(positions[:, :2] ** 2, axis=1) <= 100**2))
+
+            self.assertTrue(
+                np.all(positions[:, 2] >= -50) and np.all(positions[:, 2] <= 50)
+            )
+
+            ### uniform over the area: about a quarter of the points within half of the radius
+            inner = np.mean(np.sum(positions[:, :2] ** 2, axis=1) <= 50**2)
+
+            if vertices is None:
+                self.assertTrue(abs(inner - 0.25) < 0.02)
+
+            else:
+                self.assertTrue(
+                    np.all(oc_spatial.points_in_polygon(positions[:, :2], vertices))
+                )
+
+                self.assertTrue(abs(inner - np.pi / (6 * np.sqrt(3))) < 0.02)
+
+        network = neuroml.Network(id="Net0")
+
+        pop, positions = oc_build.add_population_in_cylindrical_region(
+            network,
+            "Pop0",
+            "L23PyrRS",
+            1000,
+            100,
+            0,
+            200,
+            store_soma=True,
+            num_of_polygon_sides=6,
+            positions_of_vertices=hexagon.tolist(),
+        )
+
+        self.assertEqual(positions.shape, (1000, 3))
+
+        self.assertTrue(
+            np.all(oc_spatial.points_in_polygon(positions[:, [0, 2]], hexagon))
+        )
+
+        self.assertTrue(np.all(positions[:, 1] >= 0) and np.all(positions[:, 1] <= 200))
+
+        self.assertEqual(len(pop.instances), 1000)
+
+        self.assertEqual(pop.instances[10].location.z, positions[10, 2])
+
+        ### constants_of_sides is ignored
+
+        with self.assertWarns(DeprecationWarning):
+            oc_build.add_population_in_cylindrical_region(
+                neuroml.Network(id="Net1"),
+                "Pop0",
+                "L23PyrRS",
+                10,
+                100,
+                0,
+                200,
+                num_of_polygon_sides=6,
+                positions_of_vertices=hexagon.tolist(),
+                constants_of_sides=[],
+            )
@@ -0,0 +1,237 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.build as oc_build
+import opencortex.utils.statistics as oc_statistics
+
+import json
+import neuroml
+import neuroml.loaders as loaders
+import numpy as np
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestStatisticsMethods(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+        self.nml_doc, self.net = oc.generate_network("StatsNet", network_seed=1234)
+
+        self.pop_pre = oc.add_population_in_rectangular_region(
+            self.net, "Pre", "iaf", 200, 0, 0, 0, 500, 500, 500
+        )
+
+        self.pop_post = oc.add_population_in_rectangular_region(
+            self.net, "Post", "iaf", 150, 0, 0, 0, 500, 500, 500
+        )
+
+        self.proj = oc.add_probabilistic_projection(
+            self.net, "proj", self.pop_pre, self.pop_post, "ampa", 0.2, weight=2
+        )
+
+        self.recurrent = oc.add_probabilistic_projection(
+            self.net, "rec", self.pop_post, self.pop_post, "ampa", 0.5, delay=3
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    #########################################################################
+    def test_network_statistics(self):
+        statistics = oc_statistics.get_network_statistics(self.nml_doc)
+
+        self.assertEqual(statistics["network"], "StatsNet")
+
+        self.assertEqual(statistics["populations"]["Pre"]["size"], 200)
+
+        self.assertEqual(len(statistics["projections"]), 2)
+
+        projection = statistics["projections"][0]
+
+        columns = self.proj.connection_wds.columns()
+
+        self.assertEqual(projection["id"], self.proj.id)
+
+        self.assertEqual(projection["type"], "chemical")
+
+        self.assertEqual(projection["connections"], len(self.proj.connection_wds))
+
+        in_degrees = np.bincount(columns["post_cell"], minlength=150)
+
+        self.assertEqual(projection["in_degree"]["max"], in_degrees.max())
+
+        self.assertAlmostEqual(projection["in_degree"]["mean"], in_degrees.mean())
+
+        self.assertEqual(sum(projection["in_degree"]["histogram"]["counts"]), 150)
+
+        self.assertEqual(sum(projection["out_degree"]["histogram"]["counts"]), 200)
+
+        self.assertEqual(projection["weight"]["min"], 2)
+
+        self.assertEqual(projection["weight"]["std"], 0)
+
+        self.assertEqual(projection["delay"]["mean"], 0)
+
+        self.assertEqual(
+            projection["synapses"]["segments"], {"0": len(self.proj.connection_wds)}
+        )
+
+        distance = projection["distance"]
+
+        self.assertEqual(sum(distance["connections"]), projection["connections"])
+
+        self.assertAlmostEqual(sum(distance["pairs"]), 200 * 150)
+
+        probabilities = [
+            probability
+            for probability, pairs in zip(distance["probability"], distance["pairs"])
+            if pairs > 500
+        ]
+
+        self.assertTrue(
+            all(abs(probability - 0.2) < 0.05 for probability in probabilities)
+        )
+
+        ### pairs of the same cell are not counted in recurrent projections
+
+        recurrent = statistics["projections"][1]
+
+        self.assertAlmostEqual(sum(recurrent["distance"]["pairs"]), 150 * 149)
+
+        self.assertEqual(recurrent["delay"]["max"], 3)
+
+        ### the same statistics from the HDF5 file, read in small chunks
+
+        oc.save_network(
+            self.nml_doc,
+            "StatsNet.net.nml.h5",
+            validate=False,
+            format="hdf5",
+            target_dir=self.dir,
+        )
+
+        chunk_size = oc_statistics.CHUNK_SIZE
+
+        oc_statistics.CHUNK_SIZE = 1000
+
+        try:
+            loaded = oc_statistics.get_network_statistics(
+                os.path.join(self.dir, "StatsNet.net.nml.h5")
+            )
+
+        finally:
+            oc_statistics.CHUNK_SIZE = chunk_size
+
+        self.assertEqual(loaded["populations"], statistics["populations"])
+
+        for projection, loaded_projection in zip(
+            statistics["projections"], loaded["projections"]
+        ):
+            for key in [
+                "id",
+                "connections",
+                "in_degree",
+                "out_degree",
+                "weight",
+                "delay",
+                "synapses",
+            ]:
+                self.assertEqual(projection[key], loaded_projection[key])
+
+            self.assertEqual(
+                sum(loaded_projection["distance"]["connections"]),
+                projection["connections"],
+            )
+
+    #########################################################################
+    def test_segment_groups(self):
+        cell = loaders.read_neuroml2_file(
+            os.path.join(os.path.dirname(__file__), "Test.cell.nml")
+        ).cells[0]
+
+        population = neuroml.Population(
+            id="Pyr", component=cell.id, size=10, type="populationList"
+        )
+
+        self.net.populations.append(population)
+
+        proj = oc_build.containers.ColumnarProjection(
+            id="proj_Pyr",
+            presynaptic_population="Pre",
+            postsynaptic_population="Pyr",
+            synapse="ampa",
+            pre_cell_format=oc_build.containers.cell_id_format(self.pop_pre),
+            post_cell_format=oc_build.containers.cell_id_format(population),
+        )
+
+        index = oc_build.morphology.get_morphology_index(cell)
+
+        soma_segments = index.segments_in_group("soma_group")
+
+        dendrite_segments = index.segments_in_group("dendrite_group")
+
+        post_segments = np.concatenate(
+            [np.repeat(soma_segments[:1], 5), np.repeat(dendrite_segments[:2], 4)]
+        )
+
+        proj.connection_wds.add(
+            np.arange(len(post_segments)),
+            np.arange(len(post_segments)),
+            np.arange(len(post_segments)) % 10,
+            post_segment_ids=post_segments,
+        )
+
+        self.net.projections.append(proj)
+
+        statistics = oc_statistics.get_network_statistics(
+            self.net,
+            cells={cell.id: cell},
+            segment_groups=["soma_group", "dendrite_group", "axon_group"],
+        )
+
+        synapses = statistics["projections"][-1]["synapses"]
+
+        self.assertEqual(
+            synapses["segment_groups"], {"soma_group": 5, "dendrite_group": 8}
+        )
+
+        self.assertEqual(sum(synapses["segments"].values()), 13)
+
+        ### without the cells, only the segments are counted
+
+        statistics = oc_statistics.get_network_statistics(self.net)
+
+        self.assertFalse("segment_groups" in statistics["projections"][-1]["synapses"])
+
+    #########################################################################
+    def test_save_report(self):
+        statistics = oc_statistics.get_network_statistics(self.nml_doc)
+
+        json_file_name = oc_statistics.save_report(
+            statistics, os.path.join(self.dir, "StatsNet.json")
+        )
+
+        with open(json_file_name) as json_file:
+            self.assertEqual(json.load(json_file), json.loads(json.dumps(statistics)))
+
+        html_file_name = oc_statistics.save_report(
+            statistics, os.path.join(self.dir, "StatsNet.html")
+        )
+
+        with open(html_file_name) as html_file:
+            report = html_file.read()
+
+        self.assertTrue(report.startswith("<!DOCTYPE html>"))
+
+        self.assertTrue(self.proj.id in report)
+
+        self.assertTrue("<svg" in report)
@@ -0,0 +1,160 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.build.streaming as oc_streaming
+from neuroml.loaders import NeuroMLHdf5Loader
+
+import os
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class TestStreamingMethods(unittest.TestCase):
+    #########################################################################
+    def _build_network(self, target_dir, stream):
+        nml_doc, net = oc.generate_network("StreamNet", network_seed=1234)
+
+        oc.add_exp_two_syn(nml_doc, "ampa", "1nS", "0mV", "0.1ms", "2ms")
+
+        oc.add_pulse_generator(nml_doc, "pg", "10ms", "100ms", "0.1nA")
+
+        if stream:
+            writer = oc.stream_network_to_hdf5(
+                nml_doc, net, "StreamNet.net.nml.h5", target_dir=target_dir
+            )
+
+            self.assertTrue(oc_streaming.get_writer(net) is writer)
+
+        pop1 = oc.add_population_in_rectangular_region(
+            net, "Pop1", "iaf", 30, 0, 0, 0, 100, 100, 100
+        )
+
+        pop2 = oc.add_population_in_rectangular_region(
+            net, "Pop2", "iaf", 20, 0, 0, 0, 100, 100, 100
+        )
+
+        proj = oc.add_probabilistic_projection(
+            net, "proj", pop1, pop2, "ampa", 0.3, delay=2, weight=0.5
+        )
+
+        if stream:
+            ### the connections have been written to file and released
+            self.assertEqual(len(proj.connection_wds), 0)
+
+        oc.add_probabilistic_projection(net, "proj", pop2, pop1, "ampa", 0.2)
+
+        oc.add_inputs_to_population(net, "stim", pop1, "pg", all_cells=True)
+
+        oc.save_network(
+            nml_doc,
+            "StreamNet.net.nml.h5",
+            validate=False,
+            format="hdf5",
+            target_dir=target_dir,
+        )
+
+        if stream:
+            self.assertTrue(oc_streaming.get_writer(net) == None)
+
+        return NeuroMLHdf5Loader.load(os.path.join(target_dir, "StreamNet.net.nml.h5"))
+
+    #########################################################################
+    def test_stream_network_to_hdf5(self):
+        expected_doc = self._build_network(tempfile.mkdtemp(), False)
+
+        streamed_doc = self._build_network(tempfile.mkdtemp(), True)
+
+        self.assertEqual(
+            [synapse.id for synapse in streamed_doc.exp_two_synapses], ["ampa"]
+        )
+
+        expected_net = expected_doc.networks[0]
+
+        streamed_net = streamed_doc.networks[0]
+
+        self.assertEqual(streamed_net.temperature, expected_net.temperature)
+
+        self.assertEqual(
+            [pop.id for pop in streamed_net.populations],
+            [pop.id for pop in expected_net.populations],
+        )
+
+        self.assertEqual(
+            [input_list.id for input_list in streamed_net.input_lists], ["stim"]
+        )
+
+        self.assertEqual(len(streamed_net.input_lists[0].input), 30)
+
+        self.assertEqual(len(streamed_net.projections), 2)
+
+        for expected_proj, streamed_proj in zip(
+            expected_net.projections, streamed_net.projections
+        ):
+            self.assertEqual(streamed_proj.id, expected_proj.id)
+
+            self.assertEqual(
+                len(streamed_proj.connection_wds), len(expected_proj.connection_wds)
+            )
+
+            self.assertTrue(len(streamed_proj.connection_wds) > 0)
+
+            for expected, streamed in zip(
+                expected_proj.connection_wds, streamed_proj.connection_wds
+            ):
+                self.assertEqual(
+                    (
+                        streamed.get_pre_cell_id(),
+                        streamed.get_post_cell_id(),
+                        streamed.weight,
+                        streamed.get_delay_in_ms(),
+                    ),
+                    (
+                        expected.get_pre_cell_id(),
+                        expected.get_post_cell_id(),
+                        expected.weight,
+                        expected.get_delay_in_ms(),
+                    ),
+                )
+
+    #########################################################################
+    def test_save_streamed_network_as_xml(self):
+        target_dir = tempfile.mkdtemp()
+
+        nml_doc, net = oc.generate_network("StreamNet", network_seed=1234)
+
+        oc.add_exp_two_syn(nml_doc, "ampa", "1nS", "0mV", "0.1ms", "2ms")
+
+        oc.stream_network_to_hdf5(
+            nml_doc, net, "StreamNet.net.nml.h5", target_dir=target_dir
+        )
+
+        pop = oc.add_population_in_rectangular_region(
+            net, "Pop", "iaf", 20, 0, 0, 0, 100, 100, 100
+        )
+
+        oc.add_probabilistic_projection(net, "proj", pop, pop, "ampa", 0.3)
+
+        ### the connections have been released, so they cannot be written to XML
+
+        with self.assertRaises(Exception):
+            oc.save_network(
+                nml_doc, "StreamNet.net.nml", validate=False, target_dir=target_dir
+            )
+
+        self.assertFalse(os.path.exists(os.path.join(target_dir, "StreamNet.net.nml")))
+
+        ### the streamed file has been completed and closed
+
+        self.assertTrue(oc_streaming.get_writer(net) == None)
+
+        streamed_net = NeuroMLHdf5Loader.load(
+            os.path.join(target_dir, "StreamNet.net.nml.h5")
+        ).networks[0]
+
+        self.assertTrue(len(streamed_net.projections[0].connection_wds) > 0)
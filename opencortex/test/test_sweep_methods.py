@@ -0,0 +1,203 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex.core as oc
+import opencortex.utils.sweep as oc_sweep
+
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+def _log_call(name):
+    ### the working directory of a job is in the sweep directory
+    with open(os.path.join("..", "calls.txt"), "a") as f:
+        f.write("%s\n" % name)
+
+
+def generate(size, rate):
+    """Builds a small network and writes its LEMS simulation in the current directory"""
+
+    reference = "Sweep_%s_%s" % (size, rate)
+
+    _log_call(reference)
+
+    if rate < 0:
+        raise Exception("Error! The rate must not be negative")
+
+    nml_doc, network = oc.generate_network(reference)
+
+    oc.add_spike_source_poisson(nml_doc, "ssp", "0ms", "100ms", "%sHz" % rate)
+
+    oc.add_population_in_rectangular_region(
+        network, "Pop0", "ssp", size, 0, 0, 0, 100, 100, 100
+    )
+
+    nml_file_name = "%s.net.nml" % network.id
+
+    oc.save_network(nml_doc, nml_file_name, validate=False)
+
+    lems_file_name, lems_sim = oc.generate_lems_simulation(
+        nml_doc, network, nml_file_name, duration=100, dt=0.025
+    )
+
+    return nml_doc, nml_file_name, lems_file_name
+
+
+def generate_and_crash_once(size, rate):
+    """Ends the worker process the first time it is called with size 3"""
+
+    if size == 3 and not os.path.isfile(os.path.join("..", "crashed.txt")):
+        open(os.path.join("..", "crashed.txt"), "w").close()
+
+        os._exit(1)
+
+    return generate(size, rate)
+
+
+def count_cells(parameters, output, results):
+    return len(output[0].networks[0].populations[0].instances)
+
+
+class TestSweepMethods(unittest.TestCase):
+    def setUp(self):
+        self.sweep_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.sweep_dir)
+
+    def _get_calls(self):
+        with open(os.path.join(self.sweep_dir, "calls.txt")) as f:
+            return f.read().split()
+
+    #########################################################################
+    def test_expand_parameter_grid(self):
+        points = oc_sweep.expand_parameter_grid({"a": [1, 2], "b": ["x", "y", "z"]})
+
+        self.assertEqual(len(points), 6)
+
+        self.assertEqual(points[0], {"a": 1, "b": "x"})
+
+        self.assertEqual(points[1], {"a": 1, "b": "y"})
+
+        points = oc_sweep.expand_parameter_grid(
+            [{"a": [1, 2], "b": ["x"]}, {"a": 3, "b": "y"}]
+        )
+
+        self.assertEqual(
+            points, [{"a": 1, "b": "x"}, {"a": 2, "b": "x"}, {"a": 3, "b": "y"}]
+        )
+
+        self.assertEqual(
+            oc_sweep.get_job_id({"a": 1, "b": "x"}),
+            oc_sweep.get_job_id({"b": "x", "a": 1}),
+        )
+
+        self.assertNotEqual(
+            oc_sweep.get_job_id({"a": 1, "b": "x"}),
+            oc_sweep.get_job_id({"a": 2, "b": "x"}),
+        )
+
+    #########################################################################
+    def test_number_of_workers(self):
+        self.assertEqual(oc_sweep.parse_memory("400M"), 400)
+
+        self.assertEqual(oc_sweep.parse_memory("4G"), 4096)
+
+        self.assertEqual(oc_sweep.get_number_of_workers("400M", "2G", 16), 5)
+
+        self.assertEqual(oc_sweep.get_number_of_workers("400M", "2G", 2), 2)
+
+        self.assertEqual(oc_sweep.get_number_of_workers("1G", None, 3), 3)
+
+        self.assertRaises(Exception, oc_sweep.get_number_of_workers, "4G", "1G", 2)
+
+    #########################################################################
+    def test_run_sweep(self):
+        grid = {"size": [2, 3], "rate": [10, -1, 20]}
+
+        finished = []
+
+        results = oc_sweep.run_sweep(
+            generate,
+            grid,
+            self.sweep_dir,
+            simulator=None,
+            max_workers=2,
+            analyse=count_cells,
+            callback=lambda result: finished.append(result["Id"]),
+        )
+
+        self.assertEqual(len(results), 6)
+
+        self.assertEqual(sorted(finished), sorted([result["Id"] for result in results]))
+
+        for parameters, result in zip(oc_sweep.expand_parameter_grid(grid), results):
+            self.assertEqual(result["Parameters"], parameters)
+
+            if parameters["rate"] < 0:
+                self.assertEqual(result["Status"], oc_sweep.FAILED)
+
+                self.assertTrue("must not be negative" in result["Error"])
+
+            else:
+                self.assertEqual(result["Status"], oc_sweep.DONE)
+
+                self.assertEqual(result["Output"], parameters["size"])
+
+                self.assertTrue(
+                    os.path.isfile(
+                        os.path.join(result["Directory"], result["LEMSFile"])
+                    )
+                )
+
+        self.assertEqual(len(self._get_calls()), 6)
+
+        ### only the failed jobs are run again when the sweep is resumed
+
+        results = oc_sweep.run_sweep(
+            generate, grid, self.sweep_dir, simulator=None, analyse=count_cells
+        )
+
+        self.assertEqual(len(self._get_calls()), 8)
+
+        self.assertEqual(
+            [result["Status"] for result in results],
+            ["done", "failed", "done", "done", "failed", "done"],
+        )
+
+        self.assertEqual(len(oc_sweep.load_sweep_results(self.sweep_dir)), 6)
+
+        results = oc_sweep.run_sweep(
+            generate,
+            grid,
+            self.sweep_dir,
+            simulator=None,
+            analyse=count_cells,
+            retry_failed=False,
+        )
+
+        self.assertEqual(len(self._get_calls()), 8)
+
+    #########################################################################
+    def test_worker_crash(self):
+        results = oc_sweep.run_sweep(
+            generate_and_crash_once,
+            {"size": [2, 3, 4], "rate": [10]},
+            self.sweep_dir,
+            simulator=None,
+            max_workers=1,
+            analyse=count_cells,
+        )
+
+        self.assertTrue(os.path.isfile(os.path.join(self.sweep_dir, "crashed.txt")))
+
+        self.assertEqual([result["Status"] for result in results], ["done"] * 3)
+
+        self.assertEqual([result["Output"] for result in results], [2, 3, 4])
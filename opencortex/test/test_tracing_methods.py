@@ -0,0 +1,159 @@
+#####################
+### Subject to change without notice!!
+#####################
+
+import opencortex
+import opencortex.build.tracing as oc_tracing
+import opencortex.core as oc
+
+import os
+import shutil
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+
+class NotFormatted(object):
+    def __str__(self):
+        raise Exception("Error! This comment should not be formatted")
+
+
+class TestTracingMethods(unittest.TestCase):
+    def tearDown(self):
+        oc_tracing.disable()
+
+        oc_tracing.reset()
+
+    #########################################################################
+    def test_disabled(self):
+        self.assertFalse(oc_tracing.enabled)
+
+        with oc_tracing.stage("Stage0"):
+            oc_tracing.count("connections", 10)
+
+        nml_doc, network = oc.generate_network("Net0")
+
+        oc.add_single_cell_population(network, "Pop0", "iaf")
+
+        self.assertEqual(oc_tracing.get_report(), {})
+
+        ### the arguments of comments which are not printed are not formatted
+
+        opencortex.print_comment("Comment %s", args=(NotFormatted(),))
+
+        opencortex.print_comment("Comment %s", print_it=False, args=(NotFormatted(),))
+
+        self.assertRaises(
+            Exception,
+            opencortex.print_comment,
+            "Comment %s",
+            print_it=True,
+            args=(NotFormatted(),),
+        )
+
+    #########################################################################
+    def test_report(self):
+        oc_tracing.enable(memory=True)
+
+        nml_doc, network = oc.generate_network("Net0")
+
+        with oc_tracing.stage("build"):
+            pop_pre = oc.add_population_in_rectangular_region(
+                network, "Pop0", "iaf", 50, 0, 0, 0, 100, 100, 100
+            )
+
+            pop_post = oc.add_population_in_rectangular_region(
+                network, "Pop1", "iaf", 40, 0, 0, 0, 100, 100, 100
+            )
+
+            oc.add_probabilistic_projection(
+                network, "proj", pop_pre, pop_post, "AMPA", 0.5
+            )
+
+            oc.add_inputs_to_population(
+                network, "Input0", pop_post, "pg0", number_per_cell=3, all_cells=True
+            )
+
+        target_dir = tempfile.mkdtemp()
+
+        try:
+            oc.save_network(
+                nml_doc,
+                "Net0.net.nml.h5",
+                validate=False,
+                format="hdf5",
+                target_dir=target_dir,
+            )
+
+            file_size = os.path.getsize(os.path.join(target_dir, "Net0.net.nml.h5"))
+
+        finally:
+            shutil.rmtree(target_dir)
+
+        report = oc_tracing.get_report()
+
+        self.assertEqual(report["build"]["Calls"], 1)
+
+        population_stage = "build/add_population_in_rectangular_region/_add_population_in_rectangular_region"
+
+        self.assertEqual(report[population_stage]["Calls"], 2)
+
+        self.assertEqual(report[population_stage]["Counters"]["cells"], 90)
+
+        self.assertTrue(
+            report["build"]["Time"]
+            >= report["build/add_probabilistic_projection"]["Time"]
+        )
+
+        num_connections = sum(
+            [len(projection.connection_wds) for projection in network.projections]
+        )
+
+        self.assertTrue(num_connections > 0)
+
+        self.assertEqual(
+            report["build/add_probabilistic_projection"]["Counters"]["connections"],
+            num_connections,
+        )
+
+        self.assertEqual(
+            report["build/add_inputs_to_population"]["Counters"]["inputs"], 120
+        )
+
+        self.assertEqual(report["save_network"]["Counters"]["bytes written"], file_size)
+
+        self.assertTrue(report["build"]["Peak"] > 0)
+
+        self.assertTrue(
+            report["build"]["Peak"]
+            >= report["build/add_probabilistic_projection"]["Peak"]
+        )
+
+        self.assertEqual(
+            oc_tracing.get_totals(),
+            {
+                "cells": 90,
+                "connections": num_connections,
+                "inputs": 120,
+                "bytes written": file_size,
+            },
+        )
+
+        lines = oc_tracing.format_report().split("\n")
+
+        self.assertTrue(lines[1].startswith("build"))
+
+        self.assertTrue(
+            lines[2].strip().startswith("add_population_in_rectangular_region")
+        )
+
+        self.assertTrue(lines[-1].startswith("Totals"))
+
+        oc_tracing.disable()
+
+        oc.add_single_cell_population(network, "Pop2", "iaf")
+
+        self.assertFalse("add_single_cell_population" in oc_tracing.get_report())
@@ -14,6 +14,7 @@ import opencortex.utils as oc_utils
 import neuroml
 import numpy as np
 import math
+import random
 
 try:
     import unittest2 as unittest
@@ -904,6 +905,108 @@ class TestUtilsMethods(unittest.TestCase):
 
         self.assertTrue(num_of_checked_chemical_projections == 8)
 
+    def test_build_connectivity_in_parallel(self):
+        popDict = {}
+        popDict["CG3D_L23PyrRS"] = (100, "L23", "Test", "multi", None)
+        popDict["CG3D_L23PyrFRB"] = (20, "L23", "Test2", "multi", None)
+        boundaries = {}
+        boundaries["L1"] = [0, 0]
+        boundaries["L23"] = [0, -500]
+
+        built = {}
+
+        for n_jobs in [
+            None,
+            2,
+            3,
+            "seeded",
+            "seeded_parallel",
+            "rank",
+            "rank_parallel",
+        ]:
+            random.seed(1234)
+
+            if str(n_jobs).startswith("seeded") or str(n_jobs).startswith("rank"):
+                nml_doc, network = oc.generate_network("Net0", network_seed=1234)
+
+            else:
+                network = neuroml.Network(id="Net0")
+
+            pop_params = oc_utils.add_populations_in_rectangular_layers(
+                net=network,
+                boundaryDict=boundaries,
+                popDict=popDict,
+                x_vector=[0, 500],
+                z_vector=[0, 500],
+            )
+
+            random_state = random.getstate()
+
+            ### the rank is set in the main process only: the workers must build the same slice
+
+            if str(n_jobs).startswith("rank"):
+                oc_build.partition.set_rank(oc_build.partition.Partition(2), 0)
+
+            try:
+                all_synapse_components, proj_array = oc_utils.build_connectivity(
+                    net=network,
+                    pop_objects=pop_params,
+                    path_to_cells=None,
+                    full_path_to_conn_summary="ConnListTest",
+                    return_cached_dicts=False,
+                    n_jobs={
+                        "seeded": None,
+                        "seeded_parallel": 2,
+                        "rank": None,
+                        "rank_parallel": 2,
+                    }.get(n_jobs, n_jobs),
+                )
+
+            finally:
+                oc_build.partition.clear_rank()
+
+            ### the projections of a network with a seed do not draw from the global random module
+
+            if str(n_jobs).startswith("seeded"):
+                self.assertEqual(random.getstate(), random_state)
+
+            built[n_jobs] = (
+                [proj.id for proj in network.projections],
+                [proj.id for proj in network.electrical_projections],
+                [
+                    (conn.pre_cell_id, conn.post_cell_id, conn.post_segment_id)
+                    for proj in network.projections
+                    for conn in proj.connection_wds
+                ],
+            )
+
+            self.assertTrue(len(built[n_jobs][2]) > 0)
+
+        self.assertEqual(built[None][0], built[2][0])
+
+        self.assertEqual(len(built[None][2]), len(built[2][2]))
+
+        self.assertEqual(built[2], built[3])
+
+        ### with a network seed the projections are built from their own random streams, as in the serial build
+
+        self.assertEqual(built["seeded"], built["seeded_parallel"])
+
+        ### a rank builds the connections onto its cells only, in the workers as in the main process
+
+        self.assertEqual(built["rank"], built["rank_parallel"])
+
+        self.assertTrue(len(built["rank"][2]) < len(built["seeded"][2]))
+
+        ### rank 0 of 2 owns the first 60 of the 120 cells, i.e. cells 0-59 of CG3D_L23PyrRS
+
+        self.assertTrue(
+            all(
+                int(post_cell.split("/")[2]) < 60
+                for pre_cell, post_cell, segment in built["rank"][2]
+            )
+        )
+
     def test_probability_based_connectivity(self):
         network = neuroml.Network(id="Net0")
         popDict = {}
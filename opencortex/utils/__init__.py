@@ -17,20 +17,25 @@ import neuroml.writers as writers
 import numpy as np
 import opencortex
 import opencortex.build as oc_build
+from opencortex.build import cell_cache
+from opencortex.utils import connectivity
 import operator
 import os
-import pyneuroml
-from pyneuroml import pynml
-import pyneuroml.lems
-from pyneuroml.lems.LEMSSimulation import LEMSSimulation
 import random
 import shutil
 import sys
 
 
+def __getattr__(name):
+    """Imports the slow modules of pyNeuroML (e.g. pynml) when they are first used"""
+
+    return opencortex._get_lazy_attribute(__name__, name)
+
+
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_populations_in_rectangular_layers(
     net,
     boundaryDict,
@@ -40,6 +45,7 @@ def add_populations_in_rectangular_layers(
     storeSoma=True,
     cellBodiesOverlap=True,
     cellDiameterArray=None,
+    placement="random",
 ):
     """This method distributes the cells in rectangular layers. The input arguments:
 
@@ -61,8 +67,11 @@ def add_populations_in_rectangular_layers(
 
     cellDiameterArray - optional dictionary of cell model diameters required when cellBodiesOverlap is set to False;
 
+    placement - 'random' (default) or 'poisson_disk', see opencortex.core.add_population_in_rectangular_region(); cellDiameterArray is required for 'poisson_disk';
+
     This method returns the dictionary; each key is a unique cell population id and the corresponding value is a dictionary
-    which refers to libNeuroML population object (key 'PopObj') and cell position array ('Positions') which by default is None."""
+    which refers to libNeuroML population object (key 'PopObj') and cell position array ('Positions') which by default is None.
+    """
 
     return_pops = {}
 
@@ -95,6 +104,7 @@ def add_populations_in_rectangular_layers(
                     population_dictionary=return_pops,
                     cell_diameter_dict=cellDiameterArray,
                     color=color,
+                    placement=placement,
                 )
 
             else:
@@ -113,6 +123,7 @@ def add_populations_in_rectangular_layers(
                     store_soma=storeSoma,
                     population_dictionary=return_pops,
                     cell_diameter_dict=cellDiameterArray,
+                    placement=placement,
                 )
 
                 cellPositions = None
@@ -131,6 +142,7 @@ def add_populations_in_rectangular_layers(
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def add_populations_in_cylindrical_layers(
     net,
     boundaryDict,
@@ -140,6 +152,7 @@ def add_populations_in_cylindrical_layers(
     cellBodiesOverlap=True,
     cellDiameterArray=None,
     numOfSides=None,
+    placement="random",
 ):
     """This method distributes the cells in cylindrical layers. The input arguments:
 
@@ -166,15 +179,16 @@ def add_populations_in_cylindrical_layers(
     numOfSides - optional argument which specifies the number of sides of regular polygon which is inscribed in the cylindrical column of a given radius; default value is None,
     thus cylindrical but not polygonal shape is built.
 
+    placement - 'random' (default) or 'poisson_disk', see opencortex.build.add_population_in_cylindrical_region(); cellDiameterArray is required for 'poisson_disk'.
+
     This method returns the dictionary; each key is a unique cell population id and the corresponding value is a dictionary
-    which refers to libNeuroML population object (key 'PopObj') and cell position array ('Positions') which by default is None."""
+    which refers to libNeuroML population object (key 'PopObj') and cell position array ('Positions') which by default is None.
+    """
 
     if numOfSides != None:
         if numOfSides >= 3:
             vertex_array = []
 
-            xy_sides = []
-
             angle_array = np.linspace(
                 0, 2 * math.pi * (1 - (1.0 / numOfSides)), numOfSides
             )
@@ -202,27 +216,6 @@ def add_populations_in_cylindrical_layers(
                 % (numOfSides, vertex_array)
             )
 
-            for v_ind in range(0, len(vertex_array)):
-                v1 = vertex_array[v_ind]
-
-                v2 = vertex_array[v_ind - 1]
-
-                if abs(v1[0] - v2[0]) > 0.00000001 and abs(v1[1] - v2[1]) > 0.00000001:
-                    A = np.array([[v1[0], 1], [v2[0], 1]])
-
-                    b = np.array([v1[1], v2[1]])
-
-                    xcyc = np.linalg.solve(A, b)
-
-                    xy_sides.append(list(xcyc))
-
-                else:
-                    if abs(v1[0] - v2[0]) <= 0.00000001:
-                        xy_sides.append([v1[0], None])
-
-                    if abs(v1[1] - v2[1]) <= 0.00000001:
-                        xy_sides.append([None, v1[1]])
-
         else:
             opencortex.print_comment_v(
                 "Error! Method opencortex.build.%s() called with numOfSides set to %d but regular polygon must contain at least 3 vertices."
@@ -235,8 +228,6 @@ def add_populations_in_cylindrical_layers(
     else:
         vertex_array = None
 
-        xy_sides = None
-
     return_pops = {}
 
     for cell_pop in popDict.keys():
@@ -260,8 +251,8 @@ def add_populations_in_cylindrical_layers(
                     cell_diameter_dict=cellDiameterArray,
                     num_of_polygon_sides=numOfSides,
                     positions_of_vertices=vertex_array,
-                    constants_of_sides=xy_sides,
                     color=color,
+                    placement=placement,
                 )
 
             else:
@@ -279,7 +270,7 @@ def add_populations_in_cylindrical_layers(
                     cell_diameter_dict=cellDiameterArray,
                     num_of_polygon_sides=numOfSides,
                     positions_of_vertices=vertex_array,
-                    constants_of_sides=xy_sides,
+                    placement=placement,
                 )
 
                 cellPositions = None
@@ -298,6 +289,7 @@ def add_populations_in_cylindrical_layers(
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def build_projection(
     net,
     proj_counter,
@@ -314,6 +306,8 @@ def build_projection(
     post_cell_positions=None,
     delays_dict=None,
     weights_dict=None,
+    cutoff_radius=None,
+    spatial_index_cache=None,
 ):
     """This method calls the appropriate methods that construct chemical or electrical projections. The input arguments are as follows:
 
@@ -347,7 +341,12 @@ def build_projection(
 
     delays_dict - optional dictionary that specifies the delays (in ms) for individual synapse components, e.g. {'NMDA':5.0} or {'AMPA':3.0,'NMDA':5};
 
-    weights_dict - optional dictionary that specifies the weights for individual synapse components, e.g. {'NMDA':1} or {'NMDA':1,'AMPA':2}."""
+    weights_dict - optional dictionary that specifies the weights for individual synapse components, e.g. {'NMDA':1} or {'NMDA':1,'AMPA':2};
+
+    cutoff_radius - optional distance beyond which distance_dependent_rule is assumed to be 0, see opencortex.build.add_chem_spatial_projection();
+
+    spatial_index_cache - optional dictionary in which the spatial indices over cell positions are cached, see opencortex.build.add_chem_spatial_projection().
+    """
 
     if presynaptic_population.size == 0 or postsynaptic_population.size == 0:
         return None
@@ -359,7 +358,7 @@ def build_projection(
 
     for synapse_id in synapse_list:
         if proj_type == "Elect":
-            proj = neuroml.ElectricalProjection(
+            proj = oc_build.containers.ColumnarElectricalProjection(
                 id="Proj%dsyn%d_%s_%s"
                 % (
                     proj_counter,
@@ -375,7 +374,7 @@ def build_projection(
             proj_array.append(proj)
 
         if proj_type == "Chem":
-            proj = neuroml.Projection(
+            proj = oc_build.containers.ColumnarProjection(
                 id="Proj%dsyn%d_%s_%s"
                 % (
                     proj_counter,
@@ -436,6 +435,8 @@ def build_projection(
                 post_cell_positions,
                 delays_dict,
                 weights_dict,
+                cutoff_radius=cutoff_radius,
+                spatial_index_cache=spatial_index_cache,
             )
 
         if proj_type == "Elect":
@@ -452,6 +453,8 @@ def build_projection(
                 distance_dependent_rule,
                 pre_cell_positions,
                 post_cell_positions,
+                cutoff_radius=cutoff_radius,
+                spatial_index_cache=spatial_index_cache,
             )
 
     return proj_array, proj_counter
@@ -459,7 +462,120 @@ def build_projection(
 
 ##############################################################################################
 
+### Populations and spatial indices shared by the projections built in a worker process of build_connectivity()
+_projection_worker_state = {}
+
+
+def _init_projection_worker(pop_objects, network_seed, populations, rank):
+    _projection_worker_state["pop_objects"] = pop_objects
+
+    _projection_worker_state["network_seed"] = network_seed
+
+    _projection_worker_state["populations"] = populations
+
+    ### the rank of the main process, if any, so that the workers build the same slice of the projections
+    partition, rank = rank
 
+    if partition != None:
+        oc_build.partition.set_rank(partition, rank)
+
+    else:
+        oc_build.partition.clear_rank()
+
+    _projection_worker_state["spatial_index_cache"] = {}
+
+
+def _build_projection_in_worker(task):
+    """Builds one projection of build_connectivity() in a worker process; returns the projections built together with those
+    which were added to the network (i.e. had connections)"""
+
+    seed, prePop, postPop, projection_args = task
+
+    ### projections of networks without a network seed are built from the seed drawn for them in the main process
+    if seed != None:
+        random.seed(seed)
+
+        np.random.seed(seed % 2**32)
+
+    pop_objects = _projection_worker_state["pop_objects"]
+
+    worker_net = neuroml.Network(id="worker")
+
+    ### the populations of the network (without their cells), from which the cells owned by the rank are found
+    for population_id, component, size in _projection_worker_state["populations"]:
+        worker_net.populations.append(
+            neuroml.Population(id=population_id, component=component, size=size)
+        )
+
+    if _projection_worker_state["network_seed"] != None:
+        oc_build.set_network_seed(worker_net, _projection_worker_state["network_seed"])
+
+    compound_proj = build_projection(
+        net=worker_net,
+        presynaptic_population=pop_objects[prePop]["PopObj"],
+        postsynaptic_population=pop_objects[postPop]["PopObj"],
+        pre_cell_positions=pop_objects[prePop]["Positions"],
+        post_cell_positions=pop_objects[postPop]["Positions"],
+        spatial_index_cache=_projection_worker_state["spatial_index_cache"],
+        **projection_args,
+    )
+
+    ### pickled together, so that the objects in the network lists are the same as in compound_proj
+    return compound_proj, worker_net.projections, worker_net.electrical_projections
+
+
+def _build_projections_in_parallel(net, pop_objects, projection_tasks, n_jobs):
+    """Builds the projections specified in `projection_tasks` (tuples of pre population id, post population id and
+    the other arguments of build_projection()) with a pool of `n_jobs` processes and adds them to `net` in order
+    """
+
+    import concurrent.futures
+
+    ### the global random module is only used (as in the serial build) if the projections are not built from the network seed
+    seeded = oc_build.get_network_seed(net) == None
+
+    seeded_tasks = [
+        (random.getrandbits(64) if seeded else None, prePop, postPop, projection_args)
+        for prePop, postPop, projection_args in projection_tasks
+    ]
+
+    opencortex.print_comment_v(
+        "Building %i projections with %i processes" % (len(seeded_tasks), n_jobs)
+    )
+
+    final_proj_array = []
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_jobs,
+        initializer=_init_projection_worker,
+        initargs=(
+            pop_objects,
+            oc_build.get_network_seed(net),
+            [
+                (population.id, population.component, population.size)
+                for population in net.populations
+            ],
+            oc_build.partition.get_rank(),
+        ),
+    ) as executor:
+        for compound_proj, projections, electrical_projections in executor.map(
+            _build_projection_in_worker, seeded_tasks
+        ):
+            net.projections.extend(projections)
+
+            net.electrical_projections.extend(electrical_projections)
+
+            oc_build.streaming.flush(net)
+
+            final_proj_array.extend(compound_proj)
+
+    return final_proj_array
+
+
+##############################################################################################
+
+
+@oc_build.tracing.traced()
 def build_connectivity(
     net,
     pop_objects,
@@ -471,6 +587,8 @@ def build_connectivity(
     synaptic_delay_params=None,
     distance_dependence_params=None,
     ignore_synapses=[],
+    distance_cutoff_radius=None,
+    n_jobs=None,
 ):
     """This method calls the appropriate build and utils methods to build connectivity of the NeuroML2 cortical network. Input arguments are as follows:
 
@@ -481,7 +599,8 @@ def build_connectivity(
     path_to_cells - dir path to the folder where target NeuroML2 .cell.nml files are found;
 
     full_path_to_conn_sumary - full path to the file which stores the connectivity summary, e.g. file named netConnList in the current working dir,
-    then this string must be "netConnList";
+    then this string must be "netConnList"; summaries in .csv/.tsv files are read with opencortex.utils.connectivity.ConnectivityTable.from_csv(); alternatively
+    a ConnectivityTable; the summary is parsed once and looked up for each pair of populations;
 
     pre_segment_group_info - input argument of type 'list' which specifies presynaptic segment groups; made to supplement connectivity summary of type netConnList
     in the Thalamocortical project; default value is []; alternatively it might have one value of type'dict' or several values of type 'dict'; in the former case,
@@ -508,16 +627,38 @@ def build_connectivity(
 
     distance_dependent_params - optional input argument, default value is None. Alternatively, it take the format of
 
-    [{'PrePopID':'Pop1','PostPopID':'Pop2','DistDependConn':'- 17.45 + 18.36 / (math.exp((r-267.)/39.) +1)','Type':'Elect'}]."""
+    [{'PrePopID':'Pop1','PostPopID':'Pop2','DistDependConn':'- 17.45 + 18.36 / (math.exp((r-267.)/39.) +1)','Type':'Elect'}]; each dictionary can also contain the
+    field 'CutoffRadius', the distance beyond which the rule is assumed to be 0 (overrides distance_cutoff_radius).
+
+    distance_cutoff_radius - optional default for the distance beyond which the distance dependent rules are assumed to be 0; candidate pairs of cells are then found with
+    radius queries on spatial indices over the cell positions, which are shared by all the projections built in this call.
+
+    n_jobs - optional number of worker processes (-1 for one per CPU) among which the projections are shared out; by default they are built serially.
+    The projections are added to net in the same order as in the serial build. For networks created with opencortex.core.generate_network() each projection
+    is built from its own random stream (see opencortex.build.get_element_rng()), so the result is the same as the serial build; otherwise each projection
+    gets a seed drawn in order from the global random module, so the result does not depend on n_jobs but differs from the serial build.
+    """
 
     final_synapse_list = []
 
+    projection_tasks = []
+
     final_proj_array = []
 
     cached_target_dict = {}
 
+    spatial_index_cache = {}
+
     proj_counter = 0
 
+    if isinstance(full_path_to_conn_summary, connectivity.ConnectivityTable):
+        conn_table = full_path_to_conn_summary
+
+    else:
+        conn_table = connectivity.get_connectivity_table(
+            full_path_to_conn_summary, ignore_synapses
+        )
+
     for prePop in pop_objects.keys():
         preCellObject = pop_objects[prePop]
 
@@ -525,12 +666,7 @@ def build_connectivity(
             postCellObject = pop_objects[postPop]
 
             if preCellObject["PopObj"].size != 0 and postCellObject["PopObj"].size != 0:
-                proj_summary = read_connectivity(
-                    prePop,
-                    postPop,
-                    full_path_to_conn_summary,
-                    ignore_synapses=ignore_synapses,
-                )
+                proj_summary = conn_table.get(prePop, postPop)
 
                 if proj_summary != []:
                     for proj_ind in range(0, len(proj_summary)):
@@ -568,14 +704,27 @@ def build_connectivity(
                         else:
                             delays = None
 
+                        cutoff_radius = distance_cutoff_radius
+
                         if distance_dependence_params != None:
-                            dist_par = parse_distance_dependent_rule(
+                            dist_par = parse_distance_dependence_params(
                                 distance_dependence_params,
                                 prePop,
                                 postPop,
                                 projInfo["Type"],
                             )
 
+                            dist_cutoff = parse_distance_dependence_params(
+                                distance_dependence_params,
+                                prePop,
+                                postPop,
+                                projInfo["Type"],
+                                parameter="CutoffRadius",
+                            )
+
+                            if dist_cutoff != None:
+                                cutoff_radius = dist_cutoff
+
                         else:
                             dist_par = None
 
@@ -684,26 +833,50 @@ def build_connectivity(
                         else:
                             PreSegLengthDict = None
 
-                        compound_proj = build_projection(
-                            net=net,
-                            proj_counter=proj_counter,
-                            proj_type=projInfo["Type"],
-                            presynaptic_population=preCellObject["PopObj"],
-                            postsynaptic_population=postCellObject["PopObj"],
-                            synapse_list=synapseList,
-                            targeting_mode=targetingMode,
-                            pre_seg_length_dict=PreSegLengthDict,
-                            post_seg_length_dict=PostSegLengthDict,
-                            num_of_conn_dict=subset_dict,
-                            distance_dependent_rule=dist_par,
-                            pre_cell_positions=preCellObject["Positions"],
-                            post_cell_positions=postCellObject["Positions"],
-                            delays_dict=delays,
-                            weights_dict=weights,
+                        ### the projections are built once all of them have been specified, see below
+                        projection_tasks.append(
+                            (
+                                prePop,
+                                postPop,
+                                dict(
+                                    proj_counter=proj_counter,
+                                    proj_type=projInfo["Type"],
+                                    synapse_list=synapseList,
+                                    targeting_mode=targetingMode,
+                                    pre_seg_length_dict=PreSegLengthDict,
+                                    post_seg_length_dict=PostSegLengthDict,
+                                    num_of_conn_dict=subset_dict,
+                                    distance_dependent_rule=dist_par,
+                                    delays_dict=delays,
+                                    weights_dict=weights,
+                                    cutoff_radius=cutoff_radius,
+                                ),
+                            )
                         )
 
                         proj_counter += 1
-                        final_proj_array.extend(compound_proj)
+
+    if n_jobs != None and n_jobs < 0:
+        n_jobs = os.cpu_count()
+
+    if n_jobs == None or n_jobs <= 1:
+        for prePop, postPop, projection_args in projection_tasks:
+            compound_proj = build_projection(
+                net=net,
+                presynaptic_population=pop_objects[prePop]["PopObj"],
+                postsynaptic_population=pop_objects[postPop]["PopObj"],
+                pre_cell_positions=pop_objects[prePop]["Positions"],
+                post_cell_positions=pop_objects[postPop]["Positions"],
+                spatial_index_cache=spatial_index_cache,
+                **projection_args,
+            )
+
+            final_proj_array.extend(compound_proj)
+
+    else:
+        final_proj_array.extend(
+            _build_projections_in_parallel(net, pop_objects, projection_tasks, n_jobs)
+        )
 
     final_synapse_list = np.unique(final_synapse_list)
 
@@ -719,6 +892,7 @@ def build_connectivity(
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def build_probability_based_connectivity(
     net,
     pop_params,
@@ -768,7 +942,80 @@ def build_probability_based_connectivity(
 
     std_weight_matrix - optional matrix in the format weight_synapse which specifies the corresponding standard deviations of synaptic weights; default is set to None;
 
-    std_delay_matrix - optional matrix in the format delay_synapse which specifies the corresponding standard deviations of synaptic delays; default is set to None."""
+    std_delay_matrix - optional matrix in the format delay_synapse which specifies the corresponding standard deviations of synaptic delays; default is set to None.
+    """
+
+    proj_array = []
+
+    for proj_params in get_probability_based_projection_params(
+        list(pop_params.keys()),
+        probability_matrix,
+        synapse_matrix,
+        weight_matrix,
+        delay_matrix,
+        tags_on_populations,
+        std_weight_matrix,
+        std_delay_matrix,
+    ):
+        returned_projs = _add_probability_based_projection(
+            net,
+            pop_params[proj_params["PreCellGroup"]]["PopObj"],
+            pop_params[proj_params["PostCellGroup"]]["PopObj"],
+            proj_params,
+        )
+
+        if returned_projs != None:
+            proj_array.extend(returned_projs)
+
+    return proj_array
+
+
+##############################################################################################
+
+
+def _add_probability_based_projection(net, pre_pop_obj, post_pop_obj, proj_params):
+    """Adds the projection described by an entry of the list returned by get_probability_based_projection_params()"""
+
+    if pre_pop_obj.size == 0 or post_pop_obj.size == 0:
+        return None
+
+    returned_projs = oc_build.add_probabilistic_projection_list(
+        net=net,
+        presynaptic_population=pre_pop_obj,
+        postsynaptic_population=post_pop_obj,
+        synapse_list=proj_params["SynapseList"],
+        connection_probability=proj_params["ConnectionProbability"],
+        delay=proj_params["Delay"],
+        weight=proj_params["Weight"],
+        std_delay=proj_params["StdDelay"],
+        std_weight=proj_params["StdWeight"],
+    )
+
+    if returned_projs != None:
+        opencortex.print_comment_v(
+            "Addded a projection between %s and %s" % (pre_pop_obj.id, post_pop_obj.id)
+        )
+
+    return returned_projs
+
+
+##############################################################################################
+
+
+def get_probability_based_projection_params(
+    pop_ids,
+    probability_matrix,
+    synapse_matrix,
+    weight_matrix,
+    delay_matrix,
+    tags_on_populations,
+    std_weight_matrix=None,
+    std_delay_matrix=None,
+):
+    """Checks the matrices of build_probability_based_connectivity() and returns, for each pair of the populations with ids in pop_ids which
+    are connected with a non zero probability, a dictionary with the keys 'PreCellGroup', 'PostCellGroup', 'SynapseList', 'ConnectionProbability',
+    'Weight', 'Delay', 'StdWeight' and 'StdDelay'; see build_probability_based_connectivity() for the arguments.
+    """
 
     errors_found = 0
 
@@ -859,10 +1106,10 @@ def build_probability_based_connectivity(
 
         quit()
 
-    proj_array = []
+    projection_params = []
 
-    for pre_pop_id in pop_params.keys():
-        for post_pop_id in pop_params.keys():
+    for pre_pop_id in pop_ids:
+        for post_pop_id in pop_ids:
             found_pre_pop = False
 
             found_post_pop = False
@@ -881,10 +1128,6 @@ def build_probability_based_connectivity(
                     found_post_pop = True
 
             if found_pre_pop and found_post_pop:
-                pre_pop_obj = pop_params[pre_pop_id]["PopObj"]
-
-                post_pop_obj = pop_params[post_pop_id]["PopObj"]
-
                 ####################################################################
                 prob_val = parse_parameter_value(
                     parameter_matrix=probability_matrix,
@@ -901,7 +1144,7 @@ def build_probability_based_connectivity(
                 )
 
                 #######################################################################
-                if prob_val != 0 and pre_pop_obj.size != 0 and post_pop_obj.size != 0:
+                if prob_val != 0:
                     if synapse_list != None:
                         if not isinstance(synapse_list, list):
                             synapse_list = [synapse_list]
@@ -945,26 +1188,19 @@ def build_probability_based_connectivity(
                             std_delay_list = None
                         ###############################################################################
 
-                        returned_projs = oc_build.add_probabilistic_projection_list(
-                            net=net,
-                            presynaptic_population=pre_pop_obj,
-                            postsynaptic_population=post_pop_obj,
-                            synapse_list=synapse_list,
-                            connection_probability=prob_val,
-                            delay=delay_list,
-                            weight=weight_list,
-                            std_delay=std_delay_list,
-                            std_weight=std_weight_list,
+                        projection_params.append(
+                            {
+                                "PreCellGroup": pre_pop_id,
+                                "PostCellGroup": post_pop_id,
+                                "SynapseList": synapse_list,
+                                "ConnectionProbability": prob_val,
+                                "Weight": weight_list,
+                                "Delay": delay_list,
+                                "StdWeight": std_weight_list,
+                                "StdDelay": std_delay_list,
+                            }
                         )
 
-                        if returned_projs != None:
-                            opencortex.print_comment_v(
-                                "Addded a projection between %s and %s"
-                                % (pre_pop_id, post_pop_id)
-                            )
-
-                            proj_array.extend(returned_projs)
-
                     else:
                         opencortex.print_comment_v(
                             "Error in opencortex.utils.build_probability_based_connectivity(): connection probability is not equal to 0 but synapse list is None"
@@ -993,114 +1229,21 @@ def build_probability_based_connectivity(
 
                     quit()
 
-    return proj_array
+    return projection_params
 
 
 ##############################################################################################
 
 
 def read_connectivity(pre_pop, post_pop, path_to_txt_file, ignore_synapses=[]):
-    """Method that reads the txt file in the format of netConnList found in: Thalamocortical/neuroConstruct/pythonScripts/netbuild."""
-
-    proj_summary = []
-
-    with open(path_to_txt_file, "r") as file:
-        lines = file.readlines()
-
-    num_per_post_cell = False
-
-    num_per_pre_cell = False
-
-    for line in lines:
-        if "NumPerPostCell" in line:
-            num_per_post_cell = True
-            break
-
-        if "NumPerPreCell" in line:
-            num_per_pre_cell = True
-            break
-
-    for line in lines:
-        split_line = line.split(" ")
-
-        extract_info = []
-
-        for string_index in range(0, len(split_line)):
-            if split_line[string_index] != "":
-                extract_info.append(split_line[string_index])
-
-        counter = 0
-
-        if pre_pop in extract_info[0] and post_pop in extract_info[1]:
-            proj_info = {}
-
-            proj_info["PreCellGroup"] = pre_pop
-
-            proj_info["PostCellGroup"] = post_pop
-
-            synapse_list = []
-
-            if "," in extract_info[2]:
-                synapse_list_string = extract_info[2].split(",")
-            else:
-                synapse_list_string = [extract_info[2]]
-
-            for synapse_string in synapse_list_string:
-                if "[" and "]" in synapse_string:
-                    left = synapse_string.find("[")
-
-                    right = synapse_string.find("]")
-
-                    synapse = synapse_string[left + 1 : right]
+    """Method that reads the txt file in the format of netConnList found in: Thalamocortical/neuroConstruct/pythonScripts/netbuild.
 
-                    synapse_list.append(synapse)
-
-                    continue
-
-                if "[" in synapse_string:
-                    left = synapse_string.find("[")
-
-                    synapse = synapse_string[left + 1 :]
-
-                    synapse_list.append(synapse)
-
-                    continue
-
-                if "]" in synapse_string:
-                    right = synapse_string.find("]")
-
-                    synapse = synapse_string[0:right]
-
-                    synapse_list.append(synapse)
-
-                    continue
-
-            for syn in ignore_synapses:
-                if syn in synapse_list:
-                    synapse_list.remove(syn)
-
-            proj_info["SynapseList"] = synapse_list
-
-            if "Elect" in extract_info[2]:
-                proj_info["Type"] = "Elect"
-            else:
-                proj_info["Type"] = "Chem"
-
-            if num_per_post_cell:
-                proj_info["NumPerPostCell"] = extract_info[3]
-
-            if num_per_pre_cell:
-                proj_info["NumPerPreCell"] = extract_info[3]
-
-            if "\n" in extract_info[4]:
-                proj_info["LocOnPostCell"] = extract_info[4][0:-1]
-
-            else:
-                proj_info["LocOnPostCell"] = extract_info[4]
-
-            proj_summary.append(proj_info)
+    The file is parsed once into an opencortex.utils.connectivity.ConnectivityTable, which is reused until the file changes.
+    """
 
-    return proj_summary
+    return connectivity.get_connectivity_table(path_to_txt_file, ignore_synapses).get(
+        pre_pop, post_pop
+    )
 
 
 ##############################################################################################
@@ -1298,23 +1441,26 @@ def check_cached_dicts(
         cell_nml_file = "%s.cell.nml" % cell_component
 
         if path_to_nml2 != None:
-            document_cell = neuroml.loaders.NeuroMLLoader.load(
-                os.path.join(path_to_nml2, cell_nml_file)
-            )
+            cell_nml_file = os.path.join(path_to_nml2, cell_nml_file)
 
-        else:
-            document_cell = neuroml.loaders.NeuroMLLoader.load(cell_nml_file)
+        cellObject = cell_cache.load_cell_document(cell_nml_file).cells[0]
 
-        cellObject = document_cell.cells[0]
+        def make_seg_length_dict(document_cell):
+            target_segments = oc_build.extract_seg_ids(
+                cell_object=document_cell.cells[0],
+                target_compartment_array=list_of_target_seg_groups,
+                targeting_mode="segGroups",
+            )
 
-        target_segments = oc_build.extract_seg_ids(
-            cell_object=cellObject,
-            target_compartment_array=list_of_target_seg_groups,
-            targeting_mode="segGroups",
-        )
+            return oc_build.make_target_dict(
+                cell_object=document_cell.cells[0], target_segs=target_segments
+            )
 
-        segLengthDict = oc_build.make_target_dict(
-            cell_object=cellObject, target_segs=target_segments
+        ### the cumulative lengths of the segments of the target groups are stored in the cell cache
+        segLengthDict = cell_cache.get_derived(
+            cell_nml_file,
+            ("TargetDict", tuple(list_of_target_seg_groups)),
+            make_seg_length_dict,
         )
 
         cached_dicts[cell_component] = {}
@@ -1427,6 +1573,7 @@ def check_pre_segment_groups(pre_segment_group_info):
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def build_inputs(
     nml_doc,
     net,
@@ -1525,9 +1672,13 @@ def build_inputs(
 
                     fraction_to_target = input_group_params["FractionToTarget"]
 
+                    rng = oc_build.get_element_rng(net, input_group_tag)
+
                     if not input_group_params["LocationSpecific"]:
                         target_cell_ids = oc_build.get_target_cells(
-                            population=pop, fraction_to_target=fraction_to_target
+                            population=pop,
+                            fraction_to_target=fraction_to_target,
+                            rng=rng,
                         )
 
                     else:
@@ -1552,6 +1703,7 @@ def build_inputs(
                             list_of_xvectors=x_list,
                             list_of_yvectors=y_list,
                             list_of_zvectors=z_list,
+                            rng=rng,
                         )
 
                     if target_cell_ids != []:
@@ -1735,7 +1887,7 @@ def build_inputs(
                                             input_group_params["SmallestAmplitudeList"]
                                         ),
                                     ):
-                                        random_amplitude = random.uniform(
+                                        random_amplitude = rng.uniform(
                                             input_group_params["SmallestAmplitudeList"][
                                                 input_index
                                             ],
@@ -1861,6 +2013,7 @@ def build_inputs(
 ##############################################################################################
 
 
+@oc_build.tracing.traced()
 def replace_cell_types(
     net_file_name,
     path_to_net,
@@ -1878,6 +2031,8 @@ def replace_cell_types(
 ):
     """This method substitutes the target cell types to a given NeuroML2 cortical network."""
 
+    from pyneuroml import pynml
+
     if len(cell_types_to_be_replaced) == len(cell_types_replaced_by):
         nml2_file_path = os.path.join(path_to_net, net_file_name + ".net.nml")
 
@@ -2350,9 +2505,561 @@ def replace_cell_types(
 ##############################################################################################
 
 
+def _get_cell_type_conversions(
+    populations, cell_types_to_be_replaced, cell_types_replaced_by
+):
+    """Returns the list of dictionaries {'OldPopID', 'OldCellComponent', 'NewPopID', 'NewCellComponent'} of the populations (a list of
+    (population id, component)) whose cell type is replaced, as in replace_cell_types(): the old cell type in the id of a population
+    is replaced by the new one"""
+
+    old_to_new = []
+
+    for pop_id, component in populations:
+        for cell_index in range(0, len(cell_types_replaced_by)):
+            if component == cell_types_to_be_replaced[cell_index]:
+                new_pop_id = pop_id.replace(
+                    cell_types_to_be_replaced[cell_index],
+                    cell_types_replaced_by[cell_index],
+                )
+
+                old_to_new.append(
+                    {
+                        "OldPopID": pop_id,
+                        "OldCellComponent": component,
+                        "NewPopID": new_pop_id,
+                        "NewCellComponent": cell_types_replaced_by[cell_index],
+                    }
+                )
+
+    return old_to_new
+
+
+def _get_h5_column_indices(h5_array):
+    return dict(
+        (str(h5_array._v_attrs["column_%i" % index]), index)
+        for index in range(h5_array.shape[1])
+        if "column_%i" % index in h5_array._v_attrs
+    )
+
+
+def _get_fraction_column(segment_column):
+    return segment_column.replace("segment_id", "fraction_along")
+
+
+def _get_h5_column_default(column):
+    if column.endswith("fraction_along"):
+        return 0.5
+
+    return 1 if column == "weight" else 0
+
+
+def _copy_h5_array(
+    h5file, h5_array, group, name, column_values, canonical_columns, rng, block_size
+):
+    """Copies `h5_array` to `name` in `group`, setting the columns in `column_values` (a dict {column: value}, where a value is a
+    scalar or, for a segment column, a (SegmentSampler, segment group, keep_zero) tuple whose sampled segments and fractions fill the
+    segment column and its fraction column); columns not in `h5_array` are added, in the order of `canonical_columns`.
+    The array is copied unchanged (without decompressing it) if there is nothing to set, otherwise in blocks of `block_size` rows.
+    """
+
+    import tables
+
+    indices = _get_h5_column_indices(h5_array)
+
+    values = {}
+
+    for column, value in column_values.items():
+        if isinstance(value, tuple):
+            values[column] = value
+
+            values[_get_fraction_column(column)] = None
+
+        ### missing columns have the default values (segment 0, fraction 0.5) already
+        elif column in indices:
+            values[column] = value
+
+    if len(values) == 0:
+        return h5_array._f_copy(group, name)
+
+    columns = [column for column, index in sorted(indices.items(), key=lambda c: c[1])]
+
+    for column in values.keys():
+        if column not in columns:
+            columns.append(column)
+
+    columns = [column for column in canonical_columns if column in columns] + [
+        column for column in columns if column not in canonical_columns
+    ]
+
+    new_array = h5file.create_carray(
+        group,
+        name,
+        atom=tables.Float32Atom(),
+        shape=(h5_array.shape[0], len(columns)),
+        title=h5_array.title,
+    )
+
+    for index, column in enumerate(columns):
+        new_array._f_setattr("column_%i" % index, column)
+
+    for start in range(0, h5_array.shape[0], block_size):
+        rows = h5_array.read(start, min(h5_array.shape[0], start + block_size))
+
+        block = np.empty((len(rows), len(columns)), dtype=np.float32)
+
+        for index, column in enumerate(columns):
+            if column in indices:
+                block[:, index] = rows[:, indices[column]]
+
+            else:
+                block[:, index] = _get_h5_column_default(column)
+
+        for column, value in values.items():
+            if isinstance(value, tuple):
+                sampler, target_group, keep_zero = value
+
+                segment_index = columns.index(column)
+
+                fraction_index = columns.index(_get_fraction_column(column))
+
+                ### as in replace_cell_types(), inputs onto segment 0 can be kept there
+                resampled = (
+                    block[:, segment_index] != 0
+                    if keep_zero
+                    else np.ones(len(block), dtype=bool)
+                )
+
+                segment_ids, fractions = sampler.sample_group(
+                    rng, target_group, int(np.count_nonzero(resampled))
+                )
+
+                block[resampled, segment_index] = segment_ids
+
+                block[resampled, fraction_index] = fractions
+
+            elif value != None:
+                block[:, columns.index(column)] = value
+
+        new_array[start : start + len(block)] = block
+
+    return new_array
+
+
+def _copy_h5_attrs(source, target, replaced=None):
+    source._v_attrs._f_copy(target)
+
+    for name, value in (replaced or {}).items():
+        target._f_setattr(name, value)
+
+
+def replace_cell_types_hdf5(
+    net_file_name,
+    path_to_net,
+    new_net_id,
+    cell_types_to_be_replaced,
+    cell_types_replaced_by,
+    dir_to_new_components,
+    dir_to_old_components,
+    reduced_to_single_compartment=True,
+    return_synapses=False,
+    connection_segment_groups=None,
+    input_segment_groups=None,
+    synapse_file_tags=None,
+    target_dir="./",
+    compress=True,
+):
+    """
+    Streaming version of replace_cell_types() for networks saved in the NeuroML HDF5 format: substitutes the cell types of the network
+    in `path_to_net`/`net_file_name`.net.nml.h5 and saves the new network `new_net_id` to `target_dir`/`new_net_id`.net.nml.h5 (the
+    arguments are as in replace_cell_types()).
+
+    The network is copied group by group with PyTables, so the renaming of populations, cell components and projections only changes
+    the attributes and the names of the HDF5 groups, and the arrays of connections and inputs are copied as they are, unless their
+    segments change. The segments of the connections and inputs onto the new cell types are then set in blocks of rows: to segment 0
+    (if `reduced_to_single_compartment`), or drawn for all the rows of a block at once on the segment groups in
+    `connection_segment_groups` and `input_segment_groups`. Returns the name of the new file (and the list of the included synapse
+    files if `return_synapses` is True).
+    """
+
+    import io
+    import tables
+
+    if len(cell_types_to_be_replaced) != len(cell_types_replaced_by):
+        raise Exception(
+            "Error! The number of cell types in cell_types_to_be_replaced (%i) is not equal to the number of new cell types in cell_types_replaced_by (%i)"
+            % (len(cell_types_to_be_replaced), len(cell_types_replaced_by))
+        )
+
+    h5_file_name = os.path.join(path_to_net, net_file_name + ".net.nml.h5")
+
+    new_h5_file_name = os.path.join(target_dir, "%s.net.nml.h5" % new_net_id)
+
+    filters = (
+        tables.Filters(complib="zlib", complevel=5) if compress else tables.Filters()
+    )
+
+    rng = oc_build._get_rng()
+
+    cached_target_dict = {}
+
+    def get_sampler(cell_component, segment_group):
+        seg_length_dict, cached = check_cached_dicts(
+            cell_component,
+            cached_target_dict,
+            [segment_group],
+            path_to_nml2=dir_to_new_components,
+        )
+
+        return oc_build.sampling.SegmentSampler(seg_length_dict)
+
+    h5file = tables.open_file(h5_file_name, mode="r")
+
+    try:
+        root_group = h5file.root.neuroml
+
+        net_group = root_group.network
+
+        groups = list(net_group._f_iter_nodes("Group"))
+
+        populations = [
+            (str(group._v_attrs["id"]), str(group._v_attrs["component"]))
+            for group in groups
+            if group._v_name.startswith("population_")
+        ]
+
+        old_to_new = _get_cell_type_conversions(
+            populations, cell_types_to_be_replaced, cell_types_replaced_by
+        )
+
+        conversions = dict(
+            (conversion["OldPopID"], conversion) for conversion in old_to_new
+        )
+
+        new_file = tables.open_file(
+            new_h5_file_name, mode="w", title=new_net_id, filters=filters
+        )
+
+        try:
+            new_root_group = new_file.create_group("/", "neuroml", "Root NeuroML group")
+
+            new_net_group = new_file.create_group(new_root_group, "network")
+
+            _copy_h5_attrs(root_group, new_root_group, {"id": new_net_id})
+
+            _copy_h5_attrs(net_group, new_net_group, {"id": new_net_id})
+
+            for group in groups:
+                attrs = group._v_attrs
+
+                group_type = str(attrs["type"]) if "type" in attrs else None
+
+                if group._v_name.startswith("population_"):
+                    pop_id = str(attrs["id"])
+
+                    if pop_id not in conversions:
+                        group._f_copy(new_net_group, recursive=True)
+
+                        continue
+
+                    conversion = conversions[pop_id]
+
+                    new_group = new_file.create_group(
+                        new_net_group, "population_" + conversion["NewPopID"]
+                    )
+
+                    _copy_h5_attrs(
+                        group,
+                        new_group,
+                        {
+                            "id": conversion["NewPopID"],
+                            "component": conversion["NewCellComponent"],
+                        },
+                    )
+
+                    for child in group._f_iter_nodes():
+                        child._f_copy(
+                            new_group,
+                            (
+                                conversion["NewPopID"]
+                                if child._v_name == pop_id
+                                else child._v_name
+                            ),
+                            recursive=True,
+                        )
+
+                elif group_type in [
+                    "projection",
+                    "electricalProjection",
+                    "continuousProjection",
+                ]:
+                    proj_id = str(attrs["id"])
+
+                    proj_type = "Chem" if group_type == "projection" else "Elect"
+
+                    new_proj_id = proj_id
+
+                    ends = {}
+
+                    for end, attribute in [
+                        ("pre", "presynapticPopulation"),
+                        ("post", "postsynapticPopulation"),
+                    ]:
+                        pop_id = str(attrs[attribute])
+
+                        if pop_id in conversions:
+                            ends[end] = conversions[pop_id]
+
+                            new_proj_id = new_proj_id.replace(
+                                pop_id, conversions[pop_id]["NewPopID"]
+                            )
+
+                    column_values = {}
+
+                    samplers = {}
+
+                    if (
+                        not reduced_to_single_compartment
+                        and connection_segment_groups != None
+                        and len(ends) == 2
+                    ):
+                        for proj_info in connection_segment_groups:
+                            if (
+                                ends["pre"]["NewCellComponent"]
+                                == proj_info["PreCellType"]
+                                and ends["post"]["NewCellComponent"]
+                                == proj_info["PostCellType"]
+                                and proj_info["Type"] == proj_type
+                            ):
+                                samplers["pre"] = (
+                                    get_sampler(
+                                        ends["pre"]["NewCellComponent"],
+                                        proj_info["PreSegGroup"],
+                                    ),
+                                    proj_info["PreSegGroup"],
+                                )
+
+                                samplers["post"] = (
+                                    get_sampler(
+                                        ends["post"]["NewCellComponent"],
+                                        proj_info["PostSegGroup"],
+                                    ),
+                                    proj_info["PostSegGroup"],
+                                )
+
+                                break
+
+                    for end in ends.keys():
+                        if end in samplers:
+                            sampler, target_group = samplers[end]
+
+                            column_values["%s_segment_id" % end] = (
+                                sampler,
+                                target_group,
+                                False,
+                            )
+
+                        elif reduced_to_single_compartment:
+                            column_values["%s_segment_id" % end] = 0
+
+                            column_values["%s_fraction_along" % end] = 0.5
+
+                    new_group = new_file.create_group(
+                        new_net_group, "projection_" + new_proj_id
+                    )
+
+                    replaced = {"id": new_proj_id}
+
+                    if "pre" in ends:
+                        replaced["presynapticPopulation"] = ends["pre"]["NewPopID"]
+
+                    if "post" in ends:
+                        replaced["postsynapticPopulation"] = ends["post"]["NewPopID"]
+
+                    _copy_h5_attrs(group, new_group, replaced)
+
+                    if proj_id in group:
+                        _copy_h5_array(
+                            new_file,
+                            group._f_get_child(proj_id),
+                            new_group,
+                            new_proj_id,
+                            column_values,
+                            list(oc_build.sparse.HDF5_COLUMNS.keys()),
+                            rng,
+                            oc_build.containers.WRITE_BLOCK_SIZE,
+                        )
+
+                elif group._v_name.startswith("inputList_"):
+                    input_list_id = str(attrs["id"])
+
+                    pop_id = str(attrs["population"])
+
+                    if pop_id not in conversions:
+                        group._f_copy(new_net_group, recursive=True)
+
+                        continue
+
+                    conversion = conversions[pop_id]
+
+                    column_values = {"segment_id": 0, "fraction_along": 0.5}
+
+                    if (
+                        not reduced_to_single_compartment
+                        and input_segment_groups != None
+                    ):
+                        for input_group_info in input_segment_groups:
+                            if (
+                                conversion["NewCellComponent"]
+                                == input_group_info["PostCellType"]
+                            ):
+                                column_values = {
+                                    "segment_id": (
+                                        get_sampler(
+                                            conversion["NewCellComponent"],
+                                            input_group_info["PostSegGroup"],
+                                        ),
+                                        input_group_info["PostSegGroup"],
+                                        True,
+                                    )
+                                }
+
+                                break
+
+                    new_group = new_file.create_group(new_net_group, group._v_name)
+
+                    _copy_h5_attrs(
+                        group, new_group, {"population": conversion["NewPopID"]}
+                    )
+
+                    if input_list_id in group:
+                        _copy_h5_array(
+                            new_file,
+                            group._f_get_child(input_list_id),
+                            new_group,
+                            input_list_id,
+                            column_values,
+                            oc_build.containers.input_column_names(True),
+                            rng,
+                            oc_build.containers.WRITE_BLOCK_SIZE,
+                        )
+
+                else:
+                    group._f_copy(new_net_group, recursive=True)
+
+            ### the top level elements (includes, synapses, inputs...) of the document, with the new cell types
+
+            if "neuroml_top_level" in root_group._v_attrs:
+                top_level = loaders.read_neuroml2_string(
+                    str(root_group._v_attrs["neuroml_top_level"])
+                )
+
+            else:
+                top_level = neuroml.NeuroMLDocument(id=new_net_id)
+
+            top_level.id = new_net_id
+
+            include_synapses = []
+
+            list_of_synapses = []
+
+            if synapse_file_tags != None:
+                for include in top_level.includes:
+                    if any(
+                        synapse_tag in include.href for synapse_tag in synapse_file_tags
+                    ):
+                        include_synapses.append(include)
+
+                        list_of_synapses.append(include.href)
+
+            top_level.includes = include_synapses
+
+            defined_components = [
+                cell.id for cell in oc_build._get_cells_of_all_known_types(top_level)
+            ]
+
+            ### only the components of the new network are included and copied to its directory
+            copied_files = list(oc_build.to_be_copied_on_save)
+
+            included_files = list(oc_build.all_included_files)
+
+            del oc_build.to_be_copied_on_save[:]
+
+            del oc_build.all_included_files[:]
+
+            for conversion in old_to_new:
+                oc_build._add_cell_and_channels(
+                    top_level,
+                    os.path.join(
+                        dir_to_new_components,
+                        "%s.cell.nml" % conversion["NewCellComponent"],
+                    ),
+                    conversion["NewCellComponent"],
+                    use_prototypes=False,
+                )
+
+            replaced_components = [
+                conversion["OldCellComponent"] for conversion in old_to_new
+            ]
+
+            for cell_model in sorted(
+                set(component for pop_id, component in populations)
+            ):
+                if (
+                    cell_model not in replaced_components
+                    and cell_model not in defined_components
+                ):
+                    oc_build._add_cell_and_channels(
+                        top_level,
+                        os.path.join(dir_to_old_components, "%s.cell.nml" % cell_model),
+                        cell_model,
+                        use_prototypes=False,
+                    )
+
+            oc_build._finalise_copy_to_dir_for_model(
+                top_level, os.path.join(target_dir, "")
+            )
+
+            oc_build.to_be_copied_on_save[:] = copied_files
+
+            oc_build.all_included_files[:] = included_files
+
+            xml = io.StringIO()
+
+            writers.NeuroMLWriter.write(top_level, xml, close=False)
+
+            new_root_group._f_setattr("neuroml_top_level", xml.getvalue())
+
+        finally:
+            new_file.close()
+
+    finally:
+        h5file.close()
+
+    opencortex.print_comment_v(
+        "Replaced the cell types of %i populations of %s in %s"
+        % (len(old_to_new), h5_file_name, new_h5_file_name)
+    )
+
+    if return_synapses:
+        return new_h5_file_name, list_of_synapses
+
+    return new_h5_file_name
+
+
+##############################################################################################
+
+
 def parse_distance_dependence_params(
-    distance_dependence_params, pre_pop, post_pop, proj_type
+    distance_dependence_params,
+    pre_pop,
+    post_pop,
+    proj_type,
+    parameter="DistDependConn",
 ):
+    """Returns the value of the field `parameter` (by default the distance dependent rule 'DistDependConn') of the first dictionary in the list
+    distance_dependence_params which matches the given pre and post population ids and projection type; returns None if there is no such value.
+    """
+
     dist_rule = None
 
     for distance_param in range(0, len(distance_dependence_params)):
@@ -2369,7 +3076,7 @@ def parse_distance_dependence_params(
         )
 
         if check_pre_pop and check_post_pop and check_proj_type:
-            dist_rule = distance_dependence_params["DistDependConn"]
+            dist_rule = distance_dependence_params[distance_param].get(parameter)
 
             break
 
@@ -2492,6 +3199,8 @@ def parse_weights(weights_params, post_pop, synapse_list):
 
 
 def check_includes_in_cells(dir_to_cells, list_of_cell_ids, extra_channel_tags=None):
+    from pyneuroml import pynml
+
     passed = True
 
     list_of_cell_file_names = []
@@ -2521,9 +3230,7 @@ def check_includes_in_cells(dir_to_cells, list_of_cell_ids, extra_channel_tags=N
             break
 
         else:
-            nml2_doc_cell = pynml.read_neuroml2_file(
-                full_path_to_cell, include_includes=False
-            )
+            nml2_doc_cell = cell_cache.load_cell_document(full_path_to_cell, copy=True)
 
             for included in nml2_doc_cell.includes:
                 if ".channel.nml" in included.href:
@@ -2674,16 +3381,7 @@ def get_segment_groups(cell_id, path_to_cells):
     else:
         cell_nml_file = "%s.cell.nml" % cell_id
 
-    document_cell = neuroml.loaders.NeuroMLLoader.load(cell_nml_file)
-
-    cell_object = document_cell.cells[0]
-
-    segment_groups = []
-
-    for segment_group in cell_object.morphology.segment_groups:
-        segment_groups.append(segment_group.id)
-
-    return segment_groups
+    return cell_cache.get_segment_groups(cell_nml_file)
 
 
 ##############################################################################################
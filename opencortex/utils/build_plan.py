@@ -0,0 +1,620 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Incremental, cached network builds.
+
+A BuildPlan records how a network is built as a list of named stages, each a call of one of the builders of opencortex.core,
+opencortex.build or opencortex.utils (or of any other function adding elements to the network) with its arguments, e.g.
+
+    plan = BuildPlan("Net", network_seed=1234)
+    pops = plan.add_stage("populations", oc_utils.add_populations_in_rectangular_layers, args=(NETWORK, boundaries, pop_dict, xs, zs))
+    plan.add_probability_based_connectivity("conns", pops, pop_dict.keys(), probability_matrix, ...)
+    nml_doc, network = plan.build()
+
+The arguments may refer to the NeuroMLDocument (DOCUMENT) and the network (NETWORK) being built and to the values returned by
+earlier stages (see BuildPlan.output()). Each stage has a hash of all of its inputs: the builder, its arguments, the network seed and
+the optional seed of the stage, the content of the files it declares and the hashes of the stages it uses. The elements a stage adds to
+the document and to the network (populations, projections, input lists, pulse generators...) are pickled together with the value returned
+by the builder into the cache directory (see set_cache_dir()) under that hash, so that when the plan is built again only the stages whose
+inputs changed, and the stages using them, are executed; the others are loaded from the cache.
+
+The populations, projections and input lists are built with random numbers derived from the network seed and their own ids only
+(see opencortex.build.get_element_rng()), so a network assembled from cached stages is the same as one built from scratch; builders
+drawing other random numbers should take them from such a generator too.
+
+Only the elements added to the lists of the document and of the network are cached; the value returned by a builder is restored from
+the cache as a copy, in which the elements added by the stage are the ones in the network. Stages with other side effects, e.g.
+opencortex.core.include_neuroml2_cell() (which copies files and registers the cell in opencortex.build) or builders changing the elements
+added by earlier stages, must be added with cache=False: they are executed at every build.
+"""
+
+import hashlib
+import inspect
+import io
+import os
+import pickle
+
+from neuroml.nml.nml import GeneratedsSuper
+import numpy as np
+
+import opencortex
+import opencortex.build as oc_build
+import opencortex.core as oc
+import opencortex.utils as oc_utils
+from opencortex.build import cell_cache
+
+_cache_dir = os.environ.get(
+    "OPENCORTEX_BUILD_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "opencortex", "builds"),
+)
+
+### Outputs of the stages built in this process, by hash
+_outputs = {}
+
+### Changed whenever the format of the cached outputs (or the way the hashes are computed) changes
+CACHE_FORMAT = 1
+
+
+##############################################################################################
+
+
+def set_cache_dir(cache_dir):
+    """Sets the directory where the outputs of the stages are stored; if `cache_dir` is None they are only cached in memory"""
+
+    global _cache_dir
+
+    _cache_dir = cache_dir
+
+
+def get_cache_dir():
+    return _cache_dir
+
+
+def clear_memory_cache():
+    """Forgets the outputs of the stages cached in memory (the files in the cache directory are kept)"""
+
+    _outputs.clear()
+
+
+##############################################################################################
+
+
+class _BuildObject(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "<%s being built>" % self.name
+
+
+### Placeholders for the NeuroMLDocument and the network being built, to be used in the arguments of stages
+DOCUMENT = _BuildObject("document")
+
+NETWORK = _BuildObject("network")
+
+
+class StageOutput(object):
+    """Placeholder for the value returned by the builder of the stage `stage_name`, or for an item of it, e.g.
+    plan.output('populations')['L23Pyr']['PopObj'], which is replaced by the value when the plan is built
+    """
+
+    def __init__(self, stage_name, path=()):
+        self.stage_name = stage_name
+
+        self.path = tuple(path)
+
+    def __getitem__(self, key):
+        return StageOutput(self.stage_name, self.path + (key,))
+
+    def resolve(self, results):
+        value = results[self.stage_name]
+
+        for key in self.path:
+            value = value[key]
+
+        return value
+
+    def __repr__(self):
+        return "StageOutput(%s%s)" % (
+            self.stage_name,
+            "".join("[%r]" % key for key in self.path),
+        )
+
+
+class Stage(object):
+    """A named call of `function` with `args` and `kwargs`; see BuildPlan.add_stage()"""
+
+    def __init__(self, name, function, args, kwargs, seed, files, after, cache):
+        self.name = name
+
+        self.function = function
+
+        self.args = tuple(args)
+
+        self.kwargs = dict(kwargs) if kwargs != None else {}
+
+        self.seed = seed
+
+        self.files = list(files) if files != None else []
+
+        self.after = list(after) if after != None else []
+
+        self.cache = cache
+
+    def __repr__(self):
+        return "Stage(%s: %s)" % (self.name, _function_name(self.function))
+
+
+##############################################################################################
+
+
+def _function_name(function):
+    return "%s.%s" % (
+        getattr(function, "__module__", None),
+        getattr(function, "__qualname__", getattr(function, "__name__", function)),
+    )
+
+
+def _function_fingerprint(function):
+    """The name and (if available) a hash of the source code of `function`, so that the stages are executed again when it is changed"""
+
+    try:
+        source = inspect.getsource(function)
+
+    except (OSError, TypeError):
+        source = ""
+
+    return (
+        "function",
+        _function_name(function),
+        hashlib.sha256(source.encode("utf-8")).hexdigest(),
+    )
+
+
+def _fingerprint(value):
+    """Returns a representation of `value` made of tuples, strings and numbers, from which the hash of a stage is computed"""
+
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return (type(value).__name__, repr(value))
+
+    if isinstance(value, _BuildObject):
+        return ("build_object", value.name)
+
+    if isinstance(value, StageOutput):
+        return ("stage_output", value.stage_name, _fingerprint(value.path))
+
+    if isinstance(value, np.generic):
+        return _fingerprint(value.item())
+
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+
+        return (
+            "ndarray",
+            value.dtype.str,
+            value.shape,
+            hashlib.sha256(value.tobytes()).hexdigest(),
+        )
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_fingerprint(item) for item in value]
+
+        if isinstance(value, (set, frozenset)):
+            items = sorted(items, key=repr)
+
+        return (type(value).__name__, tuple(items))
+
+    if isinstance(value, dict):
+        return (
+            "dict",
+            tuple(
+                sorted(
+                    [
+                        (_fingerprint(key), _fingerprint(item))
+                        for key, item in value.items()
+                    ],
+                    key=repr,
+                )
+            ),
+        )
+
+    if isinstance(value, GeneratedsSuper):
+        xml = io.StringIO()
+
+        value.export(xml, 0)
+
+        return ("neuroml", type(value).__name__, xml.getvalue())
+
+    if callable(value):
+        return _function_fingerprint(value)
+
+    raise Exception(
+        "Error! Cannot compute the hash of the argument %r of a stage; use BuildPlan.output() to refer to the values returned by other stages"
+        % (value,)
+    )
+
+
+def _find_stage_outputs(value, found):
+    """Adds the names of the stages referred to by the StageOutputs in `value` to the list `found`"""
+
+    if isinstance(value, StageOutput):
+        if value.stage_name not in found:
+            found.append(value.stage_name)
+
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            _find_stage_outputs(item, found)
+
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _find_stage_outputs(key, found)
+            _find_stage_outputs(item, found)
+
+
+def _resolve(value, nml_doc, network, results):
+    """Replaces the placeholders in `value` (recursively in lists, tuples and dicts) with the objects being built"""
+
+    if value is DOCUMENT:
+        return nml_doc
+
+    if value is NETWORK:
+        return network
+
+    if isinstance(value, StageOutput):
+        return value.resolve(results)
+
+    if isinstance(value, (list, tuple)):
+        return type(value)(_resolve(item, nml_doc, network, results) for item in value)
+
+    if isinstance(value, dict):
+        return dict(
+            (key, _resolve(item, nml_doc, network, results))
+            for key, item in value.items()
+        )
+
+    return value
+
+
+##############################################################################################
+
+
+def _get_list_lengths(nml_doc, network):
+    lengths = {}
+
+    for owner, element in [("document", nml_doc), ("network", network)]:
+        for attribute, value in vars(element).items():
+            if isinstance(value, list):
+                lengths[(owner, attribute)] = len(value)
+
+    return lengths
+
+
+def _get_added_elements(nml_doc, network, lengths):
+    """Returns the list of (owner, attribute, elements) of the elements added to the lists of the document and the network since
+    _get_list_lengths() returned `lengths`"""
+
+    added = []
+
+    for owner, element in [("document", nml_doc), ("network", network)]:
+        for attribute, value in vars(element).items():
+            if isinstance(value, list) and len(value) > lengths.get(
+                (owner, attribute), 0
+            ):
+                added.append(
+                    (owner, attribute, value[lengths.get((owner, attribute), 0) :])
+                )
+
+    return added
+
+
+def _get_cache_file(key):
+    return os.path.join(_cache_dir, "%s.pickle" % key)
+
+
+def _save_output(key, output):
+    _outputs[key] = output
+
+    if _cache_dir == None:
+        return
+
+    cache_file = _get_cache_file(key)
+
+    try:
+        if not os.path.isdir(_cache_dir):
+            os.makedirs(_cache_dir, exist_ok=True)
+
+        ### write to a temporary file first, so that concurrent builds never read a partially written output
+        temp_file = "%s.%i.tmp" % (cache_file, os.getpid())
+
+        with open(temp_file, "wb") as f:
+            f.write(output)
+
+        os.replace(temp_file, cache_file)
+
+    except OSError as error:
+        opencortex.print_comment_v(
+            "Could not write the output of a stage to the build cache: %s" % error
+        )
+
+
+def _load_output(key):
+    if key in _outputs:
+        return _outputs[key]
+
+    if _cache_dir == None or not os.path.isfile(_get_cache_file(key)):
+        return None
+
+    with open(_get_cache_file(key), "rb") as f:
+        output = f.read()
+
+    _outputs[key] = output
+
+    return output
+
+
+##############################################################################################
+
+
+class BuildPlan(object):
+    """Plan of the build of the network `reference` (with the seed `network_seed` and temperature `temperature`, as in
+    opencortex.core.generate_network()) as a list of named stages, see the module documentation.
+
+    After build(), `executed_stages` and `cached_stages` hold the names of the stages which were executed and loaded from the cache.
+    """
+
+    def __init__(self, reference, network_seed=1234, temperature="32degC"):
+        self.reference = reference
+
+        self.network_seed = network_seed
+
+        self.temperature = temperature
+
+        self.stages = []
+
+        self.executed_stages = []
+
+        self.cached_stages = []
+
+    def get_stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+
+        raise Exception(
+            "Error! There is no stage %s in the build plan of %s"
+            % (name, self.reference)
+        )
+
+    def add_stage(
+        self,
+        name,
+        function,
+        args=(),
+        kwargs=None,
+        seed=None,
+        files=None,
+        after=None,
+        cache=True,
+    ):
+        """Adds the stage `name`, which calls function(*args, **kwargs). Input arguments to this method:
+
+        args, kwargs - the arguments of `function`; they can contain DOCUMENT, NETWORK and the outputs of earlier stages (see output());
+
+        seed - optional seed of the stage, used instead of the network seed for the random numbers of the stage;
+
+        files - optional list of the files read by the stage (e.g. connectivity summaries), whose contents are part of the hash of the stage;
+
+        after - optional list of the names of earlier stages which this stage depends on without using their outputs;
+
+        cache - whether the output of the stage is cached (see the module documentation for the stages which must not be cached).
+
+        Returns the output of the stage (see output())."""
+
+        if name in [stage.name for stage in self.stages]:
+            raise Exception(
+                "Error! There is already a stage %s in the build plan of %s"
+                % (name, self.reference)
+            )
+
+        stage = Stage(name, function, args, kwargs, seed, files, after, cache)
+
+        for upstream in self._get_upstream_stages(stage):
+            self.get_stage(upstream)
+
+        self.stages.append(stage)
+
+        return self.output(name)
+
+    def output(self, name):
+        """Returns a placeholder for the value returned by the builder of the stage `name`, which can be used in the arguments of later stages;
+        items of the value can be selected with [], e.g. plan.output('populations')['L23Pyr']['PopObj']
+        """
+
+        self.get_stage(name)
+
+        return StageOutput(name)
+
+    def add_probability_based_connectivity(
+        self,
+        name,
+        pop_params,
+        pop_ids,
+        probability_matrix,
+        synapse_matrix,
+        weight_matrix,
+        delay_matrix,
+        tags_on_populations,
+        std_weight_matrix=None,
+        std_delay_matrix=None,
+    ):
+        """Adds the projections built by opencortex.utils.build_probability_based_connectivity() as one stage per pair of connected populations,
+        named '<name>_<presynaptic population>_<postsynaptic population>', which only depends on the entries of the matrices for that pair, so
+        that changing an entry only rebuilds one projection. `pop_params` is the output of the stage adding the populations with ids `pop_ids`
+        (e.g. with opencortex.utils.add_populations_in_rectangular_layers()); see build_probability_based_connectivity() for the other arguments.
+
+        Returns the list of the outputs of the stages added."""
+
+        outputs = []
+
+        for proj_params in oc_utils.get_probability_based_projection_params(
+            list(pop_ids),
+            probability_matrix,
+            synapse_matrix,
+            weight_matrix,
+            delay_matrix,
+            tags_on_populations,
+            std_weight_matrix,
+            std_delay_matrix,
+        ):
+            outputs.append(
+                self.add_stage(
+                    "%s_%s_%s"
+                    % (name, proj_params["PreCellGroup"], proj_params["PostCellGroup"]),
+                    oc_utils._add_probability_based_projection,
+                    args=(
+                        NETWORK,
+                        pop_params[proj_params["PreCellGroup"]]["PopObj"],
+                        pop_params[proj_params["PostCellGroup"]]["PopObj"],
+                        proj_params,
+                    ),
+                )
+            )
+
+        return outputs
+
+    def _get_upstream_stages(self, stage):
+        upstream = list(stage.after)
+
+        _find_stage_outputs(stage.args, upstream)
+
+        _find_stage_outputs(stage.kwargs, upstream)
+
+        return upstream
+
+    def get_stage_hashes(self):
+        """Returns a dictionary with the hash of each stage"""
+
+        hashes = {}
+
+        for stage in self.stages:
+            fingerprint = (
+                CACHE_FORMAT,
+                opencortex.__version__,
+                self.reference,
+                _fingerprint(self.network_seed),
+                _fingerprint(self.temperature),
+                stage.name,
+                _function_fingerprint(stage.function),
+                _fingerprint(stage.args),
+                _fingerprint(stage.kwargs),
+                _fingerprint(stage.seed),
+                tuple(
+                    (os.path.abspath(file_name), cell_cache.file_hash(file_name))
+                    for file_name in stage.files
+                ),
+                tuple(
+                    (upstream, hashes[upstream])
+                    for upstream in sorted(self._get_upstream_stages(stage))
+                ),
+            )
+
+            hashes[stage.name] = hashlib.sha256(
+                repr(fingerprint).encode("utf-8")
+            ).hexdigest()
+
+        return hashes
+
+    def _execute_stage(self, stage, nml_doc, network, results):
+        args = _resolve(stage.args, nml_doc, network, results)
+
+        kwargs = _resolve(stage.kwargs, nml_doc, network, results)
+
+        if stage.seed != None:
+            oc_build.set_network_seed(network, stage.seed)
+
+        try:
+            lengths = _get_list_lengths(nml_doc, network)
+
+            result = stage.function(*args, **kwargs)
+
+        finally:
+            oc_build.set_network_seed(network, self.network_seed)
+
+        return result, _get_added_elements(nml_doc, network, lengths)
+
+    def build(self):
+        """Builds the network, executing the stages whose inputs changed since they were last built and loading the others from
+        the cache; returns the NeuroMLDocument and the network, as opencortex.core.generate_network()
+        """
+
+        nml_doc, network = oc.generate_network(
+            self.reference, network_seed=self.network_seed, temperature=self.temperature
+        )
+
+        hashes = self.get_stage_hashes()
+
+        results = {}
+
+        self.executed_stages = []
+
+        self.cached_stages = []
+
+        for stage in self.stages:
+            output = _load_output(hashes[stage.name]) if stage.cache else None
+
+            if output != None:
+                opencortex.print_comment_v(
+                    "Loading stage %s of %s from the build cache"
+                    % (stage.name, self.reference)
+                )
+
+                cached = pickle.loads(output)
+
+                for owner, attribute, elements in cached["Added"]:
+                    target = nml_doc if owner == "document" else network
+
+                    getattr(target, attribute).extend(elements)
+
+                results[stage.name] = cached["Result"]
+
+                self.cached_stages.append(stage.name)
+
+                continue
+
+            opencortex.print_comment_v(
+                "Executing stage %s of %s" % (stage.name, self.reference)
+            )
+
+            result, added = self._execute_stage(stage, nml_doc, network, results)
+
+            results[stage.name] = result
+
+            self.executed_stages.append(stage.name)
+
+            if stage.cache:
+                try:
+                    output = pickle.dumps(
+                        {"Added": added, "Result": result},
+                        protocol=pickle.HIGHEST_PROTOCOL,
+                    )
+
+                except Exception as error:
+                    opencortex.print_comment_v(
+                        "The output of stage %s cannot be cached: %s"
+                        % (stage.name, error)
+                    )
+
+                    continue
+
+                _save_output(hashes[stage.name], output)
+
+        return nml_doc, network
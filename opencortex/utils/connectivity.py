@@ -0,0 +1,293 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Connectivity summaries, e.g. the netConnList files of the Thalamocortical project, parsed once into a ConnectivityTable which
+is indexed by (presynaptic population, postsynaptic population).
+
+Besides the whitespace separated netConnList format, tabular summaries can be read from CSV files (see
+ConnectivityTable.from_csv()).
+"""
+
+import copy
+import csv
+import os
+
+### Tables read by get_connectivity_table(), by (path, modification time, size, synapses to ignore)
+_tables = {}
+
+NUM_PER_POST_CELL = "NumPerPostCell"
+
+NUM_PER_PRE_CELL = "NumPerPreCell"
+
+
+##############################################################################################
+
+
+def parse_synapse_list(synapse_string):
+    """Parses the synapse list of a line of a netConnList file, e.g. [Syn_AMPA_L2Pyr_L2Pyr,Syn_NMDA_L2Pyr_L2Pyr]"""
+
+    synapse_list = []
+
+    if "," in synapse_string:
+        synapse_list_string = synapse_string.split(",")
+    else:
+        synapse_list_string = [synapse_string]
+
+    for synapse_string in synapse_list_string:
+        if "]" in synapse_string:
+            left = synapse_string.find("[")
+
+            right = synapse_string.find("]")
+
+            synapse_list.append(synapse_string[left + 1 : right])
+
+            continue
+
+        if "[" in synapse_string:
+            left = synapse_string.find("[")
+
+            synapse_list.append(synapse_string[left + 1 :])
+
+    return synapse_list
+
+
+##############################################################################################
+
+
+class ConnectivityTable(object):
+    """Projection summaries indexed by (presynaptic population, postsynaptic population).
+
+    Each projection is a dictionary in the format returned by opencortex.utils.read_connectivity(), with the keys 'PreCellGroup',
+    'PostCellGroup', 'SynapseList', 'Type', 'LocOnPostCell' and 'NumPerPostCell' or 'NumPerPreCell'. The synapses in
+    `ignore_synapses` are removed from the synapse lists when the projections are added.
+    """
+
+    def __init__(self, ignore_synapses=None):
+        self.ignore_synapses = list(ignore_synapses) if ignore_synapses != None else []
+
+        self.projections = []
+
+        self._index = {}
+
+        self._matches = {}
+
+    def add_projection(
+        self,
+        pre_pop,
+        post_pop,
+        synapse_list,
+        num_per_cell,
+        loc_on_post_cell,
+        mode=NUM_PER_POST_CELL,
+        proj_type=None,
+    ):
+        """Adds a projection; proj_type is 'Chem' or 'Elect' and by default is 'Elect' if the name of a synapse contains 'Elect'"""
+
+        synapse_list = list(synapse_list)
+
+        if proj_type == None:
+            proj_type = (
+                "Elect"
+                if any("Elect" in synapse for synapse in synapse_list)
+                else "Chem"
+            )
+
+        for syn in self.ignore_synapses:
+            if syn in synapse_list:
+                synapse_list.remove(syn)
+
+        proj_info = {
+            "PreCellGroup": pre_pop,
+            "PostCellGroup": post_pop,
+            "SynapseList": synapse_list,
+            "Type": proj_type,
+        }
+
+        if mode != None:
+            proj_info[mode] = num_per_cell
+
+        proj_info["LocOnPostCell"] = loc_on_post_cell
+
+        if (pre_pop, post_pop) not in self._index:
+            self._index[(pre_pop, post_pop)] = []
+
+        self._index[(pre_pop, post_pop)].append(len(self.projections))
+
+        self.projections.append(proj_info)
+
+        self._matches = {}
+
+    def get(self, pre_pop, post_pop, exact=False):
+        """Returns the list of projections (copies of the dictionaries) from pre_pop to post_pop, in the order of the summary.
+
+        As in read_connectivity(), the populations of the summary match if pre_pop and post_pop are substrings of them (e.g. 'L23PyrRS' matches
+        'CG3D_L23PyrRS') and 'PreCellGroup'/'PostCellGroup' of the projections returned are set to pre_pop and post_pop; if `exact` is True
+        only the projections between exactly these populations are returned."""
+
+        if exact:
+            rows = self._index.get((pre_pop, post_pop), [])
+
+        else:
+            if (pre_pop, post_pop) not in self._matches:
+                rows = []
+
+                for pre, post in self._index.keys():
+                    if pre_pop in pre and post_pop in post:
+                        rows.extend(self._index[(pre, post)])
+
+                self._matches[(pre_pop, post_pop)] = sorted(rows)
+
+            rows = self._matches[(pre_pop, post_pop)]
+
+        proj_summary = []
+
+        for row in rows:
+            proj_info = copy.deepcopy(self.projections[row])
+
+            proj_info["PreCellGroup"] = pre_pop
+
+            proj_info["PostCellGroup"] = post_pop
+
+            proj_summary.append(proj_info)
+
+        return proj_summary
+
+    def pairs(self):
+        """Returns the (presynaptic population, postsynaptic population) pairs of the table, in the order they first appear"""
+
+        return list(self._index.keys())
+
+    def __len__(self):
+        return len(self.projections)
+
+    @classmethod
+    def from_txt(cls, path_to_txt_file, ignore_synapses=None):
+        """Reads a summary in the format of netConnList found in: Thalamocortical/neuroConstruct/pythonScripts/netbuild"""
+
+        table = cls(ignore_synapses)
+
+        with open(path_to_txt_file, "r") as file:
+            lines = file.readlines()
+
+        mode = None
+
+        for line in lines:
+            if NUM_PER_POST_CELL in line:
+                mode = NUM_PER_POST_CELL
+                break
+
+            if NUM_PER_PRE_CELL in line:
+                mode = NUM_PER_PRE_CELL
+                break
+
+        for line in lines:
+            extract_info = [item for item in line.split(" ") if item != ""]
+
+            if len(extract_info) < 5 or extract_info[0].startswith("#"):
+                continue
+
+            loc_on_post_cell = extract_info[4]
+
+            if "\n" in loc_on_post_cell:
+                loc_on_post_cell = loc_on_post_cell[0:-1]
+
+            table.add_projection(
+                extract_info[0],
+                extract_info[1],
+                parse_synapse_list(extract_info[2]),
+                extract_info[3],
+                loc_on_post_cell,
+                mode=mode,
+                proj_type="Elect" if "Elect" in extract_info[2] else "Chem",
+            )
+
+        return table
+
+    @classmethod
+    def from_csv(cls, path_to_csv_file, ignore_synapses=None, delimiter=","):
+        """Reads a tabular summary with a header row and the columns PreCellGroup, PostCellGroup, SynapseList (synapses separated
+        by ';' or spaces, optionally in brackets), NumPerPostCell or NumPerPreCell, LocOnPostCell and optionally Type ('Chem' or 'Elect')
+        """
+
+        table = cls(ignore_synapses)
+
+        with open(path_to_csv_file, "r", newline="") as file:
+            reader = csv.DictReader(
+                (line for line in file if not line.startswith("#")),
+                delimiter=delimiter,
+            )
+
+            fields = [field.strip() for field in reader.fieldnames or []]
+
+            if NUM_PER_POST_CELL in fields:
+                mode = NUM_PER_POST_CELL
+
+            elif NUM_PER_PRE_CELL in fields:
+                mode = NUM_PER_PRE_CELL
+
+            else:
+                raise Exception(
+                    "Error! The connectivity summary %s has neither a %s nor a %s column"
+                    % (path_to_csv_file, NUM_PER_POST_CELL, NUM_PER_PRE_CELL)
+                )
+
+            for row in reader:
+                row = dict((key.strip(), value.strip()) for key, value in row.items())
+
+                synapses = row["SynapseList"].strip("[]").replace(";", " ").split()
+
+                proj_type = row.get("Type")
+
+                table.add_projection(
+                    row["PreCellGroup"],
+                    row["PostCellGroup"],
+                    synapses,
+                    row[mode],
+                    row["LocOnPostCell"],
+                    mode=mode,
+                    proj_type=proj_type if proj_type else None,
+                )
+
+        return table
+
+    @classmethod
+    def read(cls, path, ignore_synapses=None):
+        """Reads a summary with from_csv() if the file name ends with .csv or .tsv and with from_txt() otherwise"""
+
+        if path.endswith(".csv"):
+            return cls.from_csv(path, ignore_synapses)
+
+        if path.endswith(".tsv"):
+            return cls.from_csv(path, ignore_synapses, delimiter="\t")
+
+        return cls.from_txt(path, ignore_synapses)
+
+
+##############################################################################################
+
+
+def get_connectivity_table(path, ignore_synapses=None):
+    """Returns the ConnectivityTable read from `path` (see ConnectivityTable.read()); tables are cached until the file changes"""
+
+    stat = os.stat(path)
+
+    key = (
+        os.path.abspath(path),
+        stat.st_mtime_ns,
+        stat.st_size,
+        tuple(ignore_synapses) if ignore_synapses != None else (),
+    )
+
+    if key not in _tables:
+        _tables[key] = ConnectivityTable.read(path, ignore_synapses)
+
+    return _tables[key]
@@ -0,0 +1,527 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Distributed builds of networks: each rank of a Partition (see opencortex.build.partition) builds the slice of the network it owns
+(all the populations, and the connections and inputs onto its own cells) and writes it to its own NeuroML HDF5 file, its shard.
+merge_shards() then combines the shards into a single file of the whole network.
+
+The network is built by a generator function, which builds the whole network with opencortex.core (as in the examples) and returns
+the NeuroMLDocument (or a tuple whose first element is the document) without saving it. With MPI, each process builds its rank, e.g.
+
+    rank = comm.Get_rank()
+
+    build_rank(generate, partition, rank, 'shards/Net.rank%i.net.nml.h5' % rank, parameters={'scale': 10})
+
+and, once all the ranks have finished, one of them calls merge_shards(). Without MPI, build_partitioned() runs the ranks in local
+processes, e.g. to test a partition on a single machine.
+"""
+
+import concurrent.futures
+import os
+import tempfile
+
+import neuroml
+import numpy as np
+
+import opencortex
+import opencortex.core as oc
+from opencortex.build import containers
+from opencortex.build import partition as oc_partition
+
+### Canonical order of the columns of the HDF5 arrays of projections and input lists, as written by libNeuroML
+CONNECTION_COLUMNS = [
+    "id",
+    "pre_cell_id",
+    "post_cell_id",
+    "pre_segment_id",
+    "post_segment_id",
+    "pre_fraction_along",
+    "post_fraction_along",
+    "weight",
+    "delay",
+]
+
+INPUT_COLUMNS = containers.input_column_names(True)
+
+### Number of rows sorted in memory at once when merging the arrays of shards not sorted by postsynaptic cell (or by id for inputs)
+SORT_RUN_SIZE = 2**20
+
+### Number of rows up to which the (renumbered) ids of a merged array are exact in float32
+FLOAT32_EXACT_INTEGERS = 2**24
+
+### Values of the columns missing from the array of a shard
+COLUMN_DEFAULTS = {
+    "pre_segment_id": 0,
+    "post_segment_id": 0,
+    "pre_fraction_along": 0.5,
+    "post_fraction_along": 0.5,
+    "segment_id": 0,
+    "fraction_along": 0.5,
+    "weight": 1,
+    "delay": 0,
+}
+
+
+##############################################################################################
+
+
+def _get_nml_doc(output):
+    if isinstance(output, (tuple, list)) and len(output) > 0:
+        output = output[0]
+
+    if not isinstance(output, neuroml.NeuroMLDocument):
+        raise Exception(
+            "Error! The generator of a partitioned network must return its NeuroMLDocument (or a tuple starting with it), not %s"
+            % type(output)
+        )
+
+    return output
+
+
+def build_rank(generator, partition, rank, shard_file_name, parameters=None):
+    """
+    Builds the slice of the network owned by `rank` of `partition`, by calling generator(**parameters) with the rank set (see
+    opencortex.build.partition.set_rank()), and saves it to the NeuroML HDF5 file `shard_file_name`. Returns `shard_file_name`.
+    """
+
+    if parameters == None:
+        parameters = {}
+
+    oc_partition.set_rank(partition, rank)
+
+    try:
+        nml_doc = _get_nml_doc(generator(**parameters))
+
+        for network in nml_doc.networks:
+            oc_partition.restrict_inputs(network)
+
+        target_dir = os.path.dirname(os.path.abspath(shard_file_name))
+
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+
+        oc.save_network(
+            nml_doc,
+            os.path.basename(shard_file_name),
+            validate=False,
+            format="hdf5",
+            target_dir=target_dir,
+        )
+
+    finally:
+        oc_partition.clear_rank()
+
+    opencortex.print_comment_v(
+        "Built rank %i of %i of the network in %s"
+        % (rank, partition.num_ranks, shard_file_name)
+    )
+
+    return shard_file_name
+
+
+def _build_rank_in_worker(task):
+    return build_rank(*task)
+
+
+def build_partitioned(
+    generator,
+    partition,
+    shard_file_pattern,
+    merged_file_name=None,
+    parameters=None,
+    max_workers=None,
+):
+    """
+    Emulates a distributed build on the local machine: builds each rank r of `partition` with build_rank() in a pool of (at most
+    `max_workers`) processes, saving its shard to shard_file_pattern % r (e.g. 'Net.rank%i.net.nml.h5'), and merges the shards into
+    `merged_file_name` if it is given. Returns the list of the shard file names, by rank.
+    """
+
+    tasks = [
+        (generator, partition, rank, shard_file_pattern % rank, parameters)
+        for rank in range(partition.num_ranks)
+    ]
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(max_workers or partition.num_ranks, partition.num_ranks)
+    ) as executor:
+        shard_file_names = list(executor.map(_build_rank_in_worker, tasks))
+
+    if merged_file_name != None:
+        merge_shards(shard_file_names, merged_file_name)
+
+    return shard_file_names
+
+
+##############################################################################################
+
+
+def _get_column_names(h5_array):
+    return [
+        h5_array._v_attrs["column_%i" % index] for index in range(h5_array.shape[1])
+    ]
+
+
+class _SortedRows(object):
+    """Rows `start` to `end` of the HDF5 array `h5_array`, sorted by its column `key_index` (or all with the key 0 if it is None),
+    read sequentially in blocks of at most `buffer_size` rows"""
+
+    def __init__(self, h5_array, start, end, key_index, buffer_size):
+        self.h5_array = h5_array
+
+        self.next = start
+
+        self.end = end
+
+        self.key_index = key_index
+
+        self.buffer_size = buffer_size
+
+        self.rows = h5_array[start:start]
+
+        self.keys = np.zeros(0, dtype=np.int64)
+
+    def complete(self):
+        """Returns whether all the remaining rows are in the buffer"""
+
+        return self.next == self.end
+
+    def fill(self):
+        if len(self.rows) >= self.buffer_size or self.complete():
+            return
+
+        stop = min(self.next + self.buffer_size - len(self.rows), self.end)
+
+        rows = self.h5_array[self.next : stop]
+
+        self.next = stop
+
+        self.rows = np.concatenate([self.rows, rows])
+
+        if self.key_index == None:
+            self.keys = np.zeros(len(self.rows), dtype=np.int64)
+
+        else:
+            self.keys = self.rows[:, self.key_index].astype(np.int64)
+
+    def take(self, count):
+        """Removes the first `count` rows from the buffer and returns them"""
+
+        rows = self.rows[:count]
+
+        self.rows = self.rows[count:]
+
+        self.keys = self.keys[count:]
+
+        return rows
+
+
+def _is_sorted(h5_array, key_index, block_size):
+    """Returns whether the rows of `h5_array` are sorted by its column `key_index`, reading the column in blocks"""
+
+    previous = None
+
+    for start in range(0, h5_array.shape[0], block_size):
+        keys = h5_array[start : start + block_size, key_index]
+
+        if np.any(keys[1:] < keys[:-1]) or (previous != None and keys[0] < previous):
+            return False
+
+        previous = keys[-1]
+
+    return True
+
+
+def _open_temp_file(h5file):
+    """Opens a temporary (uncompressed) HDF5 file in the directory of `h5file`"""
+
+    import tables
+
+    handle, temp_file_name = tempfile.mkstemp(
+        suffix=".h5", dir=os.path.dirname(os.path.abspath(h5file.filename))
+    )
+
+    os.close(handle)
+
+    return tables.open_file(temp_file_name, mode="w")
+
+
+def _sort_runs(h5_array, key_index, temp_file):
+    """Copies the rows of `h5_array` to an array of the HDF5 file `temp_file` in runs of SORT_RUN_SIZE rows, each stably sorted by
+    the column `key_index`, and returns the (array, start, end) of the runs"""
+
+    runs_array = temp_file.create_earray(
+        temp_file.root,
+        "runs%i" % len(temp_file.root._v_children),
+        atom=h5_array.atom,
+        shape=(0, h5_array.shape[1]),
+        expectedrows=h5_array.shape[0],
+    )
+
+    runs = []
+
+    for start in range(0, h5_array.shape[0], SORT_RUN_SIZE):
+        rows = h5_array[start : start + SORT_RUN_SIZE]
+
+        runs_array.append(rows[np.argsort(rows[:, key_index], kind="stable")])
+
+        runs.append((runs_array, start, start + len(rows)))
+
+    return runs
+
+
+def _merge_arrays(
+    h5file, group, element_id, h5_arrays, canonical_columns, sort_column, renumber
+):
+    """
+    Writes the rows of the arrays of the shards of a projection or input list to the array `element_id` of `group`, with the union of
+    their columns (in canonical order), stably sorted by the column `sort_column`, and with the column 'id' renumbered if `renumber`.
+
+    The rows are merged k-way (the shards not sorted already are first sorted in runs, see _sort_runs(), in a temporary file next
+    to h5file) and written in blocks, so only a few blocks of rows are in memory at once. The array is float32, as written by
+    libNeuroML, unless it has more than FLOAT32_EXACT_INTEGERS rows, in which case it is float64 so that the renumbered ids stay exact.
+    """
+
+    import tables
+
+    columns = []
+
+    for h5_array in h5_arrays:
+        for name in _get_column_names(h5_array):
+            if name not in columns:
+                columns.append(name)
+
+    columns = sorted(
+        columns,
+        key=lambda name: (
+            canonical_columns.index(name)
+            if name in canonical_columns
+            else len(canonical_columns)
+        ),
+    )
+
+    temp_file = None
+
+    try:
+        block_size = containers.WRITE_BLOCK_SIZE
+
+        sources = []
+
+        for h5_array in h5_arrays:
+            names = _get_column_names(h5_array)
+
+            key_index = names.index(sort_column) if sort_column in names else None
+
+            if key_index == None or _is_sorted(h5_array, key_index, block_size):
+                runs = [(h5_array, 0, h5_array.shape[0])]
+
+            else:
+                if temp_file == None:
+                    temp_file = _open_temp_file(h5file)
+
+                runs = _sort_runs(h5_array, key_index, temp_file)
+
+            positions = [columns.index(name) for name in names]
+
+            sources += [(run, key_index, positions) for run in runs]
+
+        buffer_size = max(block_size // len(sources), 1)
+
+        rows = [
+            _SortedRows(array, start, end, key_index, buffer_size)
+            for (array, start, end), key_index, positions in sources
+        ]
+
+        num_rows = sum(h5_array.shape[0] for h5_array in h5_arrays)
+
+        merged_array = h5file.create_carray(
+            group,
+            element_id,
+            atom=(
+                tables.Float64Atom()
+                if num_rows > FLOAT32_EXACT_INTEGERS
+                else tables.Float32Atom()
+            ),
+            shape=(num_rows, len(columns)),
+            title=h5_arrays[0].title,
+        )
+
+        for index, column in enumerate(columns):
+            merged_array._f_setattr("column_%i" % index, column)
+
+        written = 0
+
+        while written < num_rows:
+            for source_rows in rows:
+                source_rows.fill()
+
+            ### the rows with keys below the smallest last key of the sources with rows left out of their buffer can be written; the
+            ### rows with that key are written from the sources before (and including) the first such source, to keep the order stable
+
+            bounds = [
+                source_rows.keys[-1]
+                for source_rows in rows
+                if not source_rows.complete()
+            ]
+
+            bound = min(bounds) if len(bounds) > 0 else None
+
+            side = "right"
+
+            block = []
+
+            keys = []
+
+            for source_rows, (run, key_index, positions) in zip(rows, sources):
+                if bound == None:
+                    count = len(source_rows.keys)
+
+                else:
+                    count = np.searchsorted(source_rows.keys, bound, side=side)
+
+                    if not source_rows.complete() and source_rows.keys[-1] == bound:
+                        side = "left"
+
+                keys.append(source_rows.keys[:count])
+
+                source_block = np.empty((count, len(columns)), dtype=np.float64)
+
+                for index, name in enumerate(columns):
+                    source_block[:, index] = COLUMN_DEFAULTS.get(name, 0)
+
+                source_block[:, positions] = source_rows.take(count)
+
+                block.append(source_block)
+
+            block = np.concatenate(block)[
+                np.argsort(np.concatenate(keys), kind="stable")
+            ]
+
+            if renumber and "id" in columns:
+                block[:, columns.index("id")] = np.arange(written, written + len(block))
+
+            merged_array[written : written + len(block)] = block
+
+            written += len(block)
+
+    finally:
+        if temp_file != None:
+            temp_file.close()
+
+            os.remove(temp_file.filename)
+
+
+def merge_shards(shard_file_names, file_name, compress=True):
+    """
+    Merges the NeuroML HDF5 files of the ranks of a partitioned network (see build_rank()) into the single NeuroML HDF5 file `file_name`.
+
+    The populations and the top level elements of the document are taken from the first shard. The connections of each projection
+    are those of all the shards, ordered by postsynaptic cell (so the merged network does not depend on the partition) and renumbered;
+    the inputs of each input list are those of all the shards, ordered by id. The rows are merged and written in blocks (see
+    _merge_arrays()), so the projections do not need to fit in memory.
+    """
+
+    import tables
+
+    filters = (
+        tables.Filters(complib="zlib", complevel=5) if compress else tables.Filters()
+    )
+
+    shards = [tables.open_file(shard, mode="r") for shard in shard_file_names]
+
+    try:
+        h5file = tables.open_file(
+            file_name,
+            mode="w",
+            title=shards[0].title,
+            filters=filters,
+        )
+
+        try:
+            root_group = h5file.create_group("/", "neuroml", "Root NeuroML group")
+
+            net_group = h5file.create_group(root_group, "network")
+
+            shards[0].root.neuroml._v_attrs._f_copy(root_group)
+
+            shards[0].root.neuroml.network._v_attrs._f_copy(net_group)
+
+            shard_groups = [
+                dict(
+                    (group._v_name, group)
+                    for group in shard.root.neuroml.network._f_iter_nodes("Group")
+                )
+                for shard in shards
+            ]
+
+            names = []
+
+            for groups in shard_groups:
+                for name in groups.keys():
+                    if name not in names:
+                        names.append(name)
+
+            for name in names:
+                groups = [groups[name] for groups in shard_groups if name in groups]
+
+                if name.startswith("population_"):
+                    groups[0]._f_copy(net_group, recursive=True)
+
+                    continue
+
+                group = h5file.create_group(net_group, name)
+
+                groups[0]._v_attrs._f_copy(group)
+
+                element_id = groups[0]._v_attrs["id"]
+
+                h5_arrays = [
+                    g._f_get_child(element_id) for g in groups if element_id in g
+                ]
+
+                if len(h5_arrays) == 0:
+                    continue
+
+                if name.startswith("inputList_"):
+                    _merge_arrays(
+                        h5file,
+                        group,
+                        element_id,
+                        h5_arrays,
+                        INPUT_COLUMNS,
+                        "id",
+                        False,
+                    )
+
+                else:
+                    _merge_arrays(
+                        h5file,
+                        group,
+                        element_id,
+                        h5_arrays,
+                        CONNECTION_COLUMNS,
+                        "post_cell_id",
+                        True,
+                    )
+
+        finally:
+            h5file.close()
+
+    finally:
+        for shard in shards:
+            shard.close()
+
+    opencortex.print_comment_v(
+        "Merged %i shards of the network into %s" % (len(shard_file_names), file_name)
+    )
+
+    return file_name
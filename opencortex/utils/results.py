@@ -0,0 +1,516 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Columnar loading of the outputs of simulations of the LEMS files written by opencortex.core.generate_lems_simulation().
+
+The text files saved by a simulation (the OutputFiles of traces and the EventOutputFiles of spikes) are parsed once, in chunks,
+into binary caches (NumPy .npy files next to each output file, unless a `cache_dir` is given), which are then memory-mapped:
+loading the results again (while the output files are unchanged) reads nothing until the arrays are used. E.g.
+
+    import opencortex.utils.results as oc_results
+
+    results = oc_results.load_simulation_results('LEMS_Multiscale.xml')
+
+    t = results['t'] * 1000                                       # times of the first trace file, in ms
+    v = results.traces['Multiscale_popExc_v.dat'].values * 1000   # time x column array, in mV
+    spikes = results.events['Sim_Multiscale.popExc.spikes']       # spikes.ids and spikes.times, flat arrays
+
+The values are in SI units, as saved by the simulators. The arrays of traces are stored column by column (Fortran order), so the
+trace of a single cell is contiguous in the cache.
+"""
+
+import json
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+### Increased when the format of the caches changes, which invalidates the caches written before
+CACHE_VERSION = 1
+
+### Number of bytes of an output file parsed at a time
+CHUNK_SIZE = 16 * 1024 * 1024
+
+LEMS_NAMESPACES = ["", "{http://www.neuroml.org/lems/0.7.2}"]
+
+
+##############################################################################################
+
+
+class TraceFile(object):
+    """The traces saved in one OutputFile: the times `t` (1D array) and the values `values` (2D array, time x column), with the
+    quantities of the columns in `columns`"""
+
+    def __init__(self, file_name, columns, t, values):
+        self.file_name = file_name
+
+        self.columns = list(columns)
+
+        self.t = t
+
+        self.values = values
+
+        self._index = dict((quantity, i) for i, quantity in enumerate(self.columns))
+
+    def __getitem__(self, quantity):
+        """Returns the times for 't', otherwise the trace (1D array) of the quantity"""
+
+        if quantity == "t":
+            return self.t
+
+        return self.values[:, self._index[quantity]]
+
+    def __contains__(self, quantity):
+        return quantity == "t" or quantity in self._index
+
+    def __len__(self):
+        return len(self.t)
+
+    def keys(self):
+        return ["t"] + self.columns
+
+
+class EventFile(object):
+    """The events saved in one EventOutputFile, as flat arrays of the ids of the event selections (`ids`) and the times of the
+    events (`times`), in the order of the file; `selections` maps the ids to the selections, e.g. {0: 'popExc/0/RS'}
+    """
+
+    def __init__(self, file_name, selections, ids, times):
+        self.file_name = file_name
+
+        self.selections = dict(selections)
+
+        self.ids = ids
+
+        self.times = times
+
+        self._ids = dict((select, id) for id, select in self.selections.items())
+
+    def get_times(self, select):
+        """Returns the times of the events of the selection `select` (e.g. 'popExc/0/RS')"""
+
+        return self.times[self.ids == self._ids[select]]
+
+    def __contains__(self, select):
+        return select in self._ids
+
+    def __len__(self):
+        return len(self.times)
+
+    def to_dict(self):
+        """Returns the events in the format of pyneuroml.pynml.reload_saved_data(): {selection: [times]}"""
+
+        order = np.argsort(self.ids, kind="stable")
+
+        ids = self.ids[order]
+
+        times = self.times[order]
+
+        events = {}
+
+        for id, select in self.selections.items():
+            start, end = np.searchsorted(ids, [id, id + 1])
+
+            events[select] = times[start:end].tolist()
+
+        return events
+
+
+class SimulationResults(object):
+    """The results of a simulation: `traces`, the TraceFiles by output file name, and `events`, the EventFiles by output file
+    name, in the order of the LEMS file.
+
+    Quantities and selections can also be looked up without their files: results['t'] returns the times of the first trace file,
+    results[quantity] the trace of the quantity and results.get_events(select) the times of the events of a selection.
+    """
+
+    def __init__(self, lems_file_name, traces, events):
+        self.lems_file_name = lems_file_name
+
+        self.traces = traces
+
+        self.events = events
+
+    def __getitem__(self, quantity):
+        for trace_file in self.traces.values():
+            if quantity in trace_file:
+                return trace_file[quantity]
+
+        raise KeyError(quantity)
+
+    def __contains__(self, quantity):
+        return any(quantity in trace_file for trace_file in self.traces.values())
+
+    def get_events(self, select):
+        for event_file in self.events.values():
+            if select in event_file:
+                return event_file.get_times(select)
+
+        raise KeyError(select)
+
+
+##############################################################################################
+
+
+def get_lems_outputs(lems_file_name):
+    """Returns the output files of the Simulation in a LEMS file: (trace_files, event_files), where trace_files is a list of
+    (file name, [quantities]) and event_files a list of (file name, format, {id: selection})
+    """
+
+    root = ET.parse(lems_file_name).getroot()
+
+    simulation = None
+
+    for ns in LEMS_NAMESPACES:
+        simulation = root.find(ns + "Simulation")
+
+        if simulation is None:
+            for component in root.findall(ns + "Component"):
+                if component.attrib.get("type") == "Simulation":
+                    simulation = component
+
+        if simulation is not None:
+            break
+
+    if simulation is None:
+        raise Exception("Error! No Simulation found in %s" % lems_file_name)
+
+    trace_files = []
+
+    event_files = []
+
+    for output_file in simulation.findall(ns + "OutputFile"):
+        trace_files.append(
+            (
+                output_file.attrib["fileName"],
+                [
+                    column.attrib["quantity"]
+                    for column in output_file.findall(ns + "OutputColumn")
+                ],
+            )
+        )
+
+    for output_file in simulation.findall(ns + "EventOutputFile"):
+        event_files.append(
+            (
+                output_file.attrib["fileName"],
+                output_file.attrib.get("format", "TIME_ID"),
+                dict(
+                    (int(selection.attrib["id"]), selection.attrib["select"])
+                    for selection in output_file.findall(ns + "EventSelection")
+                ),
+            )
+        )
+
+    return trace_files, event_files
+
+
+def _count_lines(file_name):
+    lines = 0
+
+    last = b"\n"
+
+    with open(file_name, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+
+            if not chunk:
+                break
+
+            lines += chunk.count(b"\n")
+
+            last = chunk[-1:]
+
+    if last != b"\n":
+        lines += 1
+
+    return lines
+
+
+def _read_rows(file_name, num_columns):
+    """Yields the rows of a file of whitespace separated numbers, as 2D arrays of (at most) CHUNK_SIZE bytes of the file"""
+
+    remainder = b""
+
+    with open(file_name, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+
+            if chunk:
+                chunk = remainder + chunk
+
+                end = chunk.rfind(b"\n") + 1
+
+                remainder = chunk[end:]
+
+                chunk = chunk[:end]
+
+            else:
+                chunk = remainder
+
+                remainder = b""
+
+            if len(chunk.strip()) > 0:
+                numbers = np.fromstring(chunk.decode("ascii"), sep=" ")
+
+                if len(numbers) % num_columns != 0:
+                    raise Exception(
+                        "Error! The rows of %s do not all have %i columns"
+                        % (file_name, num_columns)
+                    )
+
+                yield numbers.reshape(-1, num_columns)
+
+            if not chunk and not remainder:
+                break
+
+
+def _get_cache_paths(file_name, cache_dir, extensions):
+    if cache_dir == None:
+        cache_dir = os.path.dirname(os.path.abspath(file_name))
+
+    base = os.path.join(cache_dir, os.path.basename(file_name))
+
+    return base + ".json", [base + extension for extension in extensions]
+
+
+def _get_source_info(file_name, **info):
+    stat = os.stat(file_name)
+
+    info.update(
+        {
+            "Version": CACHE_VERSION,
+            "Size": stat.st_size,
+            "MTime": stat.st_mtime_ns,
+        }
+    )
+
+    return info
+
+
+def _is_cache_valid(info_file, array_files, info):
+    if not os.path.isfile(info_file) or not all(os.path.isfile(f) for f in array_files):
+        return False
+
+    with open(info_file) as f:
+        try:
+            return json.load(f) == info
+        except ValueError:
+            return False
+
+
+def _write_cache(info_file, array_files, info, write_arrays):
+    """Writes the arrays (with write_arrays(temporary file names)) and then the description of the source file, each to a
+    temporary file which is renamed when complete, so that an interrupted write leaves no valid cache
+    """
+
+    directory = os.path.dirname(info_file)
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    temp_files = ["%s.%i.tmp.npy" % (f[:-4], os.getpid()) for f in array_files]
+
+    try:
+        write_arrays(temp_files)
+
+    except BaseException:
+        for temp_file in temp_files:
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+        raise
+
+    for temp_file, array_file in zip(temp_files, array_files):
+        os.replace(temp_file, array_file)
+
+    temp_info_file = "%s.%i.tmp" % (info_file, os.getpid())
+
+    with open(temp_info_file, "w") as f:
+        json.dump(info, f)
+
+    os.replace(temp_info_file, info_file)
+
+
+def _load_array(file_name, mmap):
+    return np.load(file_name, mmap_mode="r" if mmap else None)
+
+
+##############################################################################################
+
+
+def load_trace_file(file_name, columns, cache_dir=None, mmap=True):
+    """Returns the TraceFile of the output file `file_name`, whose columns (after the first, the time) are the quantities in
+    `columns`; the file is parsed into the cache if it is not there yet (or has changed since)
+    """
+
+    info_file, array_files = _get_cache_paths(file_name, cache_dir, [".npy"])
+
+    info = _get_source_info(file_name, Columns=list(columns))
+
+    if not _is_cache_valid(info_file, array_files, info):
+        num_columns = len(columns) + 1
+
+        def write_arrays(temp_files):
+            rows = _count_lines(file_name)
+
+            data = np.lib.format.open_memmap(
+                temp_files[0],
+                mode="w+",
+                dtype=np.float64,
+                shape=(rows, num_columns),
+                fortran_order=True,
+            )
+
+            start = 0
+
+            for chunk in _read_rows(file_name, num_columns):
+                if start + len(chunk) > rows:
+                    raise Exception("Error! Could not parse the rows of %s" % file_name)
+
+                data[start : start + len(chunk)] = chunk
+
+                start += len(chunk)
+
+            if start != rows:
+                raise Exception(
+                    "Error! Found %i rows of values in %s, which has %i lines"
+                    % (start, file_name, rows)
+                )
+
+            data.flush()
+
+            del data
+
+        _write_cache(info_file, array_files, info, write_arrays)
+
+    data = _load_array(array_files[0], mmap)
+
+    return TraceFile(file_name, columns, data[:, 0], data[:, 1:])
+
+
+def load_event_file(file_name, selections, format="TIME_ID", cache_dir=None, mmap=True):
+    """Returns the EventFile of the output file `file_name` of events in the format `format` ('TIME_ID' or 'ID_TIME'), with the
+    selections {id: selection}; the file is parsed into the cache if it is not there yet (or has changed since)
+    """
+
+    if format not in ["TIME_ID", "ID_TIME"]:
+        raise Exception(
+            "Error! Unsupported format of the events in %s: %s" % (file_name, format)
+        )
+
+    info_file, array_files = _get_cache_paths(
+        file_name, cache_dir, [".ids.npy", ".times.npy"]
+    )
+
+    info = _get_source_info(file_name, Format=format)
+
+    if not _is_cache_valid(info_file, array_files, info):
+        id_column, time_column = (1, 0) if format == "TIME_ID" else (0, 1)
+
+        def write_arrays(temp_files):
+            rows = _count_lines(file_name)
+
+            ids = np.lib.format.open_memmap(
+                temp_files[0], mode="w+", dtype=np.int32, shape=(rows,)
+            )
+
+            times = np.lib.format.open_memmap(
+                temp_files[1], mode="w+", dtype=np.float64, shape=(rows,)
+            )
+
+            start = 0
+
+            for chunk in _read_rows(file_name, 2):
+                if start + len(chunk) > rows:
+                    raise Exception("Error! Could not parse the rows of %s" % file_name)
+
+                ids[start : start + len(chunk)] = chunk[:, id_column]
+
+                times[start : start + len(chunk)] = chunk[:, time_column]
+
+                start += len(chunk)
+
+            if start != rows:
+                raise Exception(
+                    "Error! Found %i events in %s, which has %i lines"
+                    % (start, file_name, rows)
+                )
+
+            ids.flush()
+
+            times.flush()
+
+            del ids, times
+
+        _write_cache(info_file, array_files, info, write_arrays)
+
+    return EventFile(
+        file_name,
+        selections,
+        _load_array(array_files[0], mmap),
+        _load_array(array_files[1], mmap),
+    )
+
+
+def _find_output_file(name, base_dir, lems_dir):
+    for directory in [base_dir, lems_dir]:
+        file_name = os.path.join(directory, name)
+
+        if os.path.isfile(file_name):
+            return file_name
+
+    raise Exception("Error! Could not find the simulation output file %s" % name)
+
+
+def load_simulation_results(
+    lems_file_name,
+    base_dir=".",
+    cache_dir=None,
+    traces=True,
+    events=True,
+    mmap=True,
+):
+    """
+    Returns the SimulationResults of a run of the LEMS file `lems_file_name`, with the traces (if `traces`) and the events
+    (if `events`) of its output files, which are looked for relative to `base_dir` and then to the directory of the LEMS file.
+
+    The output files are parsed into binary caches in `cache_dir` (by default, next to each output file) the first time they are
+    loaded, and the arrays of the results are memory-mapped from the caches (unless `mmap` is False, in which case they are read
+    into memory).
+    """
+
+    trace_files, event_files = get_lems_outputs(lems_file_name)
+
+    lems_dir = os.path.dirname(os.path.abspath(lems_file_name))
+
+    results = SimulationResults(lems_file_name, {}, {})
+
+    if traces:
+        for name, columns in trace_files:
+            results.traces[name] = load_trace_file(
+                _find_output_file(name, base_dir, lems_dir),
+                columns,
+                cache_dir=cache_dir,
+                mmap=mmap,
+            )
+
+    if events:
+        for name, format, selections in event_files:
+            results.events[name] = load_event_file(
+                _find_output_file(name, base_dir, lems_dir),
+                selections,
+                format=format,
+                cache_dir=cache_dir,
+                mmap=mmap,
+            )
+
+    return results
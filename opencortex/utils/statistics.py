@@ -0,0 +1,887 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Statistics of the connectivity of networks, computed with NumPy on the connection arrays: for each projection the number of
+connections, the distributions of the in and out degrees of the cells, the synapses per postsynaptic segment (and segment group,
+if the postsynaptic cells are known), the connection probability as a function of the distance between the cells, and summaries
+of the weights and delays.
+
+Networks are read either in memory (a neuroml.NeuroMLDocument or neuroml.Network, e.g. as built with opencortex.core) or from a
+NeuroML HDF5 file, whose connection arrays are read in chunks of CHUNK_SIZE connections. get_network_statistics() returns the
+statistics as a dictionary, which save_report() writes as a compact JSON or HTML report, e.g.
+
+    statistics = get_network_statistics('Net.net.nml.h5')
+
+    save_report(statistics, 'Net.connectivity.html')
+"""
+
+import html
+import json
+import math
+
+import neuroml
+import neuroml.loaders as loaders
+import numpy as np
+
+import opencortex
+import opencortex.build as oc_build
+
+### Number of connections read (and processed) at once
+CHUNK_SIZE = 2**20
+
+### Number of bins of the histograms
+NUM_BINS = 20
+
+### Largest number of pairs of cells whose distances are all computed; the distances of larger projections are estimated from
+### a random sample of this many pairs
+DISTANCE_SAMPLES = 10**6
+
+PROJECTION_TYPES = {
+    "projection": "chemical",
+    "electricalProjection": "electrical",
+    "continuousProjection": "continuous",
+}
+
+
+##############################################################################################
+
+
+def _histogram(counts, edges):
+    return {"edges": [float(edge) for edge in edges], "counts": counts.tolist()}
+
+
+def _get_edges(minimum, maximum, num_bins, integer=False):
+    """Returns the edges of `num_bins` bins (fewer for small ranges of integers) from `minimum` to `maximum`"""
+
+    if integer and maximum - minimum < num_bins:
+        return np.arange(minimum, maximum + 2, dtype=np.float64)
+
+    if maximum == minimum:
+        return np.array([minimum, minimum + 1], dtype=np.float64)
+
+    return np.linspace(minimum, maximum, num_bins + 1)
+
+
+def _degree_statistics(degrees, num_bins):
+    """Returns the summary and histogram of the numbers of connections of the cells"""
+
+    if len(degrees) == 0:
+        return None
+
+    edges = _get_edges(int(degrees.min()), int(degrees.max()), num_bins, integer=True)
+
+    counts, edges = np.histogram(degrees, bins=edges)
+
+    return {
+        "min": int(degrees.min()),
+        "max": int(degrees.max()),
+        "mean": float(degrees.mean()),
+        "std": float(degrees.std()),
+        "histogram": _histogram(counts, edges),
+    }
+
+
+##############################################################################################
+
+
+class _ValueSummary(object):
+    """Running count, mean, standard deviation, minimum and maximum of values (e.g. weights) added in chunks, and their histogram
+    once the range is known (see add_to_histogram())"""
+
+    def __init__(self):
+        self.count = 0
+
+        self.total = 0.0
+
+        self.total_squares = 0.0
+
+        self.min = math.inf
+
+        self.max = -math.inf
+
+        self.counts = None
+
+        self.edges = None
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+
+        self.count += len(values)
+
+        self.total += float(np.sum(values, dtype=np.float64))
+
+        self.total_squares += float(np.sum(np.square(values, dtype=np.float64)))
+
+        self.min = min(self.min, float(values.min()))
+
+        self.max = max(self.max, float(values.max()))
+
+    def is_constant(self):
+        return self.count == 0 or self.min == self.max
+
+    def add_to_histogram(self, values, num_bins):
+        if self.edges is None:
+            self.edges = _get_edges(self.min, self.max, num_bins)
+
+            self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+        self.counts += np.histogram(values, bins=self.edges)[0]
+
+    def get_statistics(self):
+        if self.count == 0:
+            return None
+
+        mean = self.total / self.count
+
+        if self.is_constant():
+            self.edges = _get_edges(self.min, self.max, 1)
+
+            self.counts = np.array([self.count], dtype=np.int64)
+
+        return {
+            "min": self.min,
+            "max": self.max,
+            "mean": mean,
+            "std": math.sqrt(max(self.total_squares / self.count - mean**2, 0)),
+            "histogram": _histogram(self.counts, self.edges),
+        }
+
+
+##############################################################################################
+
+
+def _get_distance_edges(pre_positions, post_positions, num_bins):
+    """Returns the edges of the histograms of the distances between the cells, from 0 to the diagonal of their bounding box"""
+
+    positions = np.concatenate([pre_positions, post_positions])
+
+    diagonal = float(
+        np.sqrt(np.sum((positions.max(axis=0) - positions.min(axis=0)) ** 2))
+    )
+
+    return np.linspace(0, max(diagonal, 1e-9) * (1 + 1e-9), num_bins + 1)
+
+
+def _get_distances(pre_positions, post_positions, pre_cells, post_cells):
+    return np.sqrt(
+        np.sum((pre_positions[pre_cells] - post_positions[post_cells]) ** 2, axis=1)
+    )
+
+
+def _get_pair_distance_counts(pre_positions, post_positions, edges, same_population):
+    """Returns the numbers of pairs of (distinct) cells in each distance bin: exact if there are at most DISTANCE_SAMPLES pairs,
+    otherwise estimated from DISTANCE_SAMPLES random pairs"""
+
+    num_pre = len(pre_positions)
+
+    num_post = len(post_positions)
+
+    num_pairs = num_pre * num_post - (num_pre if same_population else 0)
+
+    counts = np.zeros(len(edges) - 1, dtype=np.float64)
+
+    if num_pre * num_post <= DISTANCE_SAMPLES:
+        rows = max(1, CHUNK_SIZE // max(num_post, 1))
+
+        post_cells = np.arange(num_post)
+
+        for start in range(0, num_pre, rows):
+            pre_cells = np.repeat(
+                np.arange(start, min(num_pre, start + rows)), num_post
+            )
+
+            chunk_post_cells = np.tile(post_cells, len(pre_cells) // max(num_post, 1))
+
+            if same_population:
+                distinct = pre_cells != chunk_post_cells
+
+                pre_cells = pre_cells[distinct]
+
+                chunk_post_cells = chunk_post_cells[distinct]
+
+            counts += np.histogram(
+                _get_distances(
+                    pre_positions, post_positions, pre_cells, chunk_post_cells
+                ),
+                bins=edges,
+            )[0]
+
+        return counts
+
+    ### a fixed seed, so that the report of a network is always the same
+    rng = np.random.default_rng(0)
+
+    pre_cells = rng.integers(0, num_pre, size=DISTANCE_SAMPLES)
+
+    post_cells = rng.integers(0, num_post, size=DISTANCE_SAMPLES)
+
+    if same_population:
+        distinct = pre_cells != post_cells
+
+        pre_cells = pre_cells[distinct]
+
+        post_cells = post_cells[distinct]
+
+    counts += np.histogram(
+        _get_distances(pre_positions, post_positions, pre_cells, post_cells),
+        bins=edges,
+    )[0]
+
+    return counts * num_pairs / max(len(pre_cells), 1)
+
+
+##############################################################################################
+
+
+class _ProjectionStatistics(object):
+    """Statistics of a projection, accumulated over chunks of its connections (see add())"""
+
+    def __init__(self, info, pre_population, post_population, cell, num_bins):
+        self.info = info
+
+        self.pre_population = pre_population
+
+        self.post_population = post_population
+
+        self.cell = cell
+
+        self.num_bins = num_bins
+
+        self.count = 0
+
+        self.in_degrees = np.zeros(post_population["size"], dtype=np.int64)
+
+        self.out_degrees = np.zeros(pre_population["size"], dtype=np.int64)
+
+        self.segment_counts = np.zeros(0, dtype=np.int64)
+
+        self.weights = _ValueSummary()
+
+        self.delays = _ValueSummary() if info["type"] == "chemical" else None
+
+        self.has_positions = (
+            pre_population["positions"] is not None
+            and post_population["positions"] is not None
+        )
+
+        if self.has_positions:
+            self.distance_edges = _get_distance_edges(
+                pre_population["positions"], post_population["positions"], num_bins
+            )
+
+            self.distance_counts = np.zeros(num_bins, dtype=np.int64)
+
+    def add(self, pre_cells, post_cells, post_segments, weights, delays):
+        """Adds a chunk of connections, given by the arrays of their pre and post cell indices, post segments, weights and delays"""
+
+        self.count += len(pre_cells)
+
+        self.in_degrees += np.bincount(post_cells, minlength=len(self.in_degrees))[
+            : len(self.in_degrees)
+        ]
+
+        self.out_degrees += np.bincount(pre_cells, minlength=len(self.out_degrees))[
+            : len(self.out_degrees)
+        ]
+
+        segment_counts = np.bincount(post_segments)
+
+        if len(segment_counts) > len(self.segment_counts):
+            segment_counts[: len(self.segment_counts)] += self.segment_counts
+
+            self.segment_counts = segment_counts
+
+        else:
+            self.segment_counts[: len(segment_counts)] += segment_counts
+
+        self.weights.add(weights)
+
+        if self.delays is not None:
+            self.delays.add(delays)
+
+        if self.has_positions:
+            self.distance_counts += np.histogram(
+                _get_distances(
+                    self.pre_population["positions"],
+                    self.post_population["positions"],
+                    pre_cells,
+                    post_cells,
+                ),
+                bins=self.distance_edges,
+            )[0]
+
+    def needs_values(self):
+        """Whether the histograms of the weights or delays need a second pass over the connections (their values vary)"""
+
+        return not self.weights.is_constant() or (
+            self.delays is not None and not self.delays.is_constant()
+        )
+
+    def add_values(self, weights, delays):
+        """Adds a chunk of weights and delays to their histograms, once all the connections have been added with add()"""
+
+        if not self.weights.is_constant():
+            self.weights.add_to_histogram(weights, self.num_bins)
+
+        if self.delays is not None and not self.delays.is_constant():
+            self.delays.add_to_histogram(delays, self.num_bins)
+
+    def _get_segment_statistics(self, segment_groups):
+        segments = np.nonzero(self.segment_counts)[0]
+
+        statistics = {
+            "segments": dict(
+                (str(segment), int(self.segment_counts[segment]))
+                for segment in segments.tolist()
+            )
+        }
+
+        if self.cell == None or self.cell.morphology == None:
+            return statistics
+
+        index = oc_build.morphology.get_morphology_index(self.cell)
+
+        groups = {}
+
+        for segment_group in self.cell.morphology.segment_groups:
+            if segment_groups != None and segment_group.id not in segment_groups:
+                continue
+
+            group_segments = index.segments_in_group(segment_group.id)
+
+            group_segments = group_segments[group_segments < len(self.segment_counts)]
+
+            count = int(np.sum(self.segment_counts[group_segments]))
+
+            if count > 0:
+                groups[segment_group.id] = count
+
+        statistics["segment_groups"] = groups
+
+        return statistics
+
+    def get_statistics(self, segment_groups=None):
+        statistics = dict(self.info)
+
+        statistics["connections"] = self.count
+
+        statistics["in_degree"] = _degree_statistics(self.in_degrees, self.num_bins)
+
+        statistics["out_degree"] = _degree_statistics(self.out_degrees, self.num_bins)
+
+        statistics["synapses"] = self._get_segment_statistics(segment_groups)
+
+        statistics["weight"] = self.weights.get_statistics()
+
+        statistics["delay"] = (
+            self.delays.get_statistics() if self.delays is not None else None
+        )
+
+        if self.has_positions:
+            pairs = _get_pair_distance_counts(
+                self.pre_population["positions"],
+                self.post_population["positions"],
+                self.distance_edges,
+                self.info["presynaptic_population"]
+                == self.info["postsynaptic_population"],
+            )
+
+            statistics["distance"] = {
+                "edges": self.distance_edges.tolist(),
+                "connections": self.distance_counts.tolist(),
+                "pairs": pairs.tolist(),
+                "probability": [
+                    float(connections / pair_count) if pair_count > 0 else None
+                    for connections, pair_count in zip(
+                        self.distance_counts.tolist(), pairs.tolist()
+                    )
+                ],
+            }
+
+        return statistics
+
+
+##############################################################################################
+
+
+def _get_instance_positions(population):
+    """Returns the (size, 3) array of the positions of the cells of a population, by cell index, or None if it has no instances"""
+
+    if len(population.instances) == 0:
+        return None
+
+    positions = np.zeros((population.size, 3))
+
+    for instance in population.instances:
+        location = instance.location
+
+        positions[int(instance.id)] = [location.x, location.y, location.z]
+
+    return positions
+
+
+def _get_cell(nml_doc, component, cells):
+    if cells != None and component in cells:
+        return cells[component]
+
+    cell = None
+
+    if nml_doc != None:
+        for doc_cell in nml_doc.cells:
+            if doc_cell.id == component:
+                cell = doc_cell
+
+    if cell == None:
+        if component in oc_build.cell_ids_vs_nml_docs:
+            cell = oc_build.cell_ids_vs_nml_docs[component].get_by_id(component)
+
+    if not isinstance(cell, neuroml.Cell):
+        return None
+
+    return cell
+
+
+def _get_memory_projections(nml_doc, net, cells, num_bins):
+    """Yields the (statistics, function returning an iterator over the chunks of connections) of the projections of `net`"""
+
+    populations = {}
+
+    for population in net.populations:
+        populations[population.id] = {
+            "size": population.size,
+            "component": population.component,
+            "positions": _get_instance_positions(population),
+        }
+
+    for projection_type, projections in [
+        ("chemical", net.projections),
+        ("electrical", net.electrical_projections),
+        ("continuous", net.continuous_projections),
+    ]:
+        for proj in projections:
+            columns = oc_build.sparse.get_connection_columns(proj)
+
+            def chunks(columns=columns):
+                for start in range(0, len(columns["id"]), CHUNK_SIZE):
+                    yield dict(
+                        (name, columns[name][start : start + CHUNK_SIZE])
+                        for name in [
+                            "pre_cell",
+                            "post_cell",
+                            "post_segment",
+                            "weight",
+                            "delay",
+                        ]
+                    )
+
+            post_population = populations[proj.postsynaptic_population]
+
+            info = {
+                "id": proj.id,
+                "type": projection_type,
+                "presynaptic_population": proj.presynaptic_population,
+                "postsynaptic_population": proj.postsynaptic_population,
+                "synapse": getattr(proj, "synapse", None),
+            }
+
+            yield (
+                _ProjectionStatistics(
+                    info,
+                    populations[proj.presynaptic_population],
+                    post_population,
+                    _get_cell(nml_doc, post_population["component"], cells),
+                    num_bins,
+                ),
+                chunks,
+            )
+
+
+def _get_hdf5_projections(h5file, cells, num_bins):
+    """Yields the (statistics, function returning an iterator over the chunks of connections) of the projections of the network
+    in the open HDF5 file `h5file`"""
+
+    net_group = h5file.root.neuroml.network
+
+    populations = {}
+
+    groups = list(net_group._f_iter_nodes("Group"))
+
+    for group in groups:
+        if not group._v_name.startswith("population_"):
+            continue
+
+        attrs = group._v_attrs
+
+        population_id = str(attrs["id"])
+
+        positions = None
+
+        if population_id in group:
+            h5_array = group._f_get_child(population_id)
+
+            array = h5_array.read()
+
+            names = [
+                str(h5_array._v_attrs["column_%i" % index])
+                for index in range(array.shape[1])
+                if "column_%i" % index in h5_array._v_attrs
+            ]
+
+            if len(names) == array.shape[1]:
+                ids = array[:, names.index("id")] if "id" in names else None
+
+                array = array[:, [names.index(axis) for axis in ["x", "y", "z"]]]
+
+            else:
+                ids = array[:, 0] if array.shape[1] == 4 else None
+
+                array = array[:, -3:]
+
+            positions = np.zeros((int(attrs["size"]), 3))
+
+            if ids is None:
+                positions[: len(array)] = array
+
+            else:
+                positions[ids.astype(np.int64)] = array
+
+        populations[population_id] = {
+            "size": int(attrs["size"]),
+            "component": str(attrs["component"]),
+            "positions": positions,
+        }
+
+    for group in groups:
+        attrs = group._v_attrs
+
+        if group._v_name.startswith("population_") or "type" not in attrs:
+            continue
+
+        if str(attrs["type"]) not in PROJECTION_TYPES:
+            continue
+
+        proj_id = str(attrs["id"])
+
+        h5_array = group._f_get_child(proj_id) if proj_id in group else None
+
+        def chunks(h5_array=h5_array):
+            if h5_array is None:
+                return
+
+            indices = {}
+
+            for index in range(h5_array.shape[1]):
+                name = "column_%i" % index
+
+                if name in h5_array._v_attrs:
+                    indices[str(h5_array._v_attrs[name])] = index
+
+            ### as in neuroml.hdf5.NetworkContainer.ConnectionList, the cells are in columns 1 and 2 if there are no attributes
+            indices.setdefault("pre_cell_id", 1)
+
+            indices.setdefault("post_cell_id", 2)
+
+            for start in range(0, h5_array.shape[0], CHUNK_SIZE):
+                rows = h5_array.read(start, min(h5_array.shape[0], start + CHUNK_SIZE))
+
+                chunk = {}
+
+                for hdf5_name in [
+                    "pre_cell_id",
+                    "post_cell_id",
+                    "post_segment_id",
+                    "weight",
+                    "delay",
+                ]:
+                    name = oc_build.sparse.HDF5_COLUMNS[hdf5_name]
+
+                    if hdf5_name in indices:
+                        chunk[name] = rows[:, indices[hdf5_name]]
+
+                    else:
+                        chunk[name] = np.full(
+                            len(rows),
+                            oc_build.sparse.COLUMN_DEFAULTS[name],
+                            dtype=np.float32,
+                        )
+
+                for name in ["pre_cell", "post_cell", "post_segment"]:
+                    chunk[name] = chunk[name].astype(np.int64)
+
+                yield chunk
+
+        post_population = populations[str(attrs["postsynapticPopulation"])]
+
+        projection_type = PROJECTION_TYPES[str(attrs["type"])]
+
+        info = {
+            "id": proj_id,
+            "type": projection_type,
+            "presynaptic_population": str(attrs["presynapticPopulation"]),
+            "postsynaptic_population": str(attrs["postsynapticPopulation"]),
+            "synapse": str(attrs["synapse"]) if "synapse" in attrs else None,
+        }
+
+        yield (
+            _ProjectionStatistics(
+                info,
+                populations[info["presynaptic_population"]],
+                post_population,
+                _get_cell(None, post_population["component"], cells),
+                num_bins,
+            ),
+            chunks,
+        )
+
+
+##############################################################################################
+
+
+def _get_statistics(network_id, populations, projections, segment_groups):
+    statistics = {
+        "network": network_id,
+        "populations": populations,
+        "projections": [],
+    }
+
+    for projection, chunks in projections:
+        for chunk in chunks():
+            projection.add(
+                chunk["pre_cell"],
+                chunk["post_cell"],
+                chunk["post_segment"],
+                chunk["weight"],
+                chunk["delay"],
+            )
+
+        if projection.needs_values():
+            for chunk in chunks():
+                projection.add_values(chunk["weight"], chunk["delay"])
+
+        statistics["projections"].append(projection.get_statistics(segment_groups))
+
+    return statistics
+
+
+def get_network_statistics(network, cells=None, segment_groups=None, num_bins=NUM_BINS):
+    """
+    Returns the connectivity statistics (see the module documentation) of `network`: a neuroml.NeuroMLDocument, a neuroml.Network or
+    the name of a NeuroML file (HDF5 files, ending with .h5, are read in chunks; other files are loaded whole).
+
+    `cells` is an optional dictionary {component id: neuroml.Cell} of the postsynaptic cells, used for the synapses per segment
+    group; by default the cells in the document or those included with opencortex are used. `segment_groups` optionally restricts
+    the segment groups reported (by default all the groups with synapses).
+    """
+
+    if isinstance(network, str):
+        if network.endswith(".h5"):
+            import tables
+
+            with tables.open_file(network, mode="r") as h5file:
+                projections = _get_hdf5_projections(h5file, cells, num_bins)
+
+                net_group = h5file.root.neuroml.network
+
+                populations = dict(
+                    (
+                        str(group._v_attrs["id"]),
+                        {
+                            "size": int(group._v_attrs["size"]),
+                            "component": str(group._v_attrs["component"]),
+                        },
+                    )
+                    for group in net_group._f_iter_nodes("Group")
+                    if group._v_name.startswith("population_")
+                )
+
+                return _get_statistics(
+                    str(net_group._v_attrs["id"]),
+                    populations,
+                    projections,
+                    segment_groups,
+                )
+
+        network = loaders.read_neuroml2_file(network)
+
+    if isinstance(network, neuroml.NeuroMLDocument):
+        nml_doc = network
+
+        if len(nml_doc.networks) != 1:
+            raise Exception(
+                "Error! Expected a single network in document %s, found %i"
+                % (nml_doc.id, len(nml_doc.networks))
+            )
+
+        net = nml_doc.networks[0]
+
+    else:
+        nml_doc = None
+
+        net = network
+
+    populations = dict(
+        (population.id, {"size": population.size, "component": population.component})
+        for population in net.populations
+    )
+
+    return _get_statistics(
+        net.id,
+        populations,
+        _get_memory_projections(nml_doc, net, cells, num_bins),
+        segment_groups,
+    )
+
+
+##############################################################################################
+
+
+def _svg_histogram(counts, width=240, height=60):
+    """Returns an inline SVG bar chart of the counts of a histogram"""
+
+    counts = [count if count != None else 0 for count in counts]
+
+    maximum = max(counts) if len(counts) > 0 and max(counts) > 0 else 1
+
+    bar_width = float(width) / max(len(counts), 1)
+
+    bars = []
+
+    for index, count in enumerate(counts):
+        bar_height = height * count / maximum
+
+        bars.append(
+            '<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f"/>'
+            % (index * bar_width, height - bar_height, bar_width * 0.9, bar_height)
+        )
+
+    return '<svg width="%i" height="%i">%s</svg>' % (width, height, "".join(bars))
+
+
+def _html_summary_row(name, summary):
+    if summary == None:
+        return ""
+
+    return (
+        "<tr><th>%s</th><td>%s</td><td>%s</td><td>%.4g</td><td>%.4g</td><td>%s</td></tr>"
+        % (
+            html.escape(name),
+            summary["min"],
+            summary["max"],
+            summary["mean"],
+            summary["std"],
+            _svg_histogram(summary["histogram"]["counts"]),
+        )
+    )
+
+
+def _to_html(statistics):
+    lines = [
+        "<!DOCTYPE html>",
+        "<html><head><meta charset='utf-8'><title>Connectivity of %s</title>"
+        % html.escape(statistics["network"]),
+        "<style>body{font-family:sans-serif} table{border-collapse:collapse;margin-bottom:1em} "
+        "td,th{border:1px solid #ccc;padding:2px 6px;text-align:left} rect{fill:#4a78b0}</style>",
+        "</head><body>",
+        "<h1>Connectivity of %s</h1>" % html.escape(statistics["network"]),
+        "<table><tr><th>Population</th><th>Component</th><th>Size</th></tr>",
+    ]
+
+    for population_id, population in statistics["populations"].items():
+        lines.append(
+            "<tr><td>%s</td><td>%s</td><td>%i</td></tr>"
+            % (
+                html.escape(population_id),
+                html.escape(population["component"]),
+                population["size"],
+            )
+        )
+
+    lines.append("</table>")
+
+    for projection in statistics["projections"]:
+        lines.append(
+            "<h2>%s</h2><p>%s projection %s &rarr; %s, synapse %s: %i connections</p>"
+            % (
+                html.escape(projection["id"]),
+                projection["type"],
+                html.escape(projection["presynaptic_population"]),
+                html.escape(projection["postsynaptic_population"]),
+                html.escape(str(projection["synapse"])),
+                projection["connections"],
+            )
+        )
+
+        lines.append(
+            "<table><tr><th></th><th>Min</th><th>Max</th><th>Mean</th><th>Std</th><th>Histogram</th></tr>"
+        )
+
+        lines.append(_html_summary_row("In degree", projection["in_degree"]))
+
+        lines.append(_html_summary_row("Out degree", projection["out_degree"]))
+
+        lines.append(_html_summary_row("Weight", projection["weight"]))
+
+        lines.append(_html_summary_row("Delay (ms)", projection["delay"]))
+
+        lines.append("</table>")
+
+        if "distance" in projection:
+            distance = projection["distance"]
+
+            lines.append(
+                "<p>Connection probability vs distance (0 to %.4g um): %s</p>"
+                % (distance["edges"][-1], _svg_histogram(distance["probability"]))
+            )
+
+        synapses = projection["synapses"].get(
+            "segment_groups", projection["synapses"]["segments"]
+        )
+
+        if len(synapses) > 0:
+            lines.append(
+                "<p>Synapses per %s: %s</p>"
+                % (
+                    (
+                        "segment group"
+                        if "segment_groups" in projection["synapses"]
+                        else "segment"
+                    ),
+                    ", ".join(
+                        "%s: %i" % (html.escape(name), count)
+                        for name, count in sorted(synapses.items())
+                    ),
+                )
+            )
+
+    lines.append("</body></html>")
+
+    return "\n".join(lines)
+
+
+def save_report(statistics, file_name):
+    """Saves the statistics returned by get_network_statistics() as a compact JSON report, or as an HTML report (with tables and
+    histograms) if `file_name` ends with .html"""
+
+    with open(file_name, "w") as report_file:
+        if file_name.endswith(".html"):
+            report_file.write(_to_html(statistics))
+
+        else:
+            json.dump(statistics, report_file, separators=(",", ":"))
+
+    opencortex.print_comment_v(
+        "Saved the connectivity statistics of %s to %s"
+        % (statistics["network"], file_name)
+    )
+
+    return file_name
@@ -0,0 +1,481 @@
+###############################################################
+###
+### Note: OpenCortex is under active development, the API is subject to change without notice!!
+###
+### Authors: Padraig Gleeson, Rokas Stanislovas
+###
+### This software has been funded by the Wellcome Trust, as well as a GSoC 2016 project
+### on Cortical Network develoment
+###
+##############################################################
+
+"""
+Parameter sweeps: a network generator function is run for each point of a parameter grid, and the LEMS simulation it writes
+is run with opencortex.core.simulate_network(), in a pool of worker processes.
+
+Each point (job) of the sweep is run in its own working directory in the sweep directory, named after a hash of its parameters.
+The result of a job is saved there as soon as it finishes, so a sweep which is interrupted (or crashes) can be run again with
+the same arguments and only runs the jobs which have not finished (and, by default, those which failed).
+
+The number of jobs run at the same time is limited both by `max_workers` and by the total memory the JVMs of the simulations
+may use (`memory_budget`): each simulation is given `max_memory`, so at most memory_budget / max_memory jobs run concurrently.
+"""
+
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import shutil
+import time
+import traceback
+
+import opencortex
+import opencortex.core as oc
+
+RESULT_FILE = "result.pickle"
+
+PARAMETERS_FILE = "parameters.json"
+
+DONE = "done"
+
+FAILED = "failed"
+
+
+##############################################################################################
+
+
+def expand_parameter_grid(parameter_grid):
+    """Returns the list of parameter dictionaries of the sweep: `parameter_grid` is either a dictionary of lists of values, e.g.
+    {'ratio_inh_exc': [1, 2], 'input_rate': [50, 100, 150]}, which is expanded to all the combinations of the values (with the last
+    parameter changing fastest), or a list of such dictionaries (grids), or a list of parameter dictionaries
+    """
+
+    if isinstance(parameter_grid, dict):
+        names = list(parameter_grid.keys())
+
+        return [
+            dict(zip(names, values))
+            for values in itertools.product(
+                *[list(parameter_grid[name]) for name in names]
+            )
+        ]
+
+    points = []
+
+    for grid in parameter_grid:
+        if isinstance(grid, dict) and any(
+            isinstance(value, (list, tuple, range)) for value in grid.values()
+        ):
+            points.extend(expand_parameter_grid(grid))
+
+        else:
+            points.append(dict(grid))
+
+    return points
+
+
+def _to_json_value(value):
+    """Converts NumPy scalars (e.g. the values of numpy.arange()) to Python numbers"""
+
+    if hasattr(value, "item") and not isinstance(value, (list, dict, str)):
+        return value.item()
+
+    return value
+
+
+def get_job_id(parameters):
+    """Returns the id of the job with the dictionary of `parameters`, which only depends on the names and values of the parameters"""
+
+    parameters = dict(
+        (name, _to_json_value(value)) for name, value in parameters.items()
+    )
+
+    text = json.dumps(parameters, sort_keys=True, default=repr)
+
+    return "job_%s" % hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_memory(memory):
+    """Returns the memory in MB specified by `memory`, a number of MB or a string as used for the JVM, e.g. '400M' or '4G'"""
+
+    if isinstance(memory, (int, float)):
+        return float(memory)
+
+    text = memory.strip().upper()
+
+    units = {"K": 1.0 / 1024, "M": 1.0, "G": 1024.0, "T": 1024.0 * 1024}
+
+    try:
+        if text[-1] in units:
+            return float(text[:-1]) * units[text[-1]]
+
+        return float(text) / (1024 * 1024)
+
+    except ValueError:
+        raise Exception("Error! Cannot parse the amount of memory: %s" % memory)
+
+
+def get_number_of_workers(max_memory, memory_budget=None, max_workers=None):
+    """Returns the number of jobs which can run at the same time: at most `max_workers` (by default the number of CPUs) and such
+    that the JVMs, which use up to `max_memory` each, fit in `memory_budget`"""
+
+    if max_workers == None:
+        max_workers = os.cpu_count() or 1
+
+    if memory_budget == None:
+        return max(1, max_workers)
+
+    num_workers = int(parse_memory(memory_budget) // parse_memory(max_memory))
+
+    if num_workers < 1:
+        raise Exception(
+            "Error! The memory of a single simulation (%s) is larger than the memory budget of the sweep (%s)"
+            % (max_memory, memory_budget)
+        )
+
+    return max(1, min(max_workers, num_workers))
+
+
+##############################################################################################
+
+
+def _get_lems_file_name(output):
+    """Returns the LEMS file name in the value returned by a generator: the file name itself or the last element of a tuple or list,
+    e.g. the (nml_doc, nml_file_name, lems_file_name) returned by the generate() functions of the examples
+    """
+
+    if isinstance(output, (tuple, list)) and len(output) > 0:
+        output = output[-1]
+
+    if isinstance(output, str) and output.endswith(".xml"):
+        return output
+
+    return None
+
+
+def _save_result(job_dir, result):
+    result_file = os.path.join(job_dir, RESULT_FILE)
+
+    temp_file = "%s.%i.tmp" % (result_file, os.getpid())
+
+    with open(temp_file, "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.replace(temp_file, result_file)
+
+
+def load_job_result(job_dir):
+    """Returns the saved result of the job in `job_dir`, or None if the job has not finished"""
+
+    result_file = os.path.join(job_dir, RESULT_FILE)
+
+    if not os.path.isfile(result_file):
+        return None
+
+    try:
+        with open(result_file, "rb") as f:
+            return pickle.load(f)
+
+    except Exception as error:
+        opencortex.print_comment_v(
+            "Ignoring the unreadable result file %s: %s" % (result_file, error)
+        )
+
+        return None
+
+
+def _run_job(job):
+    """Runs one job of the sweep in a worker process: calls the generator in the working directory of the job, simulates the LEMS
+    file it returns and saves the result"""
+
+    (
+        job_id,
+        job_dir,
+        generator,
+        parameters,
+        simulator,
+        max_memory,
+        simulate_kwargs,
+        analyse,
+    ) = job
+
+    start = time.time()
+
+    result = {
+        "Id": job_id,
+        "Parameters": parameters,
+        "Directory": job_dir,
+        "Status": FAILED,
+        "LEMSFile": None,
+        "Output": None,
+        "Results": None,
+        "Error": None,
+        "Time": 0,
+    }
+
+    current_dir = os.getcwd()
+
+    try:
+        os.chdir(job_dir)
+
+        output = generator(**parameters)
+
+        lems_file_name = _get_lems_file_name(output)
+
+        result["LEMSFile"] = lems_file_name
+
+        if simulator != None and lems_file_name != None:
+            kwargs = {"nogui": True, "verbose": False}
+
+            kwargs.update(simulate_kwargs)
+
+            result["Results"] = oc.simulate_network(
+                lems_file_name, simulator, max_memory=max_memory, **kwargs
+            )
+
+        if analyse != None:
+            result["Output"] = analyse(parameters, output, result["Results"])
+
+        elif simulator == None or lems_file_name == None:
+            result["Output"] = _picklable_or_none(output)
+
+        result["Status"] = DONE
+
+    except Exception:
+        result["Error"] = traceback.format_exc()
+
+    finally:
+        os.chdir(current_dir)
+
+    result["Time"] = time.time() - start
+
+    _save_result(job_dir, result)
+
+    return result
+
+
+def _prepare_job_dir(job_dir, parameters):
+    """Creates the working directory of a job, removing the outputs of an unfinished (or failed) run of the job"""
+
+    if os.path.isdir(job_dir):
+        shutil.rmtree(job_dir)
+
+    os.makedirs(job_dir)
+
+    with open(os.path.join(job_dir, PARAMETERS_FILE), "w") as f:
+        json.dump(
+            dict((name, _to_json_value(value)) for name, value in parameters.items()),
+            f,
+            indent=2,
+            default=repr,
+        )
+
+
+def _picklable_or_none(value):
+    try:
+        pickle.dumps(value)
+
+        return value
+
+    except Exception:
+        return None
+
+
+##############################################################################################
+
+
+def run_sweep(
+    generator,
+    parameter_grid,
+    sweep_dir,
+    simulator="jNeuroML",
+    max_memory="400M",
+    memory_budget=None,
+    max_workers=None,
+    simulate_kwargs=None,
+    analyse=None,
+    callback=None,
+    resume=True,
+    retry_failed=True,
+    max_restarts=3,
+):
+    """Runs `generator` (a function at the top level of a module, so that it can be used in other processes) with each point of
+    `parameter_grid` (see expand_parameter_grid()) as keyword arguments and simulates the LEMS file it writes with
+    opencortex.core.simulate_network(). Arguments:
+
+    `generator`
+        function which builds the network and writes the LEMS file in the current directory (the working directory of the job) and returns
+        the name of the LEMS file, or a tuple/list with the LEMS file name last (e.g. (nml_doc, nml_file_name, lems_file_name))
+
+    `parameter_grid`
+        dictionary of lists of parameter values, or a list of such dictionaries or of parameter dictionaries
+
+    `sweep_dir`
+        directory in which the working directories of the jobs are created
+
+    `simulator`
+        the simulator used by simulate_network(), e.g. 'jNeuroML' or 'jNeuroML_NEURON'; if None, the networks are only generated
+
+    `max_memory`
+        the memory of the JVM of each simulation, e.g. '400M'
+
+    `memory_budget`
+        optional, the total memory of the JVMs of the simulations run at the same time, e.g. '8G'; limits the number of concurrent jobs
+
+    `max_workers`
+        optional, the maximum number of concurrent jobs (default: number of CPUs)
+
+    `simulate_kwargs`
+        optional, other arguments of simulate_network(), e.g. {'load_saved_data': True}
+
+    `analyse`
+        optional function (at the top level of a module) called in the worker as analyse(parameters, generator output, simulation
+        results); its (picklable) return value is stored as the 'Output' of the job, e.g. to keep only the firing rates
+
+    `callback`
+        optional function called in this process with the result of each job as soon as it finishes
+
+    `resume`
+        if True, the jobs whose result is saved in `sweep_dir` are not run again (failed jobs are run again if `retry_failed` is True)
+
+    `max_restarts`
+        number of times the pool of workers is restarted if a worker process dies (e.g. killed when out of memory); the jobs still
+        unfinished after that are returned as failed, and not saved, so that they are run again when the sweep is resumed
+
+    Returns the list of the results of the jobs, in the order of the points of the grid: dictionaries with the keys 'Id', 'Parameters',
+    'Directory', 'Status' ('done' or 'failed'), 'LEMSFile', 'Output', 'Results' (the value returned by simulate_network()), 'Error'
+    and 'Time'.
+    """
+
+    points = expand_parameter_grid(parameter_grid)
+
+    sweep_dir = os.path.abspath(sweep_dir)
+
+    if not os.path.isdir(sweep_dir):
+        os.makedirs(sweep_dir)
+
+    num_workers = get_number_of_workers(max_memory, memory_budget, max_workers)
+
+    results = {}
+
+    pending = []
+
+    job_ids = []
+
+    for parameters in points:
+        job_id = get_job_id(parameters)
+
+        job_ids.append(job_id)
+
+        if job_id in results or job_id in [job[0] for job in pending]:
+            continue
+
+        job_dir = os.path.join(sweep_dir, job_id)
+
+        saved = load_job_result(job_dir) if resume else None
+
+        if saved != None and (saved["Status"] == DONE or not retry_failed):
+            results[job_id] = saved
+
+            continue
+
+        _prepare_job_dir(job_dir, parameters)
+
+        pending.append(
+            (
+                job_id,
+                job_dir,
+                generator,
+                parameters,
+                simulator,
+                max_memory,
+                simulate_kwargs if simulate_kwargs != None else {},
+                analyse,
+            )
+        )
+
+    opencortex.print_comment_v(
+        "Running %i of the %i jobs of the sweep in %s with %i processes"
+        % (len(pending), len(job_ids), sweep_dir, num_workers)
+    )
+
+    restarts = 0
+
+    while len(pending) > 0:
+        unfinished = []
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(num_workers, len(pending))
+        ) as executor:
+            futures = dict((executor.submit(_run_job, job), job) for job in pending)
+
+            for future in concurrent.futures.as_completed(futures):
+                job = futures[future]
+
+                try:
+                    result = future.result()
+
+                except concurrent.futures.process.BrokenProcessPool:
+                    unfinished.append(job)
+
+                    continue
+
+                results[job[0]] = result
+
+                if callback != None:
+                    callback(result)
+
+        pending = unfinished
+
+        if len(pending) > 0:
+            if restarts == max_restarts:
+                for job in pending:
+                    result = {
+                        "Id": job[0],
+                        "Parameters": job[3],
+                        "Directory": job[1],
+                        "Status": FAILED,
+                        "LEMSFile": None,
+                        "Output": None,
+                        "Results": None,
+                        "Error": "The worker process running the job ended unexpectedly",
+                        "Time": 0,
+                    }
+
+                    results[job[0]] = result
+
+                    if callback != None:
+                        callback(result)
+
+                break
+
+            restarts += 1
+
+            for job in pending:
+                _prepare_job_dir(job[1], job[3])
+
+            opencortex.print_comment_v(
+                "A worker process of the sweep ended unexpectedly; restarting the %i unfinished jobs"
+                % len(pending)
+            )
+
+    return [results[job_id] for job_id in job_ids]
+
+
+def load_sweep_results(sweep_dir):
+    """Returns the saved results of the (finished or failed) jobs in `sweep_dir`, in no particular order"""
+
+    results = []
+
+    for name in sorted(os.listdir(sweep_dir)):
+        job_dir = os.path.join(sweep_dir, name)
+
+        if os.path.isdir(job_dir):
+            result = load_job_result(job_dir)
+
+            if result != None:
+                results.append(result)
+
+    return results
@@ -34,6 +34,7 @@ setup(
     install_requires=[
         "pyNeuroML>=0.3.18",  # sets dependencies for other neuroml libs
         "matplotlib",
+        "scipy",
         "tables",
     ],
     dependency_links=[